@@ -1,29 +1,276 @@
-from collections.abc import AsyncGenerator
+import asyncio
+import inspect
+import logging
+import time
+from collections.abc import AsyncGenerator, Awaitable, Callable
+from typing import Any
 
+from sqlalchemy import event, make_url
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
     AsyncSession,
     async_sessionmaker,
     create_async_engine,
 )
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.orm import DeclarativeBase, Session
+from sqlalchemy.sql.dml import UpdateBase
 
-from app.config import DATABASE_URL
+from app.config import (
+    BASE_DIR,
+    DATABASE_URL,
+    DB_INIT_MODE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_RECYCLE_SEC,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT_SEC,
+    DB_STATEMENT_CACHE_SIZE,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_CACHE_SIZE_KB,
+    SQLITE_MMAP_SIZE,
+    SQLITE_TUNING,
+    SQLITE_WRITER_TIMEOUT_SEC,
+)
+from app.metrics import LatencyRecorder
 
-engine = create_async_engine(DATABASE_URL, echo=False)
+logger = logging.getLogger(__name__)
+
+
+def engine_options(url: str) -> dict[str, Any]:
+    """バックエンドごとの create_async_engine 引数。"""
+    if url.startswith("postgresql"):
+        return {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT_SEC,
+            "pool_recycle": DB_POOL_RECYCLE_SEC,
+            # RDS のフェイルオーバー後に切れた接続を使わない
+            "pool_pre_ping": True,
+            "connect_args": {"prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE},
+        }
+    return {}
+
+
+# ── SQLite 実行時プロファイル ─────────────────────────
+#
+# ファイル DB の場合、接続ごとに以下を設定する:
+#   journal_mode=WAL        読み取りが書き込みを待たない
+#   synchronous=NORMAL      WAL では COMMIT ごとの fsync を省いても破損しない
+#   busy_timeout            ロック競合時に即 "database is locked" にせず待つ
+#   mmap_size / cache_size  読み取りのページキャッシュ
+# さらに書き込みは writer エンジン（接続1本のプール）に集約する。
+# 書き込みを含むトランザクションは writer 接続の空きを順番に待つため、
+# SQLite のライタロックを取り合ってリトライ・失敗することがなくなる。
+# 読み取りは従来どおり reader 接続のプールを使う。
+
+
+def is_sqlite_file(url: str) -> bool:
+    u = make_url(url)
+    return u.get_backend_name() == "sqlite" and u.database not in (None, "", ":memory:")
+
+
+def _apply_sqlite_pragmas(dbapi_conn, _record) -> None:
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.close()
+
+
+class RoutingSession(Session):
+    """読み取りは bind（reader プール）、書き込みは writer に流すセッション。
+
+    一度書き込んだセッションは、自分の未コミットの変更を読めるよう
+    トランザクションが終わるまで以降の読み取りも writer で行う。
+    """
+
+    def __init__(self, *args: Any, writer: AsyncEngine | None = None, **kw: Any) -> None:
+        super().__init__(*args, **kw)
+        self._writer = writer.sync_engine if writer is not None else None
+        self._wrote = False
+
+    def get_bind(self, mapper=None, *, clause=None, **kw):
+        if self._writer is not None and (
+            self._wrote or self._flushing or isinstance(clause, UpdateBase)
+        ):
+            self._wrote = True
+            return self._writer
+        return super().get_bind(mapper, clause=clause, **kw)
 
-async_session_factory = async_sessionmaker(
-    engine,
-    class_=AsyncSession,
-    expire_on_commit=False,
-)
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _reset_route(session: RoutingSession, transaction) -> None:
+    # コミット後の読み取りは reader に戻し、writer 接続を握り続けない
+    if transaction.parent is None:
+        session._wrote = False
+
+
+def create_engines(
+    url: str,
+    *,
+    sqlite_tuning: bool = SQLITE_TUNING,
+) -> tuple[AsyncEngine, AsyncEngine | None]:
+    """(reader 兼デフォルトのエンジン, writer エンジン) を作る。writer は SQLite プロファイル時のみ。"""
+    reader = create_async_engine(url, echo=False, **engine_options(url))
+    if not (sqlite_tuning and is_sqlite_file(url)):
+        return reader, None
+    writer = create_async_engine(
+        url,
+        echo=False,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=SQLITE_WRITER_TIMEOUT_SEC,
+    )
+    for e in (reader, writer):
+        event.listen(e.sync_engine, "connect", _apply_sqlite_pragmas)
+    return reader, writer
+
+
+def create_session_factory(
+    reader: AsyncEngine,
+    writer: AsyncEngine | None = None,
+) -> async_sessionmaker[AsyncSession]:
+    if writer is None:
+        return async_sessionmaker(reader, class_=AsyncSession, expire_on_commit=False)
+    return async_sessionmaker(
+        reader,
+        class_=AsyncSession,
+        sync_session_class=RoutingSession,
+        writer=writer,
+        expire_on_commit=False,
+    )
+
+
+engine, writer_engine = create_engines(DATABASE_URL)
+
+async_session_factory = create_session_factory(engine, writer_engine)
 
 
 class Base(DeclarativeBase):
     pass
 
 
-async def init_db() -> None:
-    """テーブルを全て作成する（開発用）。"""
+# ── コミット後の処理 ───────────────────────────────────
+
+_AFTER_COMMIT = "after_commit"
+_ON_ROLLBACK = "on_rollback"
+# 実行中のコールバック（タスクが GC されないよう参照を持つ）
+_after_commit_tasks: set[asyncio.Task] = set()
+
+
+def after_commit(
+    session: AsyncSession,
+    callback: Callable[[], Awaitable[None]],
+    *,
+    on_rollback: Callable[[], Awaitable[None] | None] | None = None,
+) -> None:
+    """session のトランザクションがコミットされたら callback() をタスクとして実行する。
+
+    他ワーカーへのキャッシュ無効化など、コミット前に行うと古い行を読み直させてしまう処理に使う。
+    コミットせずに終わったトランザクションでは callback を捨てて on_rollback() を呼ぶ
+    （コルーチンを返す場合はタスクとして実行する）。
+    トランザクションが始まっていなければ（待つ書き込みがない）すぐに実行する。
+    """
+    if not session.in_transaction():
+        _spawn(callback)
+        return
+    session.info.setdefault(_AFTER_COMMIT, []).append(callback)
+    if on_rollback is not None:
+        session.info.setdefault(_ON_ROLLBACK, []).append(on_rollback)
+
+
+def _spawn(callback: Callable[[], Awaitable[None]]) -> None:
+    task = asyncio.get_running_loop().create_task(_run_after_commit(callback))
+    _after_commit_tasks.add(task)
+    task.add_done_callback(_after_commit_tasks.discard)
+
+
+async def _run_after_commit(callback: Callable[[], Awaitable[None]]) -> None:
+    try:
+        await callback()
+    except Exception:
+        logger.exception("[after_commit] callback failed")
+
+
+@event.listens_for(Session, "after_commit")
+def _on_commit(sync_session: Session) -> None:
+    sync_session.info.pop(_ON_ROLLBACK, None)
+    for callback in sync_session.info.pop(_AFTER_COMMIT, ()):
+        _spawn(callback)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _on_transaction_end(sync_session: Session, transaction) -> None:
+    if transaction.parent is not None:
+        return
+    # after_commit で取り出されずに残っていれば、コミットされなかった
+    sync_session.info.pop(_AFTER_COMMIT, None)
+    for on_rollback in sync_session.info.pop(_ON_ROLLBACK, ()):
+        result = on_rollback()
+        if inspect.isawaitable(result):
+            _spawn(lambda result=result: result)
+
+
+# ── 計測（書き込み待ち） ───────────────────────────────
+
+
+class DBMetrics:
+    """書き込み文・COMMIT（get_session 内）の所要時間とロック競合エラーを数える。
+
+    SQLite ではライタロック待ち（busy_timeout）がこの所要時間に含まれる。
+    """
+
+    _WRITE_PREFIXES = ("INSERT", "UPDATE", "DELETE")
+
+    def __init__(self) -> None:
+        self.write_latency = LatencyRecorder()
+        self.commit_latency = LatencyRecorder()
+        self.locked_errors = 0
+
+    def install(self, sync_engine: Engine) -> None:
+        event.listen(sync_engine, "before_cursor_execute", self._before_execute)
+        event.listen(sync_engine, "after_cursor_execute", self._after_execute)
+        event.listen(sync_engine, "handle_error", self._on_error)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info["_metrics_started"] = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop("_metrics_started", None)
+        if started is not None and statement.lstrip()[:6].upper().startswith(self._WRITE_PREFIXES):
+            self.write_latency.record(time.perf_counter() - started)
+
+    def _on_error(self, context):
+        if "locked" in str(context.original_exception).lower():
+            self.locked_errors += 1
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "write_latency": self.write_latency.summary(),
+            "commit_latency": self.commit_latency.summary(),
+            "locked_errors": self.locked_errors,
+        }
+
+    def clear(self) -> None:
+        self.write_latency.clear()
+        self.commit_latency.clear()
+        self.locked_errors = 0
+
+
+db_metrics = DBMetrics()
+for _e in (engine, writer_engine):
+    if _e is not None:
+        db_metrics.install(_e.sync_engine)
+
+
+async def init_db(*, mode: str = DB_INIT_MODE, bind: AsyncEngine | None = None) -> str:
+    """テーブルを作成する。実際に行った処理（"create_all" / "skipped"）を返す。
+
+    mode="auto" では Alembic の head が DB に適用済みなら create_all を省く
+    （スキーマはマイグレーションで管理されている。全テーブルの存在確認を毎回しない）。
+    """
     # 全モデルを import してメタデータに登録する
     import app.models.admin  # noqa: F401
     import app.models.answer  # noqa: F401
@@ -31,8 +278,49 @@ async def init_db() -> None:
     import app.models.question  # noqa: F401
     import app.models.user  # noqa: F401
 
-    async with engine.begin() as conn:
+    if mode == "skip":
+        return "skipped"
+    async with (bind or writer_engine or engine).begin() as conn:
+        if mode == "auto":
+            heads = _alembic_heads()
+            if heads and await conn.run_sync(_current_revisions) == heads:
+                return "skipped"
         await conn.run_sync(Base.metadata.create_all)
+        # 既存のテーブルに後から追加したインデックス（create_all はテーブルがあると作らない）
+        await conn.run_sync(_create_missing_indexes)
+    return "create_all"
+
+
+def _alembic_heads() -> set[str]:
+    """alembic/versions の head リビジョン。Alembic 未導入・マイグレーション未作成なら空。"""
+    try:
+        from alembic.config import Config
+        from alembic.script import ScriptDirectory
+    except ImportError:
+        return set()
+    ini = BASE_DIR / "alembic.ini"
+    if not ini.exists():
+        return set()
+    config = Config(str(ini))
+    config.set_main_option("script_location", str(BASE_DIR / "alembic"))
+    try:
+        return set(ScriptDirectory.from_config(config).get_heads())
+    except Exception:
+        logger.exception("[init_db] failed to read alembic revisions")
+        return set()
+
+
+def _current_revisions(sync_conn) -> set[str]:
+    """DB に適用済みのリビジョン（alembic_version テーブル）。"""
+    from alembic.runtime.migration import MigrationContext
+
+    return set(MigrationContext.configure(sync_conn).get_current_heads())
+
+
+def _create_missing_indexes(sync_conn) -> None:
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
 
 
 async def get_session() -> AsyncGenerator[AsyncSession]:
@@ -40,7 +328,9 @@ async def get_session() -> AsyncGenerator[AsyncSession]:
     async with async_session_factory() as session:
         try:
             yield session
+            started = time.perf_counter()
             await session.commit()
+            db_metrics.commit_latency.record(time.perf_counter() - started)
         except Exception:
             await session.rollback()
             raise
@@ -5,52 +5,61 @@ from __future__ import annotations
 from fastapi import Depends, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import get_session
+from app.database import async_session_factory, get_session
+from app.services.answer_idempotency import answer_idempotency_store
+from app.services.answer_ingest import answer_ingestor
 from app.services.answer_service import AnswerService
+from app.services.deadline_scheduler import deadline_scheduler
 from app.services.event_service import EventService
+from app.services.event_state import event_state_cache
+from app.services.leaderboard import leaderboard_registry
+from app.services.question_bank import question_bank
 from app.services.question_service import QuestionService
+from app.services.question_stats import question_stats_registry
 from app.services.ranking_service import RankingService
-from app.store.sqlite_store import (
-    SQLiteAdminStore,
-    SQLiteAnswerStore,
-    SQLiteEventStore,
-    SQLiteQuestionStore,
-    SQLiteUserStore,
+from app.store import stores_for
+from app.store.base import (
+    BaseAdminStore,
+    BaseAnswerStore,
+    BaseEventStore,
+    BaseQuestionStore,
+    BaseUserStore,
 )
 from app.ws.manager import ws_manager
 
 
 # ── 低レベル: ストア ───────────────────────────────────
+# 実装（SQLite / PostgreSQL）はセッションの接続先（DATABASE_URL）で選ぶ。
 
 
 async def get_event_store(
     session: AsyncSession = Depends(get_session),
-) -> SQLiteEventStore:
-    return SQLiteEventStore(session)
+) -> BaseEventStore:
+    return stores_for(session).event(session)
 
 
 async def get_question_store(
     session: AsyncSession = Depends(get_session),
-) -> SQLiteQuestionStore:
-    return SQLiteQuestionStore(session)
+) -> BaseQuestionStore:
+    return stores_for(session).question(session)
 
 
 async def get_user_store(
     session: AsyncSession = Depends(get_session),
-) -> SQLiteUserStore:
-    return SQLiteUserStore(session)
+) -> BaseUserStore:
+    return stores_for(session).user(session)
 
 
 async def get_answer_store(
     session: AsyncSession = Depends(get_session),
-) -> SQLiteAnswerStore:
-    return SQLiteAnswerStore(session)
+) -> BaseAnswerStore:
+    return stores_for(session).answer(session)
 
 
 async def get_admin_store(
     session: AsyncSession = Depends(get_session),
-) -> SQLiteAdminStore:
-    return SQLiteAdminStore(session)
+) -> BaseAdminStore:
+    return stores_for(session).admin(session)
 
 
 # ── 高レベル: サービス ─────────────────────────────────
@@ -59,40 +68,70 @@ async def get_admin_store(
 async def get_event_service(
     session: AsyncSession = Depends(get_session),
 ) -> EventService:
+    stores = stores_for(session)
     return EventService(
-        event_store=SQLiteEventStore(session),
-        question_store=SQLiteQuestionStore(session),
-        user_store=SQLiteUserStore(session),
-        answer_store=SQLiteAnswerStore(session),
+        event_store=stores.event(session),
+        question_store=stores.question(session),
+        user_store=stores.user(session),
+        answer_store=stores.answer(session),
         ws_manager=ws_manager,
+        leaderboards=leaderboard_registry,
+        ingestor=answer_ingestor,
+        state_cache=event_state_cache,
+        question_stats=question_stats_registry,
+        deadlines=deadline_scheduler,
+        questions=question_bank,
     )
 
 
+async def close_expired_question(event_id: str, question_id: str) -> None:
+    """締切到達時の自動クローズ（DeadlineScheduler から呼ばれる。リクエスト外で独自にセッションを開く）。"""
+    async with async_session_factory() as session:
+        service = await get_event_service(session)
+        await service.close_expired(event_id, question_id)
+        await session.commit()
+
+
 async def get_question_service(
     session: AsyncSession = Depends(get_session),
 ) -> QuestionService:
-    return QuestionService(SQLiteQuestionStore(session))
+    return QuestionService(
+        stores_for(session).question(session),
+        state_cache=event_state_cache,
+        questions=question_bank,
+        ws_manager=ws_manager,
+    )
 
 
 async def get_answer_service(
     session: AsyncSession = Depends(get_session),
 ) -> AnswerService:
+    stores = stores_for(session)
     return AnswerService(
-        answer_store=SQLiteAnswerStore(session),
-        event_store=SQLiteEventStore(session),
-        question_store=SQLiteQuestionStore(session),
-        user_store=SQLiteUserStore(session),
+        answer_store=stores.answer(session),
+        event_store=stores.event(session),
+        question_store=stores.question(session),
+        user_store=stores.user(session),
         ws_manager=ws_manager,
+        leaderboards=leaderboard_registry,
+        ingestor=answer_ingestor,
+        state_cache=event_state_cache,
+        question_stats=question_stats_registry,
+        deadlines=deadline_scheduler,
+        idempotency=answer_idempotency_store,
     )
 
 
 async def get_ranking_service(
     session: AsyncSession = Depends(get_session),
 ) -> RankingService:
+    stores = stores_for(session)
     return RankingService(
-        event_store=SQLiteEventStore(session),
-        user_store=SQLiteUserStore(session),
-        answer_store=SQLiteAnswerStore(session),
+        event_store=stores.event(session),
+        user_store=stores.user(session),
+        answer_store=stores.answer(session),
+        leaderboards=leaderboard_registry,
+        ingestor=answer_ingestor,
     )
 
 
@@ -1,22 +1,50 @@
 """Phase 2: FastAPI アプリケーションエントリポイント。"""
 
+import asyncio
+import contextlib
 import logging
 from contextlib import asynccontextmanager
+from functools import partial
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
-from app.config import CORS_ORIGINS, UPLOADS_DIR, REDIS_URL
-from app.database import async_session_factory, init_db
+from app.config import ANSWER_WRITE_BEHIND, CORS_ORIGINS, UPLOADS_DIR, REDIS_URL, WS_IPC_SOCKET
+from app.database import async_session_factory, engine, init_db
+from app.dependencies import close_expired_question
+from app.metrics import startup_timings
 from app.routers import admin, events, health, ws
 from app.seed import seed_all
+from app.services.admin_sessions import admin_session_store
+from app.services.analytics import analytics_archive
+from app.services.answer_ingest import answer_ingestor
+from app.services.answer_service import record_stored_answers
+from app.services.audit_log import audit_log_writer
+from app.services.deadline_scheduler import deadline_scheduler
+from app.services.event_state import event_state_cache
+from app.services.participant_cache import participant_cache
+from app.services.question_bank import question_bank
+from app.services.question_stats import question_stats_registry
+from app.store import store_classes
+from app.valkey import valkey_pool
+from app.ws.manager import ws_manager
 
 logger = logging.getLogger(__name__)
 # 起動時に確認できるようにWARNINGレベルで必ず出力する
 logging.getLogger("app.main").setLevel(logging.WARNING)
 
 
+async def _warm_question_bank() -> None:
+    try:
+        with startup_timings.phase("question_bank"):
+            await question_bank.warm(
+                async_session_factory, store_classes(engine.dialect.name).question,
+            )
+    except Exception:
+        logger.exception("[startup] question bank warm-up failed")
+
+
 @asynccontextmanager
 async def lifespan(_app: FastAPI):
     # ── startup ──
@@ -28,11 +56,53 @@ async def lifespan(_app: FastAPI):
     logging.warning("[VERSION CHECK] This is revision 7 with Valkey logging")
     logging.warning("=" * 80)
 
-    await init_db()
-    async with async_session_factory() as session:
-        await seed_all(session)
+    with startup_timings.phase("init_db"):
+        startup_timings.results["init_db"] = await init_db()
+    with startup_timings.phase("seed"):
+        async with async_session_factory() as session:
+            startup_timings.results["seeded"] = await seed_all(session)
+    with startup_timings.phase("services"):
+        deadline_scheduler.configure(close_expired_question)
+        # 複数ワーカー構成で他のワーカーが更新したイベント状態・参加者を捨てる
+        ws_manager.on_invalidate("event_state", event_state_cache.forget)
+        ws_manager.on_invalidate("participant", participant_cache.invalidate)
+        ws_manager.on_invalidate("participant_event", participant_cache.invalidate_event)
+        await admin_session_store.start()
+        await ws_manager.start()
+        await audit_log_writer.start(
+            async_session_factory, store_classes(engine.dialect.name).admin,
+        )
+        question_stats_registry.configure(
+            async_session_factory, store_classes(engine.dialect.name).answer,
+        )
+        if ANSWER_WRITE_BEHIND and WS_IPC_SOCKET and not REDIS_URL:
+            # 回答済みの判定をワーカー間で共有できない（同じユーザの回答を2回受理しうる）
+            logger.error(
+                "[startup] ANSWER_WRITE_BEHIND needs REDIS_URL when WS_IPC_SOCKET is set; "
+                "answers are written in the request instead",
+            )
+        elif ANSWER_WRITE_BEHIND:
+            await answer_ingestor.start(
+                async_session_factory, store_classes(engine.dialect.name).answer,
+                on_written=partial(record_stored_answers, ws_manager=ws_manager),
+            )
+    # 問題バンクの読み込みは待たない（終わるまではキャッシュミスとして DB から引く）
+    warm_task = asyncio.create_task(_warm_question_bank())
+    startup_timings.mark_ready()
+    logger.warning("[startup] %s", startup_timings.stats())
     yield
     # ── shutdown ──
+    warm_task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await warm_task
+    deadline_scheduler.clear()
+    # 未書き込みの回答を全て書き出してから終了する
+    await answer_ingestor.stop()
+    await analytics_archive.wait_idle()
+    await audit_log_writer.stop()
+    await admin_session_store.stop()
+    await ws_manager.stop()
+    await valkey_pool.close()
 
 
 app = FastAPI(lifespan=lifespan)
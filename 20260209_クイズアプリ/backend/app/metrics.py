@@ -0,0 +1,74 @@
+"""プロセス内のレイテンシ・起動処理の所要時間の計測（/api/health で公開する）。"""
+
+from __future__ import annotations
+
+import time
+from collections import deque
+from collections.abc import Iterator, Iterable
+from contextlib import contextmanager
+from typing import Any
+
+
+def percentiles(samples: Iterable[float], ps: Iterable[int] = (50, 95, 99)) -> dict[str, float]:
+    """最近傍順位法のパーセンタイル（秒のサンプルをミリ秒に丸めて返す）。"""
+    data = sorted(samples)
+    if not data:
+        return {}
+    out: dict[str, float] = {}
+    for p in ps:
+        idx = max(0, min(len(data) - 1, -(-p * len(data) // 100) - 1))
+        out[f"p{p}_ms"] = round(data[idx] * 1000, 2)
+    out["max_ms"] = round(data[-1] * 1000, 2)
+    return out
+
+
+class LatencyRecorder:
+    """直近 sample_size 件のレイテンシ（秒）を保持する。"""
+
+    def __init__(self, sample_size: int = 2048) -> None:
+        self._samples: deque[float] = deque(maxlen=sample_size)
+        self.count = 0
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+        self.count += 1
+
+    def summary(self) -> dict[str, Any]:
+        return {"count": self.count, **percentiles(self._samples)}
+
+    def clear(self) -> None:
+        self._samples.clear()
+        self.count = 0
+
+
+class StartupTimings:
+    """起動処理のフェーズごとの所要時間（ミリ秒）。"""
+
+    def __init__(self) -> None:
+        self._started = time.perf_counter()
+        self.phases: dict[str, float] = {}
+        self.results: dict[str, Any] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round((time.perf_counter() - start) * 1000, 2)
+
+    def mark_ready(self) -> None:
+        """モジュールの読み込みから起動完了（リクエストを受け付け始める）までの経過時間を記録する。"""
+        self.phases["total"] = round((time.perf_counter() - self._started) * 1000, 2)
+
+    def stats(self) -> dict[str, Any]:
+        return {"phases_ms": dict(self.phases), **self.results}
+
+    def reset(self) -> None:
+        self._started = time.perf_counter()
+        self.phases.clear()
+        self.results.clear()
+
+
+# グローバルシングルトン（main.py の lifespan で記録）
+startup_timings = StartupTimings()
@@ -1,7 +1,7 @@
 from app.models.admin import Admin, AdminAuditLog
 from app.models.answer import Answer
 from app.models.event import Event, EventQuestion
-from app.models.question import Question, QuestionChoice
+from app.models.question import Question, QuestionChoice, QuestionSearch, QuestionTag
 from app.models.user import EventSession, EventUser
 
 __all__ = [
@@ -14,4 +14,6 @@ __all__ = [
     "EventUser",
     "Question",
     "QuestionChoice",
+    "QuestionSearch",
+    "QuestionTag",
 ]
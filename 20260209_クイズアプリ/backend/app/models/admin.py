@@ -1,4 +1,4 @@
-from sqlalchemy import String
+from sqlalchemy import Index, String
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.database import Base
@@ -21,3 +21,9 @@ class AdminAuditLog(Base):
     event_id: Mapped[str | None]
     payload: Mapped[str | None]  # JSON string
     created_at: Mapped[str]
+
+    # /admin/logs の新しい順・イベント別のページング用
+    __table_args__ = (
+        Index("ix_admin_audit_logs_created_at", "created_at", "id"),
+        Index("ix_admin_audit_logs_event_id_created_at", "event_id", "created_at", "id"),
+    )
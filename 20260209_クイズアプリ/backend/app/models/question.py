@@ -1,8 +1,13 @@
-from sqlalchemy import ForeignKey, String, UniqueConstraint
+import sqlite3
+
+from sqlalchemy import DDL, ForeignKey, Index, String, Text, UniqueConstraint, event
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
 
+# FTS5 の trigram トークナイザ（SQLite 3.34 以降）。区切りのない日本語も部分一致で引ける。
+SQLITE_TRIGRAM = sqlite3.sqlite_version_info >= (3, 34, 0)
+
 
 class Question(Base):
     __tablename__ = "questions"
@@ -21,6 +26,16 @@ class Question(Base):
         cascade="all, delete-orphan",
         order_by="QuestionChoice.choice_index",
     )
+    tags: Mapped[list["QuestionTag"]] = relationship(
+        cascade="all, delete-orphan",
+        order_by="QuestionTag.tag",
+    )
+
+    __table_args__ = (
+        # 一覧のキーセットページング（sort_order, id の順）
+        Index("ix_questions_sort_order_id", "sort_order", "id"),
+        Index("ix_questions_is_enabled_sort_order_id", "is_enabled", "sort_order", "id"),
+    )
 
 
 class QuestionChoice(Base):
@@ -39,3 +54,72 @@ class QuestionChoice(Base):
     __table_args__ = (
         UniqueConstraint("question_id", "choice_index"),
     )
+
+
+class QuestionTag(Base):
+    __tablename__ = "question_tags"
+
+    question_id: Mapped[str] = mapped_column(
+        ForeignKey("questions.id", ondelete="CASCADE"), primary_key=True,
+    )
+    tag: Mapped[str] = mapped_column(String, primary_key=True)
+
+    __table_args__ = (
+        Index("ix_question_tags_tag_question_id", "tag", "question_id"),
+    )
+
+
+class QuestionSearch(Base):
+    """問題文と選択肢をまとめた検索用の文書（問題ごとに1行）。
+
+    SQLite では FTS5（trigram）の外部コンテンツテーブル question_search_fts、
+    PostgreSQL では pg_trgm の GIN インデックスで部分一致検索する。
+    """
+
+    __tablename__ = "question_search"
+
+    # FTS5 の content_rowid（SQLite では rowid の別名）
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    question_id: Mapped[str] = mapped_column(
+        ForeignKey("questions.id", ondelete="CASCADE"), unique=True,
+    )
+    body: Mapped[str] = mapped_column(Text)
+
+
+# ── 全文検索インデックス（question_search の作成時に作る） ──────────
+
+_SQLITE_FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS question_search_fts USING fts5(
+        body, content='question_search', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS question_search_ai AFTER INSERT ON question_search BEGIN
+        INSERT INTO question_search_fts(rowid, body) VALUES (new.id, new.body);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS question_search_ad AFTER DELETE ON question_search BEGIN
+        INSERT INTO question_search_fts(question_search_fts, rowid, body) VALUES ('delete', old.id, old.body);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS question_search_au AFTER UPDATE ON question_search BEGIN
+        INSERT INTO question_search_fts(question_search_fts, rowid, body) VALUES ('delete', old.id, old.body);
+        INSERT INTO question_search_fts(rowid, body) VALUES (new.id, new.body);
+    END""",
+]
+_POSTGRES_TRGM_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_question_search_body_trgm"
+    " ON question_search USING gin (body gin_trgm_ops)",
+]
+
+for _stmt in _SQLITE_FTS_DDL:
+    event.listen(
+        QuestionSearch.__table__, "after_create",
+        DDL(_stmt).execute_if(dialect="sqlite", callable_=lambda *a, **kw: SQLITE_TRIGRAM),
+    )
+for _stmt in _POSTGRES_TRGM_DDL:
+    event.listen(
+        QuestionSearch.__table__, "after_create",
+        DDL(_stmt).execute_if(dialect="postgresql"),
+    )
+event.listen(
+    QuestionSearch.__table__, "before_drop",
+    DDL("DROP TABLE IF EXISTS question_search_fts").execute_if(dialect="sqlite"),
+)
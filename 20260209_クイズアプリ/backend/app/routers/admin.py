@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import base64
 import json
 import logging
 import time
@@ -9,8 +10,7 @@ import uuid
 from datetime import datetime, timezone
 
 import bcrypt
-import redis.asyncio as aioredis
-from fastapi import APIRouter, Depends, HTTPException, Request, Response, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, UploadFile
 from fastapi.responses import JSONResponse
 
 logger = logging.getLogger(__name__)
@@ -21,8 +21,9 @@ from app.dependencies import (
     get_question_service,
 )
 from app.models.admin import AdminAuditLog
-from app.config import UPLOADS_DIR, REDIS_URL
 from app.schemas.admin import AdminLoginRequest, AuditLogEntry, StatusResponse
+from app.schemas.analytics import QuestionDifficulty, QuestionResponseTimes, RetentionPoint
+from app.schemas.answer import QuestionStatsResponse
 from app.schemas.event import EventCreateRequest, JoinCodeUpdateRequest
 from app.schemas.question import (
     EnabledRequest,
@@ -31,83 +32,17 @@ from app.schemas.question import (
     QuestionUpdateRequest,
     ReorderRequest,
 )
+from app.services.admin_sessions import admin_session_store
+from app.services.analytics import analytics_archive
+from app.services.audit_log import audit_log_writer
 from app.services.event_service import EventService
+from app.services.image_service import save_upload
 from app.services.question_service import QuestionService
-from app.store.sqlite_store import SQLiteAdminStore
+from app.store.base import BaseAdminStore
 
 router = APIRouter(prefix="/admin")
 
 
-# ── admin session（Valkey または インメモリ fallback） ────────────────────────
-
-# ローカル環境用 fallback（REDIS_URL がない場合）
-_admin_sessions: dict[str, str] = {}
-_redis: aioredis.Redis | None = None
-
-
-async def _get_redis() -> aioredis.Redis | None:
-    """Redis接続を取得（Valkey URL がある場合のみ）。"""
-    global _redis
-    if not REDIS_URL:
-        logger.warning("[admin.py] REDIS_URL not set, using in-memory fallback")
-        return None
-    if _redis is None:
-        try:
-            logger.info(f"[admin.py] Connecting to Valkey: {REDIS_URL}")
-            _redis = await aioredis.from_url(
-                REDIS_URL,
-                encoding="utf-8",
-                decode_responses=True,
-            )
-            logger.info("[admin.py] Valkey connection successful")
-        except Exception as e:
-            logger.error(f"[admin.py] Valkey connection failed: {type(e).__name__}: {e}", exc_info=True)
-            return None
-    return _redis
-
-
-async def _get_admin_session(token: str) -> str | None:
-    """admin_session を Valkey または メモリから取得。"""
-    redis = await _get_redis()
-    if redis:
-        # Valkey から取得
-        key = f"admin_session:{token}"
-        result = await redis.get(key)
-        logger.debug(f"[admin.py] Got session from Valkey: token={token[:8]}..., found={result is not None}")
-        return result
-    else:
-        # メモリから取得（ローカル）
-        result = _admin_sessions.get(token)
-        logger.debug(f"[admin.py] Got session from memory: token={token[:8]}..., found={result is not None}")
-        return result
-
-
-async def _set_admin_session(token: str, timestamp: str) -> None:
-    """admin_session を Valkey または メモリに保存。"""
-    redis = await _get_redis()
-    if redis:
-        # Valkey に保存（24時間 TTL）
-        key = f"admin_session:{token}"
-        await redis.set(key, timestamp, ex=86400)
-        logger.info(f"[admin.py] Saved session to Valkey: token={token[:8]}...")
-    else:
-        # メモリに保存（ローカル）
-        _admin_sessions[token] = timestamp
-        logger.warning(f"[admin.py] SAVED SESSION TO IN-MEMORY (Valkey not available): token={token[:8]}...")
-
-
-async def _delete_admin_session(token: str) -> None:
-    """admin_session を Valkey または メモリから削除。"""
-    redis = await _get_redis()
-    if redis:
-        # Valkey から削除
-        key = f"admin_session:{token}"
-        await redis.delete(key)
-    else:
-        # メモリから削除（ローカル）
-        if token in _admin_sessions:
-            del _admin_sessions[token]
-
 # ── ログイン失敗ロック ──────────────────────────────────
 
 _LOCK_THRESHOLD = 5
@@ -137,27 +72,28 @@ async def require_admin(request: Request) -> None:
     if not token:
         raise HTTPException(status_code=401, detail="admin auth required")
 
-    # Valkey またはメモリから確認
-    session_data = await _get_admin_session(token)
+    # Valkey（プロセス内で短時間キャッシュ）またはメモリから確認
+    session_data = await admin_session_store.get(token)
     if not session_data:
         raise HTTPException(status_code=401, detail="admin auth required")
 
 
 async def _log(
-    admin_store: SQLiteAdminStore,
+    admin_store: BaseAdminStore,
     action: str,
     event_id: str | None = None,
     payload: dict | None = None,
 ) -> None:
-    await admin_store.create_audit_log(
-        AdminAuditLog(
-            id=uuid.uuid4().hex,
-            action=action,
-            event_id=event_id,
-            payload=json.dumps(payload, ensure_ascii=False) if payload else None,
-            created_at=_now_iso(),
-        ),
+    log = AdminAuditLog(
+        id=uuid.uuid4().hex,
+        action=action,
+        event_id=event_id,
+        payload=json.dumps(payload, ensure_ascii=False) if payload else None,
+        created_at=_now_iso(),
     )
+    # 通常はバックグラウンドでまとめて書き込む（未開始・キュー満杯ならここで書く）
+    if not audit_log_writer.enqueue(log):
+        await admin_store.create_audit_log(log)
 
 
 # ── ログイン ───────────────────────────────────────────
@@ -167,7 +103,7 @@ async def _log(
 async def admin_login(
     req: AdminLoginRequest,
     response: Response,
-    admin_store: SQLiteAdminStore = Depends(get_admin_store),
+    admin_store: BaseAdminStore = Depends(get_admin_store),
 ) -> StatusResponse:
     _check_login_lockout()
 
@@ -180,11 +116,21 @@ async def admin_login(
     _failed_attempts.clear()
     token = uuid.uuid4().hex
     timestamp = _now_iso()
-    await _set_admin_session(token, timestamp)
+    await admin_session_store.create(token, timestamp)
     response.set_cookie(key="admin_session", value=token, httponly=True, samesite="lax")
     return StatusResponse(status="ok")
 
 
+@router.post("/logout")
+async def admin_logout(request: Request, response: Response) -> StatusResponse:
+    """管理者セッションを破棄する（他タスクの検証キャッシュにも即時に反映）。"""
+    token = request.cookies.get("admin_session")
+    if token:
+        await admin_session_store.delete(token)
+    response.delete_cookie(key="admin_session")
+    return StatusResponse(status="ok")
+
+
 # ── セッション確認 ─────────────────────────────────────
 
 
@@ -202,7 +148,7 @@ async def admin_create_event(
     req: EventCreateRequest,
     _: None = Depends(require_admin),
     event_service: EventService = Depends(get_event_service),
-    admin_store: SQLiteAdminStore = Depends(get_admin_store),
+    admin_store: BaseAdminStore = Depends(get_admin_store),
 ):
     result = await event_service.create_event(req)
     await _log(admin_store, "create_event", result.event_id, {"title": req.title})
@@ -215,7 +161,7 @@ async def admin_update_join_code(
     req: JoinCodeUpdateRequest,
     _: None = Depends(require_admin),
     event_service: EventService = Depends(get_event_service),
-    admin_store: SQLiteAdminStore = Depends(get_admin_store),
+    admin_store: BaseAdminStore = Depends(get_admin_store),
 ):
     result = await event_service.update_join_code(event_id, req.join_code)
     await _log(admin_store, "update_join_code", event_id, {"join_code": req.join_code})
@@ -227,7 +173,7 @@ async def admin_start(
     event_id: str,
     _: None = Depends(require_admin),
     event_service: EventService = Depends(get_event_service),
-    admin_store: SQLiteAdminStore = Depends(get_admin_store),
+    admin_store: BaseAdminStore = Depends(get_admin_store),
 ):
     result = await event_service.start(event_id)
     await _log(admin_store, "start", event_id, {"state": result.state})
@@ -239,7 +185,7 @@ async def admin_next(
     event_id: str,
     _: None = Depends(require_admin),
     event_service: EventService = Depends(get_event_service),
-    admin_store: SQLiteAdminStore = Depends(get_admin_store),
+    admin_store: BaseAdminStore = Depends(get_admin_store),
 ):
     result = await event_service.next_question(event_id)
     payload = {"state": result.state} if result.state else {"question_id": result.question_id}
@@ -253,7 +199,7 @@ async def admin_close(
     question_id: str,
     _: None = Depends(require_admin),
     event_service: EventService = Depends(get_event_service),
-    admin_store: SQLiteAdminStore = Depends(get_admin_store),
+    admin_store: BaseAdminStore = Depends(get_admin_store),
 ):
     result = await event_service.close_question(event_id, question_id)
     await _log(admin_store, "close", event_id, {"question_id": question_id})
@@ -266,7 +212,7 @@ async def admin_reveal(
     question_id: str,
     _: None = Depends(require_admin),
     event_service: EventService = Depends(get_event_service),
-    admin_store: SQLiteAdminStore = Depends(get_admin_store),
+    admin_store: BaseAdminStore = Depends(get_admin_store),
 ):
     result = await event_service.reveal_answer(event_id, question_id)
     await _log(
@@ -283,7 +229,7 @@ async def admin_finish(
     event_id: str,
     _: None = Depends(require_admin),
     event_service: EventService = Depends(get_event_service),
-    admin_store: SQLiteAdminStore = Depends(get_admin_store),
+    admin_store: BaseAdminStore = Depends(get_admin_store),
 ):
     result = await event_service.finish(event_id)
     await _log(admin_store, "finish", event_id, {"state": result.state})
@@ -295,7 +241,7 @@ async def admin_reset(
     event_id: str,
     _: None = Depends(require_admin),
     event_service: EventService = Depends(get_event_service),
-    admin_store: SQLiteAdminStore = Depends(get_admin_store),
+    admin_store: BaseAdminStore = Depends(get_admin_store),
 ):
     result = await event_service.reset(event_id)
     await _log(admin_store, "reset", event_id, {"state": result.state})
@@ -307,23 +253,80 @@ async def admin_abort(
     event_id: str,
     _: None = Depends(require_admin),
     event_service: EventService = Depends(get_event_service),
-    admin_store: SQLiteAdminStore = Depends(get_admin_store),
+    admin_store: BaseAdminStore = Depends(get_admin_store),
 ):
     result = await event_service.abort(event_id)
     await _log(admin_store, "abort", event_id, {"state": result.state})
     return result
 
 
+@router.get("/events/{event_id}/questions/{question_id}/stats")
+async def admin_question_stats(
+    event_id: str,
+    question_id: str,
+    _: None = Depends(require_admin),
+    event_service: EventService = Depends(get_event_service),
+) -> QuestionStatsResponse:
+    """回答数・選択肢ごとの分布・正解数・回答時間（DB を読まずにインメモリ集計から返す）。"""
+    return await event_service.get_question_stats(event_id, question_id)
+
+
+# ── カーソル（キーセットページング） ─────────────────────
+
+
+def _encode_cursor(key: object, row_id: str) -> str:
+    """並び順のキーと id を ?cursor= に渡す文字列にする。"""
+    return base64.urlsafe_b64encode(f"{key}|{row_id}".encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[str, str]:
+    try:
+        key, _, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().rpartition("|")
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="invalid cursor")
+    if not key or not row_id:
+        raise HTTPException(status_code=400, detail="invalid cursor")
+    return key, row_id
+
+
 # ── 問題管理 CRUD ─────────────────────────────────────
 
 
 @router.get("/questions")
 async def admin_list_questions(
+    response: Response,
+    q: str | None = None,
+    tag: list[str] = Query([]),
+    enabled: bool | None = None,
     enabled_only: bool = False,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: str | None = None,
     _: None = Depends(require_admin),
     question_service: QuestionService = Depends(get_question_service),
 ) -> list[QuestionResponse]:
-    return await question_service.list_all(enabled_only=enabled_only)
+    """(sort_order, id) の順の問題一覧。
+
+    q は問題文・選択肢の部分一致、tag（複数指定可）は全てのタグを持つ問題、enabled は有効/無効。
+    続きがあれば X-Next-Cursor ヘッダを ?cursor= に渡して次のページを取る。
+    """
+    after = None
+    if cursor:
+        sort_order, question_id = _decode_cursor(cursor)
+        try:
+            after = (int(sort_order), question_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="invalid cursor")
+    questions = await question_service.search(
+        query=q,
+        tags=tag,
+        enabled=True if enabled_only else enabled,
+        after=after,
+        limit=limit,
+    )
+    if len(questions) == limit:
+        last = questions[-1]
+        response.headers["X-Next-Cursor"] = _encode_cursor(last.sort_order, last.question_id)
+    return questions
 
 
 @router.post("/questions")
@@ -331,7 +334,7 @@ async def admin_create_question(
     req: QuestionCreateRequest,
     _: None = Depends(require_admin),
     question_service: QuestionService = Depends(get_question_service),
-    admin_store: SQLiteAdminStore = Depends(get_admin_store),
+    admin_store: BaseAdminStore = Depends(get_admin_store),
 ) -> QuestionResponse:
     result = await question_service.create(req)
     await _log(admin_store, "create_question", None, {"question_id": result.question_id})
@@ -343,7 +346,7 @@ async def admin_reorder_questions(
     req: ReorderRequest,
     _: None = Depends(require_admin),
     question_service: QuestionService = Depends(get_question_service),
-    admin_store: SQLiteAdminStore = Depends(get_admin_store),
+    admin_store: BaseAdminStore = Depends(get_admin_store),
 ) -> StatusResponse:
     await question_service.reorder(req.ordered_ids)
     await _log(admin_store, "reorder_questions", None, None)
@@ -356,7 +359,7 @@ async def admin_set_question_enabled(
     req: EnabledRequest,
     _: None = Depends(require_admin),
     question_service: QuestionService = Depends(get_question_service),
-    admin_store: SQLiteAdminStore = Depends(get_admin_store),
+    admin_store: BaseAdminStore = Depends(get_admin_store),
 ) -> QuestionResponse:
     result = await question_service.set_enabled(question_id, req.enabled)
     await _log(admin_store, "set_question_enabled", None, {"question_id": question_id, "enabled": req.enabled})
@@ -369,7 +372,7 @@ async def admin_update_question(
     req: QuestionUpdateRequest,
     _: None = Depends(require_admin),
     question_service: QuestionService = Depends(get_question_service),
-    admin_store: SQLiteAdminStore = Depends(get_admin_store),
+    admin_store: BaseAdminStore = Depends(get_admin_store),
 ) -> QuestionResponse:
     result = await question_service.update(question_id, req)
     await _log(admin_store, "update_question", None, {"question_id": question_id})
@@ -379,24 +382,83 @@ async def admin_update_question(
 # ── ログ閲覧 ───────────────────────────────────────────
 
 
+def _audit_payload(raw: str | None) -> dict | None:
+    """保存済みの payload（JSON 文字列）。壊れた値・オブジェクト以外の値は {"raw": 文字列} で返す。"""
+    if not raw:
+        return None
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return {"raw": raw}
+    return data if isinstance(data, dict) else {"raw": raw}
+
+
 @router.get("/logs")
 async def admin_logs(
-    limit: int = 100,
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    event_id: str | None = None,
+    cursor: str | None = None,
     _: None = Depends(require_admin),
-    admin_store: SQLiteAdminStore = Depends(get_admin_store),
+    admin_store: BaseAdminStore = Depends(get_admin_store),
 ) -> list[AuditLogEntry]:
-    logs = await admin_store.list_audit_logs(limit)
+    """新しい順の操作ログ。続きがあれば X-Next-Cursor ヘッダを ?cursor= に渡して次のページを取る。"""
+    before = _decode_cursor(cursor) if cursor else None
+    # キューに残っている直前の操作のログも返す
+    await audit_log_writer.flush()
+    logs = await admin_store.list_audit_logs(limit, event_id=event_id, before=before)
+    if len(logs) == limit:
+        response.headers["X-Next-Cursor"] = _encode_cursor(logs[-1].created_at, logs[-1].id)
     return [
         AuditLogEntry(
             ts=log.created_at,
             action=log.action,
             event_id=log.event_id,
-            payload=json.loads(log.payload) if log.payload else None,
+            payload=_audit_payload(log.payload),
         )
         for log in logs
     ]
 
 
+# ── 分析（終了したイベントの横断集計） ───────────────────
+# 稼働中の DB ではなく、終了時に書き出した Parquet アーカイブを DuckDB で集計する。
+
+
+@router.get("/analytics/questions/difficulty")
+async def admin_analytics_difficulty(
+    event_id: str | None = None,
+    min_answers: int = Query(1, ge=1),
+    limit: int = Query(50, ge=1, le=500),
+    _: None = Depends(require_admin),
+) -> list[QuestionDifficulty]:
+    """問題ごとの正答率（低い順 = 難しい順）。event_id を指定するとそのイベントの回だけ。"""
+    return await analytics_archive.question_difficulty(
+        event_id=event_id, min_answers=min_answers, limit=limit,
+    )
+
+
+@router.get("/analytics/questions/response-times")
+async def admin_analytics_response_times(
+    event_id: str | None = None,
+    question_id: str | None = None,
+    limit: int = Query(50, ge=1, le=500),
+    _: None = Depends(require_admin),
+) -> list[QuestionResponseTimes]:
+    """問題ごとの回答時間の平均と p50 / p90 / p99（中央値の長い順）。"""
+    return await analytics_archive.response_times(
+        event_id=event_id, question_id=question_id, limit=limit,
+    )
+
+
+@router.get("/analytics/retention")
+async def admin_analytics_retention(
+    event_id: str | None = None,
+    _: None = Depends(require_admin),
+) -> list[RetentionPoint]:
+    """出題順ごとに、参加者のうち回答した人の割合（何問目で離脱しているか）。"""
+    return await analytics_archive.retention(event_id=event_id)
+
+
 # ── 画像アップロード ────────────────────────────────────
 
 _ALLOWED_TYPES = {"image/png", "image/jpeg", "image/gif", "image/webp"}
@@ -421,9 +483,6 @@ async def admin_upload_image(
     if not ext or ext not in _ALLOWED_EXTS:
         ext = mimetypes.guess_extension(content_type) or ".bin"
 
-    filename = f"{uuid.uuid4().hex}{ext}"
-    dest = UPLOADS_DIR / filename
-    content = await file.read()
-    dest.write_bytes(content)
-
-    return JSONResponse({"url": f"/uploads/{filename}", "filename": filename})
+    # 保存（ディスク / S3）はアップロード用スレッドで行い、イベントループを止めない
+    url, filename = await save_upload(file.file, ext, content_type)
+    return JSONResponse({"url": url, "filename": filename})
@@ -2,18 +2,20 @@
 
 from __future__ import annotations
 
-import random
+import codecs
 import uuid
 from datetime import datetime, timezone
+from typing import Literal
 
-from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
 from fastapi.responses import StreamingResponse
+from sqlalchemy.exc import IntegrityError
 
+from app.database import after_commit
 from app.dependencies import (
     get_answer_service,
     get_event_service,
     get_event_store,
-    get_question_store,
     get_ranking_service,
     get_session_id,
     get_user_store,
@@ -24,25 +26,23 @@ from app.schemas.event import CurrentQuestionResponse, EventBrief, JoinRequest,
 from app.schemas.user import RegisterRequest, RegisterResponse, UserBrief
 from app.services.answer_service import AnswerService
 from app.services.event_service import EventService
+from app.services.leaderboard import leaderboard_registry
+from app.services.participant_cache import participant_cache
 from app.services.ranking_service import RankingService
-from app.schemas.question import ChoiceResponse, QuestionPublic
-from app.store.sqlite_store import SQLiteEventStore, SQLiteQuestionStore, SQLiteUserStore
+from app.services.suffix_allocator import suffix_allocator
+from app.store.base import BaseEventStore, BaseUserStore
+from app.ws.manager import ws_manager
 
 router = APIRouter()
 
+# 表示名サフィックスが他のワーカーの払い出しと衝突したときに取り直す回数
+_SUFFIX_ATTEMPTS = 5
+
 
 def _now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
-async def _gen_suffix(user_store: SQLiteUserStore, event_id: str) -> str:
-    for _ in range(10):
-        s = f"{random.randint(0, 9999):04d}"
-        if not await user_store.suffix_exists(event_id, s):
-            return s
-    return f"{random.randint(0, 9999):04d}"
-
-
 # ── 参加・登録 ─────────────────────────────────────────
 
 
@@ -51,8 +51,8 @@ async def join_event(
     event_id: str,
     req: JoinRequest,
     response: Response,
-    event_store: SQLiteEventStore = Depends(get_event_store),
-    user_store: SQLiteUserStore = Depends(get_user_store),
+    event_store: BaseEventStore = Depends(get_event_store),
+    user_store: BaseUserStore = Depends(get_user_store),
 ) -> JoinResponse:
     event = await event_store.get(event_id)
     if not event:
@@ -81,11 +81,11 @@ async def register_user(
     event_id: str,
     req: RegisterRequest,
     session_id: str = Depends(get_session_id),
-    user_store: SQLiteUserStore = Depends(get_user_store),
-    event_store: SQLiteEventStore = Depends(get_event_store),
+    user_store: BaseUserStore = Depends(get_user_store),
+    event_store: BaseEventStore = Depends(get_event_store),
 ) -> RegisterResponse:
-    session = await user_store.get_session(session_id)
-    if not session or session.event_id != event_id:
+    participant = await participant_cache.resolve(session_id, user_store)
+    if not participant or participant.event_id != event_id:
         raise HTTPException(status_code=401, detail="no session")
 
     event = await event_store.get(event_id)
@@ -93,20 +93,43 @@ async def register_user(
         raise HTTPException(status_code=409, detail="quiz_finished")
 
     base = req.display_name_base or "guest"
-    suffix = await _gen_suffix(user_store, event_id)
-    display_name = f"{base}-{suffix}"
-
     uid = uuid.uuid4().hex
-    user = EventUser(
-        id=uid,
-        event_id=event_id,
-        session_id=session_id,
-        display_name=display_name,
-        display_suffix=suffix,
-        joined_at=_now_iso(),
+    for attempt in range(_SUFFIX_ATTEMPTS):
+        suffix = await suffix_allocator.allocate(event_id, user_store)
+        display_name = f"{base}-{suffix}"
+        user = EventUser(
+            id=uid,
+            event_id=event_id,
+            session_id=session_id,
+            display_name=display_name,
+            display_suffix=suffix,
+            joined_at=_now_iso(),
+        )
+        try:
+            async with user_store.session.begin_nested():
+                await user_store.create_user(user)
+            break
+        except IntegrityError:
+            # 共有プールのない複数ワーカー構成では、各ワーカーのプールから同じサフィックスが
+            # 払い出されうる。使用済みになっていれば（プールからは取り出し済み）次を取る
+            taken = suffix in await user_store.list_suffixes(event_id)
+            if taken and attempt < _SUFFIX_ATTEMPTS - 1:
+                continue
+            if not taken:
+                await suffix_allocator.release(event_id, suffix)
+            raise
+        except Exception:
+            await suffix_allocator.release(event_id, suffix)
+            raise
+    # コミットできなければ（ロールバック・コミット失敗）サフィックスをプールに戻す
+    after_commit(
+        user_store.session,
+        lambda: ws_manager.publish_invalidation("participant", session_id),
+        on_rollback=lambda: suffix_allocator.release(event_id, suffix),
     )
-    await user_store.create_user(user)
     await user_store.update_session(session_id, user_id=uid)
+    participant_cache.invalidate(session_id)
+    leaderboard_registry.add_user(event_id, uid, display_name)
 
     return RegisterResponse(user=UserBrief(user_id=uid, display_name=display_name))
 
@@ -115,8 +138,12 @@ async def register_user(
 
 
 @router.post("/events/{event_id}/logout")
-async def logout_event(response: Response) -> dict:
+async def logout_event(request: Request, response: Response) -> dict:
     """session_id Cookie を削除してログアウト。"""
+    sid = request.cookies.get("session_id")
+    if sid:
+        participant_cache.invalidate(sid)
+        await ws_manager.publish_invalidation("participant", sid)
     response.delete_cookie(key="session_id")
     return {"status": "ok"}
 
@@ -142,13 +169,16 @@ async def submit_answer(
     question_id: str,
     req: AnswerRequest,
     session_id: str = Depends(get_session_id),
+    idempotency_key: str | None = Header(default=None, alias="Idempotency-Key"),
     answer_service: AnswerService = Depends(get_answer_service),
 ):
+    """回答提出。再送時は同じ Idempotency-Key を付けると最初のレスポンスが返る（409 にならない）。"""
     return await answer_service.submit(
         event_id,
         question_id,
         session_id,
         req.choice_index,
+        idempotency_key=idempotency_key,
     )
 
 
@@ -158,9 +188,19 @@ async def submit_answer(
 @router.get("/events/{event_id}/results")
 async def event_results(
     event_id: str,
+    request: Request,
+    limit: int | None = Query(default=None, ge=1),
     ranking_service: RankingService = Depends(get_ranking_service),
+    user_store: BaseUserStore = Depends(get_user_store),
 ):
-    return await ranking_service.calculate(event_id)
+    """ランキング。limit で上位のみ、Cookie があれば自分の順位 (me) も返す。"""
+    user_id = None
+    sid = request.cookies.get("session_id")
+    if sid:
+        participant = await participant_cache.resolve(sid, user_store)
+        if participant and participant.event_id == event_id:
+            user_id = participant.user_id
+    return await ranking_service.calculate(event_id, limit=limit, user_id=user_id)
 
 
 # ── ポーリングフォールバック ────────────────────────────
@@ -169,36 +209,9 @@ async def event_results(
 @router.get("/events/{event_id}/questions/current")
 async def current_question(
     event_id: str,
-    event_store: SQLiteEventStore = Depends(get_event_store),
-    question_store: SQLiteQuestionStore = Depends(get_question_store),
+    event_service: EventService = Depends(get_event_service),
 ) -> CurrentQuestionResponse:
-    event = await event_store.get(event_id)
-    if not event:
-        raise HTTPException(status_code=404, detail="event not found")
-
-    if not event.current_question_id:
-        return CurrentQuestionResponse(event_state=event.state)
-
-    q = await question_store.get(event.current_question_id)
-    question_public = None
-    if q:
-        question_public = QuestionPublic(
-            question_id=q.id,
-            question_text=q.question_text,
-            question_image=q.question_image_path,
-            choices=[
-                ChoiceResponse(choice_index=c.choice_index, text=c.text, image=c.image_path)
-                for c in q.choices
-            ],
-            correct_choice_index=q.correct_choice_index if event.revealed else None,
-        )
-
-    return CurrentQuestionResponse(
-        event_state=event.state,
-        question=question_public,
-        started_at=event.current_shown_at,
-        deadline_at=event.current_deadline_at,
-    )
+    return await event_service.get_current_question(event_id)
 
 
 # ── CSV エクスポート ────────────────────────────────────
@@ -207,12 +220,16 @@ async def current_question(
 @router.get("/events/{event_id}/results/csv")
 async def export_results_csv(
     event_id: str,
+    format: Literal["simple", "wide"] = Query(default="simple"),
     ranking_service: RankingService = Depends(get_ranking_service),
 ) -> StreamingResponse:
-    csv_text = await ranking_service.export_csv(event_id)
+    """ランキング CSV。format=wide で問題ごとの回答列を追加する。"""
+    chunks = await ranking_service.export_csv(event_id, wide=format == "wide")
 
-    def _iter():
-        yield csv_text.encode("utf-8-sig")  # BOM付きで Excel 対応
+    async def _iter():
+        yield codecs.BOM_UTF8  # BOM付きで Excel 対応
+        async for chunk in chunks:
+            yield chunk.encode("utf-8")
 
     return StreamingResponse(
         _iter(),
@@ -2,6 +2,19 @@
 
 from fastapi import APIRouter
 
+from app.database import db_metrics
+from app.metrics import startup_timings
+from app.services.admin_sessions import admin_session_store
+from app.services.analytics import analytics_archive
+from app.services.answer_idempotency import answer_idempotency_store
+from app.services.answer_ingest import answer_ingestor
+from app.services.audit_log import audit_log_writer
+from app.services.participant_cache import participant_cache
+from app.services.question_bank import question_bank
+from app.valkey import valkey_pool
+from app.ws.admission import accept_limiter
+from app.ws.manager import ws_manager
+
 router = APIRouter(tags=["health"])
 
 
@@ -10,6 +23,20 @@ async def health_check():
     """ALB ヘルスチェック用エンドポイント。
 
     Returns:
-        dict: ステータス情報
+        dict: ステータス情報（WebSocket 送信・DB 書き込みのレイテンシ、参加者キャッシュ・回答の書き込みキュー・回答の再送判定・接続受付・Valkey 接続プール・監査ログキュー・問題バンク・分析用アーカイブの状況と起動処理の所要時間を含む）
     """
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "ws": ws_manager.stats(),
+        "ws_accept": accept_limiter.stats(),
+        "db": db_metrics.stats(),
+        "participants": participant_cache.stats(),
+        "answer_ingest": answer_ingestor.stats(),
+        "answer_idempotency": answer_idempotency_store.stats(),
+        "valkey": await valkey_pool.health(),
+        "admin_sessions": admin_session_store.stats(),
+        "audit_log": audit_log_writer.stats(),
+        "question_bank": question_bank.stats(),
+        "analytics": analytics_archive.stats(),
+        "startup": startup_timings.stats(),
+    }
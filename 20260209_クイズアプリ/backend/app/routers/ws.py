@@ -2,9 +2,15 @@
 
 from __future__ import annotations
 
+from uuid import uuid4
+
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
+from app.services.admin_sessions import admin_session_store
+from app.ws.admission import CLOSE_TRY_AGAIN_LATER, accept_limiter
+from app.ws.fanout import encode_message
 from app.ws.manager import ws_manager
+from app.ws.protocol import PROTOCOL_V1, PROTOCOL_V2, SUPPORTED_PROTOCOLS, pack
 
 router = APIRouter()
 
@@ -14,17 +20,58 @@ async def websocket_endpoint(websocket: WebSocket) -> None:
     event_id = websocket.query_params.get("event_id")
     sid = websocket.cookies.get("session_id")
 
-    if not event_id:
+    # ?protocol=v2 でバイナリ（msgpack）プロトコル、?resume_from=<seq> で再送
+    protocol = websocket.query_params.get("protocol", PROTOCOL_V1)
+    resume_raw = websocket.query_params.get("resume_from")
+
+    if not event_id or protocol not in SUPPORTED_PROTOCOLS:
+        await websocket.close(code=1008)
+        return
+    try:
+        resume_from = int(resume_raw) if resume_raw is not None else None
+    except ValueError:
         await websocket.close(code=1008)
         return
 
-    await ws_manager.connect(event_id, sid or "", websocket)
+    # 再接続が集中したら再試行までの待ち時間を伝えて閉じる（state の取得もさせない）
+    retry_after = accept_limiter.try_acquire()
+    if retry_after is not None:
+        await _reject(websocket, protocol, retry_after)
+        return
+
+    # 管理者セッションの接続（管理画面・プロジェクター）だけが管理者向けの配信を受け取る
+    admin = await _is_admin(websocket)
+    if not sid and admin:
+        sid = f"admin:{uuid4().hex}"  # 参加登録していない管理画面どうしで上書きしない
+    await ws_manager.connect(
+        event_id,
+        sid or "",
+        websocket,
+        protocol=protocol,
+        resume_from=resume_from,
+        admin=admin,
+    )
 
     try:
         while True:
             msg = await websocket.receive_text()
             await websocket.send_text(f"echo: {msg}")
     except WebSocketDisconnect:
-        ws_manager.disconnect(event_id, sid or "")
+        ws_manager.disconnect(event_id, sid or "", websocket)
     except Exception:
-        ws_manager.disconnect(event_id, sid or "")
+        ws_manager.disconnect(event_id, sid or "", websocket)
+
+
+async def _is_admin(websocket: WebSocket) -> bool:
+    token = websocket.cookies.get("admin_session")
+    return bool(token) and await admin_session_store.get(token) is not None
+
+
+async def _reject(websocket: WebSocket, protocol: str, retry_after_sec: float) -> None:
+    data = {"retry_after_ms": int(retry_after_sec * 1000)}
+    await websocket.accept()
+    if protocol == PROTOCOL_V2:
+        await websocket.send_bytes(pack(0, "retry", data))
+    else:
+        await websocket.send_text(encode_message({"type": "retry", "data": data}))
+    await websocket.close(code=CLOSE_TRY_AGAIN_LATER)
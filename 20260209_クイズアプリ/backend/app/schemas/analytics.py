@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+from pydantic import BaseModel
+
+
+# ── Response ───────────────────────────────────────────
+
+
+class QuestionDifficulty(BaseModel):
+    question_id: str
+    question_text: str
+    events: int
+    answers: int
+    correct: int
+    correct_rate: float
+
+
+class QuestionResponseTimes(BaseModel):
+    question_id: str
+    question_text: str
+    answers: int
+    mean_sec: float
+    p50_sec: float
+    p90_sec: float
+    p99_sec: float
+
+
+class RetentionPoint(BaseModel):
+    position: int
+    events: int
+    participants: int
+    answered: int
+    retention: float
@@ -26,3 +26,16 @@ class AnswerInfo(BaseModel):
 class AnswerResponse(BaseModel):
     result: str  # "accepted" | "rejected"
     answer: AnswerInfo
+
+
+class QuestionStatsResponse(BaseModel):
+    """出題中（または出題済み）の問題の回答分布。"""
+
+    question_id: str
+    answered_count: int  # 受理された回答数
+    rejected_count: int  # 締切後などで不受理になった回答数
+    choice_counts: list[int]  # choice_index ごとの受理回答数
+    correct_count: int | None = None  # WebSocket 配信では正解発表まで伏せる
+    response_time_avg_sec: float | None = None
+    response_time_p50_sec: float | None = None
+    response_time_p90_sec: float | None = None
@@ -45,6 +45,7 @@ class EventStateInfo(BaseModel):
     current_question_id: str | None = None
     question_started_at: str | None = None
     answer_deadline_at: str | None = None
+    state_version: int | None = None  # 管理者操作ごとに増加
 
 
 class MeStateResponse(BaseModel):
@@ -64,6 +65,7 @@ class NextResponse(BaseModel):
     question_id: str | None = None
     started_at: str | None = None
     deadline_at: str | None = None
+    state_version: int | None = None
     state: str | None = None
 
 
@@ -101,6 +103,7 @@ class EventSummary(BaseModel):
 class ResultsResponse(BaseModel):
     leaderboard: list[LeaderboardEntry]
     event_summary: EventSummary
+    me: LeaderboardEntry | None = None  # Cookie のセッションが登録済みの場合のみ
 
 
 class CurrentQuestionResponse(BaseModel):
@@ -108,3 +111,4 @@ class CurrentQuestionResponse(BaseModel):
     question: QuestionPublic | None = None
     started_at: str | None = None
     deadline_at: str | None = None
+    state_version: int | None = None
@@ -6,10 +6,18 @@ from pydantic import BaseModel
 # ── Shared ─────────────────────────────────────────────
 
 
+class ImageSource(BaseModel):
+    """画像の縮小版（<picture> の <source> 1つ分）。"""
+
+    type: str  # 例: "image/webp"
+    srcset: str  # 例: "/uploads/ab..._320w.webp 320w, /uploads/ab..._640w.webp 640w"
+
+
 class ChoiceResponse(BaseModel):
     choice_index: int
     text: str
     image: str | None = None
+    image_sources: list[ImageSource] = []
 
 
 class QuestionPublic(BaseModel):
@@ -18,6 +26,7 @@ class QuestionPublic(BaseModel):
     question_id: str
     question_text: str
     question_image: str | None = None
+    question_image_sources: list[ImageSource] = []
     choices: list[ChoiceResponse]
     correct_choice_index: int | None = None
 
@@ -37,6 +46,7 @@ class QuestionCreateRequest(BaseModel):
     choices: list[ChoiceInput]
     correct_choice_index: int
     is_enabled: bool = True
+    tags: list[str] = []
 
 
 class QuestionUpdateRequest(BaseModel):
@@ -45,6 +55,7 @@ class QuestionUpdateRequest(BaseModel):
     choices: list[ChoiceInput] | None = None
     correct_choice_index: int | None = None
     is_enabled: bool | None = None
+    tags: list[str] | None = None
 
 
 class ReorderRequest(BaseModel):
@@ -68,5 +79,6 @@ class QuestionResponse(BaseModel):
     correct_choice_index: int
     is_enabled: bool
     sort_order: int
+    tags: list[str] = []
     created_at: str
     updated_at: str
@@ -1,17 +1,36 @@
-"""起動時のシードデータ投入（冪等）。"""
+"""起動時のシードデータ投入（冪等）。
 
+投入済みかどうかは1クエリで確認し、投入済みならサンプル JSON も読まずに返る。
+未投入のときだけロックを取って投入する（複数タスクが同時に起動しても投入は1回）:
+PostgreSQL はトランザクション単位のアドバイザリロック、それ以外で Valkey があれば
+SET NX のロック。どちらもなければ（単一プロセスの SQLite）ロックしない。
+"""
+
+import asyncio
 import json
+import logging
+import time
 import uuid
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
 
 import bcrypt
-from sqlalchemy import select
+from sqlalchemy import select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.config import ADMIN_PASSWORD, QUESTIONS_SAMPLE_PATH
+from app.config import ADMIN_PASSWORD, QUESTIONS_SAMPLE_PATH, SEED_LOCK_TIMEOUT_SEC
 from app.models.admin import Admin
 from app.models.event import Event, EventQuestion
-from app.models.question import Question, QuestionChoice
+from app.models.question import Question, QuestionChoice, QuestionSearch, QuestionTag
+from app.store import stores_for
+from app.valkey import valkey_pool
+
+logger = logging.getLogger(__name__)
+
+# pg_advisory_xact_lock のキー（アプリ内で一意な任意の整数）
+_SEED_ADVISORY_LOCK_KEY = 0x5155_495A  # "QUIZ"
+_SEED_VALKEY_LOCK_KEY = "quiz:seed_lock"
 
 
 def _now_iso() -> str:
@@ -41,6 +60,8 @@ async def seed_questions(session: AsyncSession) -> None:
             updated_at=now,
         )
         session.add(question)
+        for tag in q.get("tags", []):
+            session.add(QuestionTag(question_id=q["question_id"], tag=tag))
 
         for c in q.get("choices", []):
             choice = QuestionChoice(
@@ -102,9 +123,64 @@ async def seed_admin(session: AsyncSession) -> None:
     await session.flush()
 
 
-async def seed_all(session: AsyncSession) -> None:
-    """全シードを実行してコミットする。"""
-    await seed_questions(session)
-    await seed_demo_event(session)
-    await seed_admin(session)
-    await session.commit()
+async def is_seeded(session: AsyncSession) -> bool:
+    """問題・デモイベント・管理者と、全問題の検索用の文書があるか（1クエリ）。"""
+    missing_doc = select(Question.id).where(
+        ~select(QuestionSearch.id).where(QuestionSearch.question_id == Question.id).exists(),
+    )
+    result = await session.execute(select(
+        select(Question.id).exists(),
+        select(Event.id).where(Event.id == "demo").exists(),
+        select(Admin.id).exists(),
+        ~missing_doc.exists(),
+    ))
+    return all(result.one())
+
+
+@asynccontextmanager
+async def _seed_lock(session: AsyncSession) -> AsyncIterator[None]:
+    """シード投入の排他（PostgreSQL はアドバイザリロック、なければ Valkey）。"""
+    if session.bind.dialect.name == "postgresql":
+        # COMMIT / ROLLBACK で自動的に解放される
+        await session.execute(
+            text("SELECT pg_advisory_xact_lock(:key)"), {"key": _SEED_ADVISORY_LOCK_KEY},
+        )
+        yield
+        return
+
+    redis = valkey_pool.client()
+    if redis is None:
+        yield
+        return
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + SEED_LOCK_TIMEOUT_SEC
+    while not await redis.set(
+        _SEED_VALKEY_LOCK_KEY, token, nx=True, ex=max(1, int(SEED_LOCK_TIMEOUT_SEC)),
+    ):
+        if time.monotonic() > deadline:
+            raise TimeoutError("seed lock was not released")
+        await asyncio.sleep(0.1)
+    try:
+        yield
+    finally:
+        # 期限切れ後に他タスクが取り直したロックは消さない
+        if await redis.get(_SEED_VALKEY_LOCK_KEY) == token:
+            await redis.delete(_SEED_VALKEY_LOCK_KEY)
+
+
+async def seed_all(session: AsyncSession) -> bool:
+    """未投入なら全シードを実行してコミットする。投入したら True。"""
+    if await is_seeded(session):
+        return False
+    async with _seed_lock(session):
+        # ロック待ちの間に他タスクが投入済みにしていれば何もしない
+        if await is_seeded(session):
+            return False
+        await seed_questions(session)
+        await seed_demo_event(session)
+        await seed_admin(session)
+        # シードの問題・検索導入前からある問題の検索用の文書
+        await stores_for(session).question(session).index_missing()
+        await session.commit()
+    logger.info("[seed] seed data inserted")
+    return True
@@ -0,0 +1,165 @@
+"""管理者セッション（admin_session Cookie のトークン）の保存と検証。
+
+- REDIS_URL がなければプロセス内の dict に保存する（単一プロセス用）。
+- REDIS_URL があれば admin_session:{token} に保存し、検証できたトークンは
+  ADMIN_SESSION_CACHE_TTL_SEC 秒だけプロセス内にキャッシュする
+  （require_admin のたびに GET しない）。
+- ログアウトは DEL に加えて admin_session_revoked チャンネルへトークンを PUBLISH し、
+  各タスクはキャッシュから即時に消す。購読が途切れた場合はキャッシュを全て捨てる。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections.abc import Callable
+
+from app.config import ADMIN_SESSION_CACHE_TTL_SEC, ADMIN_SESSION_TTL_SEC
+from app.valkey import ValkeyPool, valkey_pool
+
+logger = logging.getLogger(__name__)
+
+REVOKE_CHANNEL = "admin_session_revoked"
+# キャッシュの上限（管理者セッションは少数。超えたら期限切れを掃除する）
+_CACHE_MAX_ENTRIES = 1024
+
+
+def _session_key(token: str) -> str:
+    return f"admin_session:{token}"
+
+
+class AdminSessionStore:
+    def __init__(
+        self,
+        pool: ValkeyPool | None = None,
+        *,
+        session_ttl_sec: int = ADMIN_SESSION_TTL_SEC,
+        cache_ttl_sec: float = ADMIN_SESSION_CACHE_TTL_SEC,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._pool = pool if pool is not None else valkey_pool
+        self.session_ttl_sec = session_ttl_sec
+        self.cache_ttl_sec = cache_ttl_sec
+        self._clock = clock
+        # REDIS_URL がない場合の保存先
+        self._local: dict[str, str] = {}
+        # token -> (ログイン時刻, キャッシュ期限)
+        self._cache: dict[str, tuple[str, float]] = {}
+        self._listener: asyncio.Task | None = None
+        self.hits = 0
+        self.misses = 0
+        self.revoked = 0
+
+    # ── 保存・検証 ─────────────────────────────────────
+
+    async def get(self, token: str) -> str | None:
+        """トークンが有効ならログイン時刻を返す。"""
+        redis = self._pool.client()
+        if redis is None:
+            return self._local.get(token)
+
+        cached = self._cache.get(token)
+        if cached is not None and cached[1] > self._clock():
+            self.hits += 1
+            return cached[0]
+        self.misses += 1
+        async with self._pool.timed():
+            value = await redis.get(_session_key(token))
+        if value is None:
+            self._cache.pop(token, None)
+        else:
+            self._remember(token, value)
+        return value
+
+    async def create(self, token: str, timestamp: str) -> None:
+        redis = self._pool.client()
+        if redis is None:
+            self._local[token] = timestamp
+            return
+        async with self._pool.timed():
+            await redis.set(_session_key(token), timestamp, ex=self.session_ttl_sec)
+        self._remember(token, timestamp)
+
+    async def delete(self, token: str) -> None:
+        """ログアウト: 保存先から消し、全タスクのキャッシュにも通知する。"""
+        self._cache.pop(token, None)
+        redis = self._pool.client()
+        if redis is None:
+            self._local.pop(token, None)
+            return
+        async with self._pool.timed():
+            pipe = redis.pipeline(transaction=False)
+            pipe.delete(_session_key(token))
+            pipe.publish(REVOKE_CHANNEL, token)
+            await pipe.execute()
+
+    def _remember(self, token: str, value: str) -> None:
+        if self.cache_ttl_sec <= 0:
+            return
+        now = self._clock()
+        if len(self._cache) >= _CACHE_MAX_ENTRIES:
+            self._cache = {t: v for t, v in self._cache.items() if v[1] > now}
+        self._cache[token] = (value, now + self.cache_ttl_sec)
+
+    # ── 失効通知の購読 ─────────────────────────────────
+
+    async def start(self) -> None:
+        """失効通知の購読を開始する（起動時に1回。REDIS_URL がなければ何もしない）。"""
+        redis = self._pool.client()
+        if redis is None or self._listener is not None:
+            return
+        pubsub = redis.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(REVOKE_CHANNEL)
+        self._listener = asyncio.create_task(self._listen(pubsub))
+
+    async def _listen(self, pubsub) -> None:
+        try:
+            while True:
+                try:
+                    message = await pubsub.get_message(
+                        ignore_subscribe_messages=True, timeout=1.0,
+                    )
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # 取りこぼした通知があるかもしれないのでキャッシュは捨てる
+                    logger.warning("[AdminSessionStore] revoke listener error: %s", e)
+                    self._cache.clear()
+                    await asyncio.sleep(1.0)
+                    continue
+                if message is not None and message["type"] == "message":
+                    self._cache.pop(message["data"], None)
+                    self.revoked += 1
+        finally:
+            await pubsub.aclose()
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    # ── 計測・テスト用 ─────────────────────────────────
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "cached": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "revoked": self.revoked,
+        }
+
+    def clear(self) -> None:
+        self._local.clear()
+        self._cache.clear()
+        self.hits = 0
+        self.misses = 0
+        self.revoked = 0
+
+
+# グローバルシングルトン（main.py の lifespan で start / stop）
+admin_session_store = AdminSessionStore()
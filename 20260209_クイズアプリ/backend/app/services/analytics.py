@@ -0,0 +1,361 @@
+"""イベント横断の分析用アーカイブ（終了したイベントの回答を Parquet で保存する）。
+
+イベント終了時（EventService._finish_event）に回答と参加者を1回だけ DB から読み、
+バックグラウンドで ANALYTICS_DIR に Parquet ファイルとして追記する。
+リセットで answers / event_users が消えても履歴は残る。
+
+    {ANALYTICS_DIR}/answers/{終了時刻}-{run_id}.parquet       回答1件 = 1行
+    {ANALYTICS_DIR}/participants/{終了時刻}-{run_id}.parquet  参加者1人 = 1行
+
+- 追記のみ（既存ファイルは書き換えない）。一時ファイルに書いてから rename するので、
+  集計中に書きかけのファイルを読むことはない。複数ワーカー・複数タスクから同時に書いてもよい。
+- 集計（問題ごとの難易度・回答時間のパーセンタイル・出題順ごとの継続率）は DuckDB で
+  Parquet を直接読む。稼働中の DB（OLTP）には触れない。
+- DuckDB は任意の依存。未インストールならアーカイブを作らず、集計 API は 503 を返す。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import glob
+import json
+import logging
+import os
+import tempfile
+import uuid
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from fastapi import HTTPException
+
+from app.config import ANALYTICS_ARCHIVE, ANALYTICS_DIR
+
+logger = logging.getLogger(__name__)
+
+# Parquet の列（名前, DuckDB の型）
+ANSWER_COLUMNS: list[tuple[str, str]] = [
+    ("run_id", "VARCHAR"),
+    ("event_id", "VARCHAR"),
+    ("event_title", "VARCHAR"),
+    ("finished_at", "VARCHAR"),
+    ("question_id", "VARCHAR"),
+    ("question_text", "VARCHAR"),
+    ("position", "INTEGER"),  # 出題順（1 始まり）
+    ("correct_choice_index", "INTEGER"),
+    ("user_id", "VARCHAR"),
+    ("choice_index", "INTEGER"),
+    ("accepted", "BOOLEAN"),
+    ("is_correct", "BOOLEAN"),
+    ("response_time_sec", "DOUBLE"),
+    ("submitted_at", "VARCHAR"),
+]
+PARTICIPANT_COLUMNS: list[tuple[str, str]] = [
+    ("run_id", "VARCHAR"),
+    ("event_id", "VARCHAR"),
+    ("finished_at", "VARCHAR"),
+    ("user_id", "VARCHAR"),
+    ("joined_at", "VARCHAR"),
+    ("num_questions", "INTEGER"),
+]
+
+
+def _duckdb():
+    try:
+        import duckdb
+    except ImportError:
+        return None
+    return duckdb
+
+
+def _sql_str(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _unlink_quietly(path: str | Path) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def _columns_sql(columns: list[tuple[str, str]]) -> str:
+    return "{" + ", ".join(f"{_sql_str(name)}: {_sql_str(t)}" for name, t in columns) + "}"
+
+
+@dataclass
+class ArchivedEvent:
+    """1回分のイベント結果（DB セッションから切り離した行）。"""
+
+    event_id: str
+    finished_at: str
+    answers: list[dict[str, Any]] = field(default_factory=list)
+    participants: list[dict[str, Any]] = field(default_factory=list)
+    run_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+
+    @classmethod
+    def build(
+        cls,
+        event: Any,
+        finished_at: str,
+        questions: Sequence[Any],
+        users: Iterable[Any],
+        answers: Iterable[Any],
+    ) -> ArchivedEvent:
+        """Event・出題順の問題・参加者・回答（ORM または同じ属性を持つ値）から作る。"""
+        archived = cls(event_id=event.id, finished_at=finished_at)
+        base = {"run_id": archived.run_id, "event_id": event.id, "finished_at": finished_at}
+        for user in users:
+            archived.participants.append({
+                **base,
+                "user_id": user.id,
+                "joined_at": user.joined_at,
+                "num_questions": len(questions),
+            })
+        by_id = {q.id: (i, q) for i, q in enumerate(questions, start=1)}
+        seen: set[tuple[str, str]] = set()
+        for ans in answers:
+            key = (ans.question_id, ans.user_id)
+            if key in seen or ans.question_id not in by_id:
+                continue  # 書き込み待ちと DB の重複・出題から外れた問題
+            seen.add(key)
+            position, question = by_id[ans.question_id]
+            archived.answers.append({
+                **base,
+                "event_title": event.title,
+                "question_id": ans.question_id,
+                "question_text": question.question_text,
+                "position": position,
+                "correct_choice_index": question.correct_choice_index,
+                "user_id": ans.user_id,
+                "choice_index": ans.choice_index,
+                "accepted": bool(ans.accepted),
+                "is_correct": ans.is_correct,
+                "response_time_sec": ans.response_time_sec_1dp,
+                "submitted_at": ans.submitted_at,
+            })
+        return archived
+
+    @property
+    def file_stem(self) -> str:
+        # 名前順 = 終了順になるよう時刻を先頭に置く（":" などはファイル名に使わない）
+        stamp = "".join(ch for ch in self.finished_at if ch.isdigit())[:20]
+        return f"{stamp}-{self.run_id}"
+
+
+class AnalyticsArchive:
+    def __init__(self, root: Path = ANALYTICS_DIR, *, enabled: bool = ANALYTICS_ARCHIVE) -> None:
+        self.root = Path(root)
+        self.enabled = enabled
+        self._tasks: set[asyncio.Task] = set()
+        self.archived_runs = 0
+        self.failures = 0
+
+    @property
+    def available(self) -> bool:
+        return _duckdb() is not None
+
+    # ── 書き込み ─────────────────────────────────────
+
+    def archive_event(self, archived: ArchivedEvent) -> bool:
+        """バックグラウンドで Parquet に書き出す。書かない（無効・DuckDB なし）なら False。"""
+        if not self.enabled:
+            return False
+        if not self.available:
+            logger.warning("[AnalyticsArchive] duckdb is not installed; skipping %s", archived.event_id)
+            return False
+        task = asyncio.create_task(self._write(archived))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def _write(self, archived: ArchivedEvent) -> None:
+        try:
+            await asyncio.to_thread(self._write_sync, archived)
+            self.archived_runs += 1
+        except Exception:
+            self.failures += 1
+            logger.exception("[AnalyticsArchive] failed to archive %s", archived.event_id)
+
+    def _write_sync(self, archived: ArchivedEvent) -> None:
+        duckdb = _duckdb()
+        con = duckdb.connect()
+        try:
+            for table, columns, rows in (
+                ("answers", ANSWER_COLUMNS, archived.answers),
+                ("participants", PARTICIPANT_COLUMNS, archived.participants),
+            ):
+                if rows:
+                    self._write_parquet(con, table, columns, rows, archived.file_stem)
+        finally:
+            con.close()
+
+    def _write_parquet(
+        self,
+        con: Any,
+        table: str,
+        columns: list[tuple[str, str]],
+        rows: list[dict[str, Any]],
+        stem: str,
+    ) -> None:
+        directory = self.root / table
+        directory.mkdir(parents=True, exist_ok=True)
+        target = directory / f"{stem}.parquet"
+        tmp = directory / f".{stem}.parquet.tmp"
+        # 行は NDJSON で DuckDB に渡す（任意の文字列を安全にエスケープできる）
+        fd, source = tempfile.mkstemp(suffix=".ndjson", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps(row, ensure_ascii=False))
+                    f.write("\n")
+            con.execute(
+                f"COPY (SELECT * FROM read_json({_sql_str(source)}, "
+                f"format = 'newline_delimited', columns = {_columns_sql(columns)})) "
+                f"TO {_sql_str(str(tmp))} (FORMAT PARQUET, COMPRESSION ZSTD)",
+            )
+            os.replace(tmp, target)
+        finally:
+            for path in (source, tmp):
+                _unlink_quietly(path)
+
+    async def wait_idle(self) -> None:
+        """書き込み中のアーカイブが終わるまで待つ（テスト・終了処理用）。"""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    # ── 集計 ─────────────────────────────────────────
+
+    def _files(self, table: str) -> list[str]:
+        return sorted(glob.glob(str(self.root / table / "*.parquet")))
+
+    async def _query(self, sql: str, params: list[Any], tables: Sequence[str]) -> list[dict[str, Any]]:
+        if not self.available:
+            raise HTTPException(status_code=503, detail="analytics unavailable (duckdb is not installed)")
+        files = {table: self._files(table) for table in tables}
+        if not all(files.values()):
+            return []
+        return await asyncio.to_thread(self._query_sync, sql, params, files)
+
+    def _query_sync(
+        self, sql: str, params: list[Any], files: dict[str, list[str]],
+    ) -> list[dict[str, Any]]:
+        con = _duckdb().connect()
+        try:
+            for table, paths in files.items():
+                con.execute(
+                    f"CREATE TEMP VIEW {table} AS SELECT * FROM read_parquet("
+                    + "[" + ", ".join(_sql_str(p) for p in paths) + "], union_by_name = true)",
+                )
+            cursor = con.execute(sql, params)
+            names = [d[0] for d in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+        finally:
+            con.close()
+
+    async def question_difficulty(
+        self, *, event_id: str | None = None, min_answers: int = 1, limit: int = 50,
+    ) -> list[dict[str, Any]]:
+        """正答率の低い順（受理された回答のみ）。"""
+        return await self._query(
+            """
+            SELECT question_id,
+                   arg_max(question_text, finished_at) AS question_text,
+                   count(DISTINCT run_id) AS events,
+                   count(*) AS answers,
+                   count(*) FILTER (WHERE is_correct) AS correct,
+                   round(count(*) FILTER (WHERE is_correct) / count(*), 4) AS correct_rate
+            FROM answers
+            WHERE accepted AND (?::VARCHAR IS NULL OR event_id = ?)
+            GROUP BY question_id
+            HAVING count(*) >= ?
+            ORDER BY correct_rate, answers DESC, question_id
+            LIMIT ?
+            """,
+            [event_id, event_id, min_answers, limit],
+            ("answers",),
+        )
+
+    async def response_times(
+        self, *, event_id: str | None = None, question_id: str | None = None, limit: int = 50,
+    ) -> list[dict[str, Any]]:
+        """問題ごとの回答時間（秒）のパーセンタイル。中央値の長い順。"""
+        rows = await self._query(
+            """
+            SELECT question_id,
+                   arg_max(question_text, finished_at) AS question_text,
+                   count(*) AS answers,
+                   round(avg(response_time_sec), 2) AS mean_sec,
+                   quantile_cont(response_time_sec, [0.5, 0.9, 0.99]) AS q
+            FROM answers
+            WHERE accepted AND response_time_sec IS NOT NULL
+              AND (?::VARCHAR IS NULL OR event_id = ?)
+              AND (?::VARCHAR IS NULL OR question_id = ?)
+            GROUP BY question_id
+            ORDER BY q[1] DESC, question_id
+            LIMIT ?
+            """,
+            [event_id, event_id, question_id, question_id, limit],
+            ("answers",),
+        )
+        for row in rows:
+            p50, p90, p99 = row.pop("q")
+            row.update(p50_sec=round(p50, 2), p90_sec=round(p90, 2), p99_sec=round(p99, 2))
+        return rows
+
+    async def retention(self, *, event_id: str | None = None) -> list[dict[str, Any]]:
+        """出題順ごとの継続率（回答した参加者 / 参加者）。複数回のイベントは合算する。"""
+        return await self._query(
+            """
+            WITH runs AS (
+                SELECT run_id, count(*) AS participants, any_value(num_questions) AS num_questions
+                FROM participants
+                WHERE ?::VARCHAR IS NULL OR event_id = ?
+                GROUP BY run_id
+            ),
+            slots AS (
+                SELECT run_id, participants, unnest(range(1, num_questions + 1)) AS position
+                FROM runs
+            ),
+            answered AS (
+                SELECT run_id, position, count(DISTINCT user_id) AS answered
+                FROM answers
+                WHERE accepted
+                GROUP BY run_id, position
+            )
+            SELECT s.position,
+                   count(*) AS events,
+                   sum(s.participants) AS participants,
+                   sum(coalesce(a.answered, 0)) AS answered,
+                   round(sum(coalesce(a.answered, 0)) / sum(s.participants), 4) AS retention
+            FROM slots s LEFT JOIN answered a USING (run_id, position)
+            GROUP BY s.position
+            ORDER BY s.position
+            """,
+            [event_id, event_id],
+            ("participants", "answers"),
+        )
+
+    # ── 計測 ─────────────────────────────────────────
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "available": self.available,
+            "writing": len(self._tasks),
+            "archived_runs": self.archived_runs,
+            "failures": self.failures,
+        }
+
+    def clear(self) -> None:
+        """書き込み中のタスクと計測値を破棄する（テスト用。ファイルは消さない）。"""
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+        self.archived_runs = 0
+        self.failures = 0
+
+
+# グローバルシングルトン（EventService が終了時に書き込み、main.py の lifespan 終了時に待つ）
+analytics_archive = AnalyticsArchive()
@@ -0,0 +1,188 @@
+"""回答提出の Idempotency-Key（再送の重複排除）。
+
+通信の不安定な端末は同じ回答を再送する。Idempotency-Key ヘッダ付きの提出は
+最初のレスポンス（AnswerResponse）を短時間保持し、同じキーの再送には
+セッション確認・締切判定・DB の二重提出チェックを通さずにそれを返す。
+
+- キーはセッション（session_id Cookie）・イベント・問題ごとの名前空間に入れる
+  （他人のキーと衝突しても他人の回答は返らない）。
+- REDIS_URL がなければプロセス内の dict に保存する。あれば
+  answer_idem:{...} に SET EX する（全タスクで共有）。
+- 同じプロセスで処理中のキーへの再送は、最初のリクエストの完了を待って同じ結果を返す。
+- 保存するのは成功（受理・締切後の不受理）のレスポンスだけ。4xx は保存せず、再送は通常どおり判定する。
+- リクエストの DB セッションを渡された場合は、そのコミット後に保存する（コミットに失敗した
+  回答のレスポンスを再送に返さない）。保存するまでは処理中として扱い、同じキーの再送を待たせる。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import ANSWER_IDEMPOTENCY_TTL_SEC
+from app.database import after_commit
+from app.schemas.answer import AnswerResponse
+from app.valkey import ValkeyPool, valkey_pool
+
+logger = logging.getLogger(__name__)
+
+# キーの最大長（クライアントは UUID を送る）
+MAX_KEY_LENGTH = 128
+# プロセス内に保持する件数の上限（超えたら期限切れを掃除する）
+_LOCAL_MAX_ENTRIES = 100_000
+
+
+def _redis_key(scope: str) -> str:
+    return f"answer_idem:{scope}"
+
+
+class AnswerIdempotencyStore:
+    def __init__(
+        self,
+        pool: ValkeyPool | None = None,
+        *,
+        ttl_sec: float = ANSWER_IDEMPOTENCY_TTL_SEC,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._pool = pool if pool is not None else valkey_pool
+        self.ttl_sec = ttl_sec
+        self._clock = clock
+        # REDIS_URL がない場合の保存先: scope -> (レスポンス, 期限)
+        self._local: dict[str, tuple[AnswerResponse, float]] = {}
+        # 処理中のキー（同じプロセスへの同時の再送を待たせる）
+        self._inflight: dict[str, asyncio.Future[AnswerResponse]] = {}
+        self.replays = 0
+        self.stored = 0
+
+    @staticmethod
+    def scope(event_id: str, question_id: str, session_id: str, key: str) -> str:
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail="invalid idempotency key")
+        return f"{session_id}:{event_id}:{question_id}:{key}"
+
+    # ── 保存・参照 ─────────────────────────────────────
+
+    async def get(self, scope: str) -> AnswerResponse | None:
+        redis = self._pool.client()
+        if redis is None:
+            entry = self._local.get(scope)
+            if entry is None:
+                return None
+            if entry[1] <= self._clock():
+                del self._local[scope]
+                return None
+            return entry[0]
+        async with self._pool.timed():
+            raw = await redis.get(_redis_key(scope))
+        return AnswerResponse.model_validate_json(raw) if raw is not None else None
+
+    async def put(self, scope: str, response: AnswerResponse) -> None:
+        self.stored += 1
+        redis = self._pool.client()
+        if redis is None:
+            now = self._clock()
+            if len(self._local) >= _LOCAL_MAX_ENTRIES:
+                self._local = {s: v for s, v in self._local.items() if v[1] > now}
+            self._local[scope] = (response, now + self.ttl_sec)
+            return
+        async with self._pool.timed():
+            await redis.set(
+                _redis_key(scope), response.model_dump_json(), ex=max(1, int(self.ttl_sec)),
+            )
+
+    async def run(
+        self,
+        scope: str,
+        submit: Callable[[], Awaitable[AnswerResponse]],
+        *,
+        session: AsyncSession | None = None,
+    ) -> AnswerResponse:
+        """保存済みならそのレスポンスを、なければ submit() を1回だけ実行して保存する。
+
+        session を渡すとコミット後に保存する。ロールバックされたら保存せず、待っている再送に判定し直させる。
+        """
+        inflight = self._inflight.get(scope)
+        if inflight is not None:
+            try:
+                response = await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise  # この再送自体が切断された
+                # 最初のリクエストが中断された・コミットされなかった → この再送で判定する
+            else:
+                self.replays += 1
+                return response
+
+        cached = await self.get(scope)
+        if cached is not None:
+            self.replays += 1
+            return cached
+
+        future: asyncio.Future[AnswerResponse] = asyncio.get_running_loop().create_future()
+        self._inflight[scope] = future
+        try:
+            response = await submit()
+        except Exception as e:
+            # 待っている再送にも同じエラーを返す（保存はしない）
+            future.set_exception(e)
+            future.exception()  # 待ち手がいなくても警告を出さない
+            self._release(scope, future)
+            raise
+        except BaseException:
+            self._release(scope, future)
+            raise
+
+        if session is None:
+            await self._save(scope, future, response)
+        else:
+            after_commit(
+                session,
+                lambda: self._save(scope, future, response),
+                on_rollback=lambda: self._release(scope, future),
+            )
+        return response
+
+    async def _save(
+        self, scope: str, future: asyncio.Future[AnswerResponse], response: AnswerResponse,
+    ) -> None:
+        try:
+            await self.put(scope, response)
+        except Exception as e:
+            # 回答自体は受理済み。保存できなければ再送は従来どおり 409 になる
+            logger.warning("[AnswerIdempotencyStore] failed to store response: %s", e)
+        finally:
+            if not future.done():
+                future.set_result(response)
+            self._release(scope, future)
+
+    def _release(self, scope: str, future: asyncio.Future[AnswerResponse]) -> None:
+        """処理中の登録を外す。結果の出ていない future は取り消す（待っている再送が判定し直す）。"""
+        if not future.done():
+            future.cancel()
+        if self._inflight.get(scope) is future:
+            del self._inflight[scope]
+
+    # ── 計測・テスト用 ─────────────────────────────────
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "local": len(self._local),
+            "inflight": len(self._inflight),
+            "stored": self.stored,
+            "replays": self.replays,
+        }
+
+    def clear(self) -> None:
+        self._local.clear()
+        self._inflight.clear()
+        self.replays = 0
+        self.stored = 0
+
+
+# グローバルシングルトン（AnswerService が使う）
+answer_idempotency_store = AnswerIdempotencyStore()
@@ -0,0 +1,372 @@
+"""回答のライトビハインド取り込み。
+
+AnswerService.submit は出題中の問題のスナップショット（問題ID・正解・締切）と
+インメモリの回答済みセットで受理判定を行い、結果を即座に返す。
+Answer 行はキューに積まれ、バックグラウンドタスクが数ミリ秒ごとに
+1トランザクションでまとめて INSERT する（グループコミット）。
+
+- UniqueConstraint(event_id, question_id, user_id) はインメモリの回答済みセットで
+  即時 409 を返し、DB 側でも INSERT ... ON CONFLICT DO NOTHING で担保する。
+- 書き込みに失敗したバッチはキューの先頭に残して再試行する。ANSWER_FLUSH_MAX_RETRIES 回を
+  超えたら1件ずつ書き、それでも書けない行だけを捨てる（後続の回答を止めない）。
+  捨てた行・一意制約で弾かれた行は1件ずつログに残し、dropped_rows / conflict_rows で数える。
+- 書き込めた行（コミット済み・捨てた行と一意制約で弾かれた行を除く）だけを on_written に渡す。
+  リーダーボード・回答分布はここから反映する（書けなかった回答を数えない）。
+- 回答済みセットは出題中の問題の分だけ持つ（次の問題のスナップショットで前の問題の分を捨てる）。
+- 回答済みセットはプロセス内にしかないため、REDIS_URL があれば claim で
+  answer_claim:{event_id}:{question_id}:{user_id} を SET NX し、全タスクで1回だけ受理する。
+  WS_IPC_SOCKET の複数ワーカー構成で REDIS_URL がない場合は共有できないので、
+  ライトビハインドを使わない（main.py の lifespan で start しない）。
+- 停止時（lifespan shutdown）はキューを全て書き出してから終了する。
+- start() されていない場合は使われず、AnswerService は従来の同期パスで書き込む。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import (
+    ANSWER_FLUSH_INTERVAL_MS,
+    ANSWER_FLUSH_MAX_BATCH,
+    ANSWER_FLUSH_MAX_RETRIES,
+    ANSWER_SNAPSHOT_TTL_SEC,
+)
+from app.models.answer import Answer
+from app.store.base import BaseAnswerStore
+from app.valkey import ValkeyPool, valkey_pool
+
+logger = logging.getLogger(__name__)
+
+_AnswerKey = tuple[str, str, str]  # (event_id, question_id, user_id)
+
+_CLAIM_TTL_SEC = 3600
+
+
+def _claim_key(event_id: str, question_id: str, user_id: str) -> str:
+    return f"answer_claim:{event_id}:{question_id}:{user_id}"
+
+
+@dataclass(frozen=True)
+class QuestionSnapshot:
+    """受理判定に必要な出題中の問題の情報。"""
+
+    event_id: str
+    question_id: str
+    correct_choice_index: int | None
+    deadline_at: datetime | None
+    loaded_at: float = 0.0
+
+
+SnapshotLoader = Callable[[str], Awaitable[tuple[QuestionSnapshot | None, set[str]]]]
+# 書き込めた回答を受け取る処理
+WrittenListener = Callable[[list[Answer]], None]
+
+
+class AnswerIngestor:
+    def __init__(
+        self,
+        *,
+        flush_interval_sec: float = ANSWER_FLUSH_INTERVAL_MS / 1000,
+        max_batch: int = ANSWER_FLUSH_MAX_BATCH,
+        max_retries: int = ANSWER_FLUSH_MAX_RETRIES,
+        snapshot_ttl_sec: float | None = ANSWER_SNAPSHOT_TTL_SEC,
+        pool: ValkeyPool | None = None,
+    ) -> None:
+        self._pool = pool if pool is not None else valkey_pool
+        self.flush_interval_sec = flush_interval_sec
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+        self.snapshot_ttl_sec = snapshot_ttl_sec
+
+        self._session_factory: async_sessionmaker[AsyncSession] | None = None
+        self._store_factory: Callable[[AsyncSession], BaseAnswerStore] | None = None
+        self._on_written: WrittenListener | None = None
+        self._task: asyncio.Task | None = None
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+
+        # event_id -> 出題中の問題（None は「出題中の問題なし」を確認済み）
+        self._snapshots: dict[str, QuestionSnapshot | None] = {}
+        self._snapshot_locks: dict[str, asyncio.Lock] = {}
+        # (event_id, question_id) -> 回答済み user_id（DB 分 + 未書き込み分）。出題中の問題の分のみ
+        self._answered: dict[tuple[str, str], set[str]] = {}
+        # 未書き込みの回答（到着順）と、読み取り用の索引
+        self._queue: list[Answer] = []
+        self._pending: dict[_AnswerKey, Answer] = {}
+
+        # 先頭のバッチが続けて書き込みに失敗した回数
+        self._failures = 0
+
+        self.flushed_rows = 0
+        self.conflict_rows = 0
+        self.dropped_rows = 0
+
+    # ── ライフサイクル ───────────────────────────────
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        store_factory: Callable[[AsyncSession], BaseAnswerStore],
+        on_written: WrittenListener | None = None,
+    ) -> None:
+        """書き込みタスクを開始する。アプリ起動時に1回だけ呼び出す。"""
+        if self._task is not None:
+            return
+        self._session_factory = session_factory
+        self._store_factory = store_factory
+        self._on_written = on_written
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        """書き込みタスクを停止し、未書き込みの回答を全て書き出す。"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # 再試行の上限を超えると1件ずつの書き込みに切り替わるので、この回数で必ず終わる
+        for _ in range(self.max_retries + 1):
+            try:
+                await self.flush()
+                break
+            except Exception:
+                logger.exception("[AnswerIngestor] flush on shutdown failed")
+        if self._queue:
+            logger.error("[AnswerIngestor] %d answers could not be written", len(self._queue))
+
+    def reset(self) -> None:
+        """インメモリ状態を全て破棄する（テスト用）。"""
+        self._snapshots.clear()
+        self._snapshot_locks.clear()
+        self._answered.clear()
+        self._queue.clear()
+        self._pending.clear()
+        self._failures = 0
+        self.flushed_rows = 0
+        self.conflict_rows = 0
+        self.dropped_rows = 0
+
+    # ── スナップショット ─────────────────────────────
+
+    async def get_snapshot(
+        self,
+        event_id: str,
+        loader: SnapshotLoader,
+    ) -> QuestionSnapshot | None:
+        """出題中の問題を返す。未取得・期限切れなら loader で DB から1回だけ読む。"""
+        if self._is_fresh(event_id):
+            return self._snapshots[event_id]
+
+        lock = self._snapshot_locks.setdefault(event_id, asyncio.Lock())
+        async with lock:
+            if self._is_fresh(event_id):
+                return self._snapshots[event_id]
+            snapshot, answered_user_ids = await loader(event_id)
+            if snapshot is not None:
+                self._track_question(event_id, snapshot.question_id).update(answered_user_ids)
+            self._snapshots[event_id] = snapshot
+            return snapshot
+
+    def _is_fresh(self, event_id: str) -> bool:
+        if event_id not in self._snapshots:
+            return False
+        snapshot = self._snapshots[event_id]
+        if snapshot is None or self.snapshot_ttl_sec is None:
+            return True
+        return time.monotonic() - snapshot.loaded_at <= self.snapshot_ttl_sec
+
+    def publish(self, snapshot: QuestionSnapshot) -> None:
+        """EventService が出題・締切変更時に最新のスナップショットを登録する。"""
+        self._snapshots[snapshot.event_id] = snapshot
+        self._track_question(snapshot.event_id, snapshot.question_id)
+
+    def _track_question(self, event_id: str, question_id: str) -> set[str]:
+        """出題中の問題の回答済みセットを返す。同じイベントの前の問題の分は捨てる。"""
+        for key in [k for k in self._answered if k[0] == event_id and k[1] != question_id]:
+            del self._answered[key]
+        return self._answered.setdefault((event_id, question_id), set())
+
+    def invalidate(self, event_id: str) -> None:
+        """スナップショットを破棄する（次回の回答で DB から読み直す）。"""
+        self._snapshots.pop(event_id, None)
+
+    # ── 回答の受付 ───────────────────────────────────
+
+    async def claim(self, event_id: str, question_id: str, user_id: str) -> bool:
+        """回答枠を確保する。回答済み（他のタスクで受理済みを含む）なら False。"""
+        answered = self._answered.setdefault((event_id, question_id), set())
+        if user_id in answered:
+            return False
+        answered.add(user_id)
+        redis = self._pool.client()
+        if redis is None:
+            return True
+        try:
+            async with self._pool.timed():
+                return bool(await redis.set(
+                    _claim_key(event_id, question_id, user_id), "1",
+                    nx=True, ex=_CLAIM_TTL_SEC,
+                ))
+        except BaseException:
+            answered.discard(user_id)
+            raise
+
+    def enqueue(self, answer: Answer) -> None:
+        self._queue.append(answer)
+        self._pending[(answer.event_id, answer.question_id, answer.user_id)] = answer
+        self._wakeup.set()
+
+    def pending(self, event_id: str, question_id: str, user_id: str) -> Answer | None:
+        """未書き込みの回答を返す（書き込み前でも自分の回答を読めるように）。"""
+        return self._pending.get((event_id, question_id, user_id))
+
+    def pending_for_event(self, event_id: str) -> list[Answer]:
+        return [a for a in self._queue if a.event_id == event_id]
+
+    async def discard_event(self, event_id: str) -> None:
+        """イベントの回答を全て破棄する（reset 用）。
+
+        書き込み中のバッチは完了を待ってから、残りのキューと状態を捨てる。
+        """
+        async with self._flush_lock:
+            self._queue = [a for a in self._queue if a.event_id != event_id]
+            for key in [k for k in self._pending if k[0] == event_id]:
+                del self._pending[key]
+            for key in [k for k in self._answered if k[0] == event_id]:
+                del self._answered[key]
+            self._snapshots.pop(event_id, None)
+        redis = self._pool.client()
+        if redis is not None:
+            async with self._pool.timed():
+                keys = [k async for k in redis.scan_iter(match=f"answer_claim:{event_id}:*", count=1000)]
+                if keys:
+                    await redis.unlink(*keys)
+
+    # ── 書き込み ─────────────────────────────────────
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            # 短時間待って同時到着の回答をまとめる
+            await asyncio.sleep(self.flush_interval_sec)
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("[AnswerIngestor] flush failed, retrying")
+                await asyncio.sleep(min(1.0, self.flush_interval_sec * 100))
+                self._wakeup.set()
+
+    async def flush(self) -> int:
+        """キューの回答を書き出し、書き込んだ件数を返す。
+
+        先頭のバッチが書けなければ例外を送出する（キューに残し、呼び出し側が間をおいて再試行する）。
+        """
+        if self._session_factory is None or self._store_factory is None:
+            return 0
+        written = 0
+        async with self._flush_lock:
+            while self._queue:
+                batch = self._queue[: self.max_batch]
+                try:
+                    stored = await self._write(batch)
+                except Exception:
+                    self._failures += 1
+                    if self._failures <= self.max_retries:
+                        raise
+                    logger.exception(
+                        "[AnswerIngestor] batch of %d failed %d times; writing one by one",
+                        len(batch), self._failures,
+                    )
+                    stored = await self._write_each(batch)
+                self._failures = 0
+                del self._queue[: len(batch)]
+                for a in batch:
+                    self._pending.pop((a.event_id, a.question_id, a.user_id), None)
+
+                written += len(batch)
+                self.flushed_rows += len(stored)
+                self._notify_written(stored)
+        return written
+
+    def _notify_written(self, stored: list[Answer]) -> None:
+        if self._on_written is None or not stored:
+            return
+        try:
+            self._on_written(stored)
+        except Exception:
+            logger.exception("[AnswerIngestor] on_written failed")
+
+    async def _write(self, batch: list[Answer]) -> list[Answer]:
+        """1トランザクションで INSERT し、書き込めた行を返す。一意制約で弾かれた行はログに残す。"""
+        async with self._session_factory() as session:
+            store = self._store_factory(session)
+            inserted = await store.bulk_create(batch)
+            conflicts: set[_AnswerKey] = set()
+            if inserted < len(batch):
+                conflicts = await self._log_conflicts(store, batch)
+            await session.commit()
+        return [a for a in batch if (a.event_id, a.question_id, a.user_id) not in conflicts]
+
+    async def _write_each(self, batch: list[Answer]) -> list[Answer]:
+        """1件ずつ書き込み、書けない行は捨ててログに残す。"""
+        stored: list[Answer] = []
+        for answer in batch:
+            try:
+                stored += await self._write([answer])
+            except Exception as e:
+                self.dropped_rows += 1
+                logger.error(
+                    "[AnswerIngestor] dropped answer event=%s question=%s user=%s choice=%s: %s",
+                    answer.event_id, answer.question_id, answer.user_id, answer.choice_index, e,
+                )
+        return stored
+
+    async def _log_conflicts(self, store: BaseAnswerStore, batch: list[Answer]) -> set[_AnswerKey]:
+        """受理済みなのに DB の一意制約で弾かれた回答（別プロセス経由の同時回答など）を記録して返す。"""
+        conflicts: set[_AnswerKey] = set()
+        stored: dict[_AnswerKey, Answer] = {}
+        for event_id in {a.event_id for a in batch}:
+            user_ids = [a.user_id for a in batch if a.event_id == event_id]
+            for a in await store.list_by_users(event_id, user_ids):
+                stored[(a.event_id, a.question_id, a.user_id)] = a
+        for a in batch:
+            existing = stored.get((a.event_id, a.question_id, a.user_id))
+            if existing is None or existing.id == a.id:
+                continue
+            conflicts.add((a.event_id, a.question_id, a.user_id))
+            self.conflict_rows += 1
+            logger.warning(
+                "[AnswerIngestor] answer skipped by unique constraint event=%s question=%s "
+                "user=%s choice=%s (stored choice=%s)",
+                a.event_id, a.question_id, a.user_id, a.choice_index, existing.choice_index,
+            )
+        return conflicts
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "queued": len(self._queue),
+            "flushed_rows": self.flushed_rows,
+            "conflict_rows": self.conflict_rows,
+            "dropped_rows": self.dropped_rows,
+        }
+
+
+# グローバルシングルトン（main.py の lifespan で start / stop）
+answer_ingestor = AnswerIngestor()
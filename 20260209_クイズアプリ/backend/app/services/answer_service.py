@@ -1,21 +1,58 @@
 """回答提出のビジネスロジック。
 
 締切判定・回答時間計測・二重提出チェックを行う。
+Idempotency-Key 付きの再送には、判定せずに最初のレスポンスを返す（AnswerIdempotencyStore）。
+AnswerIngestor が起動していれば、出題中の問題のスナップショットで判定して
+書き込みはバックグラウンドにまとめる（ライトビハインド）。
+リーダーボード・回答分布への反映は回答が DB に書き込めてから行う
+（同期パスはコミット後、ライトビハインドは AnswerIngestor の on_written から）。
 """
 
 from __future__ import annotations
 
+import inspect
+import time
 import uuid
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 
 from fastapi import HTTPException
 
+from app.database import after_commit
 from app.models.answer import Answer
 from app.schemas.answer import AnswerInfo, AnswerResponse
+from app.services.answer_idempotency import AnswerIdempotencyStore, answer_idempotency_store
+from app.services.answer_ingest import AnswerIngestor, QuestionSnapshot, answer_ingestor
+from app.services.deadline_scheduler import DeadlineScheduler, deadline_scheduler
+from app.services.event_state import BaseEventStateCache, event_state_cache
+from app.services.leaderboard import LeaderboardRegistry, leaderboard_registry
+from app.services.participant_cache import ParticipantCache, participant_cache
+from app.services.question_stats import QuestionStatsRegistry, question_stats_registry
 from app.store.base import BaseAnswerStore, BaseEventStore, BaseQuestionStore, BaseUserStore
 from app.ws.manager import ConnectionManager
 
 
+def record_stored_answers(
+    answers: list[Answer],
+    ws_manager: ConnectionManager,
+    *,
+    leaderboards: LeaderboardRegistry | None = None,
+    question_stats: QuestionStatsRegistry | None = None,
+) -> None:
+    """書き込めた回答をリーダーボードと回答分布へ反映する（question.stats は間引いて配信）。"""
+    leaderboards = leaderboards if leaderboards is not None else leaderboard_registry
+    question_stats = question_stats if question_stats is not None else question_stats_registry
+    for answer in answers:
+        leaderboards.record_answer(
+            answer.event_id,
+            answer.user_id,
+            answer.question_id,
+            accepted=answer.accepted,
+            is_correct=answer.is_correct,
+            response_time_sec_1dp=answer.response_time_sec_1dp,
+        )
+        question_stats.record(answer, ws_manager)
+
+
 def _now_utc() -> datetime:
     return datetime.now(timezone.utc)
 
@@ -24,6 +61,15 @@ def _iso(t: datetime) -> str:
     return t.isoformat()
 
 
+def _parse_iso(value: str | None) -> datetime | None:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except (ValueError, TypeError):
+        return None
+
+
 class AnswerService:
     def __init__(
         self,
@@ -32,12 +78,32 @@ class AnswerService:
         question_store: BaseQuestionStore,
         user_store: BaseUserStore,
         ws_manager: ConnectionManager,
+        leaderboards: LeaderboardRegistry | None = None,
+        ingestor: AnswerIngestor | None = None,
+        state_cache: BaseEventStateCache | None = None,
+        participants: ParticipantCache | None = None,
+        question_stats: QuestionStatsRegistry | None = None,
+        deadlines: DeadlineScheduler | None = None,
+        idempotency: AnswerIdempotencyStore | None = None,
     ) -> None:
         self.answer_store = answer_store
         self.event_store = event_store
         self.question_store = question_store
         self.user_store = user_store
         self.ws_manager = ws_manager
+        self.leaderboards = (
+            leaderboards if leaderboards is not None else leaderboard_registry
+        )
+        self.ingestor = ingestor if ingestor is not None else answer_ingestor
+        self.state_cache = state_cache if state_cache is not None else event_state_cache
+        self.participants = participants if participants is not None else participant_cache
+        self.question_stats = (
+            question_stats if question_stats is not None else question_stats_registry
+        )
+        self.deadlines = deadlines if deadlines is not None else deadline_scheduler
+        self.idempotency = (
+            idempotency if idempotency is not None else answer_idempotency_store
+        )
 
     async def submit(
         self,
@@ -45,62 +111,193 @@ class AnswerService:
         question_id: str,
         session_id: str,
         choice_index: int,
+        idempotency_key: str | None = None,
+    ) -> AnswerResponse:
+        if idempotency_key is None:
+            return await self._submit(event_id, question_id, session_id, choice_index)
+        scope = self.idempotency.scope(event_id, question_id, session_id, idempotency_key)
+        return await self.idempotency.run(
+            scope,
+            lambda: self._submit(event_id, question_id, session_id, choice_index),
+            session=self.answer_store.session,
+        )
+
+    async def _submit(
+        self,
+        event_id: str,
+        question_id: str,
+        session_id: str,
+        choice_index: int,
     ) -> AnswerResponse:
         # セッション・ユーザ確認
-        session = await self.user_store.get_session(session_id)
-        if not session or session.event_id != event_id:
+        participant = await self.participants.resolve(session_id, self.user_store)
+        if not participant or participant.event_id != event_id:
             raise HTTPException(status_code=401, detail="no session")
-        if not session.user_id:
+        if not participant.user_id:
             raise HTTPException(status_code=400, detail="not registered")
 
-        user_id = session.user_id
+        user_id = participant.user_id
+
+        # delivered_at: WS 送信時刻（Valkey 版は非同期・バッチで取得）
+        delivered = self.ws_manager.get_delivered_at(event_id, session_id, question_id)
+        if inspect.isawaitable(delivered):
+            delivered = await delivered
+
+        if self.ingestor.running:
+            answer = await self._submit_write_behind(
+                event_id, question_id, user_id, choice_index, delivered,
+            )
+        else:
+            answer = await self._submit_direct(
+                event_id, question_id, user_id, choice_index, delivered,
+            )
+            # リーダーボード・回答分布へはコミットできてから反映する
+            after_commit(self.answer_store.session, lambda: self._record_stored(answer))
+
+        info = AnswerInfo(
+            choice_index=answer.choice_index,
+            delivered_at=answer.delivered_at,
+            submitted_at=answer.submitted_at,
+            accepted=answer.accepted,
+            reject_reason=answer.reject_reason,
+            is_correct=answer.is_correct,
+            response_time_sec_1dp=answer.response_time_sec_1dp,
+        )
+
+        return AnswerResponse(
+            result="accepted" if answer.accepted else "rejected",
+            answer=info,
+        )
+
+    async def _record_stored(self, answer: Answer) -> None:
+        record_stored_answers(
+            [answer],
+            self.ws_manager,
+            leaderboards=self.leaderboards,
+            question_stats=self.question_stats,
+        )
+
+    async def _submit_direct(
+        self,
+        event_id: str,
+        question_id: str,
+        user_id: str,
+        choice_index: int,
+        delivered_at: str | None,
+    ) -> Answer:
+        """リクエストのトランザクション内で判定・書き込みを行う。"""
+        # イベント・問題確認（キャッシュ済みの出題状態）
+        state = await self.state_cache.get_or_load(
+            event_id, self.event_store, self.question_store,
+        )
+        if not state or state.current_question_id != question_id:
+            raise HTTPException(status_code=400, detail="question not active")
+
+        answer = self._judge(
+            event_id,
+            question_id,
+            user_id,
+            choice_index,
+            delivered_at,
+            deadline_passed=self.deadlines.is_past(
+                event_id, question_id, state.current_deadline_at,
+            ),
+            correct_choice_index=state.correct_choice_index,
+        )
+        # 二重提出は一意制約で判定する（同時提出でも 1 件だけ入る）
+        if not await self.answer_store.create_if_absent(answer):
+            raise HTTPException(status_code=409, detail="already answered")
+        return answer
 
-        # イベント・問題確認
-        event = await self.event_store.get(event_id)
-        if not event or event.current_question_id != question_id:
+    async def _submit_write_behind(
+        self,
+        event_id: str,
+        question_id: str,
+        user_id: str,
+        choice_index: int,
+        delivered_at: str | None,
+    ) -> Answer:
+        """スナップショットで判定し、書き込みは AnswerIngestor に委ねる。"""
+        snapshot = await self.ingestor.get_snapshot(event_id, self._load_snapshot)
+        if snapshot is None or snapshot.question_id != question_id:
             raise HTTPException(status_code=400, detail="question not active")
 
-        # 二重提出チェック
-        existing = await self.answer_store.get(event_id, question_id, user_id)
-        if existing:
+        if not await self.ingestor.claim(event_id, question_id, user_id):
             raise HTTPException(status_code=409, detail="already answered")
 
+        answer = self._judge(
+            event_id,
+            question_id,
+            user_id,
+            choice_index,
+            delivered_at,
+            deadline_passed=self.deadlines.is_past(
+                event_id, question_id, snapshot.deadline_at,
+            ),
+            correct_choice_index=snapshot.correct_choice_index,
+        )
+        self.ingestor.enqueue(answer)
+        return answer
+
+    async def _load_snapshot(
+        self,
+        event_id: str,
+    ) -> tuple[QuestionSnapshot | None, set[str]]:
+        """出題中の問題と DB の回答済みユーザを読む（スナップショット未取得時のみ）。"""
+        state = await self.state_cache.get_or_load(
+            event_id, self.event_store, self.question_store,
+        )
+        if not state or not state.current_question_id:
+            return None, set()
+        answered = await self.answer_store.list_answered_user_ids(
+            event_id, state.current_question_id,
+        )
+        snapshot = QuestionSnapshot(
+            event_id=event_id,
+            question_id=state.current_question_id,
+            correct_choice_index=state.correct_choice_index,
+            deadline_at=_parse_iso(state.current_deadline_at),
+            loaded_at=time.monotonic(),
+        )
+        return snapshot, answered
+
+    def _judge(
+        self,
+        event_id: str,
+        question_id: str,
+        user_id: str,
+        choice_index: int,
+        delivered_at: str | None,
+        *,
+        deadline_passed: bool,
+        correct_choice_index: int | None,
+    ) -> Answer:
+        """締切判定・回答時間計測・正解判定を行い Answer を組み立てる。"""
         submitted_at = _now_utc()
 
         # delivered_at: WS 送信時刻 or 回答時刻
-        delivered_str = self.ws_manager.get_delivered_at(event_id, session_id)
+        delivered_str = delivered_at
         if not delivered_str:
             delivered_str = _iso(submitted_at)
 
-        # 締切判定
-        accepted = True
-        reason = None
-        if event.current_deadline_at:
-            try:
-                deadline = datetime.fromisoformat(event.current_deadline_at)
-                if submitted_at > deadline + timedelta(seconds=2):
-                    accepted = False
-                    reason = "deadline_passed"
-            except (ValueError, TypeError):
-                pass
+        # 締切判定（猶予込みの判定は DeadlineScheduler が単調時計で行う）
+        accepted = not deadline_passed
+        reason = None if accepted else "deadline_passed"
 
         # 回答時間計測
         rt_1dp = None
         try:
             delivered_dt = datetime.fromisoformat(delivered_str)
-            rt = (submitted_at - delivered_dt).total_seconds()
-            rt_1dp = round(rt, 1)
+            rt_1dp = round((submitted_at - delivered_dt).total_seconds(), 1)
         except (ValueError, TypeError):
             pass
 
         # 正解判定
         is_correct = None
-        if accepted:
-            question = await self.question_store.get(question_id)
-            if question:
-                is_correct = choice_index == question.correct_choice_index
+        if accepted and correct_choice_index is not None:
+            is_correct = choice_index == correct_choice_index
 
-        answer = Answer(
+        return Answer(
             id=uuid.uuid4().hex,
             event_id=event_id,
             question_id=question_id,
@@ -113,19 +310,3 @@ class AnswerService:
             is_correct=is_correct,
             response_time_sec_1dp=rt_1dp,
         )
-        await self.answer_store.create(answer)
-
-        info = AnswerInfo(
-            choice_index=answer.choice_index,
-            delivered_at=answer.delivered_at,
-            submitted_at=answer.submitted_at,
-            accepted=answer.accepted,
-            reject_reason=answer.reject_reason,
-            is_correct=answer.is_correct,
-            response_time_sec_1dp=answer.response_time_sec_1dp,
-        )
-
-        return AnswerResponse(
-            result="accepted" if accepted else "rejected",
-            answer=info,
-        )
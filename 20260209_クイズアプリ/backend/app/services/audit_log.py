@@ -0,0 +1,151 @@
+"""管理操作の監査ログの非同期書き込み。
+
+管理 API（start / next / reveal など）は AdminAuditLog をキューに積んですぐに返り、
+バックグラウンドタスクが AUDIT_LOG_FLUSH_INTERVAL_MS ごとに1トランザクションで
+まとめて INSERT する（AnswerIngestor と同じグループコミット）。
+
+- キューは AUDIT_LOG_QUEUE_SIZE 件まで。溢れた場合と start() 前は enqueue が False を返し、
+  呼び出し側はリクエスト内で従来どおり書き込む（ログは捨てない）。
+- /admin/logs は読む前に flush() して、直前の操作のログも返す。
+- 停止時（lifespan shutdown）はキューを全て書き出してから終了する。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections.abc import Callable
+from typing import Any
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import (
+    AUDIT_LOG_FLUSH_INTERVAL_MS,
+    AUDIT_LOG_FLUSH_MAX_BATCH,
+    AUDIT_LOG_QUEUE_SIZE,
+)
+from app.models.admin import AdminAuditLog
+from app.store.base import BaseAdminStore
+
+logger = logging.getLogger(__name__)
+
+
+class AuditLogWriter:
+    def __init__(
+        self,
+        *,
+        flush_interval_sec: float = AUDIT_LOG_FLUSH_INTERVAL_MS / 1000,
+        max_batch: int = AUDIT_LOG_FLUSH_MAX_BATCH,
+        max_queue: int = AUDIT_LOG_QUEUE_SIZE,
+    ) -> None:
+        self.flush_interval_sec = flush_interval_sec
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+
+        self._session_factory: async_sessionmaker[AsyncSession] | None = None
+        self._store_factory: Callable[[AsyncSession], BaseAdminStore] | None = None
+        self._task: asyncio.Task | None = None
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._queue: list[AdminAuditLog] = []
+
+        self.flushed_rows = 0
+        self.overflows = 0
+
+    # ── ライフサイクル ───────────────────────────────
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        store_factory: Callable[[AsyncSession], BaseAdminStore],
+    ) -> None:
+        """書き込みタスクを開始する。アプリ起動時に1回だけ呼び出す。"""
+        if self._task is not None:
+            return
+        self._session_factory = session_factory
+        self._store_factory = store_factory
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        """書き込みタスクを停止し、未書き込みのログを全て書き出す。"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+        if self._queue:
+            logger.error("[AuditLogWriter] %d audit logs could not be written", len(self._queue))
+
+    def reset(self) -> None:
+        """キューと計測値を破棄する（テスト用）。"""
+        self._queue.clear()
+        self.flushed_rows = 0
+        self.overflows = 0
+
+    # ── 受付 ─────────────────────────────────────────
+
+    def enqueue(self, log: AdminAuditLog) -> bool:
+        """キューに積む。未開始・満杯なら False（呼び出し側で同期的に書き込む）。"""
+        if self._task is None:
+            return False
+        if len(self._queue) >= self.max_queue:
+            self.overflows += 1
+            return False
+        self._queue.append(log)
+        self._wakeup.set()
+        return True
+
+    # ── 書き込み ─────────────────────────────────────
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            # 短時間待って連続した操作のログをまとめる
+            await asyncio.sleep(self.flush_interval_sec)
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("[AuditLogWriter] flush failed, retrying")
+                await asyncio.sleep(min(1.0, self.flush_interval_sec * 10))
+                self._wakeup.set()
+
+    async def flush(self) -> int:
+        """キューのログを書き出し、書き込んだ件数を返す。"""
+        if self._session_factory is None or self._store_factory is None:
+            return 0
+        written = 0
+        async with self._flush_lock:
+            while self._queue:
+                batch = self._queue[: self.max_batch]
+                async with self._session_factory() as session:
+                    await self._store_factory(session).bulk_create_audit_logs(batch)
+                    await session.commit()
+                del self._queue[: len(batch)]
+                written += len(batch)
+                self.flushed_rows += len(batch)
+        return written
+
+    # ── 計測 ─────────────────────────────────────────
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "running": self.running,
+            "queued": len(self._queue),
+            "flushed_rows": self.flushed_rows,
+            "overflows": self.overflows,
+        }
+
+
+# グローバルシングルトン（main.py の lifespan で start / stop）
+audit_log_writer = AuditLogWriter()
@@ -0,0 +1,212 @@
+"""出題中の問題の締切管理と自動クローズ。
+
+- 締切はイベントごとに1件だけ持ち、イベントループのタイマー（loop.call_at）に
+  締切時刻ちょうどで登録する。発火すると close_question と同じ手順で
+  question.closed を配信する（管理者の「締切」操作は不要になる）。
+- 回答の締切判定は、パース済みの締切を単調時計（loop.time()）に換算した値で比較する。
+  締切文字列が変わらない限り datetime.fromisoformat は1回だけ。
+- 回答を受けた全タスク・全ワーカーがタイマーを持つ（出題したプロセスが落ちても誰かが閉じる）。
+  実際に閉じるのは closer（EventService.close_expired）の条件付き UPDATE に通った1回だけ。
+  REDIS_URL があれば question_close:{event_id}:{question_id}:{締切ms} の SET NX で
+  DB に行く前に間引く（接続は app/valkey.py の共有プールから借りる）。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from app.config import ANSWER_GRACE_SEC, AUTO_CLOSE_QUESTIONS
+from app.valkey import ValkeyPool, valkey_pool
+
+logger = logging.getLogger(__name__)
+
+# (event_id, question_id) を受け取り、まだ開いていれば閉じる
+Closer = Callable[[str, str], Awaitable[None]]
+
+_CLOSE_LOCK_TTL_SEC = 3600
+
+
+def _parse(value: str | datetime | None) -> datetime | None:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    # タイムゾーンなしの値は UTC とみなす
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+def _close_key(event_id: str, entry: _Deadline) -> tuple[str, str, int]:
+    return (event_id, entry.question_id, int(entry.at.timestamp() * 1000))
+
+
+@dataclass
+class _Deadline:
+    question_id: str
+    raw: str | datetime
+    at: datetime
+    mono: float  # loop.time() 基準の締切
+    timer: asyncio.TimerHandle | None = None
+
+
+class DeadlineScheduler:
+    def __init__(
+        self,
+        *,
+        grace_sec: float = ANSWER_GRACE_SEC,
+        auto_close: bool = AUTO_CLOSE_QUESTIONS,
+        pool: ValkeyPool | None = None,
+    ) -> None:
+        self.grace_sec = grace_sec
+        self.auto_close = auto_close
+        self._pool = pool if pool is not None else valkey_pool
+        self._deadlines: dict[str, _Deadline] = {}
+        self._closer: Closer | None = None
+        self._tasks: set[asyncio.Task] = set()
+        # 閉じ済み（または閉じに行った）締切。リセット後の同じ問題は締切が変わるので別扱い
+        self._closed_local: set[tuple[str, str, int]] = set()
+        self.fired = 0
+        self.closed = 0
+
+    def configure(self, closer: Closer) -> None:
+        """締切到達時に呼ぶ処理を登録する（起動時に1回）。"""
+        self._closer = closer
+
+    # ── 締切の登録 ───────────────────────────────────
+
+    def _entry(
+        self,
+        event_id: str,
+        question_id: str,
+        deadline: str | datetime | None,
+    ) -> _Deadline | None:
+        """締切をパース済みのエントリにして返す。同じ締切なら既存のものを使う。"""
+        cur = self._deadlines.get(event_id)
+        if cur is not None and cur.question_id == question_id and cur.raw == deadline:
+            return cur
+        at = _parse(deadline)
+        if at is None:
+            return None
+        loop = asyncio.get_running_loop()
+        mono = loop.time() + (at - datetime.now(timezone.utc)).total_seconds()
+        if cur is not None and cur.timer is not None:
+            cur.timer.cancel()
+        entry = _Deadline(question_id=question_id, raw=deadline, at=at, mono=mono)
+        self._deadlines[event_id] = entry
+        return entry
+
+    def schedule(self, event_id: str, question_id: str, deadline: str | datetime) -> None:
+        """出題時に締切を登録し、自動クローズのタイマーを仕掛ける。"""
+        entry = self._entry(event_id, question_id, deadline)
+        if entry is not None:
+            self._arm(event_id, entry)
+
+    def mark_closed(self, event_id: str, question_id: str, closed_at: datetime) -> None:
+        """手動クローズ: 締切を閉じた時刻に更新し、タイマーは外す。"""
+        entry = self._entry(event_id, question_id, closed_at)
+        if entry is not None:
+            if entry.timer is not None:
+                entry.timer.cancel()
+                entry.timer = None
+            self._closed_local.add(_close_key(event_id, entry))
+
+    def cancel(self, event_id: str) -> None:
+        entry = self._deadlines.pop(event_id, None)
+        if entry is not None and entry.timer is not None:
+            entry.timer.cancel()
+
+    def _arm(self, event_id: str, entry: _Deadline) -> None:
+        if not self.auto_close or entry.timer is not None:
+            return
+        if _close_key(event_id, entry) in self._closed_local:
+            return
+        loop = asyncio.get_running_loop()
+        entry.timer = loop.call_at(entry.mono, self._fire, event_id, entry)
+
+    # ── 回答の締切判定 ───────────────────────────────
+
+    def is_past(
+        self,
+        event_id: str,
+        question_id: str,
+        deadline: str | datetime | None,
+    ) -> bool:
+        """締切 + 猶予を過ぎていれば True。締切なしなら False。
+
+        回答を受けたタスクでは自動クローズのタイマーも仕掛ける（未登録の場合のみ）。
+        """
+        entry = self._entry(event_id, question_id, deadline)
+        if entry is None:
+            return False
+        self._arm(event_id, entry)
+        return asyncio.get_running_loop().time() > entry.mono + self.grace_sec
+
+    def deadline(self, event_id: str) -> datetime | None:
+        entry = self._deadlines.get(event_id)
+        return entry.at if entry else None
+
+    # ── 自動クローズ ─────────────────────────────────
+
+    def _fire(self, event_id: str, entry: _Deadline) -> None:
+        entry.timer = None
+        self.fired += 1
+        task = asyncio.create_task(self._close(event_id, entry))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _acquire(self, event_id: str, entry: _Deadline) -> bool:
+        key = _close_key(event_id, entry)
+        if key in self._closed_local:
+            return False
+        self._closed_local.add(key)
+        redis = self._pool.client()
+        if redis is None:
+            return True
+        async with self._pool.timed():
+            return bool(await redis.set(
+                "question_close:{}:{}:{}".format(*key), "1",
+                nx=True, ex=_CLOSE_LOCK_TTL_SEC,
+            ))
+
+    async def _close(self, event_id: str, entry: _Deadline) -> None:
+        if self._closer is None:
+            return
+        question_id = entry.question_id
+        try:
+            if not await self._acquire(event_id, entry):
+                return
+            await self._closer(event_id, question_id)
+            self.closed += 1
+        except Exception:
+            logger.exception("[DeadlineScheduler] auto close failed: %s/%s", event_id, question_id)
+
+    async def wait_idle(self) -> None:
+        """実行中の自動クローズが終わるまで待つ（テスト・終了処理用）。"""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    def stats(self) -> dict[str, int]:
+        return {"scheduled": len(self._deadlines), "fired": self.fired, "closed": self.closed}
+
+    def clear(self) -> None:
+        for entry in self._deadlines.values():
+            if entry.timer is not None:
+                entry.timer.cancel()
+        for task in self._tasks:
+            task.cancel()
+        self._deadlines.clear()
+        self._tasks.clear()
+        self._closed_local.clear()
+        self._closer = None
+        self.fired = 0
+        self.closed = 0
+
+
+# グローバルシングルトン（main.py の lifespan で configure）
+deadline_scheduler = DeadlineScheduler()
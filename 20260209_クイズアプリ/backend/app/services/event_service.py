@@ -1,21 +1,26 @@
 """イベント進行のビジネスロジック。
 
 管理者操作 (start / next / close / reveal / finish / abort) と
-ユーザ向け状態取得 (get_user_state) を提供する。
+ユーザ向け状態取得 (get_user_state / get_current_question) を提供する。
+管理者操作のたびに最新の状態を EventStateCache に登録し、
+ユーザ向けの読み取りはキャッシュから返す。
 """
 
 from __future__ import annotations
 
+import time
 from datetime import datetime, timedelta, timezone
 
 from fastapi import HTTPException
 
 import uuid
 
+from app.database import after_commit
 from app.models.event import Event
-from app.schemas.answer import AnswerInfo
+from app.schemas.answer import AnswerInfo, QuestionStatsResponse
 from app.schemas.event import (
     CloseResponse,
+    CurrentQuestionResponse,
     EventBrief,
     EventCreateRequest,
     EventStateInfo,
@@ -25,8 +30,24 @@ from app.schemas.event import (
     RevealResponse,
     StartResponse,
 )
-from app.schemas.question import ChoiceResponse, QuestionPublic
-from app.schemas.user import UserInfo
+from app.schemas.question import QuestionPublic
+from app.services.analytics import AnalyticsArchive, ArchivedEvent, analytics_archive
+from app.services.answer_ingest import AnswerIngestor, QuestionSnapshot, answer_ingestor
+from app.services.deadline_scheduler import DeadlineScheduler, deadline_scheduler
+from app.services.event_state import (
+    BaseEventStateCache,
+    EventState,
+    event_state_cache,
+    question_image_urls,
+    question_to_public,
+    read_event_state,
+)
+from app.services.image_service import image_variant_index
+from app.services.leaderboard import LeaderboardRegistry, leaderboard_registry
+from app.services.participant_cache import ParticipantCache, participant_cache
+from app.services.question_bank import QuestionBank, question_bank
+from app.services.question_stats import QuestionStatsRegistry, question_stats_registry
+from app.services.suffix_allocator import BaseSuffixAllocator, suffix_allocator
 from app.store.base import BaseAnswerStore, BaseEventStore, BaseQuestionStore, BaseUserStore
 from app.ws.manager import ConnectionManager
 
@@ -47,12 +68,34 @@ class EventService:
         user_store: BaseUserStore,
         answer_store: BaseAnswerStore,
         ws_manager: ConnectionManager,
+        leaderboards: LeaderboardRegistry | None = None,
+        ingestor: AnswerIngestor | None = None,
+        state_cache: BaseEventStateCache | None = None,
+        participants: ParticipantCache | None = None,
+        suffixes: BaseSuffixAllocator | None = None,
+        question_stats: QuestionStatsRegistry | None = None,
+        deadlines: DeadlineScheduler | None = None,
+        questions: QuestionBank | None = None,
+        archive: AnalyticsArchive | None = None,
     ) -> None:
         self.event_store = event_store
         self.question_store = question_store
         self.user_store = user_store
         self.answer_store = answer_store
         self.ws_manager = ws_manager
+        self.leaderboards = (
+            leaderboards if leaderboards is not None else leaderboard_registry
+        )
+        self.ingestor = ingestor if ingestor is not None else answer_ingestor
+        self.state_cache = state_cache if state_cache is not None else event_state_cache
+        self.participants = participants if participants is not None else participant_cache
+        self.suffixes = suffixes if suffixes is not None else suffix_allocator
+        self.question_stats = (
+            question_stats if question_stats is not None else question_stats_registry
+        )
+        self.deadlines = deadlines if deadlines is not None else deadline_scheduler
+        self.questions = questions if questions is not None else question_bank
+        self.archive = archive if archive is not None else analytics_archive
 
     # ── helpers ────────────────────────────────────────
 
@@ -62,21 +105,61 @@ class EventService:
             raise HTTPException(status_code=404, detail="event not found")
         return event
 
-    def _question_to_public(self, q, *, include_answer: bool = False) -> QuestionPublic:
-        return QuestionPublic(
-            question_id=q.id,
-            question_text=q.question_text,
-            question_image=q.question_image_path,
-            choices=[
-                ChoiceResponse(
-                    choice_index=c.choice_index,
-                    text=c.text,
-                    image=c.image_path,
-                )
-                for c in q.choices
-            ],
-            correct_choice_index=q.correct_choice_index if include_answer else None,
+    async def _get_state_or_404(self, event_id: str) -> EventState:
+        state = await self.state_cache.get_or_load(
+            event_id, self.event_store, self.question_store,
+        )
+        if state is None:
+            raise HTTPException(status_code=404, detail="event not found")
+        return state
+
+    async def _publish_state(self, event_id: str, *, question=None) -> None:
+        """更新後のイベント状態をコミット後にキャッシュへ登録し、他ワーカーの分を捨てさせる。
+
+        コミットまではキャッシュを空にしておく（読み取り側はコミット済みの行を DB から読む）。
+        ロールバックされた場合は登録しない。
+        """
+        state = await read_event_state(
+            event_id, self.event_store, self.question_store, question=question,
+        )
+        await self.state_cache.invalidate(event_id)
+
+        async def _publish() -> None:
+            if state is not None:
+                await self.state_cache.put(state)
+            await self.ws_manager.publish_invalidation("event_state", event_id)
+
+        after_commit(self.event_store.session, _publish)
+
+    async def _load_questions(self, event_id: str) -> list:
+        """出題順の全問題（画像の縮小版の一覧も読み込んでおく）。"""
+        questions = []
+        for qid in await self.event_store.get_question_ids(event_id):
+            q = await self.questions.get_or_load(qid, self.question_store)
+            if q:
+                questions.append(q)
+        await image_variant_index.load(
+            url for q in questions for url in question_image_urls(q)
+        )
+        return questions
+
+    async def _preload_questions(self, event_id: str, questions: list) -> None:
+        """プロトコル v2 のクライアントへ全問題（正解なし）を先送りする。"""
+        preload = getattr(self.ws_manager, "preload_questions", None)
+        if preload is None:
+            return
+        await preload(event_id, [self._question_to_public(q).model_dump() for q in questions])
+
+    @staticmethod
+    def _image_prefetch(questions: list) -> list[dict]:
+        """開始時に送る画像の事前読み込みリスト（重複なし・出題順）。"""
+        urls = dict.fromkeys(
+            url for q in questions for url in question_image_urls(q) if url
         )
+        return [image_variant_index.prefetch(url) for url in urls]
+
+    def _question_to_public(self, q, *, include_answer: bool = False) -> QuestionPublic:
+        return question_to_public(q, include_answer=include_answer)
 
     # ── 管理者操作 ─────────────────────────────────────
 
@@ -92,10 +175,18 @@ class EventService:
             current_index=-1,
             started_at=now,
         )
+        await self._publish_state(event_id)
+        questions = await self._load_questions(event_id)
+        await self._preload_questions(event_id, questions)
 
+        # 画像は開始時に先読みさせ、出題時にはキャッシュから表示できるようにする
         await self.ws_manager.broadcast(event_id, {
             "type": "event.state_changed",
-            "data": {"state": "running", "server_time": now},
+            "data": {
+                "state": "running",
+                "server_time": now,
+                "prefetch": self._image_prefetch(questions),
+            },
         })
 
         return StartResponse(status="ok", state="running")
@@ -111,7 +202,7 @@ class EventService:
             return await self._finish_event(event_id)
 
         question_id = qids[next_index]
-        question = await self.question_store.get(question_id)
+        question = await self.questions.get_or_load(question_id, self.question_store)
         if not question:
             raise HTTPException(status_code=500, detail="question not found")
 
@@ -128,6 +219,21 @@ class EventService:
             revealed=False,
             closed=False,
         )
+        self.ingestor.publish(QuestionSnapshot(
+            event_id=event_id,
+            question_id=question_id,
+            correct_choice_index=question.correct_choice_index,
+            deadline_at=deadline,
+            loaded_at=time.monotonic(),
+        ))
+        await image_variant_index.load(question_image_urls(question))
+        await self._publish_state(event_id, question=question)
+        self.question_stats.start_question(event_id, question_id, len(question.choices))
+        self.deadlines.schedule(event_id, question_id, _iso(deadline))
+
+        # 配信の完了待ち（最大 send_timeout_sec）の間、writer 接続（SQLite では1本）を握らない。
+        # 出題をコミットしてから届けるので、受け取った参加者の回答はどのワーカーでも受け付けられる
+        await self.event_store.session.commit()
 
         q_public = self._question_to_public(question, include_answer=False)
         payload = {
@@ -153,17 +259,46 @@ class EventService:
         if event.current_question_id != question_id:
             raise HTTPException(status_code=400, detail="question not active")
 
-        now = _iso(_now_utc())
+        now_dt = _now_utc()
         await self.event_store.update(
             event_id,
-            current_deadline_at=now,
+            current_deadline_at=_iso(now_dt),
             closed=True,
         )
+        return await self._after_close(event_id, question_id, now_dt)
+
+    async def close_expired(self, event_id: str, question_id: str) -> CloseResponse | None:
+        """締切到達時の自動クローズ。既に閉じている・次の問題に進んでいれば何もしない。
+
+        締切のタイマーは回答を受けた全ワーカー・全タスクが持つため、DB の条件付き UPDATE に
+        通った1回だけが閉じて question.closed を配信する。
+        """
+        now_dt = _now_utc()
+        if not await self.event_store.close_if_open(event_id, question_id, _iso(now_dt)):
+            return None
+        return await self._after_close(event_id, question_id, now_dt)
+
+    async def _after_close(
+        self, event_id: str, question_id: str, now_dt: datetime,
+    ) -> CloseResponse:
+        """締切済みにした後の共通処理（キャッシュ更新と question.closed の配信）。"""
+        now = _iso(now_dt)
+        question = await self.questions.get_or_load(question_id, self.question_store)
+        self.ingestor.publish(QuestionSnapshot(
+            event_id=event_id,
+            question_id=question_id,
+            correct_choice_index=question.correct_choice_index if question else None,
+            deadline_at=now_dt,
+            loaded_at=time.monotonic(),
+        ))
+        await self._publish_state(event_id, question=question)
+        self.deadlines.mark_closed(event_id, question_id, now_dt)
 
         await self.ws_manager.broadcast(event_id, {
             "type": "question.closed",
             "data": {"question_id": question_id, "closed_at": now},
         })
+        self.question_stats.close_question(event_id, question_id, self.ws_manager)
 
         return CloseResponse(status="ok", closed_at=now)
 
@@ -172,10 +307,11 @@ class EventService:
         if event.current_question_id != question_id:
             raise HTTPException(status_code=400, detail="question not active")
 
-        question = await self.question_store.get(question_id)
+        question = await self.questions.get_or_load(question_id, self.question_store)
         correct = question.correct_choice_index if question else 0
 
         await self.event_store.update(event_id, revealed=True)
+        await self._publish_state(event_id, question=question)
 
         await self.ws_manager.broadcast(event_id, {
             "type": "question.revealed",
@@ -199,8 +335,19 @@ class EventService:
         await self._get_event_or_404(event_id)
 
         # フルリセット: 回答 → ユーザ/セッション の順に削除
+        # （未書き込みの回答も破棄する）
+        await self.ingestor.discard_event(event_id)
         await self.answer_store.delete_by_event(event_id)
         await self.user_store.delete_by_event(event_id)
+        self.leaderboards.invalidate(event_id)
+        self.participants.invalidate_event(event_id)
+        after_commit(
+            self.event_store.session,
+            lambda: self.ws_manager.publish_invalidation("participant_event", event_id),
+        )
+        await self.suffixes.release_event(event_id)
+        self.deadlines.cancel(event_id)
+        self.question_stats.invalidate_event(event_id)
 
         await self.event_store.update(
             event_id,
@@ -214,6 +361,7 @@ class EventService:
             started_at=None,
             finished_at=None,
         )
+        await self._publish_state(event_id)
 
         await self.ws_manager.broadcast(event_id, {
             "type": "event.state_changed",
@@ -256,6 +404,9 @@ class EventService:
             state="aborted",
             finished_at=now,
         )
+        self.ingestor.invalidate(event_id)
+        self.deadlines.cancel(event_id)
+        await self._publish_state(event_id)
         await self.ws_manager.broadcast(event_id, {
             "type": "event.finished",
             "data": {"event_id": event_id},
@@ -263,18 +414,43 @@ class EventService:
         return FinishResponse(status="ok", state="aborted")
 
     async def _finish_event(self, event_id: str) -> NextResponse | FinishResponse:
+        event = await self.event_store.get(event_id)
         now = _iso(_now_utc())
+        # 分析用アーカイブは初回の終了時だけ（書き込み待ちの回答を捨てる前に集める）
+        if event is not None and event.state != "finished":
+            await self._archive_results(event, now)
         await self.event_store.update(
             event_id,
             state="finished",
             finished_at=now,
         )
+        self.ingestor.invalidate(event_id)
+        self.deadlines.cancel(event_id)
+        await self._publish_state(event_id)
         await self.ws_manager.broadcast(event_id, {
             "type": "event.finished",
             "data": {"event_id": event_id},
         })
         return FinishResponse(status="ok", state="finished")
 
+    async def _archive_results(self, event: Event, finished_at: str) -> None:
+        """終了したイベントの回答・参加者を分析用アーカイブに渡す（書き出しはバックグラウンド）。"""
+        if not self.archive.enabled:
+            return
+        questions = []
+        for qid in await self.event_store.get_question_ids(event.id):
+            question = await self.questions.get_or_load(qid, self.question_store)
+            if question is not None:
+                questions.append(question)
+        users = await self.user_store.list_event_users(event.id)
+        answers = [
+            *self.ingestor.pending_for_event(event.id),
+            *await self.answer_store.list_by_event(event.id),
+        ]
+        self.archive.archive_event(
+            ArchivedEvent.build(event, finished_at, questions, users, answers),
+        )
+
     # ── ユーザ向け状態取得 ─────────────────────────────
 
     async def get_user_state(
@@ -282,44 +458,29 @@ class EventService:
         event_id: str,
         session_id: str,
     ) -> MeStateResponse:
-        event = await self._get_event_or_404(event_id)
-        session = await self.user_store.get_session(session_id)
-        if not session or session.event_id != event_id:
+        event = await self._get_state_or_404(event_id)
+        participant = await self.participants.resolve(session_id, self.user_store)
+        if not participant or participant.event_id != event_id:
             raise HTTPException(status_code=401, detail="no session")
 
         # me
-        me = None
-        user = None
-        if session.user_id:
-            user = await self.user_store.get_user(session.user_id)
-            if user:
-                me = UserInfo(
-                    user_id=user.id,
-                    event_id=user.event_id,
-                    session_id=user.session_id,
-                    display_name=user.display_name,
-                    display_suffix=user.display_suffix,
-                    joined_at=user.joined_at,
-                )
+        me = participant.user_info()
+        user_id = me.user_id if me else None
 
         # current_question
-        current_question = None
-        if event.current_question_id:
-            q = await self.question_store.get(event.current_question_id)
-            if q:
-                current_question = self._question_to_public(
-                    q,
-                    include_answer=event.revealed,
-                )
+        current_question = event.public_question(include_answer=event.revealed)
 
         # my_answer
         my_answer = None
-        if user and event.current_question_id:
-            ans = await self.answer_store.get(
-                event_id,
-                event.current_question_id,
-                user.id,
-            )
+        if user_id and event.current_question_id:
+            # 書き込み待ちの回答を優先（ライトビハインド時）
+            ans = self.ingestor.pending(event_id, event.current_question_id, user_id)
+            if ans is None:
+                ans = await self.answer_store.get(
+                    event_id,
+                    event.current_question_id,
+                    user_id,
+                )
             if ans:
                 my_answer = AnswerInfo(
                     choice_index=ans.choice_index,
@@ -338,8 +499,41 @@ class EventService:
                 current_question_id=event.current_question_id,
                 question_started_at=event.current_shown_at,
                 answer_deadline_at=event.current_deadline_at,
+                state_version=event.version,
             ),
             me=me,
             current_question=current_question,
             my_answer=my_answer,
         )
+
+    async def get_question_stats(self, event_id: str, question_id: str) -> QuestionStatsResponse:
+        """管理者向けの回答分布（正解数を含む）。"""
+        await self._get_event_or_404(event_id)
+        if question_id not in await self.event_store.get_question_ids(event_id):
+            raise HTTPException(status_code=404, detail="question not found")
+        stats = self.question_stats.get(event_id, question_id)
+        if stats is None:
+            question = await self.questions.get_or_load(question_id, self.question_store)
+            stats = await self.question_stats.get_or_load(
+                event_id,
+                question_id,
+                self.answer_store,
+                num_choices=len(question.choices) if question else 0,
+            )
+        return stats.to_response()
+
+    async def get_current_question(self, event_id: str) -> CurrentQuestionResponse:
+        """ポーリングフォールバック用の出題中の問題。"""
+        state = await self._get_state_or_404(event_id)
+        if not state.current_question_id:
+            return CurrentQuestionResponse(
+                event_state=state.state,
+                state_version=state.version,
+            )
+        return CurrentQuestionResponse(
+            event_state=state.state,
+            question=state.public_question(include_answer=state.revealed),
+            started_at=state.current_shown_at,
+            deadline_at=state.current_deadline_at,
+            state_version=state.version,
+        )
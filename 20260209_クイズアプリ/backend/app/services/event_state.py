@@ -0,0 +1,353 @@
+"""出題中のイベント状態キャッシュ（参加者の読み取りパス用）。
+
+GET /me/state・GET /questions/current・回答提出は毎回 Event と
+出題中の Question（選択肢込み）を読む。管理者操作のたびに EventService がコミット後に
+最新の状態を put し、読み取り側はキャッシュから返す。
+
+- version はイベントごとに単調増加する（put のたびに +1）。
+  DB から読み直して埋める fill は version を進めず、既存エントリを上書きしない。
+- 問題の編集時は invalidate_question で該当問題を出題中のエントリを破棄する。
+- 単一プロセスではインメモリ、REDIS_URL があれば Valkey に保存して
+  複数タスクで共有する。
+- WS_IPC_SOCKET の複数ワーカー構成（インメモリ）では、更新したワーカーがコミット後に
+  "event_state" の無効化通知を送り、他のワーカーは forget で自分の分を捨てて DB から読み直す。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass, replace
+
+import redis.asyncio as aioredis
+
+from app.config import EVENT_STATE_TTL_SEC, REDIS_URL
+from app.schemas.question import ChoiceResponse, QuestionPublic
+from app.services.image_service import image_variant_index
+from app.store.base import BaseEventStore, BaseQuestionStore
+from app.valkey import ValkeyPool, valkey_pool
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class EventState:
+    """参加者向けに必要なイベント状態と出題中の問題。"""
+
+    event_id: str
+    state: str
+    current_question_id: str | None
+    current_index: int
+    current_shown_at: str | None
+    current_deadline_at: str | None
+    revealed: bool
+    closed: bool
+    question: QuestionPublic | None = None  # correct_choice_index は含めない
+    correct_choice_index: int | None = None
+    version: int = 0
+
+    def public_question(self, *, include_answer: bool) -> QuestionPublic | None:
+        if self.question is None:
+            return None
+        if not include_answer:
+            return self.question
+        return self.question.model_copy(
+            update={"correct_choice_index": self.correct_choice_index},
+        )
+
+    def to_json(self) -> str:
+        data = asdict(self)
+        data["question"] = self.question.model_dump() if self.question else None
+        return json.dumps(data)
+
+    @classmethod
+    def from_json(cls, raw: str) -> EventState:
+        data = json.loads(raw)
+        q = data.get("question")
+        data["question"] = QuestionPublic.model_validate(q) if q else None
+        return cls(**data)
+
+
+def question_image_urls(question) -> list[str | None]:
+    """問題文と選択肢の画像 URL（縮小版の一覧を読み込むため）。"""
+    return [question.question_image_path, *(c.image_path for c in question.choices)]
+
+
+def question_to_public(question, *, include_answer: bool = False) -> QuestionPublic:
+    """配信用の問題。画像の縮小版（srcset）は image_variant_index に読み込み済みのものを付ける。"""
+    return QuestionPublic(
+        question_id=question.id,
+        question_text=question.question_text,
+        question_image=question.question_image_path,
+        question_image_sources=image_variant_index.sources(question.question_image_path),
+        choices=[
+            ChoiceResponse(
+                choice_index=c.choice_index,
+                text=c.text,
+                image=c.image_path,
+                image_sources=image_variant_index.sources(c.image_path),
+            )
+            for c in question.choices
+        ],
+        correct_choice_index=question.correct_choice_index if include_answer else None,
+    )
+
+
+async def read_event_state(
+    event_id: str,
+    event_store: BaseEventStore,
+    question_store: BaseQuestionStore,
+    *,
+    question=None,
+) -> EventState | None:
+    """DB から EventState を組み立てる（version は 0）。"""
+    event = await event_store.get(event_id)
+    if not event:
+        return None
+
+    q_public = None
+    correct = None
+    if event.current_question_id:
+        if question is None or question.id != event.current_question_id:
+            question = await question_store.get(event.current_question_id)
+        if question:
+            await image_variant_index.load(question_image_urls(question))
+            q_public = question_to_public(question)
+            correct = question.correct_choice_index
+
+    return EventState(
+        event_id=event.id,
+        state=event.state,
+        current_question_id=event.current_question_id,
+        current_index=event.current_index,
+        current_shown_at=event.current_shown_at,
+        current_deadline_at=event.current_deadline_at,
+        revealed=event.revealed,
+        closed=event.closed,
+        question=q_public,
+        correct_choice_index=correct,
+    )
+
+
+# ── キャッシュ本体 ───────────────────────────────────
+
+
+class BaseEventStateCache(ABC):
+    def __init__(self) -> None:
+        self._load_locks: dict[str, asyncio.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @abstractmethod
+    async def get(self, event_id: str) -> EventState | None: ...
+
+    @abstractmethod
+    async def put(self, state: EventState) -> EventState:
+        """管理者操作後の状態を登録し、version を進めたものを返す。"""
+        ...
+
+    @abstractmethod
+    async def fill(self, state: EventState) -> EventState:
+        """キャッシュミス時に DB から読んだ状態を登録する（既存エントリは優先）。"""
+        ...
+
+    @abstractmethod
+    async def invalidate(self, event_id: str) -> None: ...
+
+    @abstractmethod
+    async def invalidate_question(self, question_id: str) -> None:
+        """指定の問題を出題中のエントリを全て破棄する。"""
+        ...
+
+    async def get_or_load(
+        self,
+        event_id: str,
+        event_store: BaseEventStore,
+        question_store: BaseQuestionStore,
+    ) -> EventState | None:
+        """キャッシュから返す。ミス時は同一イベントにつき1回だけ DB から読む。"""
+        state = await self._safe_get(event_id)
+        if state is not None:
+            self.hits += 1
+            return state
+
+        lock = self._load_locks.setdefault(event_id, asyncio.Lock())
+        async with lock:
+            state = await self._safe_get(event_id)
+            if state is not None:
+                self.hits += 1
+                return state
+            self.misses += 1
+            state = await read_event_state(event_id, event_store, question_store)
+            if state is None:
+                return None
+            try:
+                return await self.fill(state)
+            except Exception as e:
+                logger.warning("[EventStateCache] fill failed: %s", e)
+                return state
+
+    def forget(self, event_id: str | None) -> None:
+        """他ワーカーからの無効化通知で、このプロセスの分を捨てる（None なら全て）。
+
+        共有ストアを使う版では何もしない。
+        """
+
+    async def _safe_get(self, event_id: str) -> EventState | None:
+        try:
+            return await self.get(event_id)
+        except Exception as e:
+            # キャッシュ障害時は DB にフォールバック
+            logger.warning("[EventStateCache] get failed: %s", e)
+            return None
+
+    def clear(self) -> None:
+        self._load_locks.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+class InMemoryEventStateCache(BaseEventStateCache):
+    def __init__(self, ttl_sec: float | None = EVENT_STATE_TTL_SEC) -> None:
+        super().__init__()
+        self.ttl_sec = ttl_sec
+        # event_id -> (state, 登録時刻)
+        self._states: dict[str, tuple[EventState, float]] = {}
+        # version は invalidate 後も引き継ぐ
+        self._versions: dict[str, int] = {}
+
+    async def get(self, event_id: str) -> EventState | None:
+        entry = self._states.get(event_id)
+        if entry is None:
+            return None
+        state, stored_at = entry
+        if self.ttl_sec is not None and time.monotonic() - stored_at > self.ttl_sec:
+            self._states.pop(event_id, None)
+            return None
+        return state
+
+    async def put(self, state: EventState) -> EventState:
+        version = self._versions.get(state.event_id, 0) + 1
+        self._versions[state.event_id] = version
+        state = replace(state, version=version)
+        self._states[state.event_id] = (state, time.monotonic())
+        return state
+
+    async def fill(self, state: EventState) -> EventState:
+        current = await self.get(state.event_id)
+        if current is not None:
+            return current
+        state = replace(state, version=self._versions.get(state.event_id, 0))
+        self._states[state.event_id] = (state, time.monotonic())
+        return state
+
+    async def invalidate(self, event_id: str) -> None:
+        self._states.pop(event_id, None)
+
+    async def invalidate_question(self, question_id: str) -> None:
+        for event_id, (state, _) in list(self._states.items()):
+            if state.current_question_id == question_id:
+                del self._states[event_id]
+
+    def forget(self, event_id: str | None) -> None:
+        if event_id is None:
+            self._states.clear()
+        else:
+            self._states.pop(event_id, None)
+
+    def clear(self) -> None:
+        super().clear()
+        self._states.clear()
+        self._versions.clear()
+
+
+# 保存済みより新しい version の場合のみ上書きする
+_PUT_IF_NEWER = """
+local cur = redis.call('GET', KEYS[1])
+if cur then
+  local ok, data = pcall(cjson.decode, cur)
+  if ok and tonumber(data['version']) >= tonumber(ARGV[2]) then
+    return 0
+  end
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+return 1
+"""
+
+
+class ValkeyEventStateCache(BaseEventStateCache):
+    """Valkey に保存する版。キー: event_state:{event_id}, event_state_ver:{event_id}
+
+    接続は app/valkey.py の共有プールから借りる。
+    """
+
+    def __init__(
+        self,
+        pool: ValkeyPool | None = None,
+        ttl_sec: float | None = EVENT_STATE_TTL_SEC,
+    ) -> None:
+        super().__init__()
+        self._pool = pool if pool is not None else valkey_pool
+        self.ttl_sec = int(ttl_sec) if ttl_sec else 86400
+        self._put_script = None
+
+    def _client(self) -> aioredis.Redis:
+        redis = self._pool.client()
+        if self._put_script is None:
+            self._put_script = redis.register_script(_PUT_IF_NEWER)
+        return redis
+
+    async def get(self, event_id: str) -> EventState | None:
+        async with self._pool.timed():
+            raw = await self._client().get(f"event_state:{event_id}")
+        return EventState.from_json(raw) if raw else None
+
+    async def put(self, state: EventState) -> EventState:
+        redis = self._client()
+        async with self._pool.timed():
+            version = await redis.incr(f"event_state_ver:{state.event_id}")
+            state = replace(state, version=int(version))
+            await self._put_script(
+                keys=[f"event_state:{state.event_id}"],
+                args=[state.to_json(), state.version, self.ttl_sec],
+            )
+        return state
+
+    async def fill(self, state: EventState) -> EventState:
+        redis = self._client()
+        async with self._pool.timed():
+            version = await redis.get(f"event_state_ver:{state.event_id}")
+            state = replace(state, version=int(version or 0))
+            stored = await redis.set(
+                f"event_state:{state.event_id}",
+                state.to_json(),
+                ex=self.ttl_sec,
+                nx=True,
+            )
+        if not stored:
+            current = await self.get(state.event_id)
+            if current is not None:
+                return current
+        return state
+
+    async def invalidate(self, event_id: str) -> None:
+        async with self._pool.timed():
+            await self._client().delete(f"event_state:{event_id}")
+
+    async def invalidate_question(self, question_id: str) -> None:
+        # 問題編集は稀なので SCAN で十分
+        redis = self._client()
+        async with self._pool.timed():
+            async for key in redis.scan_iter(match="event_state:*"):
+                raw = await redis.get(key)
+                if raw and EventState.from_json(raw).current_question_id == question_id:
+                    await redis.delete(key)
+
+
+# グローバルシングルトン
+event_state_cache: BaseEventStateCache = (
+    ValkeyEventStateCache() if REDIS_URL else InMemoryEventStateCache()
+)
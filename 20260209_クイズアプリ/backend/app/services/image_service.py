@@ -2,96 +2,277 @@
 
 環境変数 S3_BUCKET_NAME が設定されている場合は S3 にアップロード、
 未設定の場合はローカルの uploads/ ディレクトリに保存します。
+
+保存はイベントループを止めないよう専用のスレッドプール（UPLOAD_WORKERS）で行う。
+- 受信済みのファイル（UploadFile.file）を UPLOAD_CHUNK_BYTES ずつ読み書きし、
+  全体をメモリに載せない。
+- S3 は upload_fileobj で送る（一定サイズ以上は自動でマルチパート）。
+  クライアントはプロセスで1つだけ作って使い回す。
+- MAX_UPLOAD_BYTES を超えるファイルは保存せずに 413 を返す。
+
+保存名は内容の SHA-256（先頭 128 bit）で、同じ画像の再アップロードは保存済みのものを返す。
+アップロード時に IMAGE_VARIANT_WIDTHS の幅 × IMAGE_VARIANT_FORMATS（AVIF / WebP）の
+縮小版を作り、一覧をマニフェスト（{hash}.json）に書く:
+  {hash}.png / {hash}_320w.avif / {hash}_320w.webp / ... / {hash}.json
+ImageVariantIndex がマニフェストをプロセス内に保持し、QuestionPublic の
+question_image_sources（<picture> の <source> 相当）を組み立てる。
 """
 
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import io
+import json
+import logging
 import os
-from pathlib import Path
-from uuid import uuid4
+import re
+import shutil
+from collections import OrderedDict
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import Any, BinaryIO, TypeVar
+
+from fastapi import HTTPException
+
+from app.config import (
+    CLOUDFRONT_DOMAIN,
+    IMAGE_VARIANT_FORMATS,
+    IMAGE_VARIANT_QUALITY,
+    IMAGE_VARIANT_WIDTHS,
+    MAX_UPLOAD_BYTES,
+    S3_BUCKET_NAME,
+    UPLOAD_CHUNK_BYTES,
+    UPLOAD_WORKERS,
+    UPLOADS_DIR,
+)
+from app.schemas.question import ImageSource
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 保存名に使う内容ハッシュ（SHA-256 の先頭 128 bit）
+_HASH_LEN = 32
+_HASH_NAME = re.compile(rf"[0-9a-f]{{{_HASH_LEN}}}")
+# 内容ハッシュ名なので CDN・ブラウザで無期限にキャッシュしてよい
+_IMMUTABLE = "public, max-age=31536000, immutable"
+
+_executor = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix="upload")
+
+
+async def _run(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """ブロッキング処理をアップロード用スレッドで実行する。"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(fn, *args, **kwargs))
+
+
+@lru_cache(maxsize=1)
+def _s3_client():
+    """S3 クライアント（boto3 のクライアントはスレッドセーフなので共有する）。"""
+    import boto3
 
-from app.config import CLOUDFRONT_DOMAIN, S3_BUCKET_NAME, UPLOADS_DIR
+    return boto3.client("s3")
 
 
-def _get_file_extension(filename: str) -> str:
-    """ファイル拡張子を取得。"""
-    return Path(filename).suffix.lower()
+def _file_size(fileobj: BinaryIO) -> int:
+    fileobj.seek(0, os.SEEK_END)
+    size = fileobj.tell()
+    fileobj.seek(0)
+    return size
 
 
-async def upload_image(file_data: bytes, filename: str, content_type: str) -> str:
-    """画像をアップロードしてURLを返す。
+def _public_url(filename: str) -> str:
+    """保存ファイル名から配信 URL を作る。"""
+    if S3_BUCKET_NAME:
+        key = f"images/{filename}"
+        # CloudFrontドメインが設定されていればCloudFront URL、なければS3 URL
+        if CLOUDFRONT_DOMAIN:
+            return f"https://{CLOUDFRONT_DOMAIN}/{key}"
+        region = os.getenv("AWS_REGION", "ap-northeast-1")
+        return f"https://{S3_BUCKET_NAME}.s3.{region}.amazonaws.com/{key}"
+    return f"/uploads/{filename}"
+
+
+def _name_from_url(url: str) -> str | None:
+    """内容ハッシュで保存した画像の URL からハッシュ名を取り出す（それ以外は None）。"""
+    stem = url.rsplit("/", 1)[-1].split("?", 1)[0].split(".", 1)[0]
+    return stem if _HASH_NAME.fullmatch(stem) else None
+
+
+async def save_upload(
+    fileobj: BinaryIO,
+    ext: str,
+    content_type: str,
+    *,
+    max_bytes: int | None = None,
+) -> tuple[str, str]:
+    """受信済みの画像を保存して (URL, 保存ファイル名) を返す。
+
+    同じ内容の画像がすでに保存されていれば、保存も縮小版の生成もせずにそれを返す。
 
     Args:
-        file_data: ファイルのバイナリデータ
-        filename: 元のファイル名
+        fileobj: 画像のファイルオブジェクト（UploadFile.file）
+        ext: 保存する拡張子（".png" など）
         content_type: コンテンツタイプ (例: "image/jpeg")
+        max_bytes: 上限サイズ（省略時は MAX_UPLOAD_BYTES）。超えたら 413
 
     Returns:
-        str: 画像のURL
+        tuple[str, str]: 画像の URL と保存ファイル名
     """
-    ext = _get_file_extension(filename)
-    unique_filename = f"{uuid4()}{ext}"
+    limit = MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    if await _run(_file_size, fileobj) > limit:
+        raise HTTPException(status_code=413, detail="file too large")
+
+    manifest = await _run(_store_image, fileobj, ext, content_type)
+    image_variant_index.remember(manifest)
+    url = manifest["original"]
+    return url, url.rsplit("/", 1)[-1]
+
+
+# ── 保存と縮小版の生成（スレッドで実行） ─────────────────
 
-    # S3 が設定されている場合は S3 にアップロード
+
+def _content_hash(fileobj: BinaryIO) -> str:
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    while chunk := fileobj.read(UPLOAD_CHUNK_BYTES):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()[:_HASH_LEN]
+
+
+def _store_image(fileobj: BinaryIO, ext: str, content_type: str) -> dict[str, Any]:
+    """原寸と縮小版を保存してマニフェストを返す。
+
+    マニフェストは最後に書くので、あれば縮小版まで揃っている（保存済みとみなす）。
+    """
+    name = _content_hash(fileobj)
+    manifest = _read_manifest(name)
+    if manifest is not None:
+        return manifest
+
+    original = f"{name}{ext}"
+    _put(fileobj, original, content_type)
+    manifest = {"original": _public_url(original), "width": None, "height": None, "variants": []}
+    fileobj.seek(0)
+    for filename, mime, width, data in _make_variants(fileobj, name, manifest):
+        _put(io.BytesIO(data), filename, mime)
+        manifest["variants"].append({"url": _public_url(filename), "type": mime, "width": width})
+    _put(io.BytesIO(json.dumps(manifest).encode()), f"{name}.json", "application/json")
+    return manifest
+
+
+def _make_variants(
+    fileobj: BinaryIO,
+    name: str,
+    manifest: dict[str, Any],
+) -> Iterator[tuple[str, str, int, bytes]]:
+    """IMAGE_VARIANT_WIDTHS × IMAGE_VARIANT_FORMATS の縮小版を (ファイル名, MIME, 幅, 中身) で返す。
+
+    Pillow がない・読めない画像・アニメーション画像は縮小版を作らない（原寸のみ）。
+    原寸より大きい幅は原寸に揃える（拡大はしない）。
+    """
+    try:
+        from PIL import Image, ImageOps, features
+    except ImportError:
+        logger.warning("[ImageService] Pillow is not installed; skipping variants")
+        return
+    try:
+        img = Image.open(fileobj)
+        if getattr(img, "is_animated", False):
+            return
+        img = ImageOps.exif_transpose(img)
+        img.load()
+    except Exception as e:
+        logger.warning("[ImageService] cannot decode image %s: %s", name, e)
+        return
+
+    manifest["width"], manifest["height"] = img.size
+    if img.mode not in ("RGB", "RGBA"):
+        has_alpha = img.mode in ("LA", "PA") or "transparency" in img.info
+        img = img.convert("RGBA" if has_alpha else "RGB")
+
+    formats = [f for f in IMAGE_VARIANT_FORMATS if features.check(f)]
+    for width in sorted({min(w, img.width) for w in IMAGE_VARIANT_WIDTHS}):
+        if width == img.width:
+            resized = img
+        else:
+            height = max(1, round(img.height * width / img.width))
+            resized = img.resize((width, height), Image.LANCZOS)
+        for fmt in formats:
+            buf = io.BytesIO()
+            resized.save(buf, format=fmt.upper(), quality=IMAGE_VARIANT_QUALITY)
+            yield f"{name}_{width}w.{fmt}", f"image/{fmt}", width, buf.getvalue()
+
+
+def _put(fileobj: BinaryIO, filename: str, content_type: str) -> str:
+    """S3 またはローカルへ1ファイル保存して URL を返す。"""
     if S3_BUCKET_NAME:
-        return await _upload_to_s3(file_data, unique_filename, content_type)
+        return _upload_to_s3(fileobj, filename, content_type)
+    return _upload_to_local(fileobj, filename)
 
-    # ローカルに保存
-    return await _upload_to_local(file_data, unique_filename)
 
+def _read_manifest(name: str) -> dict[str, Any] | None:
+    """保存済みのマニフェストを読む（なければ None）。"""
+    try:
+        if S3_BUCKET_NAME:
+            obj = _s3_client().get_object(Bucket=S3_BUCKET_NAME, Key=f"images/{name}.json")
+            return json.loads(obj["Body"].read())
+        return json.loads((UPLOADS_DIR / f"{name}.json").read_bytes())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        # S3 の NoSuchKey（ClientError）は「未保存」
+        if "NoSuchKey" not in str(e):
+            logger.warning("[ImageService] failed to read manifest %s: %s", name, e)
+        return None
 
-async def _upload_to_s3(
-    file_data: bytes,
-    filename: str,
-    content_type: str,
-) -> str:
-    """S3に画像をアップロード。
+
+def _upload_to_s3(fileobj: BinaryIO, filename: str, content_type: str) -> str:
+    """S3に画像をアップロード（スレッドで実行）。
 
     Args:
-        file_data: ファイルのバイナリデータ
+        fileobj: 画像のファイルオブジェクト
         filename: S3に保存するファイル名
         content_type: コンテンツタイプ
 
     Returns:
         str: CloudFront または S3 の URL
     """
-    import boto3
-
-    s3_client = boto3.client("s3")
-    key = f"images/{filename}"
-
-    # S3にアップロード
-    s3_client.put_object(
-        Bucket=S3_BUCKET_NAME,
-        Key=key,
-        Body=file_data,
-        ContentType=content_type,
+    _s3_client().upload_fileobj(
+        fileobj,
+        S3_BUCKET_NAME,
+        f"images/{filename}",
+        ExtraArgs={"ContentType": content_type, "CacheControl": _IMMUTABLE},
     )
+    return _public_url(filename)
 
-    # CloudFrontドメインが設定されていればCloudFront URL、なければS3 URL
-    if CLOUDFRONT_DOMAIN:
-        return f"https://{CLOUDFRONT_DOMAIN}/{key}"
-    else:
-        region = os.getenv("AWS_REGION", "ap-northeast-1")
-        return f"https://{S3_BUCKET_NAME}.s3.{region}.amazonaws.com/{key}"
 
+def _upload_to_local(fileobj: BinaryIO, filename: str) -> str:
+    """ローカルディレクトリに画像を保存（スレッドで実行）。
 
-async def _upload_to_local(file_data: bytes, filename: str) -> str:
-    """ローカルディレクトリに画像を保存。
+    書き込み途中のファイルが配信されないよう、一時ファイルに書いてから名前を変える。
 
     Args:
-        file_data: ファイルのバイナリデータ
+        fileobj: 画像のファイルオブジェクト
         filename: 保存するファイル名
 
     Returns:
         str: ローカルのURL（/uploads/...）
     """
     file_path = UPLOADS_DIR / filename
-
-    # ファイルを保存
-    with open(file_path, "wb") as f:
-        f.write(file_data)
+    tmp_path = file_path.with_name(f".{filename}.part")
+    try:
+        with open(tmp_path, "wb") as f:
+            shutil.copyfileobj(fileobj, f, UPLOAD_CHUNK_BYTES)
+        os.replace(tmp_path, file_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
 
     # ローカルURLを返す
-    return f"/uploads/{filename}"
+    return _public_url(filename)
 
 
 async def delete_image(image_url: str) -> None:
@@ -102,23 +283,21 @@ async def delete_image(image_url: str) -> None:
     """
     # S3の画像の場合
     if S3_BUCKET_NAME and (
-        CLOUDFRONT_DOMAIN in image_url
+        (CLOUDFRONT_DOMAIN and CLOUDFRONT_DOMAIN in image_url)
         or S3_BUCKET_NAME in image_url
     ):
-        await _delete_from_s3(image_url)
+        await _run(_delete_from_s3, image_url)
     # ローカルの画像の場合
     elif image_url.startswith("/uploads/"):
-        await _delete_from_local(image_url)
+        await _run(_delete_from_local, image_url)
 
 
-async def _delete_from_s3(image_url: str) -> None:
+def _delete_from_s3(image_url: str) -> None:
     """S3から画像を削除。
 
     Args:
         image_url: S3またはCloudFrontのURL
     """
-    import boto3
-
     # URLからキーを抽出
     # 例: https://dxxxx.cloudfront.net/images/abc.jpg -> images/abc.jpg
     if "/images/" in image_url:
@@ -126,14 +305,13 @@ async def _delete_from_s3(image_url: str) -> None:
     else:
         return  # キーが不明な場合はスキップ
 
-    s3_client = boto3.client("s3")
     try:
-        s3_client.delete_object(Bucket=S3_BUCKET_NAME, Key=key)
+        _s3_client().delete_object(Bucket=S3_BUCKET_NAME, Key=key)
     except Exception as e:
         print(f"[ImageService] Failed to delete from S3: {e}")
 
 
-async def _delete_from_local(image_url: str) -> None:
+def _delete_from_local(image_url: str) -> None:
     """ローカルから画像を削除。
 
     Args:
@@ -147,3 +325,66 @@ async def _delete_from_local(image_url: str) -> None:
             file_path.unlink()
     except Exception as e:
         print(f"[ImageService] Failed to delete from local: {e}")
+
+
+# ── 縮小版の一覧（マニフェストのキャッシュ） ─────────────────
+
+
+class ImageVariantIndex:
+    """画像 URL -> マニフェスト。内容ハッシュ名なので一度読めば変わらない。"""
+
+    def __init__(self, max_entries: int = 4096) -> None:
+        self.max_entries = max_entries
+        # ハッシュ名 -> マニフェスト（保存されていなければ None）
+        self._manifests: OrderedDict[str, dict[str, Any] | None] = OrderedDict()
+
+    def remember(self, manifest: dict[str, Any]) -> None:
+        name = _name_from_url(manifest["original"])
+        if name is not None:
+            self._put(name, manifest)
+
+    def _put(self, name: str, manifest: dict[str, Any] | None) -> None:
+        self._manifests[name] = manifest
+        self._manifests.move_to_end(name)
+        while len(self._manifests) > self.max_entries:
+            self._manifests.popitem(last=False)
+
+    async def load(self, urls: Iterable[str | None]) -> None:
+        """未読のマニフェストを読み込む（問題を配信用に組み立てる前に呼ぶ）。"""
+        names = {
+            name
+            for url in urls
+            if url and (name := _name_from_url(url)) is not None and name not in self._manifests
+        }
+        for name in names:
+            self._put(name, await _run(_read_manifest, name))
+
+    def sources(self, url: str | None) -> list[ImageSource]:
+        """読み込み済みの縮小版を形式ごとの srcset にまとめる（未読・縮小版なしは空）。
+
+        並びは IMAGE_VARIANT_FORMATS の順（ブラウザは対応している最初の <source> を使う）。
+        """
+        name = _name_from_url(url) if url else None
+        manifest = self._manifests.get(name) if name else None
+        if not manifest:
+            return []
+        by_type: dict[str, list[str]] = {}
+        for v in sorted(manifest["variants"], key=lambda v: v["width"]):
+            by_type.setdefault(v["type"], []).append(f"{v['url']} {v['width']}w")
+        order = {f"image/{f}": i for i, f in enumerate(IMAGE_VARIANT_FORMATS)}
+        return [
+            ImageSource(type=mime, srcset=", ".join(entries))
+            for mime, entries in sorted(by_type.items(), key=lambda kv: order.get(kv[0], len(order)))
+        ]
+
+    def prefetch(self, url: str) -> dict[str, str | None]:
+        """<link rel="preload" as="image"> 用の src / srcset（WebP の縮小版があればそれ）。"""
+        webp = next((s.srcset for s in self.sources(url) if s.type == "image/webp"), None)
+        return {"src": url, "srcset": webp}
+
+    def clear(self) -> None:
+        self._manifests.clear()
+
+
+# グローバルシングルトン
+image_variant_index = ImageVariantIndex()
@@ -0,0 +1,334 @@
+"""インクリメンタルなリーダーボード（ランキングのインメモリ集計）。
+
+AnswerService.submit が回答ごとにユーザの正解数・回答時間合計を更新し、
+RankingService は DB を全件読み直さずに上位 k 件（O(k)）と
+任意ユーザの順位（O(log n)）を返す。
+
+ソート順と同着判定は従来の RankingService.calculate と同じ:
+  正解数 desc → 回答時間合計(小数1桁に丸めた値) asc、
+  両方が等しければ同順位（1, 2, 2, 4 形式）。同着内の並びは参加順。
+
+ボードはプロセス内にのみ存在する。未構築・期限切れの場合は
+RankingService が DB から1回だけ再構築する。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+
+from app.config import LEADERBOARD_MAX_AGE_SEC
+from app.schemas.event import LeaderboardEntry
+
+# ソートキー: (-正解数, 回答時間合計[0.1秒単位], 参加順)
+_Key = tuple[int, int, int]
+
+
+def _to_tenths(sec_1dp: float | None) -> int:
+    """小数1桁の秒数を 0.1 秒単位の整数に変換（浮動小数の誤差を避ける）。"""
+    if sec_1dp is None:
+        return 0
+    return round(sec_1dp * 10)
+
+
+# ── 順序統計構造 ─────────────────────────────────────
+
+
+class _Node:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key: _Key | None, level: int) -> None:
+        self.key = key
+        self.next: list[_Node | None] = [None] * level
+        # width[lvl]: このノードから next[lvl] までの距離（末尾は size+1 の位置とみなす）
+        self.width: list[int] = [1] * level
+
+
+class RankIndex:
+    """幅付きスキップリスト。
+
+    insert / remove / count_less が O(log n)、先頭からの走査が O(k)。
+    キーは重複しない前提（参加順を末尾に含めて一意にする）。
+    """
+
+    _MAX_LEVEL = 32
+
+    def __init__(self, seed: int | None = None) -> None:
+        self._rng = random.Random(seed)
+        self._head = _Node(None, self._MAX_LEVEL)
+        self._level = 1
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < self._MAX_LEVEL and self._rng.random() < 0.5:
+            level += 1
+        return level
+
+    def _search(self, key: _Key) -> tuple[list[_Node], list[int]]:
+        """各レベルで key 未満の最後のノードとその位置を返す。"""
+        update: list[_Node] = [self._head] * self._MAX_LEVEL
+        positions = [0] * self._MAX_LEVEL
+        node = self._head
+        pos = 0
+        for lvl in reversed(range(self._level)):
+            nxt = node.next[lvl]
+            while nxt is not None and nxt.key < key:  # type: ignore[operator]
+                pos += node.width[lvl]
+                node = nxt
+                nxt = node.next[lvl]
+            update[lvl] = node
+            positions[lvl] = pos
+        return update, positions
+
+    def insert(self, key: _Key) -> None:
+        update, positions = self._search(key)
+        pos = positions[0]
+        level = self._random_level()
+        if level > self._level:
+            for lvl in range(self._level, level):
+                self._head.next[lvl] = None
+                self._head.width[lvl] = self._size + 1
+            self._level = level
+
+        node = _Node(key, level)
+        for lvl in range(level):
+            prev = update[lvl]
+            node.next[lvl] = prev.next[lvl]
+            prev.next[lvl] = node
+            node.width[lvl] = prev.width[lvl] - (pos - positions[lvl])
+            prev.width[lvl] = pos - positions[lvl] + 1
+        for lvl in range(level, self._level):
+            update[lvl].width[lvl] += 1
+        self._size += 1
+
+    def remove(self, key: _Key) -> None:
+        update, _ = self._search(key)
+        target = update[0].next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+        for lvl in range(self._level):
+            prev = update[lvl]
+            if prev.next[lvl] is target:
+                prev.width[lvl] += target.width[lvl] - 1
+                prev.next[lvl] = target.next[lvl]
+            else:
+                prev.width[lvl] -= 1
+        self._size -= 1
+        while self._level > 1 and self._head.next[self._level - 1] is None:
+            self._level -= 1
+
+    def count_less(self, key: _Key) -> int:
+        """key より小さいキーの個数。"""
+        _, positions = self._search(key)
+        return positions[0]
+
+    def __iter__(self) -> Iterator[_Key]:
+        node = self._head.next[0]
+        while node is not None:
+            yield node.key  # type: ignore[misc]
+            node = node.next[0]
+
+
+# ── イベント単位のボード ─────────────────────────────
+
+
+@dataclass
+class _UserScore:
+    user_id: str
+    display_name: str
+    seq: int
+    correct_count: int = 0
+    correct_time_tenths: int = 0
+    answered: set[str] = field(default_factory=set)
+
+    @property
+    def key(self) -> _Key:
+        return (-self.correct_count, self.correct_time_tenths, self.seq)
+
+
+class EventLeaderboard:
+    """1イベント分のリーダーボード。"""
+
+    def __init__(self, question_ids: list[str]) -> None:
+        self.question_ids = frozenset(question_ids)
+        self.total_questions = len(question_ids)
+        self.built_at = time.monotonic()
+        self._scores: dict[str, _UserScore] = {}
+        self._by_key: dict[_Key, _UserScore] = {}
+        self._index = RankIndex()
+        self._next_seq = 0
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def has_user(self, user_id: str) -> bool:
+        return user_id in self._scores
+
+    def add_user(self, user_id: str, display_name: str) -> None:
+        if user_id in self._scores:
+            return
+        score = _UserScore(user_id=user_id, display_name=display_name, seq=self._next_seq)
+        self._next_seq += 1
+        self._scores[user_id] = score
+        self._by_key[score.key] = score
+        self._index.insert(score.key)
+
+    def record_answer(
+        self,
+        user_id: str,
+        question_id: str,
+        *,
+        accepted: bool,
+        is_correct: bool | None,
+        response_time_sec_1dp: float | None,
+    ) -> bool:
+        """回答を反映する。未知のユーザなら False を返す（呼び出し側で再構築）。"""
+        score = self._scores.get(user_id)
+        if score is None:
+            return False
+        if question_id not in self.question_ids or question_id in score.answered:
+            return True
+
+        old_key = score.key
+        score.answered.add(question_id)
+        if is_correct and accepted:
+            score.correct_count += 1
+            score.correct_time_tenths += _to_tenths(response_time_sec_1dp)
+
+        if score.key != old_key:
+            self._index.remove(old_key)
+            del self._by_key[old_key]
+            self._index.insert(score.key)
+            self._by_key[score.key] = score
+        return True
+
+    def _entry(self, score: _UserScore, rank: int) -> LeaderboardEntry:
+        total = self.total_questions
+        accuracy = score.correct_count / total if total > 0 else 0
+        return LeaderboardEntry(
+            rank=rank,
+            user_id=score.user_id,
+            display_name=score.display_name,
+            correct_count=score.correct_count,
+            unanswered_count=total - len(score.answered),
+            accuracy=round(accuracy, 4),
+            correct_time_sum_sec_1dp=round(score.correct_time_tenths / 10, 1),
+        )
+
+    def top(self, limit: int | None = None) -> list[LeaderboardEntry]:
+        """上位 limit 件（None で全件）を順位付きで返す。O(k)。"""
+        entries: list[LeaderboardEntry] = []
+        prev: _Key | None = None
+        rank = 0
+        for i, key in enumerate(self._index):
+            if limit is not None and i >= limit:
+                break
+            if prev is None or key[:2] != prev[:2]:
+                rank = i + 1
+            prev = key
+            entries.append(self._entry(self._by_key[key], rank))
+        return entries
+
+    def entry_for(self, user_id: str) -> LeaderboardEntry | None:
+        """ユーザの順位付きエントリを返す。O(log n)。"""
+        score = self._scores.get(user_id)
+        if score is None:
+            return None
+        correct, tenths, _ = score.key
+        rank = self._index.count_less((correct, tenths, -1)) + 1
+        return self._entry(score, rank)
+
+
+# ── レジストリ ───────────────────────────────────────
+
+
+class LeaderboardRegistry:
+    """event_id -> EventLeaderboard のプロセス内キャッシュ。
+
+    max_age_sec を指定すると、構築から一定時間経ったボードを破棄する
+    （複数タスク構成で他タスクの回答を取り込むための上限）。
+    """
+
+    def __init__(self, max_age_sec: float | None = None) -> None:
+        self.max_age_sec = max_age_sec
+        self._boards: dict[str, EventLeaderboard] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        # 再構築中に届いた更新（DB 読み込みと並行した取りこぼしを防ぐ）
+        self._journals: dict[str, list[tuple]] = {}
+
+    def get(self, event_id: str) -> EventLeaderboard | None:
+        board = self._boards.get(event_id)
+        if board is None:
+            return None
+        if (
+            self.max_age_sec is not None
+            and time.monotonic() - board.built_at > self.max_age_sec
+        ):
+            self._boards.pop(event_id, None)
+            return None
+        return board
+
+    def build_lock(self, event_id: str) -> asyncio.Lock:
+        """同一イベントの再構築を1本にまとめるためのロック。"""
+        lock = self._locks.get(event_id)
+        if lock is None:
+            lock = self._locks[event_id] = asyncio.Lock()
+        return lock
+
+    def begin_build(self, event_id: str) -> None:
+        self._journals[event_id] = []
+
+    def finish_build(self, event_id: str, board: EventLeaderboard) -> None:
+        """構築したボードを登録し、構築中に届いた更新を再適用する。"""
+        journal = self._journals.pop(event_id, None)
+        if journal is None:
+            return  # 構築中に invalidate された
+        self._boards[event_id] = board
+        for op, args, kwargs in journal:
+            getattr(self, op)(event_id, *args, **kwargs)
+
+    def abort_build(self, event_id: str) -> None:
+        self._journals.pop(event_id, None)
+
+    def add_user(self, event_id: str, user_id: str, display_name: str) -> None:
+        journal = self._journals.get(event_id)
+        if journal is not None:
+            journal.append(("add_user", (user_id, display_name), {}))
+        board = self._boards.get(event_id)
+        if board is not None:
+            board.add_user(user_id, display_name)
+
+    def record_answer(
+        self,
+        event_id: str,
+        user_id: str,
+        question_id: str,
+        **kwargs: object,
+    ) -> None:
+        journal = self._journals.get(event_id)
+        if journal is not None:
+            journal.append(("record_answer", (user_id, question_id), kwargs))
+        board = self._boards.get(event_id)
+        if board is not None and not board.record_answer(user_id, question_id, **kwargs):
+            # ボードに存在しないユーザ → 次回の参照で再構築
+            self.invalidate(event_id)
+
+    def invalidate(self, event_id: str) -> None:
+        self._boards.pop(event_id, None)
+        self._journals.pop(event_id, None)
+
+    def clear(self) -> None:
+        self._boards.clear()
+        self._locks.clear()
+        self._journals.clear()
+
+
+# グローバルシングルトン
+leaderboard_registry = LeaderboardRegistry(max_age_sec=LEADERBOARD_MAX_AGE_SEC)
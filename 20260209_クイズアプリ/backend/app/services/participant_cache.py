@@ -0,0 +1,217 @@
+"""参加者（session_id → セッション + ユーザ）の解決キャッシュ。
+
+参加者向けの各リクエスト（me/state・回答・結果）は Cookie の session_id から
+EventSession と EventUser を引く。解決結果をプロセス内に TTL 付きで保持し、
+同時に多数のキャッシュミスが起きた場合（出題直後の一斉アクセスなど）は
+IN 句の1クエリにまとめて埋める。
+
+- キャッシュするのは登録済み（user_id あり）の参加者のみ。登録済みの組は
+  リセットまで変わらないため、未登録セッションの登録直後に古い値が残ることはない。
+- 無効化: 登録（update_session）・ログアウトで該当セッション、
+  リセット（delete_by_event）でイベント単位。
+- WS_IPC_SOCKET の複数ワーカー構成では、登録・ログアウト・リセットをコミット後に
+  無効化通知（"participant" / "participant_event"）で他のワーカーにも反映する。
+- 他タスクでのリセットや取りこぼした通知は TTL（PARTICIPANT_CACHE_TTL_SEC）経過で反映される。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+
+from app.config import (
+    PARTICIPANT_BATCH_WINDOW_MS,
+    PARTICIPANT_CACHE_MAX_ENTRIES,
+    PARTICIPANT_CACHE_TTL_SEC,
+)
+from app.models.user import EventSession, EventUser
+from app.schemas.user import UserInfo
+from app.store.base import BaseUserStore
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Participant:
+    """セッションと登録済みユーザ（未登録なら user_id=None）。DB セッションから切り離した値。"""
+
+    session_id: str
+    event_id: str
+    user_id: str | None = None
+    display_name: str | None = None
+    display_suffix: str | None = None
+    joined_at: str | None = None
+
+    @classmethod
+    def from_rows(cls, es: EventSession, user: EventUser | None) -> Participant:
+        if user is None:
+            return cls(session_id=es.id, event_id=es.event_id, user_id=es.user_id)
+        return cls(
+            session_id=es.id,
+            event_id=es.event_id,
+            user_id=user.id,
+            display_name=user.display_name,
+            display_suffix=user.display_suffix,
+            joined_at=user.joined_at,
+        )
+
+    @property
+    def registered(self) -> bool:
+        return self.user_id is not None and self.display_name is not None
+
+    def user_info(self) -> UserInfo | None:
+        if not self.registered:
+            return None
+        return UserInfo(
+            user_id=self.user_id,
+            event_id=self.event_id,
+            session_id=self.session_id,
+            display_name=self.display_name,
+            display_suffix=self.display_suffix,
+            joined_at=self.joined_at,
+        )
+
+
+class ParticipantCache:
+    def __init__(
+        self,
+        ttl_sec: float = PARTICIPANT_CACHE_TTL_SEC,
+        max_entries: int = PARTICIPANT_CACHE_MAX_ENTRIES,
+        batch_window_sec: float = PARTICIPANT_BATCH_WINDOW_MS / 1000,
+        max_batch: int = 500,
+    ) -> None:
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self.batch_window_sec = batch_window_sec
+        self.max_batch = max_batch
+        # session_id -> (participant, 登録時刻)。dict の挿入順で古いものから追い出す
+        self._entries: dict[str, tuple[Participant, float]] = {}
+        self._by_event: dict[str, set[str]] = {}
+        # 解決待ち: session_id -> Future。_batch は現在のリーダーが集めている分
+        self._waiting: dict[str, asyncio.Future[Participant | None]] = {}
+        self._batch: list[str] | None = None
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+
+    # ── 参照 ─────────────────────────────────────────
+
+    def _get(self, session_id: str) -> Participant | None:
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return None
+        participant, stored_at = entry
+        if time.monotonic() - stored_at > self.ttl_sec:
+            self._discard(session_id)
+            return None
+        return participant
+
+    async def resolve(
+        self,
+        session_id: str,
+        user_store: BaseUserStore,
+    ) -> Participant | None:
+        """session_id を解決する。存在しなければ None。"""
+        participant = self._get(session_id)
+        if participant is not None:
+            self.hits += 1
+            return participant
+        self.misses += 1
+
+        fut = self._waiting.get(session_id)
+        if fut is None:
+            fut = asyncio.get_running_loop().create_future()
+            self._waiting[session_id] = fut
+            if self._batch is None or len(self._batch) >= self.max_batch:
+                # 最初のミスがリーダーになり、自分のストアで1回だけ引く
+                self._batch = [session_id]
+                await self._load_batch(user_store)
+            else:
+                self._batch.append(session_id)
+
+        try:
+            return await asyncio.shield(fut)
+        except Exception as e:
+            # リーダー側の失敗時は自分のセッションで引き直す
+            logger.warning("[ParticipantCache] batch load failed: %s", e)
+            rows = await user_store.get_participants([session_id])
+            row = rows.get(session_id)
+            return Participant.from_rows(*row) if row else None
+
+    async def _load_batch(self, user_store: BaseUserStore) -> None:
+        batch = self._batch
+        try:
+            await asyncio.sleep(self.batch_window_sec)
+            if self._batch is batch:
+                self._batch = None
+            rows = await user_store.get_participants(batch)
+            self.batches += 1
+        except BaseException as e:
+            if self._batch is batch:
+                self._batch = None
+            for sid in batch:
+                fut = self._waiting.pop(sid, None)
+                if fut is not None and not fut.done():
+                    fut.set_exception(
+                        e if isinstance(e, Exception) else RuntimeError("batch cancelled"),
+                    )
+                    fut.exception()  # 待ち手がいない場合の未取得警告を避ける
+            if not isinstance(e, Exception):
+                raise
+            return
+
+        for sid in batch:
+            row = rows.get(sid)
+            participant = Participant.from_rows(*row) if row else None
+            if participant is not None and participant.registered:
+                self._store(participant)
+            fut = self._waiting.pop(sid, None)
+            if fut is not None and not fut.done():
+                fut.set_result(participant)
+
+    def _store(self, participant: Participant) -> None:
+        sid = participant.session_id
+        self._entries.pop(sid, None)
+        self._entries[sid] = (participant, time.monotonic())
+        self._by_event.setdefault(participant.event_id, set()).add(sid)
+        while len(self._entries) > self.max_entries:
+            self._discard(next(iter(self._entries)))
+
+    # ── 無効化 ───────────────────────────────────────
+
+    def _discard(self, session_id: str) -> None:
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            sids = self._by_event.get(entry[0].event_id)
+            if sids is not None:
+                sids.discard(session_id)
+
+    def invalidate(self, session_id: str) -> None:
+        self._discard(session_id)
+
+    def invalidate_event(self, event_id: str) -> None:
+        for sid in self._by_event.pop(event_id, set()):
+            self._entries.pop(sid, None)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "batches": self.batches,
+        }
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_event.clear()
+        self._waiting.clear()
+        self._batch = None
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+
+
+# グローバルシングルトン
+participant_cache = ParticipantCache()
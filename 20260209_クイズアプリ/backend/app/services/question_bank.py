@@ -0,0 +1,148 @@
+"""問題バンク: 出題で使う問題（選択肢込み）の読み取り専用キャッシュ。
+
+出題・締切・正解発表・集計のたびに問題と選択肢を DB から引かないよう、
+DB セッションから切り離した値（BankQuestion）をプロセス内に保持する。
+起動時に lifespan がバックグラウンドで全問題を読み込む（warm）。読み込みが
+終わる前のリクエストはキャッシュミスとして従来どおり DB から引く。
+
+- 無効化: 管理画面での問題の更新・削除・有効/無効の切り替え（QuestionService）。
+- 他タスク・他ワーカーでの編集は TTL（QUESTION_BANK_TTL_SEC）経過で反映される。
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import QUESTION_BANK_TTL_SEC
+from app.models.question import Question
+from app.store.base import BaseQuestionStore
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class BankChoice:
+    choice_index: int
+    text: str
+    image_path: str | None = None
+
+
+@dataclass(frozen=True)
+class BankQuestion:
+    """Question と同じ属性名で読めるスナップショット（question_to_public などにそのまま渡せる）。"""
+
+    id: str
+    question_text: str
+    question_image_path: str | None
+    correct_choice_index: int
+    is_enabled: bool
+    sort_order: int
+    choices: tuple[BankChoice, ...]
+
+    @classmethod
+    def from_model(cls, q: Question) -> BankQuestion:
+        return cls(
+            id=q.id,
+            question_text=q.question_text,
+            question_image_path=q.question_image_path,
+            correct_choice_index=q.correct_choice_index,
+            is_enabled=q.is_enabled,
+            sort_order=q.sort_order,
+            choices=tuple(
+                BankChoice(choice_index=c.choice_index, text=c.text, image_path=c.image_path)
+                for c in sorted(q.choices, key=lambda c: c.choice_index)
+            ),
+        )
+
+
+class QuestionBank:
+    def __init__(
+        self,
+        ttl_sec: float | None = QUESTION_BANK_TTL_SEC,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.ttl_sec = ttl_sec
+        self._clock = clock
+        # question_id -> (問題, 読み込んだ時刻)
+        self._entries: dict[str, tuple[BankQuestion, float]] = {}
+        self.warmed = False
+        self.hits = 0
+        self.misses = 0
+
+    # ── 参照 ─────────────────────────────────────────
+
+    def get(self, question_id: str) -> BankQuestion | None:
+        entry = self._entries.get(question_id)
+        if entry is None:
+            return None
+        question, loaded_at = entry
+        if self.ttl_sec is not None and self._clock() - loaded_at > self.ttl_sec:
+            del self._entries[question_id]
+            return None
+        return question
+
+    async def get_or_load(
+        self, question_id: str, store: BaseQuestionStore,
+    ) -> BankQuestion | None:
+        """キャッシュになければ store から読み込んで登録する。存在しなければ None。"""
+        question = self.get(question_id)
+        if question is not None:
+            self.hits += 1
+            return question
+        self.misses += 1
+        q = await store.get(question_id)
+        return self.put(q) if q is not None else None
+
+    def put(self, q: Question) -> BankQuestion:
+        question = BankQuestion.from_model(q)
+        self._entries[question.id] = (question, self._clock())
+        return question
+
+    # ── 読み込み・無効化 ───────────────────────────────
+
+    async def warm(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        store_factory: Callable[[AsyncSession], BaseQuestionStore],
+    ) -> int:
+        """全問題を読み込む（起動時にバックグラウンドで1回）。読み込んだ件数を返す。"""
+        async with session_factory() as session:
+            questions = await store_factory(session).list()
+        for q in questions:
+            self.put(q)
+        self.warmed = True
+        return len(questions)
+
+    def invalidate(self, question_id: str | None = None) -> None:
+        """問題を破棄する（None なら全て）。"""
+        if question_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(question_id, None)
+
+    def clear(self) -> None:
+        """キャッシュと計測値を破棄する（テスト用）。"""
+        self._entries.clear()
+        self.warmed = False
+        self.hits = 0
+        self.misses = 0
+
+    # ── 計測 ─────────────────────────────────────────
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "warmed": self.warmed,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# グローバルシングルトン（main.py の lifespan で warm）
+question_bank = QuestionBank()
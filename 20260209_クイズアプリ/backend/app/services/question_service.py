@@ -7,14 +7,19 @@ from datetime import datetime, timezone
 
 from fastapi import HTTPException
 
-from app.models.question import Question, QuestionChoice
+from app.database import after_commit
+from app.models.question import Question, QuestionChoice, QuestionTag
 from app.schemas.question import (
     ChoiceResponse,
     QuestionCreateRequest,
     QuestionResponse,
     QuestionUpdateRequest,
 )
+from app.services.event_state import BaseEventStateCache, event_state_cache
+from app.services.question_bank import QuestionBank, question_bank
 from app.store.base import BaseQuestionStore
+from app.ws.manager import ConnectionManager
+from app.ws.manager import ws_manager as shared_ws_manager
 
 
 def _now_iso() -> str:
@@ -37,19 +42,61 @@ def _to_response(q: Question) -> QuestionResponse:
         correct_choice_index=q.correct_choice_index,
         is_enabled=q.is_enabled,
         sort_order=q.sort_order,
+        tags=[t.tag for t in q.tags],
         created_at=q.created_at,
         updated_at=q.updated_at,
     )
 
 
+def _normalize_tags(tags: list[str]) -> list[str]:
+    """前後の空白を除き、空のタグと重複を取り除く（順序は保つ）。"""
+    return list(dict.fromkeys(t.strip() for t in tags if t.strip()))
+
+
 class QuestionService:
-    def __init__(self, question_store: BaseQuestionStore) -> None:
+    def __init__(
+        self,
+        question_store: BaseQuestionStore,
+        state_cache: BaseEventStateCache | None = None,
+        questions: QuestionBank | None = None,
+        ws_manager: ConnectionManager | None = None,
+    ) -> None:
         self.store = question_store
+        self.state_cache = state_cache if state_cache is not None else event_state_cache
+        self.questions = questions if questions is not None else question_bank
+        self.ws_manager = ws_manager if ws_manager is not None else shared_ws_manager
+
+    async def _invalidate_state(self, question_id: str) -> None:
+        """出題中のイベント状態を破棄する（他ワーカーの分はコミット後に全て捨てさせる）。"""
+        await self.state_cache.invalidate_question(question_id)
+        after_commit(
+            self.store.session,
+            lambda: self.ws_manager.publish_invalidation("event_state"),
+        )
 
     async def list_all(self, *, enabled_only: bool = False) -> list[QuestionResponse]:
         questions = await self.store.list(enabled_only=enabled_only)
         return [_to_response(q) for q in questions]
 
+    async def search(
+        self,
+        *,
+        query: str | None = None,
+        tags: list[str] | None = None,
+        enabled: bool | None = None,
+        after: tuple[int, str] | None = None,
+        limit: int = 100,
+    ) -> list[QuestionResponse]:
+        """絞り込み・キーセットページングした一覧（(sort_order, id) の順）。"""
+        questions = await self.store.search(
+            query=(query or "").strip() or None,
+            tags=_normalize_tags(tags or []),
+            enabled=enabled,
+            after=after,
+            limit=limit,
+        )
+        return [_to_response(q) for q in questions]
+
     async def get(self, question_id: str) -> QuestionResponse:
         q = await self.store.get(question_id)
         if not q:
@@ -88,8 +135,11 @@ class QuestionService:
                     image_path=c.image,
                 ),
             )
+        for tag in _normalize_tags(req.tags):
+            question.tags.append(QuestionTag(question_id=qid, tag=tag))
 
         await self.store.create(question)
+        await self.store.index_search(qid)
         return _to_response(question)
 
     async def update(
@@ -141,6 +191,15 @@ class QuestionService:
                     ),
                 )
 
+        if req.tags is not None:
+            await self.store.set_tags(question_id, _normalize_tags(req.tags))
+        if req.question_text is not None or req.choices is not None:
+            await self.store.index_search(question_id)
+
+        # 問題バンクと、出題中なら参加者向けキャッシュを破棄
+        self.questions.invalidate(question_id)
+        await self._invalidate_state(question_id)
+
         q = await self.store.get(question_id)
         return _to_response(q)
 
@@ -148,6 +207,8 @@ class QuestionService:
         deleted = await self.store.delete(question_id)
         if not deleted:
             raise HTTPException(status_code=404, detail="question not found")
+        self.questions.invalidate(question_id)
+        await self._invalidate_state(question_id)
 
     async def reorder(self, ordered_ids: list[str]) -> None:
         await self.store.reorder(ordered_ids)
@@ -156,4 +217,6 @@ class QuestionService:
         q = await self.store.set_enabled(question_id, enabled)
         if not q:
             raise HTTPException(status_code=404, detail="question not found")
+        self.questions.invalidate(question_id)
+        await self._invalidate_state(question_id)
         return _to_response(q)
@@ -0,0 +1,278 @@
+"""問題ごとの回答分布（インメモリ集計）と question.stats の配信。
+
+AnswerService.submit が回答ごとに (event_id, question_id) のカウンタを更新する。
+管理画面の集計 API とプロジェクター向けの WebSocket 配信は DB を読まずにこれを返す。
+
+- 選択肢ごとの受理回答数・受理/不受理数・正解数・回答時間の分布（0.1 秒単位のヒストグラム）
+- question.stats は ws_manager.broadcast_admin で管理者ソケット（管理画面・プロジェクター）にだけ
+  送る。参加者のソケットには届かず、seq と再送履歴も消費しない。回答ごとの配信は問題ごとに
+  QUESTION_STATS_PUSH_HZ 回/秒までとし、間に届いた回答は次の配信にまとめる。締切時にも確定した
+  分布を1回送る。正解数は含めない（プロジェクターに映るため）。
+- 集計はプロセス内にのみ存在する。未構築・期限切れの場合は DB から1回だけ作り直す
+  （構築中に届いた回答はユーザ単位で重複を除いて反映する）。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections.abc import Callable
+from typing import Any
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import QUESTION_STATS_MAX_AGE_SEC, QUESTION_STATS_PUSH_HZ
+from app.models.answer import Answer
+from app.schemas.answer import QuestionStatsResponse
+from app.store.base import BaseAnswerStore
+
+logger = logging.getLogger(__name__)
+
+_Key = tuple[str, str]
+
+
+def _to_tenths(sec_1dp: float | None) -> int | None:
+    if sec_1dp is None:
+        return None
+    return max(0, round(sec_1dp * 10))
+
+
+# ── 1問分の集計 ──────────────────────────────────────
+
+
+class QuestionStats:
+    def __init__(self, question_id: str, num_choices: int = 0) -> None:
+        self.question_id = question_id
+        self.built_at = time.monotonic()
+        self.choice_counts = [0] * num_choices
+        self.answered_count = 0
+        self.rejected_count = 0
+        self.correct_count = 0
+        # 回答時間（0.1 秒単位）-> 件数。回答時間は小数1桁なので分位点も正確に出る
+        self._rt_hist: dict[int, int] = {}
+        self._rt_count = 0
+        self._rt_sum_tenths = 0
+        self._users: set[str] = set()
+
+    def record(self, answer: Answer) -> bool:
+        """回答を反映する。同じユーザの2件目は無視して False を返す。"""
+        if answer.user_id in self._users:
+            return False
+        self._users.add(answer.user_id)
+        if not answer.accepted:
+            self.rejected_count += 1
+            return True
+
+        self.answered_count += 1
+        idx = answer.choice_index
+        if idx >= len(self.choice_counts):
+            self.choice_counts.extend([0] * (idx + 1 - len(self.choice_counts)))
+        if idx >= 0:
+            self.choice_counts[idx] += 1
+        if answer.is_correct:
+            self.correct_count += 1
+        tenths = _to_tenths(answer.response_time_sec_1dp)
+        if tenths is not None:
+            self._rt_hist[tenths] = self._rt_hist.get(tenths, 0) + 1
+            self._rt_count += 1
+            self._rt_sum_tenths += tenths
+        return True
+
+    def response_time_quantile(self, q: float) -> float | None:
+        if self._rt_count == 0:
+            return None
+        target = max(1, round(q * self._rt_count))
+        seen = 0
+        for tenths in sorted(self._rt_hist):
+            seen += self._rt_hist[tenths]
+            if seen >= target:
+                return tenths / 10
+        return None
+
+    def to_response(self, *, include_correct: bool = True) -> QuestionStatsResponse:
+        avg = (
+            round(self._rt_sum_tenths / self._rt_count / 10, 2)
+            if self._rt_count else None
+        )
+        return QuestionStatsResponse(
+            question_id=self.question_id,
+            answered_count=self.answered_count,
+            rejected_count=self.rejected_count,
+            choice_counts=list(self.choice_counts),
+            correct_count=self.correct_count if include_correct else None,
+            response_time_avg_sec=avg,
+            response_time_p50_sec=self.response_time_quantile(0.5),
+            response_time_p90_sec=self.response_time_quantile(0.9),
+        )
+
+
+# ── レジストリ ───────────────────────────────────────
+
+
+class QuestionStatsRegistry:
+    """(event_id, question_id) -> QuestionStats のプロセス内キャッシュと配信の間引き。"""
+
+    def __init__(
+        self,
+        max_age_sec: float | None = None,
+        push_hz: float = QUESTION_STATS_PUSH_HZ,
+    ) -> None:
+        self.max_age_sec = max_age_sec
+        self.push_interval_sec = 1 / push_hz if push_hz > 0 else None
+        self._stats: dict[_Key, QuestionStats] = {}
+        # DB から作り直している途中の集計（回答は反映するが参照には使わない）
+        self._building: dict[_Key, QuestionStats] = {}
+        self._locks: dict[_Key, asyncio.Lock] = {}
+        self._push_tasks: dict[_Key, asyncio.Task] = {}
+        self._last_push: dict[_Key, float] = {}
+        self._session_factory: async_sessionmaker[AsyncSession] | None = None
+        self._store_factory: Callable[[AsyncSession], BaseAnswerStore] | None = None
+        self.pushes = 0
+
+    def configure(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        store_factory: Callable[[AsyncSession], BaseAnswerStore],
+    ) -> None:
+        """配信時に期限切れの集計を DB から作り直すための接続設定（起動時に1回）。"""
+        self._session_factory = session_factory
+        self._store_factory = store_factory
+
+    def get(self, event_id: str, question_id: str) -> QuestionStats | None:
+        key = (event_id, question_id)
+        stats = self._stats.get(key)
+        if stats is None:
+            return None
+        if (
+            self.max_age_sec is not None
+            and time.monotonic() - stats.built_at > self.max_age_sec
+        ):
+            self._stats.pop(key, None)
+            return None
+        return stats
+
+    def start_question(self, event_id: str, question_id: str, num_choices: int) -> None:
+        """出題時に空の集計を登録する（出題前の回答はないので DB を読む必要がない）。"""
+        key = (event_id, question_id)
+        if key not in self._stats:
+            self._stats[key] = QuestionStats(question_id, num_choices)
+
+    def close_question(self, event_id: str, question_id: str, ws_manager: Any) -> None:
+        """締切時に呼ぶ。確定した分布を配信する（間引きの間隔は守る）。"""
+        self._schedule_push((event_id, question_id), ws_manager)
+
+    async def get_or_load(
+        self,
+        event_id: str,
+        question_id: str,
+        answer_store: BaseAnswerStore,
+        *,
+        num_choices: int = 0,
+    ) -> QuestionStats:
+        """集計を返す。未構築なら同一問題につき1回だけ DB から作る。"""
+        stats = self.get(event_id, question_id)
+        if stats is not None:
+            return stats
+        key = (event_id, question_id)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            stats = self.get(event_id, question_id)
+            if stats is not None:
+                return stats
+            stats = QuestionStats(question_id, num_choices)
+            self._building[key] = stats
+            try:
+                answers = await answer_store.list_by_question(event_id, question_id)
+            except BaseException:
+                self._building.pop(key, None)
+                raise
+            for a in answers:
+                stats.record(a)
+            if self._building.pop(key, None) is stats:
+                self._stats[key] = stats
+            return stats
+
+    def record(self, answer: Answer, ws_manager: Any | None = None) -> None:
+        """受け付けた回答を反映し、ws_manager があれば question.stats の配信を予約する。"""
+        key = (answer.event_id, answer.question_id)
+        building = self._building.get(key)
+        if building is not None:
+            building.record(answer)
+        stats = self.get(*key)
+        if stats is not None:
+            stats.record(answer)
+        if ws_manager is not None:
+            self._schedule_push(key, ws_manager)
+
+    # ── 配信 ─────────────────────────────────────────
+
+    def _schedule_push(self, key: _Key, ws_manager: Any) -> None:
+        if key in self._push_tasks:
+            return  # 予約済みの配信にまとめる
+        delay = 0.0
+        if self.push_interval_sec is not None:
+            last = self._last_push.get(key)
+            if last is not None:
+                delay = max(0.0, last + self.push_interval_sec - time.monotonic())
+        self._push_tasks[key] = asyncio.create_task(self._push_later(key, delay, ws_manager))
+
+    async def _push_later(self, key: _Key, delay: float, ws_manager: Any) -> None:
+        try:
+            if delay > 0:
+                await asyncio.sleep(delay)
+            # 送信前に外す: 以降の回答は次の配信で送る
+            self._push_tasks.pop(key, None)
+            self._last_push[key] = time.monotonic()
+            stats = await self._stats_for_push(*key)
+            if stats is None:
+                return
+            await ws_manager.broadcast_admin(key[0], {
+                "type": "question.stats",
+                "data": stats.to_response(include_correct=False).model_dump(),
+            })
+            self.pushes += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("[QuestionStats] push failed: %s", e)
+        finally:
+            if self._push_tasks.get(key) is asyncio.current_task():
+                self._push_tasks.pop(key, None)
+
+    async def _stats_for_push(self, event_id: str, question_id: str) -> QuestionStats | None:
+        stats = self.get(event_id, question_id)
+        if stats is not None or self._session_factory is None or self._store_factory is None:
+            return stats
+        async with self._session_factory() as session:
+            return await self.get_or_load(
+                event_id, question_id, self._store_factory(session),
+            )
+
+    async def wait_pushes(self) -> None:
+        """予約済みの配信が終わるまで待つ（テスト・終了処理用）。"""
+        while self._push_tasks:
+            await asyncio.gather(*list(self._push_tasks.values()), return_exceptions=True)
+
+    # ── 破棄 ─────────────────────────────────────────
+
+    def invalidate_event(self, event_id: str) -> None:
+        for d in (self._stats, self._building, self._locks, self._last_push):
+            for key in [k for k in d if k[0] == event_id]:
+                del d[key]
+        for key in [k for k in self._push_tasks if k[0] == event_id]:
+            self._push_tasks.pop(key).cancel()
+
+    def clear(self) -> None:
+        for task in self._push_tasks.values():
+            task.cancel()
+        self._push_tasks.clear()
+        self._stats.clear()
+        self._building.clear()
+        self._locks.clear()
+        self._last_push.clear()
+        self.pushes = 0
+
+
+# グローバルシングルトン
+question_stats_registry = QuestionStatsRegistry(max_age_sec=QUESTION_STATS_MAX_AGE_SEC)
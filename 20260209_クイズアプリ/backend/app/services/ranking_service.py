@@ -4,16 +4,29 @@ from __future__ import annotations
 
 import csv
 import io
+from collections.abc import AsyncIterator
 from datetime import datetime, timezone
 
 from fastapi import HTTPException
 
+from app.config import CSV_EXPORT_BATCH_SIZE
+from app.models.answer import Answer
 from app.schemas.event import (
     EventSummary,
-    LeaderboardEntry,
     ResultsResponse,
 )
-from app.store.base import BaseAnswerStore, BaseEventStore, BaseUserStore
+from app.services.answer_ingest import AnswerIngestor, answer_ingestor
+from app.services.leaderboard import (
+    EventLeaderboard,
+    LeaderboardRegistry,
+    leaderboard_registry,
+)
+from app.store.base import (
+    BaseAnswerStore,
+    BaseEventStore,
+    BaseUserStore,
+    UserScoreRow,
+)
 
 
 def _iso_now() -> str:
@@ -26,100 +39,183 @@ class RankingService:
         event_store: BaseEventStore,
         user_store: BaseUserStore,
         answer_store: BaseAnswerStore,
+        leaderboards: LeaderboardRegistry | None = None,
+        ingestor: AnswerIngestor | None = None,
     ) -> None:
         self.event_store = event_store
         self.user_store = user_store
         self.answer_store = answer_store
+        self.leaderboards = (
+            leaderboards if leaderboards is not None else leaderboard_registry
+        )
+        self.ingestor = ingestor if ingestor is not None else answer_ingestor
 
-    async def calculate(self, event_id: str) -> ResultsResponse:
-        event = await self.event_store.get(event_id)
-        if not event:
-            raise HTTPException(status_code=404, detail="event not found")
-
+    async def _build_leaderboard(self, event_id: str) -> EventLeaderboard:
+        """DB の参加者・回答からリーダーボードを構築する（キャッシュミス時のみ）。"""
         qids = await self.event_store.get_question_ids(event_id)
-        total_questions = len(qids)
-
         users = await self.user_store.list_event_users(event_id)
+        # 書き込み待ちの回答は含めない（書き込めた時点で on_written から反映される。
+        # 構築中に届いた分は finish_build が再適用する）
         answers = await self.answer_store.list_by_event(event_id)
 
-        # 回答を (question_id, user_id) でインデックス化
-        answer_map: dict[tuple[str, str], object] = {}
-        for ans in answers:
-            answer_map[(ans.question_id, ans.user_id)] = ans
-
-        entries: list[LeaderboardEntry] = []
+        board = EventLeaderboard(qids)
         for user in users:
-            correct_count = 0
-            unanswered_count = 0
-            correct_time_sum = 0.0
-            for qid in qids:
-                ans = answer_map.get((qid, user.id))
-                if ans is None:
-                    unanswered_count += 1
-                elif ans.is_correct and ans.accepted:
-                    correct_count += 1
-                    if ans.response_time_sec_1dp is not None:
-                        correct_time_sum += ans.response_time_sec_1dp
-
-            accuracy = correct_count / total_questions if total_questions > 0 else 0
-
-            entries.append(
-                LeaderboardEntry(
-                    rank=0,  # 後で計算
-                    user_id=user.id,
-                    display_name=user.display_name,
-                    correct_count=correct_count,
-                    unanswered_count=unanswered_count,
-                    accuracy=round(accuracy, 4),
-                    correct_time_sum_sec_1dp=round(correct_time_sum, 1),
-                ),
+            board.add_user(user.id, user.display_name)
+        for ans in answers:
+            board.record_answer(
+                ans.user_id,
+                ans.question_id,
+                accepted=ans.accepted,
+                is_correct=ans.is_correct,
+                response_time_sec_1dp=ans.response_time_sec_1dp,
             )
+        return board
+
+    async def get_leaderboard(self, event_id: str) -> EventLeaderboard:
+        """キャッシュ済みのリーダーボードを返す。なければ1回だけ構築する。"""
+        board = self.leaderboards.get(event_id)
+        if board is not None:
+            return board
+
+        async with self.leaderboards.build_lock(event_id):
+            board = self.leaderboards.get(event_id)
+            if board is not None:
+                return board
+            self.leaderboards.begin_build(event_id)
+            try:
+                board = await self._build_leaderboard(event_id)
+            except Exception:
+                self.leaderboards.abort_build(event_id)
+                raise
+            self.leaderboards.finish_build(event_id, board)
+            return board
+
+    async def calculate(
+        self,
+        event_id: str,
+        *,
+        limit: int | None = None,
+        user_id: str | None = None,
+    ) -> ResultsResponse:
+        """ランキングを返す。
+
+        limit 指定時は上位 limit 件のみ、user_id 指定時はそのユーザの
+        順位を me に入れて返す。
+        """
+        event = await self.event_store.get(event_id)
+        if not event:
+            raise HTTPException(status_code=404, detail="event not found")
 
-        # ソート: 正解数 desc → 回答時間合計 asc
-        entries.sort(
-            key=lambda e: (-e.correct_count, e.correct_time_sum_sec_1dp),
-        )
-
-        # ランク付け（同着対応）
-        for i, entry in enumerate(entries):
-            if i == 0:
-                entry.rank = 1
-            else:
-                prev = entries[i - 1]
-                if (
-                    entry.correct_count == prev.correct_count
-                    and entry.correct_time_sum_sec_1dp
-                    == prev.correct_time_sum_sec_1dp
-                ):
-                    entry.rank = prev.rank
-                else:
-                    entry.rank = i + 1
+        board = await self.get_leaderboard(event_id)
+        me = board.entry_for(user_id) if user_id else None
 
         finished_at = event.finished_at if event.finished_at else _iso_now()
 
         return ResultsResponse(
-            leaderboard=entries,
+            leaderboard=board.top(limit),
             event_summary=EventSummary(
-                total_questions=total_questions,
+                total_questions=board.total_questions,
                 finished_at=finished_at,
             ),
+            me=me,
         )
 
-    async def export_csv(self, event_id: str) -> str:
-        """ランキングを CSV 文字列として返す。"""
-        result = await self.calculate(event_id)
-
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(["順位", "表示名", "正解数", "未回答数", "正答率", "回答時間合計(秒)"])
-        for e in result.leaderboard:
-            writer.writerow([
-                e.rank,
-                e.display_name,
-                e.correct_count,
-                e.unanswered_count,
-                f"{e.accuracy:.1%}",
-                e.correct_time_sum_sec_1dp,
-            ])
-
-        return output.getvalue()
+    async def export_csv(
+        self,
+        event_id: str,
+        *,
+        wide: bool = False,
+        batch_size: int = CSV_EXPORT_BATCH_SIZE,
+    ) -> AsyncIterator[str]:
+        """ランキングを CSV として少しずつ返す（batch_size 行ごとに1チャンク）。
+
+        参加者の成績は DB 側で集計・整列し、batch_size 件ずつ読み出して順位を付ける。
+        wide=True では問題ごとの選択肢番号・正誤・回答時間の列を追加する。
+        イベントが存在しなければ 404（ストリーム開始前に判定する）。
+        """
+        event = await self.event_store.get(event_id)
+        if not event:
+            raise HTTPException(status_code=404, detail="event not found")
+        # 書き込み待ちの回答を DB に反映してから集計する
+        await self.ingestor.flush()
+        qids = await self.event_store.get_question_ids(event_id)
+        return self._iter_csv(event_id, qids, wide=wide, batch_size=batch_size)
+
+    async def _iter_csv(
+        self,
+        event_id: str,
+        question_ids: list[str],
+        *,
+        wide: bool,
+        batch_size: int,
+    ) -> AsyncIterator[str]:
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+
+        header = ["順位", "表示名", "正解数", "未回答数", "正答率", "回答時間合計(秒)"]
+        if wide:
+            for i in range(len(question_ids)):
+                header += [f"Q{i + 1} 選択肢", f"Q{i + 1} 正誤", f"Q{i + 1} 回答時間(秒)"]
+        writer.writerow(header)
+
+        total = len(question_ids)
+        rank = 0
+        prev: tuple[int, int] | None = None
+        batch: list[tuple[int, UserScoreRow]] = []
+
+        async def _flush_batch() -> str:
+            answers: dict[str, dict[str, Answer]] = {}
+            if wide:
+                user_ids = [row.user_id for _, row in batch]
+                for a in await self.answer_store.list_by_users(event_id, user_ids):
+                    answers.setdefault(a.user_id, {})[a.question_id] = a
+            for r, row in batch:
+                accuracy = round(row.correct_count / total, 4) if total > 0 else 0
+                line = [
+                    r,
+                    row.display_name,
+                    row.correct_count,
+                    total - row.answered_count,
+                    f"{accuracy:.1%}",
+                    round(row.correct_time_tenths / 10, 1),
+                ]
+                if wide:
+                    line += _question_columns(question_ids, answers.get(row.user_id, {}))
+                writer.writerow(line)
+            batch.clear()
+            chunk = buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+            return chunk
+
+        i = 0
+        async for row in self.answer_store.iter_user_scores(
+            event_id, question_ids, batch_size=batch_size,
+        ):
+            # 同着（正解数と回答時間合計が同じ）は同順位: 1, 2, 2, 4
+            key = (row.correct_count, row.correct_time_tenths)
+            if key != prev:
+                rank = i + 1
+                prev = key
+            i += 1
+            batch.append((rank, row))
+            if len(batch) >= batch_size:
+                yield await _flush_batch()
+
+        chunk = await _flush_batch()
+        if chunk:
+            yield chunk
+
+
+def _question_columns(question_ids: list[str], answers: dict[str, Answer]) -> list[object]:
+    """wide 形式の問題ごとの列（選択肢番号・正誤・回答時間）。未回答は空欄。"""
+    cols: list[object] = []
+    for qid in question_ids:
+        a = answers.get(qid)
+        if a is None:
+            cols += ["", "", ""]
+            continue
+        mark = "○" if a.accepted and a.is_correct else "×"
+        rt = a.response_time_sec_1dp if a.response_time_sec_1dp is not None else ""
+        cols += [a.choice_index, mark, rt]
+    return cols
@@ -0,0 +1,179 @@
+"""表示名サフィックス（0000〜9999）の払い出し。
+
+イベントごとに未使用サフィックスのプールを持ち、1件ずつ取り出す。
+プールは初回の払い出し時に DB の使用済み一覧（1クエリ）を除いて作るため、
+以降の登録では DB を引かず、(event_id, display_suffix) の一意制約にも当たらない。
+
+- 単一プロセス: インメモリのシャッフル済みリストから pop する。
+  WS_IPC_SOCKET の複数ワーカー構成ではワーカーごとのプールになるため、
+  登録側（register_user）が一意制約違反で取り直す。
+- REDIS_URL あり: Valkey の SET に入れて SPOP する（全タスクで共有）。
+- 払い出したサフィックスで登録できなかった場合（ロールバック・コミット失敗など）は
+  release でプールに戻す。
+- リセット（参加者の全削除）で release_event してプールを作り直す。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+from abc import ABC, abstractmethod
+
+import redis.asyncio as aioredis
+from fastapi import HTTPException
+
+from app.config import REDIS_URL, SUFFIX_POOL_TTL_SEC
+from app.store.base import BaseUserStore
+from app.valkey import ValkeyPool, valkey_pool
+
+SUFFIX_SPACE = 10000
+
+
+def _free_suffixes(used: set[str]) -> list[str]:
+    return [s for s in (f"{i:04d}" for i in range(SUFFIX_SPACE)) if s not in used]
+
+
+def _exhausted() -> HTTPException:
+    return HTTPException(status_code=409, detail="event_full")
+
+
+class BaseSuffixAllocator(ABC):
+    @abstractmethod
+    async def allocate(self, event_id: str, user_store: BaseUserStore) -> str:
+        """未使用のサフィックスを1件払い出す。空きがなければ 409。"""
+        ...
+
+    @abstractmethod
+    async def release(self, event_id: str, suffix: str) -> None:
+        """払い出したが使わなかったサフィックスをプールに戻す。"""
+        ...
+
+    @abstractmethod
+    async def release_event(self, event_id: str) -> None:
+        """イベントのプールを破棄する（次回の払い出しで DB から作り直す）。"""
+        ...
+
+    def clear(self) -> None:
+        pass
+
+
+class InMemorySuffixAllocator(BaseSuffixAllocator):
+    def __init__(self) -> None:
+        self._pools: dict[str, list[str]] = {}
+        self._init_locks: dict[str, asyncio.Lock] = {}
+
+    async def allocate(self, event_id: str, user_store: BaseUserStore) -> str:
+        pool = self._pools.get(event_id)
+        if pool is None:
+            lock = self._init_locks.setdefault(event_id, asyncio.Lock())
+            async with lock:
+                pool = self._pools.get(event_id)
+                if pool is None:
+                    pool = _free_suffixes(await user_store.list_suffixes(event_id))
+                    random.shuffle(pool)
+                    self._pools[event_id] = pool
+        if not pool:
+            raise _exhausted()
+        return pool.pop()
+
+    async def release(self, event_id: str, suffix: str) -> None:
+        # プールがなければ（リセット後など）次回 DB から作るときに空きとして入る
+        pool = self._pools.get(event_id)
+        if pool is not None and suffix not in pool:
+            pool.append(suffix)
+
+    async def release_event(self, event_id: str) -> None:
+        self._pools.pop(event_id, None)
+
+    def remaining(self, event_id: str) -> int | None:
+        pool = self._pools.get(event_id)
+        return len(pool) if pool is not None else None
+
+    def clear(self) -> None:
+        self._pools.clear()
+        self._init_locks.clear()
+
+
+class ValkeySuffixAllocator(BaseSuffixAllocator):
+    """Valkey 版。キー: suffix_pool:{event_id}（SET）, suffix_pool_init:{event_id}
+
+    接続は app/valkey.py の共有プールから借りる。
+    """
+
+    def __init__(
+        self,
+        pool: ValkeyPool | None = None,
+        *,
+        ttl_sec: int = SUFFIX_POOL_TTL_SEC,
+    ) -> None:
+        self._pool = pool if pool is not None else valkey_pool
+        self.ttl_sec = ttl_sec
+        # プロセス内では1リクエストだけが作成を試みる
+        self._init_locks: dict[str, asyncio.Lock] = {}
+
+    async def allocate(self, event_id: str, user_store: BaseUserStore) -> str:
+        redis = self._pool.client()
+        pool_key = f"suffix_pool:{event_id}"
+        init_key = f"suffix_pool_init:{event_id}"
+        async with self._pool.timed():
+            suffix = await redis.spop(pool_key)
+        if suffix is not None:
+            return suffix
+        lock = self._init_locks.setdefault(event_id, asyncio.Lock())
+        async with lock:
+            async with self._pool.timed():
+                initialized = await redis.exists(init_key)
+            if not initialized:
+                await self._init_pool(redis, event_id, pool_key, init_key, user_store)
+        async with self._pool.timed():
+            suffix = await redis.spop(pool_key)
+        if suffix is None:
+            raise _exhausted()
+        return suffix
+
+    async def _init_pool(
+        self,
+        redis: aioredis.Redis,
+        event_id: str,
+        pool_key: str,
+        init_key: str,
+        user_store: BaseUserStore,
+    ) -> None:
+        """プールと作成済みフラグを同じトランザクションで作る。
+
+        同時に複数タスクが作りに来た場合は WATCH で先着の1回だけが通る。
+        """
+        free = _free_suffixes(await user_store.list_suffixes(event_id))
+        async with self._pool.timed(), redis.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(init_key)
+                if await pipe.exists(init_key):
+                    return
+                pipe.multi()
+                if free:
+                    pipe.sadd(pool_key, *free)
+                    pipe.expire(pool_key, self.ttl_sec)
+                pipe.set(init_key, "1", ex=self.ttl_sec)
+                await pipe.execute()
+            except aioredis.WatchError:
+                pass
+
+    async def release(self, event_id: str, suffix: str) -> None:
+        redis = self._pool.client()
+        async with self._pool.timed():
+            # プールがなければ（リセット後など）次回 DB から作るときに空きとして入る
+            if await redis.exists(f"suffix_pool_init:{event_id}"):
+                await redis.sadd(f"suffix_pool:{event_id}", suffix)
+
+    async def release_event(self, event_id: str) -> None:
+        async with self._pool.timed():
+            await self._pool.client().delete(f"suffix_pool:{event_id}", f"suffix_pool_init:{event_id}")
+
+    def clear(self) -> None:
+        self._init_locks.clear()
+
+
+# グローバルシングルトン
+suffix_allocator: BaseSuffixAllocator = (
+    ValkeySuffixAllocator() if REDIS_URL else InMemorySuffixAllocator()
+)
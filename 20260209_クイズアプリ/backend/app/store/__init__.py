@@ -0,0 +1,51 @@
+"""ストア層。DB の方言に応じて SQLite / PostgreSQL 実装を選ぶ。"""
+
+from __future__ import annotations
+
+from typing import NamedTuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.store.base import (
+    BaseAdminStore,
+    BaseAnswerStore,
+    BaseEventStore,
+    BaseQuestionStore,
+    BaseUserStore,
+)
+
+
+class StoreClasses(NamedTuple):
+    event: type[BaseEventStore]
+    question: type[BaseQuestionStore]
+    user: type[BaseUserStore]
+    answer: type[BaseAnswerStore]
+    admin: type[BaseAdminStore]
+
+
+def store_classes(dialect_name: str) -> StoreClasses:
+    """SQLAlchemy の dialect 名（"sqlite" / "postgresql"）に対応するストア群。"""
+    if dialect_name == "postgresql":
+        from app.store import postgres_store as m
+
+        return StoreClasses(
+            m.PostgresEventStore,
+            m.PostgresQuestionStore,
+            m.PostgresUserStore,
+            m.PostgresAnswerStore,
+            m.PostgresAdminStore,
+        )
+    from app.store import sqlite_store as m
+
+    return StoreClasses(
+        m.SQLiteEventStore,
+        m.SQLiteQuestionStore,
+        m.SQLiteUserStore,
+        m.SQLiteAnswerStore,
+        m.SQLiteAdminStore,
+    )
+
+
+def stores_for(session: AsyncSession) -> StoreClasses:
+    """セッションの接続先に対応するストア群。"""
+    return store_classes(session.bind.dialect.name)
@@ -6,6 +6,8 @@ Phase 3 で RDS 実装に差し替える際のインターフェース定義。
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator, Sequence
+from typing import NamedTuple
 
 from app.models.admin import Admin, AdminAuditLog
 from app.models.answer import Answer
@@ -14,6 +16,16 @@ from app.models.question import Question
 from app.models.user import EventSession, EventUser
 
 
+class UserScoreRow(NamedTuple):
+    """ランキング用に DB 側で集計した1ユーザ分の成績。"""
+
+    user_id: str
+    display_name: str
+    correct_count: int
+    correct_time_tenths: int  # 正解した回答の回答時間合計（0.1 秒単位）
+    answered_count: int
+
+
 # ── Event ──────────────────────────────────────────────
 
 
@@ -27,6 +39,14 @@ class BaseEventStore(ABC):
     @abstractmethod
     async def update(self, event_id: str, **kwargs: object) -> Event | None: ...
 
+    @abstractmethod
+    async def close_if_open(self, event_id: str, question_id: str, closed_at: str) -> bool:
+        """question_id を出題中で未締切なら締切済みにして True を返す（条件付き UPDATE 1文）。
+
+        複数のプロセスが同時に呼んでも True になるのは1回だけ。
+        """
+        ...
+
     @abstractmethod
     async def get_question_ids(self, event_id: str) -> list[str]: ...
 
@@ -48,6 +68,22 @@ class BaseQuestionStore(ABC):
     @abstractmethod
     async def list(self, *, enabled_only: bool = False) -> list[Question]: ...
 
+    @abstractmethod
+    async def search(
+        self,
+        *,
+        query: str | None = None,
+        tags: Sequence[str] = (),
+        enabled: bool | None = None,
+        after: tuple[int, str] | None = None,
+        limit: int = 100,
+    ) -> list[Question]:
+        """(sort_order, id) の順に返す。after=(sort_order, id) より後ろだけ（カーソル）。
+
+        query は問題文・選択肢の部分一致、tags は全てのタグを持つ問題。
+        """
+        ...
+
     @abstractmethod
     async def create(self, question: Question) -> Question: ...
 
@@ -71,6 +107,21 @@ class BaseQuestionStore(ABC):
         enabled: bool,
     ) -> Question | None: ...
 
+    @abstractmethod
+    async def set_tags(self, question_id: str, tags: Sequence[str]) -> None:
+        """タグを置き換える。"""
+        ...
+
+    @abstractmethod
+    async def index_search(self, question_id: str) -> None:
+        """問題文・選択肢の変更を検索用の文書に反映する。"""
+        ...
+
+    @abstractmethod
+    async def index_missing(self) -> int:
+        """検索用の文書がない問題（シード・既存 DB）の分を作り、件数を返す。"""
+        ...
+
 
 # ── User / Session ─────────────────────────────────────
 
@@ -95,12 +146,25 @@ class BaseUserStore(ABC):
     @abstractmethod
     async def get_user(self, user_id: str) -> EventUser | None: ...
 
+    @abstractmethod
+    async def get_participants(
+        self,
+        session_ids: list[str],
+    ) -> dict[str, tuple[EventSession, EventUser | None]]:
+        """セッションと（登録済みなら）ユーザを1クエリでまとめて引く。"""
+        ...
+
     @abstractmethod
     async def list_event_users(self, event_id: str) -> list[EventUser]: ...
 
     @abstractmethod
     async def suffix_exists(self, event_id: str, suffix: str) -> bool: ...
 
+    @abstractmethod
+    async def list_suffixes(self, event_id: str) -> set[str]:
+        """イベント内で使用済みの表示名サフィックス。"""
+        ...
+
     @abstractmethod
     async def delete_by_event(self, event_id: str) -> int:
         """event_users と event_sessions を event_id で一括削除し、削除件数を返す。"""
@@ -114,6 +178,12 @@ class BaseAnswerStore(ABC):
     @abstractmethod
     async def create(self, answer: Answer) -> Answer: ...
 
+    @abstractmethod
+    async def create_if_absent(self, answer: Answer) -> bool:
+        """answer を INSERT する。同じ (event_id, question_id, user_id) が既にあれば
+        何もせず False を返す（二重提出の判定を一意制約に任せる）。"""
+        ...
+
     @abstractmethod
     async def get(
         self,
@@ -122,9 +192,44 @@ class BaseAnswerStore(ABC):
         user_id: str,
     ) -> Answer | None: ...
 
+    @abstractmethod
+    async def bulk_create(self, answers: list[Answer]) -> int:
+        """answers をまとめて INSERT し、実際に挿入した件数を返す。
+
+        (event_id, question_id, user_id) が既存の行は無視する。
+        """
+        ...
+
+    @abstractmethod
+    async def list_answered_user_ids(
+        self,
+        event_id: str,
+        question_id: str,
+    ) -> set[str]: ...
+
     @abstractmethod
     async def list_by_event(self, event_id: str) -> list[Answer]: ...
 
+    @abstractmethod
+    async def list_by_question(self, event_id: str, question_id: str) -> list[Answer]: ...
+
+    @abstractmethod
+    def iter_user_scores(
+        self,
+        event_id: str,
+        question_ids: list[str],
+        *,
+        batch_size: int,
+    ) -> AsyncIterator[UserScoreRow]:
+        """参加者ごとの成績をランキング順（正解数 desc → 回答時間合計 asc → 参加順）で返す。
+
+        集計は DB 側で行い、結果は batch_size 件ずつ読み出す。
+        """
+        ...
+
+    @abstractmethod
+    async def list_by_users(self, event_id: str, user_ids: list[str]) -> list[Answer]: ...
+
     @abstractmethod
     async def delete_by_event(self, event_id: str) -> int:
         """answers を event_id で一括削除し、削除件数を返す。"""
@@ -147,4 +252,17 @@ class BaseAdminStore(ABC):
     async def create_audit_log(self, log: AdminAuditLog) -> AdminAuditLog: ...
 
     @abstractmethod
-    async def list_audit_logs(self, limit: int = 100) -> list[AdminAuditLog]: ...
+    async def bulk_create_audit_logs(self, logs: list[AdminAuditLog]) -> int:
+        """複数のログを1文で INSERT し、件数を返す。"""
+        ...
+
+    @abstractmethod
+    async def list_audit_logs(
+        self,
+        limit: int = 100,
+        *,
+        event_id: str | None = None,
+        before: tuple[str, str] | None = None,
+    ) -> list[AdminAuditLog]:
+        """新しい順に返す。before=(created_at, id) より古いものだけ（カーソル）。"""
+        ...
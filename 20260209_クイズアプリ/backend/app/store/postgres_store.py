@@ -0,0 +1,77 @@
+"""PostgreSQL（asyncpg）実装のストア層。
+
+クエリの大半は SQLAlchemy で方言非依存に書けているため SQLite 実装を継承し、
+方言に依存する箇所（ON CONFLICT 付き INSERT、複数テーブルの一括削除）だけ上書きする。
+commit / rollback の扱いは SQLite 実装と同じ（ストアは flush まで）。
+"""
+
+from __future__ import annotations
+
+from sqlalchemy import select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.models.answer import Answer
+from app.models.question import QuestionSearch
+from app.store.sqlite_store import (
+    SQLiteAdminStore,
+    SQLiteAnswerStore,
+    SQLiteEventStore,
+    SQLiteQuestionStore,
+    SQLiteUserStore,
+    like_pattern,
+)
+
+
+# ── Event / Question ──────────────────────────────────
+
+
+class PostgresEventStore(SQLiteEventStore):
+    pass
+
+
+class PostgresQuestionStore(SQLiteQuestionStore):
+    def _match(self, query: str):
+        # pg_trgm の GIN インデックス（ix_question_search_body_trgm）で引く部分一致。
+        # 日本語は単語の区切りがなく tsvector では引けないため trigram を使う。
+        return select(QuestionSearch.question_id).where(
+            QuestionSearch.body.ilike(like_pattern(query), escape="\\"),
+        )
+
+
+# ── User / Session ─────────────────────────────────────
+
+
+# event_users と event_sessions を1往復で削除する（データ変更 CTE）
+_DELETE_USERS_AND_SESSIONS = text("""
+WITH u AS (
+    DELETE FROM event_users WHERE event_id = :event_id RETURNING 1
+), s AS (
+    DELETE FROM event_sessions WHERE event_id = :event_id RETURNING 1
+)
+SELECT (SELECT count(*) FROM u) + (SELECT count(*) FROM s)
+""")
+
+
+class PostgresUserStore(SQLiteUserStore):
+    async def delete_by_event(self, event_id: str) -> int:
+        # セッション内に読み込み済みの行は対象外になるよう先に flush する
+        await self.session.flush()
+        result = await self.session.execute(
+            _DELETE_USERS_AND_SESSIONS, {"event_id": event_id},
+        )
+        return int(result.scalar_one())
+
+
+# ── Answer ─────────────────────────────────────────────
+
+
+class PostgresAnswerStore(SQLiteAnswerStore):
+    def _insert(self):
+        return pg_insert(Answer)
+
+
+# ── Admin / AuditLog ──────────────────────────────────
+
+
+class PostgresAdminStore(SQLiteAdminStore):
+    pass
@@ -6,14 +6,39 @@ commit / rollback はセッションスコープ側（FastAPI Depends）で管
 
 from __future__ import annotations
 
-from sqlalchemy import delete, select
+from collections.abc import AsyncIterator, Sequence
+
+from sqlalchemy import (
+    Integer,
+    and_,
+    bindparam,
+    case,
+    cast,
+    column,
+    delete,
+    exists,
+    func,
+    insert,
+    select,
+    table,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 
 from app.models.admin import Admin, AdminAuditLog
 from app.models.answer import Answer
 from app.models.event import Event, EventQuestion
-from app.models.question import Question, QuestionChoice
+from app.models.question import (
+    SQLITE_TRIGRAM,
+    Question,
+    QuestionChoice,
+    QuestionSearch,
+    QuestionTag,
+)
 from app.models.user import EventSession, EventUser
 from app.store.base import (
     BaseAdminStore,
@@ -21,6 +46,7 @@ from app.store.base import (
     BaseEventStore,
     BaseQuestionStore,
     BaseUserStore,
+    UserScoreRow,
 )
 
 
@@ -48,6 +74,19 @@ class SQLiteEventStore(BaseEventStore):
         await self.session.flush()
         return event
 
+    async def close_if_open(self, event_id: str, question_id: str, closed_at: str) -> bool:
+        result = await self.session.execute(
+            update(Event)
+            .where(
+                Event.id == event_id,
+                Event.state == "running",
+                Event.current_question_id == question_id,
+                Event.closed.is_(False),
+            )
+            .values(closed=True, current_deadline_at=closed_at),
+        )
+        return result.rowcount == 1
+
     async def get_question_ids(self, event_id: str) -> list[str]:
         result = await self.session.execute(
             select(EventQuestion.question_id)
@@ -65,10 +104,14 @@ class SQLiteEventStore(BaseEventStore):
         await self.session.execute(
             delete(EventQuestion).where(EventQuestion.event_id == event_id),
         )
-        # 新規登録
-        for i, qid in enumerate(question_ids):
-            self.session.add(
-                EventQuestion(event_id=event_id, question_id=qid, sort_order=i),
+        # 新規登録（ORM オブジェクトを作らず executemany で一括 INSERT）
+        if question_ids:
+            await self.session.execute(
+                insert(EventQuestion),
+                [
+                    {"event_id": event_id, "question_id": qid, "sort_order": i}
+                    for i, qid in enumerate(question_ids)
+                ],
             )
         await self.session.flush()
 
@@ -76,6 +119,21 @@ class SQLiteEventStore(BaseEventStore):
 # ── Question ───────────────────────────────────────────
 
 
+# FTS5 の外部コンテンツテーブル（app/models/question.py で作成）
+_question_search_fts = table("question_search_fts", column("rowid"), column("question_search_fts"))
+
+
+def search_document(question: Question) -> str:
+    """検索対象の文書（問題文と選択肢）。"""
+    return "\n".join([question.question_text, *(c.text for c in question.choices)])
+
+
+def like_pattern(query: str) -> str:
+    """部分一致の LIKE パターン（% _ \\ はエスケープする）。"""
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
 class SQLiteQuestionStore(BaseQuestionStore):
     def __init__(self, session: AsyncSession) -> None:
         self.session = session
@@ -83,7 +141,7 @@ class SQLiteQuestionStore(BaseQuestionStore):
     async def get(self, question_id: str) -> Question | None:
         result = await self.session.execute(
             select(Question)
-            .options(selectinload(Question.choices))
+            .options(selectinload(Question.choices), selectinload(Question.tags))
             .where(Question.id == question_id),
         )
         return result.scalar_one_or_none()
@@ -91,7 +149,7 @@ class SQLiteQuestionStore(BaseQuestionStore):
     async def list(self, *, enabled_only: bool = False) -> list[Question]:
         stmt = (
             select(Question)
-            .options(selectinload(Question.choices))
+            .options(selectinload(Question.choices), selectinload(Question.tags))
             .order_by(Question.sort_order)
         )
         if enabled_only:
@@ -99,6 +157,50 @@ class SQLiteQuestionStore(BaseQuestionStore):
         result = await self.session.execute(stmt)
         return list(result.scalars().all())
 
+    async def search(
+        self,
+        *,
+        query: str | None = None,
+        tags: Sequence[str] = (),
+        enabled: bool | None = None,
+        after: tuple[int, str] | None = None,
+        limit: int = 100,
+    ) -> list[Question]:
+        # (sort_order, id) のインデックスを順に読んで limit 件で止まる（OFFSET を使わない）
+        stmt = (
+            select(Question)
+            .options(selectinload(Question.choices), selectinload(Question.tags))
+            .order_by(Question.sort_order, Question.id)
+            .limit(limit)
+        )
+        if enabled is not None:
+            stmt = stmt.where(Question.is_enabled.is_(enabled))
+        for tag in tags:
+            stmt = stmt.where(
+                Question.id.in_(select(QuestionTag.question_id).where(QuestionTag.tag == tag)),
+            )
+        if query:
+            stmt = stmt.where(Question.id.in_(self._match(query)))
+        if after is not None:
+            stmt = stmt.where(tuple_(Question.sort_order, Question.id) > tuple_(*after))
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
+
+    def _match(self, query: str):
+        """query を含む問題の id（FTS5 の trigram インデックス）。"""
+        if SQLITE_TRIGRAM and len(query) >= 3:
+            phrase = '"' + query.replace('"', '""') + '"'
+            return select(QuestionSearch.question_id).where(
+                QuestionSearch.id.in_(
+                    select(_question_search_fts.c.rowid)
+                    .where(_question_search_fts.c.question_search_fts.match(phrase)),
+                ),
+            )
+        # trigram は 3 文字未満を引けないため LIKE で走査する
+        return select(QuestionSearch.question_id).where(
+            QuestionSearch.body.like(like_pattern(query), escape="\\"),
+        )
+
     async def create(self, question: Question) -> Question:
         self.session.add(question)
         await self.session.flush()
@@ -121,16 +223,33 @@ class SQLiteQuestionStore(BaseQuestionStore):
         question = await self.get(question_id)
         if not question:
             return False
+        await self.session.execute(
+            delete(QuestionSearch).where(QuestionSearch.question_id == question_id),
+        )
         await self.session.delete(question)
         await self.session.flush()
         return True
 
     async def reorder(self, ordered_ids: list[str]) -> None:
-        for i, qid in enumerate(ordered_ids):
-            question = await self.session.get(Question, qid)
-            if question:
-                question.sort_order = i
+        # 1問ずつ SELECT せず、UPDATE ... WHERE id = ? を executemany で一括発行する
         await self.session.flush()
+        order = {qid: i for i, qid in enumerate(ordered_ids)}
+        if not order:
+            return
+        table = Question.__table__
+        await self.session.execute(
+            update(table)
+            .where(table.c.id == bindparam("b_id"))
+            .values(sort_order=bindparam("b_sort_order")),
+            [{"b_id": qid, "b_sort_order": i} for qid, i in order.items()],
+        )
+        # 読み込み済みのオブジェクトにも反映する（再読み込みを発生させない）
+        for qid, sort_order in order.items():
+            question = self.session.identity_map.get(
+                self.session.sync_session.identity_key(Question, qid),
+            )
+            if question is not None:
+                set_committed_value(question, "sort_order", sort_order)
 
     async def set_enabled(
         self,
@@ -139,6 +258,46 @@ class SQLiteQuestionStore(BaseQuestionStore):
     ) -> Question | None:
         return await self.update(question_id, is_enabled=enabled)
 
+    async def set_tags(self, question_id: str, tags: Sequence[str]) -> None:
+        question = await self.get(question_id)
+        if not question:
+            return
+        # 残すタグはそのまま（同じ主キーの DELETE と INSERT を避ける）
+        wanted = list(dict.fromkeys(tags))
+        question.tags = [t for t in question.tags if t.tag in wanted] + [
+            QuestionTag(question_id=question_id, tag=tag)
+            for tag in wanted
+            if tag not in {t.tag for t in question.tags}
+        ]
+        await self.session.flush()
+
+    async def index_search(self, question_id: str) -> None:
+        question = await self.get(question_id)
+        if not question:
+            return
+        body = search_document(question)
+        doc = await self.session.scalar(
+            select(QuestionSearch).where(QuestionSearch.question_id == question_id),
+        )
+        if doc is None:
+            self.session.add(QuestionSearch(question_id=question_id, body=body))
+        elif doc.body != body:
+            doc.body = body
+        await self.session.flush()
+
+    async def index_missing(self) -> int:
+        result = await self.session.execute(
+            select(Question)
+            .options(selectinload(Question.choices))
+            .where(~exists().where(QuestionSearch.question_id == Question.id)),
+        )
+        questions = result.scalars().all()
+        self.session.add_all(
+            QuestionSearch(question_id=q.id, body=search_document(q)) for q in questions
+        )
+        await self.session.flush()
+        return len(questions)
+
 
 # ── User / Session ─────────────────────────────────────
 
@@ -176,6 +335,19 @@ class SQLiteUserStore(BaseUserStore):
     async def get_user(self, user_id: str) -> EventUser | None:
         return await self.session.get(EventUser, user_id)
 
+    async def get_participants(
+        self,
+        session_ids: list[str],
+    ) -> dict[str, tuple[EventSession, EventUser | None]]:
+        if not session_ids:
+            return {}
+        result = await self.session.execute(
+            select(EventSession, EventUser)
+            .outerjoin(EventUser, EventUser.id == EventSession.user_id)
+            .where(EventSession.id.in_(session_ids)),
+        )
+        return {es.id: (es, user) for es, user in result.all()}
+
     async def list_event_users(self, event_id: str) -> list[EventUser]:
         result = await self.session.execute(
             select(EventUser).where(EventUser.event_id == event_id),
@@ -191,6 +363,12 @@ class SQLiteUserStore(BaseUserStore):
         )
         return result.scalar() is not None
 
+    async def list_suffixes(self, event_id: str) -> set[str]:
+        result = await self.session.execute(
+            select(EventUser.display_suffix).where(EventUser.event_id == event_id),
+        )
+        return set(result.scalars().all())
+
     async def delete_by_event(self, event_id: str) -> int:
         # FK 制約順: event_users (→ event_sessions) → event_sessions
         r1 = await self.session.execute(
@@ -215,6 +393,22 @@ class SQLiteAnswerStore(BaseAnswerStore):
         await self.session.flush()
         return answer
 
+    def _insert(self):
+        """方言ごとの INSERT 構文（ON CONFLICT 付き）。"""
+        return sqlite_insert(Answer)
+
+    async def create_if_absent(self, answer: Answer) -> bool:
+        columns = [c.key for c in Answer.__table__.columns]
+        stmt = (
+            self._insert()
+            .values({col: getattr(answer, col) for col in columns})
+            .on_conflict_do_nothing(
+                index_elements=["event_id", "question_id", "user_id"],
+            )
+        )
+        result = await self.session.execute(stmt)
+        return result.rowcount > 0
+
     async def get(
         self,
         event_id: str,
@@ -230,12 +424,103 @@ class SQLiteAnswerStore(BaseAnswerStore):
         )
         return result.scalar_one_or_none()
 
+    async def bulk_create(self, answers: list[Answer]) -> int:
+        if not answers:
+            return 0
+        columns = [c.key for c in Answer.__table__.columns]
+        stmt = (
+            self._insert()
+            .values([{col: getattr(a, col) for col in columns} for a in answers])
+            .on_conflict_do_nothing(
+                index_elements=["event_id", "question_id", "user_id"],
+            )
+        )
+        result = await self.session.execute(stmt)
+        return result.rowcount
+
+    async def list_answered_user_ids(
+        self,
+        event_id: str,
+        question_id: str,
+    ) -> set[str]:
+        result = await self.session.execute(
+            select(Answer.user_id).where(
+                Answer.event_id == event_id,
+                Answer.question_id == question_id,
+            ),
+        )
+        return set(result.scalars().all())
+
     async def list_by_event(self, event_id: str) -> list[Answer]:
         result = await self.session.execute(
             select(Answer).where(Answer.event_id == event_id),
         )
         return list(result.scalars().all())
 
+    async def list_by_question(self, event_id: str, question_id: str) -> list[Answer]:
+        result = await self.session.execute(
+            select(Answer).where(
+                Answer.event_id == event_id,
+                Answer.question_id == question_id,
+            ),
+        )
+        return list(result.scalars().all())
+
+    async def iter_user_scores(
+        self,
+        event_id: str,
+        question_ids: list[str],
+        *,
+        batch_size: int,
+    ) -> AsyncIterator[UserScoreRow]:
+        scored = and_(Answer.accepted.is_(True), Answer.is_correct.is_(True))
+        correct = func.coalesce(func.sum(case((scored, 1), else_=0)), 0)
+        # EventLeaderboard と同じく 1 回答ごとに 0.1 秒単位へ丸めてから合計する
+        tenths = func.coalesce(
+            func.sum(
+                case(
+                    (scored, cast(func.round(Answer.response_time_sec_1dp * 10), Integer)),
+                    else_=0,
+                ),
+            ),
+            0,
+        )
+        stmt = (
+            select(
+                EventUser.id,
+                EventUser.display_name,
+                correct.label("correct_count"),
+                tenths.label("correct_time_tenths"),
+                func.count(Answer.id).label("answered_count"),
+            )
+            .outerjoin(
+                Answer,
+                and_(
+                    Answer.user_id == EventUser.id,
+                    Answer.event_id == event_id,
+                    Answer.question_id.in_(question_ids),
+                ),
+            )
+            .where(EventUser.event_id == event_id)
+            .group_by(EventUser.id)
+            .order_by(correct.desc(), tenths.asc(), EventUser.joined_at, EventUser.id)
+            .execution_options(yield_per=batch_size)
+        )
+        result = await self.session.stream(stmt)
+        async for row in result:
+            yield UserScoreRow(*row)
+
+    async def list_by_users(self, event_id: str, user_ids: list[str]) -> list[Answer]:
+        if not user_ids:
+            return []
+        result = await self.session.execute(
+            select(Answer).where(
+                Answer.event_id == event_id,
+                Answer.user_id.in_(user_ids),
+            ),
+        )
+        return list(result.scalars().all())
+
     async def delete_by_event(self, event_id: str) -> int:
         result = await self.session.execute(
             delete(Answer).where(Answer.event_id == event_id),
@@ -263,10 +548,28 @@ class SQLiteAdminStore(BaseAdminStore):
         await self.session.flush()
         return log
 
-    async def list_audit_logs(self, limit: int = 100) -> list[AdminAuditLog]:
+    async def bulk_create_audit_logs(self, logs: list[AdminAuditLog]) -> int:
+        if not logs:
+            return 0
+        columns = [c.key for c in AdminAuditLog.__table__.columns]
+        await self.session.execute(
+            insert(AdminAuditLog).values([{col: getattr(log, col) for col in columns} for log in logs]),
+        )
+        return len(logs)
+
+    async def list_audit_logs(
+        self,
+        limit: int = 100,
+        *,
+        event_id: str | None = None,
+        before: tuple[str, str] | None = None,
+    ) -> list[AdminAuditLog]:
+        stmt = select(AdminAuditLog)
+        if event_id is not None:
+            stmt = stmt.where(AdminAuditLog.event_id == event_id)
+        if before is not None:
+            stmt = stmt.where(tuple_(AdminAuditLog.created_at, AdminAuditLog.id) < before)
         result = await self.session.execute(
-            select(AdminAuditLog)
-            .order_by(AdminAuditLog.created_at.desc())
-            .limit(limit),
+            stmt.order_by(AdminAuditLog.created_at.desc(), AdminAuditLog.id.desc()).limit(limit),
         )
         return list(result.scalars().all())
@@ -0,0 +1,121 @@
+"""プロセス内で共有する Valkey（Redis）接続プール。
+
+REDIS_URL がある場合、管理者セッション・WebSocket の Pub/Sub・イベント状態キャッシュ・
+表示名サフィックス・自動クローズのロックなどはモジュールごとにクライアントを作らず、
+ここの1つのプールから接続を借りる。
+
+- BlockingConnectionPool: 上限（VALKEY_MAX_CONNECTIONS）に達したら空きを待つ
+  （瞬間的な集中をエラーにしない）。
+- timed() で囲んだコマンドのレイテンシとエラー数、health() の PING 結果を
+  /api/health で公開する。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Any
+
+import redis.asyncio as aioredis
+
+from app.config import (
+    REDIS_URL,
+    VALKEY_HEALTH_CHECK_INTERVAL_SEC,
+    VALKEY_MAX_CONNECTIONS,
+    VALKEY_POOL_TIMEOUT_SEC,
+    VALKEY_SOCKET_TIMEOUT_SEC,
+)
+from app.metrics import LatencyRecorder
+
+
+class ValkeyPool:
+    def __init__(
+        self,
+        redis_url: str | None,
+        *,
+        max_connections: int = VALKEY_MAX_CONNECTIONS,
+        pool_timeout_sec: float = VALKEY_POOL_TIMEOUT_SEC,
+        socket_timeout_sec: float = VALKEY_SOCKET_TIMEOUT_SEC,
+        health_check_interval_sec: int = VALKEY_HEALTH_CHECK_INTERVAL_SEC,
+        redis: aioredis.Redis | None = None,
+    ) -> None:
+        self.redis_url = redis_url
+        self.max_connections = max_connections
+        self.pool_timeout_sec = pool_timeout_sec
+        self.socket_timeout_sec = socket_timeout_sec
+        self.health_check_interval_sec = health_check_interval_sec
+        self._redis: aioredis.Redis | None = redis
+        self._pool: aioredis.BlockingConnectionPool | None = None
+        self.latency = LatencyRecorder()
+        self.errors = 0
+
+    @property
+    def configured(self) -> bool:
+        return self._redis is not None or bool(self.redis_url)
+
+    def client(self) -> aioredis.Redis | None:
+        """共有クライアントを返す（初回にプールを作る）。REDIS_URL がなければ None。"""
+        if self._redis is None and self.redis_url:
+            self._pool = aioredis.BlockingConnectionPool.from_url(
+                self.redis_url,
+                max_connections=self.max_connections,
+                timeout=self.pool_timeout_sec,
+                socket_timeout=self.socket_timeout_sec,
+                health_check_interval=self.health_check_interval_sec,
+                encoding="utf-8",
+                decode_responses=True,
+            )
+            self._redis = aioredis.Redis(connection_pool=self._pool)
+        return self._redis
+
+    @asynccontextmanager
+    async def timed(self) -> AsyncIterator[None]:
+        """囲んだ処理（Valkey へのコマンド）の所要時間とエラーを記録する。"""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self.latency.record(time.perf_counter() - start)
+
+    # ── 計測 ───────────────────────────────────────────
+
+    async def health(self) -> dict[str, Any]:
+        """PING を1回打って疎通とプールの状況を返す。"""
+        redis = self.client()
+        if redis is None:
+            return {"configured": False}
+        start = time.perf_counter()
+        try:
+            async with self.timed():
+                await asyncio.wait_for(redis.ping(), timeout=self.socket_timeout_sec)
+            ping = {"ok": True, "ping_ms": round((time.perf_counter() - start) * 1000, 2)}
+        except Exception as e:
+            ping = {"ok": False, "error": type(e).__name__}
+        return {"configured": True, **ping, **self.stats()}
+
+    def stats(self) -> dict[str, Any]:
+        pool = self._pool
+        return {
+            "max_connections": self.max_connections,
+            "in_use": len(getattr(pool, "_in_use_connections", ())) if pool else None,
+            "idle": len(getattr(pool, "_available_connections", ())) if pool else None,
+            "errors": self.errors,
+            "latency": self.latency.summary(),
+        }
+
+    async def close(self) -> None:
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+        if self._pool is not None:
+            await self._pool.disconnect()
+            self._pool = None
+
+
+# グローバルシングルトン（main.py の lifespan 終了時に close）
+valkey_pool = ValkeyPool(REDIS_URL)
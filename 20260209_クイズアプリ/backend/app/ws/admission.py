@@ -0,0 +1,88 @@
+"""WebSocket 接続受付のレート制限（再接続の集中対策）。
+
+会場の Wi-Fi が瞬断すると全クライアントが同時に /ws へ再接続する。
+プロセスごとのトークンバケットで受付数を WS_ACCEPT_RATE 件/秒（最大 WS_ACCEPT_BURST 件まで
+まとめて）に抑え、超えた接続には再試行までの待ち時間を返す。
+
+- 断った接続には受付レートの間隔で並べた再試行の枠を順に割り当て、その時刻までの
+  秒数を案内する。後から来た接続ほど後ろの枠を案内される。
+- 案内する待ち時間には WS_RETRY_JITTER の割合までランダムに上乗せし、
+  再試行が同じ瞬間に揃わないようにする。上限は WS_RETRY_MAX_SEC。
+"""
+
+from __future__ import annotations
+
+import random
+import time
+from collections.abc import Callable
+
+from app.config import WS_ACCEPT_BURST, WS_ACCEPT_RATE, WS_RETRY_JITTER, WS_RETRY_MAX_SEC
+
+# 1013 Try Again Later
+CLOSE_TRY_AGAIN_LATER = 1013
+
+
+class AcceptLimiter:
+    def __init__(
+        self,
+        rate_per_sec: float = WS_ACCEPT_RATE,
+        burst: int = WS_ACCEPT_BURST,
+        *,
+        max_retry_sec: float = WS_RETRY_MAX_SEC,
+        jitter: float = WS_RETRY_JITTER,
+        clock: Callable[[], float] = time.monotonic,
+        rng: Callable[[], float] = random.random,
+    ) -> None:
+        self.rate_per_sec = rate_per_sec
+        self.burst = max(1, burst)
+        self.max_retry_sec = max_retry_sec
+        self.jitter = jitter
+        self._clock = clock
+        self._rng = rng
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        # 次に断った接続へ割り当てる再試行枠の基準時刻
+        self._next_slot = self._updated
+        self.accepted = 0
+        self.rejected = 0
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(
+            float(self.burst), self._tokens + (now - self._updated) * self.rate_per_sec,
+        )
+        self._updated = now
+
+    def try_acquire(self) -> float | None:
+        """受け付けるなら None、断るなら再試行までの秒数（ジッタ込み）を返す。"""
+        if self.rate_per_sec <= 0:
+            return None
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            self.accepted += 1
+            return None
+
+        self.rejected += 1
+        now = self._updated
+        slot = max(now, self._next_slot) + 1 / self.rate_per_sec
+        # 枠は上限の待ち時間までしか積まない（それ以降の接続には上限を案内する）
+        self._next_slot = min(slot, now + self.max_retry_sec)
+        return min(self.max_retry_sec, (slot - now) * (1 + self.jitter * self._rng()))
+
+    def stats(self) -> dict[str, float | int]:
+        return {
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "tokens": round(self._tokens, 1),
+        }
+
+    def reset(self) -> None:
+        self._tokens = float(self.burst)
+        self._updated = self._next_slot = self._clock()
+        self.accepted = 0
+        self.rejected = 0
+
+
+# グローバルシングルトン
+accept_limiter = AcceptLimiter()
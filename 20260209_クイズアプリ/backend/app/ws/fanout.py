@@ -0,0 +1,238 @@
+"""WebSocket のファンアウト送信。
+
+ペイロードは1回だけ JSON 文字列にエンコードし、全ソケットで同じオブジェクトを共有する。
+各ソケットは上限付きの送信キューと専用の送信タスク（SocketOutbox）を持ち、
+遅いクライアントが他のクライアントへの送信を待たせることはない。
+
+- 送信がタイムアウトした、またはキューが溢れたソケットは切断（evict）する。
+- delivered コールバックは実際に send が完了した時点で呼ばれる。
+- 送信レイテンシ（キュー投入→送信完了）とファンアウト全体の所要時間を
+  パーセンタイルで集計する。
+
+str はテキストフレーム、bytes はバイナリフレーム（プロトコル v2）として送る。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from collections.abc import Callable
+from typing import Any
+
+from fastapi import WebSocket
+
+from app.config import WS_SEND_QUEUE_SIZE, WS_SEND_TIMEOUT_SEC
+from app.metrics import LatencyRecorder
+
+logger = logging.getLogger(__name__)
+
+
+# Starlette の send_json と同じ形式
+def encode_message(payload: dict[str, Any]) -> str:
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+
+class _Fanout:
+    """1回のファンアウトの進捗。全ソケットの送信完了（または失敗）で done になる。"""
+
+    __slots__ = ("started_at", "remaining", "done", "on_delivered", "engine")
+
+    def __init__(
+        self,
+        engine: FanoutEngine,
+        count: int,
+        on_delivered: Callable[[str], None] | None,
+    ) -> None:
+        self.engine = engine
+        self.started_at = time.monotonic()
+        self.remaining = count
+        self.done = asyncio.Event()
+        self.on_delivered = on_delivered
+        if count == 0:
+            self.done.set()
+
+    def complete(self, session_id: str, ok: bool) -> None:
+        if ok:
+            now = time.monotonic()
+            self.engine.send_latency.record(now - self.started_at)
+            if self.on_delivered is not None:
+                self.on_delivered(session_id)
+        self.remaining -= 1
+        if self.remaining == 0:
+            self.engine.fanout_latency.record(time.monotonic() - self.started_at)
+            self.done.set()
+
+    async def wait(self, timeout: float | None = None) -> bool:
+        try:
+            await asyncio.wait_for(self.done.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class SocketOutbox:
+    """1ソケット分の送信キューと送信タスク。"""
+
+    def __init__(
+        self,
+        event_id: str,
+        session_id: str,
+        websocket: WebSocket,
+        *,
+        queue_size: int,
+        send_timeout_sec: float,
+        on_failed: Callable[[SocketOutbox], None],
+    ) -> None:
+        self.event_id = event_id
+        self.session_id = session_id
+        self.websocket = websocket
+        self.send_timeout_sec = send_timeout_sec
+        self._queue: asyncio.Queue[tuple[str | bytes, _Fanout | None]] = asyncio.Queue(queue_size)
+        self._on_failed = on_failed
+        self._closed = False
+        self._task = asyncio.create_task(self._run())
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def offer(self, text: str | bytes, fanout: _Fanout | None) -> bool:
+        """送信キューに積む。溢れたら False（呼び出し側で evict）。"""
+        if self._closed:
+            return False
+        try:
+            self._queue.put_nowait((text, fanout))
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def _run(self) -> None:
+        while True:
+            text, fanout = await self._queue.get()
+            send = (
+                self.websocket.send_bytes(text)
+                if isinstance(text, bytes)
+                else self.websocket.send_text(text)
+            )
+            try:
+                await asyncio.wait_for(send, self.send_timeout_sec)
+            except asyncio.CancelledError:
+                if fanout is not None:
+                    fanout.complete(self.session_id, False)
+                raise
+            except Exception as e:
+                if fanout is not None:
+                    fanout.complete(self.session_id, False)
+                logger.info(
+                    "[Fanout] send failed event=%s sid=%s: %s",
+                    self.event_id, self.session_id[:8], type(e).__name__,
+                )
+                self._on_failed(self)
+                return
+            if fanout is not None:
+                fanout.complete(self.session_id, True)
+
+    def close(self) -> None:
+        """送信タスクを止め、未送信分を失敗として完了させる。"""
+        if self._closed:
+            return
+        self._closed = True
+        self._task.cancel()
+        while not self._queue.empty():
+            _, fanout = self._queue.get_nowait()
+            if fanout is not None:
+                fanout.complete(self.session_id, False)
+
+
+class FanoutEngine:
+    def __init__(
+        self,
+        *,
+        queue_size: int = WS_SEND_QUEUE_SIZE,
+        send_timeout_sec: float = WS_SEND_TIMEOUT_SEC,
+        on_evict: Callable[[SocketOutbox], None] | None = None,
+        sample_size: int = 2048,
+    ) -> None:
+        self.queue_size = queue_size
+        self.send_timeout_sec = send_timeout_sec
+        self._on_evict = on_evict
+        self._outboxes: dict[WebSocket, SocketOutbox] = {}
+        self.send_latency = LatencyRecorder(sample_size)
+        self.fanout_latency = LatencyRecorder(sample_size)
+        self.evicted = 0
+
+    # ── ソケット登録 ─────────────────────────────────
+
+    def attach(self, event_id: str, session_id: str, websocket: WebSocket) -> SocketOutbox:
+        outbox = self._outboxes.get(websocket)
+        if outbox is None or outbox.closed:
+            outbox = SocketOutbox(
+                event_id,
+                session_id,
+                websocket,
+                queue_size=self.queue_size,
+                send_timeout_sec=self.send_timeout_sec,
+                on_failed=self._evict,
+            )
+            self._outboxes[websocket] = outbox
+        return outbox
+
+    def detach(self, websocket: WebSocket) -> None:
+        outbox = self._outboxes.pop(websocket, None)
+        if outbox is not None:
+            outbox.close()
+
+    def _evict(self, outbox: SocketOutbox) -> None:
+        """停滞・送信失敗したソケットを切り離して閉じる。"""
+        if self._outboxes.get(outbox.websocket) is not outbox:
+            return
+        self.evicted += 1
+        self.detach(outbox.websocket)
+        if self._on_evict is not None:
+            self._on_evict(outbox)
+        asyncio.create_task(self._close_quietly(outbox.websocket))
+
+    async def _close_quietly(self, websocket: WebSocket) -> None:
+        try:
+            # 1013: Try Again Later（再接続で復帰してもらう）
+            await asyncio.wait_for(websocket.close(code=1013), self.send_timeout_sec)
+        except Exception:
+            pass
+
+    # ── 送信 ─────────────────────────────────────────
+
+    def send(
+        self,
+        event_id: str,
+        targets: dict[str, WebSocket],
+        text: str | bytes,
+        *,
+        on_delivered: Callable[[str], None] | None = None,
+    ) -> _Fanout:
+        """targets 全員の送信キューに同じ text を積む。完了を待つ場合は wait() する。"""
+        items = list(targets.items())
+        fanout = _Fanout(self, len(items), on_delivered)
+        for sid, ws in items:
+            outbox = self.attach(event_id, sid, ws)
+            if not outbox.offer(text, fanout):
+                # キュー溢れ = 受信が追いついていない
+                fanout.complete(sid, False)
+                self._evict(outbox)
+        return fanout
+
+    # ── 計測 ─────────────────────────────────────────
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "sockets": len(self._outboxes),
+            "evicted": self.evicted,
+            "send_latency": self.send_latency.summary(),
+            "fanout_latency": self.fanout_latency.summary(),
+        }
+
+    def reset_stats(self) -> None:
+        self.send_latency.clear()
+        self.fanout_latency.clear()
+        self.evicted = 0
@@ -0,0 +1,286 @@
+"""同一ホストの複数ワーカー（uvicorn --workers N）間の Unix ソケットのメッセージバス。
+
+WS_IPC_SOCKET を設定すると IPCConnectionManager（app/ws/ipc_manager.py）がこれを使う。
+Valkey なしで1台のホストに複数ワーカーを立てるためのもの（複数ホストは Valkey 版）。
+
+- ブローカー: {WS_IPC_SOCKET}.lock を flock で取れた1ワーカーがソケットで待ち受ける。
+  全ワーカー（ブローカー自身も）はクライアントとして接続する。
+- フレーム: 4 バイトの長さ（ビッグエンディアン）+ msgpack。
+- publish / preload はブローカーがイベントごとに seq を採番し、送信元も含む全ワーカーへ送る。
+  全ワーカーが同じ順序・同じ seq で配信するので、resume_from はどのワーカーに再接続しても使える。
+- invalidate: キャッシュの無効化通知。seq は付けずに全ワーカーへ中継する（送信元は自分で無視する）。
+- admin: 管理者ソケット向けの配信。seq は付けずに送信元も含む全ワーカーへ中継する。
+- delivered: 各ワーカーの送信完了時刻。ブローカーが出題中の問題の分を保持して全ワーカーへ転送する。
+  まだ届いていないセッションは lookup でブローカーに問い合わせる。
+- ブローカーのワーカーが落ちると、残りのワーカーが lock を取り直して引き継ぐ。
+  接続時の hello で各ワーカーの seq と delivered_at を送り、新しいブローカーは続きから採番する。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import fcntl
+import logging
+import os
+import struct
+from collections.abc import Callable
+from typing import Any
+from uuid import uuid4
+
+import msgpack
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct(">I")
+# ブローカーへの接続をやり直す間隔
+_RETRY_SEC = 0.05
+
+
+def encode_frame(msg: dict[str, Any]) -> bytes:
+    body = msgpack.packb(msg, use_bin_type=True)
+    return _HEADER.pack(len(body)) + body
+
+
+async def read_frame(reader: asyncio.StreamReader) -> dict[str, Any] | None:
+    """1フレーム読む。接続が切れたら None。"""
+    try:
+        header = await reader.readexactly(_HEADER.size)
+        body = await reader.readexactly(_HEADER.unpack(header)[0])
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+    return msgpack.unpackb(body, raw=False)
+
+
+class IPCBroker:
+    """seq の採番と delivered_at の保持、全ワーカーへの中継（ブローカーのワーカー内で動く）。"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._server: asyncio.AbstractServer | None = None
+        self._clients: set[asyncio.StreamWriter] = set()
+        self._handlers: set[asyncio.Task] = set()
+        # event_id -> 最後に採番した seq
+        self._seqs: dict[str, int] = {}
+        # event_id -> (出題中の question_id, {session_id: ISO時刻})
+        self._delivered: dict[str, tuple[str | None, dict[str, str]]] = {}
+
+    async def start(self) -> None:
+        # lock を持っているので、残っているソケットファイルは落ちたブローカーのもの
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+        for writer in list(self._clients):
+            writer.close()
+        self._clients.clear()
+        # 接続ごとの読み取りタスクが終わるのを待つ（終了時に取り残さない）
+        for task in list(self._handlers):
+            task.cancel()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        if self._server is not None:
+            await self._server.wait_closed()
+            self._server = None
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.path)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        self._clients.add(writer)
+        try:
+            while (msg := await read_frame(reader)) is not None:
+                self._dispatch(msg, writer)
+        except asyncio.CancelledError:
+            pass  # stop() による終了
+        finally:
+            self._clients.discard(writer)
+            self._handlers.discard(task)
+            writer.close()
+
+    def _dispatch(self, msg: dict[str, Any], writer: asyncio.StreamWriter) -> None:
+        op = msg.get("op")
+        if op == "hello":
+            for event_id, seq in msg.get("seqs", {}).items():
+                self._seqs[event_id] = max(self._seqs.get(event_id, 0), seq)
+            for event_id, (question_id, delivered) in msg.get("delivered", {}).items():
+                self._merge_delivered(event_id, question_id, delivered)
+        elif op in ("publish", "preload"):
+            event_id = msg["e"]
+            msg["seq"] = self._seqs[event_id] = self._seqs.get(event_id, 0) + 1
+            if msg.get("q") is not None:
+                self._delivered[event_id] = (msg["q"], {})
+            self._fanout(msg)
+        elif op in ("invalidate", "admin"):
+            self._fanout(msg)
+        elif op == "delivered":
+            if self._merge_delivered(msg["e"], msg["q"], msg["m"]):
+                self._fanout(msg)
+        elif op == "lookup":
+            question_id, delivered = self._delivered.get(msg["e"], (None, {}))
+            value = delivered.get(msg["s"]) if msg.get("q") in (None, question_id) else None
+            writer.write(encode_frame({"op": "lookup_result", "id": msg["id"], "v": value}))
+
+    def _merge_delivered(self, event_id: str, question_id: str | None, delivered: dict[str, str]) -> bool:
+        current = self._delivered.get(event_id)
+        if current is None:
+            current = self._delivered[event_id] = (question_id, {})
+        elif current[0] != question_id:
+            return False  # 前の問題の分は捨てる
+        current[1].update(delivered)
+        return True
+
+    def _fanout(self, msg: dict[str, Any]) -> None:
+        frame = encode_frame(msg)  # エンコードは1回だけ
+        for writer in self._clients:
+            writer.write(frame)
+
+    @property
+    def workers(self) -> int:
+        return len(self._clients)
+
+
+class IPCBus:
+    """ワーカー側の接続。必要ならブローカーも兼ね、落ちたら引き継ぐ。"""
+
+    def __init__(
+        self,
+        path: str,
+        on_message: Callable[[dict[str, Any]], None],
+        *,
+        hello: Callable[[], dict[str, Any]],
+        timeout_sec: float = 1.0,
+    ) -> None:
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.timeout_sec = timeout_sec
+        self._on_message = on_message
+        self._hello = hello
+        self.broker: IPCBroker | None = None
+        self._lock_fd: int | None = None
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._connected = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        # lookup の要求ID -> 応答待ちの Future
+        self._pending: dict[str, asyncio.Future] = {}
+        self.reconnects = 0
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        await self._connect()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        self._disconnected()
+        if self.broker is not None:
+            await self.broker.stop()
+            self.broker = None
+        if self._lock_fd is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    # ── 接続 ───────────────────────────────────────────
+
+    async def _try_become_broker(self) -> None:
+        if self.broker is not None:
+            return
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return
+        self._lock_fd = fd
+        self.broker = IPCBroker(self.path)
+        await self.broker.start()
+        logger.info("[IPCBus] pid %d is the broker on %s", os.getpid(), self.path)
+
+    async def _connect(self) -> None:
+        while True:
+            await self._try_become_broker()
+            try:
+                self._reader, self._writer = await asyncio.open_unix_connection(self.path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                # ブローカーの起動中・引き継ぎ中
+                await asyncio.sleep(_RETRY_SEC)
+        self._writer.write(encode_frame({"op": "hello", **self._hello()}))
+        self._connected.set()
+
+    def _disconnected(self) -> None:
+        self._connected.clear()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        for fut in self._pending.values():
+            if not fut.done():
+                fut.set_result(None)
+        self._pending.clear()
+
+    async def _run(self) -> None:
+        while True:
+            msg = await read_frame(self._reader)
+            if msg is None:
+                logger.warning("[IPCBus] lost connection to broker; reconnecting")
+                self._disconnected()
+                self.reconnects += 1
+                await self._connect()
+                continue
+            if msg["op"] == "lookup_result":
+                fut = self._pending.pop(msg["id"], None)
+                if fut is not None and not fut.done():
+                    fut.set_result(msg["v"])
+                continue
+            try:
+                self._on_message(msg)
+            except Exception:
+                logger.exception("[IPCBus] failed to handle %s", msg.get("op"))
+
+    # ── 送信 ───────────────────────────────────────────
+
+    async def send(self, msg: dict[str, Any]) -> bool:
+        """ブローカーへ送る。timeout_sec 以内に接続できなければ False。"""
+        if not self._connected.is_set():
+            try:
+                await asyncio.wait_for(self._connected.wait(), self.timeout_sec)
+            except asyncio.TimeoutError:
+                return False
+        self._writer.write(encode_frame(msg))
+        return True
+
+    async def lookup(self, event_id: str, session_id: str, question_id: str | None) -> str | None:
+        """ブローカーが保持している delivered_at を引く（応答がなければ None）。"""
+        request_id = uuid4().hex
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = fut
+        try:
+            msg = {"op": "lookup", "id": request_id, "e": event_id, "s": session_id, "q": question_id}
+            if not await self.send(msg):
+                return None
+            return await asyncio.wait_for(fut, self.timeout_sec)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self._pending.pop(request_id, None)
+
+    # ── 計測 ───────────────────────────────────────────
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "socket": self.path,
+            "broker": self.broker is not None,
+            "workers": self.broker.workers if self.broker is not None else None,
+            "connected": self._connected.is_set(),
+            "reconnects": self.reconnects,
+        }
@@ -0,0 +1,210 @@
+"""同一ホストの複数ワーカーで接続を分担する WebSocket マネージャー（Valkey 不要）。
+
+WS_IPC_SOCKET を設定して uvicorn --workers N で起動すると ws_manager がこのクラスになる。
+各ワーカーは自分が受け付けた接続だけを持ち、ブロードキャストは app/ws/ipc.py の
+バス経由で全ワーカーへ届けてから、それぞれが自分の接続へ送る。
+
+- seq はブローカーが採番するので、どのワーカーの接続にも同じ seq で届く。
+- delivered_at は各ワーカーが自分の接続への送信完了時刻を記録してブローカーへ送り、
+  ブローカーが全ワーカーへ転送する。回答を受けたワーカーに届いていなければブローカーに問い合わせる。
+- ブローカーに繋がらない間のブロードキャストは、そのワーカーの接続にだけ送る（local_only で数える）。
+- キャッシュの無効化通知（publish_invalidation）はバス経由で他の全ワーカーへ届け、
+  on_invalidate で登録された処理を呼ぶ。ブローカーに繋がらない間の通知は失われるので、
+  各キャッシュは WS_IPC_SOCKET 設定時に短い保持秒数を併用する。
+- 管理者向けの配信（broadcast_admin）も seq を付けずにバス経由で全ワーカーへ届け、
+  それぞれが自分の管理者ソケットへ送る。
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+from uuid import uuid4
+
+from app.config import WS_IPC_TIMEOUT_SEC
+from app.ws.ipc import IPCBus
+from app.ws.manager import ConnectionManager, _now_iso
+
+
+class IPCConnectionManager(ConnectionManager):
+    def __init__(
+        self,
+        socket_path: str,
+        *,
+        timeout_sec: float = WS_IPC_TIMEOUT_SEC,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(**kwargs)
+        self.bus = IPCBus(socket_path, self._on_bus_message, hello=self._hello, timeout_sec=timeout_sec)
+        # event_id -> delivered_at を記録中の question_id
+        self._delivered_question: dict[str, str | None] = {}
+        # 自分が出した問題配信の要求ID -> このワーカーの送信完了を待つ Future
+        self._waiters: dict[str, asyncio.Future] = {}
+        self._tasks: set[asyncio.Task] = set()
+        # 無効化通知の送信元（自分が送った通知を無視する）
+        self.worker_id = uuid4().hex
+        self.local_only = 0
+        self.invalidations_sent = 0
+        self.invalidations_received = 0
+
+    async def start(self) -> None:
+        await self.bus.start()
+
+    async def stop(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        await self.bus.stop()
+
+    def _hello(self) -> dict[str, Any]:
+        """(再)接続時にブローカーへ渡す状態（ブローカーが引き継がれた場合に続きから採番させる）。"""
+        return {
+            "seqs": {event_id: stream.seq for event_id, stream in self._streams.items()},
+            "delivered": {
+                event_id: [self._delivered_question.get(event_id), delivered]
+                for event_id, delivered in self._delivered_at.items()
+            },
+        }
+
+    # ── ブロードキャスト ───────────────────────────────
+
+    async def _publish(self, msg: dict[str, Any]) -> None:
+        if await self.bus.send(msg):
+            return
+        # ブローカーに繋がらない: このワーカーの接続にだけ送る
+        self.local_only += 1
+        msg["seq"] = self._stream(msg["e"]).seq + 1
+        self._on_bus_message(msg)
+
+    async def broadcast(self, event_id: str, payload: dict) -> None:
+        """全ワーカーの接続へ送る（ブローカーへ渡して即座に戻る）。"""
+        await self._publish({"op": "publish", "e": event_id, "p": payload})
+
+    async def broadcast_question(
+        self,
+        event_id: str,
+        payload: dict,
+    ) -> dict[str, str]:
+        """問題配信用ブロードキャスト。
+
+        このワーカーの接続への送信完了を待って、記録した delivered_at を返す
+        （他のワーカーの分はバス経由で届く）。
+        """
+        request_id = uuid4().hex
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[request_id] = waiter
+        question_id = (payload.get("data") or {}).get("question_id")
+        try:
+            await self._publish({
+                "op": "publish", "e": event_id, "p": payload, "q": question_id, "rid": request_id,
+            })
+            timeout = self.fanout.send_timeout_sec + self.bus.timeout_sec
+            return await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            return dict(self._delivered_at.get(event_id, {}))
+        finally:
+            self._waiters.pop(request_id, None)
+
+    async def preload_questions(self, event_id: str, questions: list[dict[str, Any]]) -> None:
+        await self._publish({"op": "preload", "e": event_id, "p": questions})
+
+    async def broadcast_admin(self, event_id: str, payload: dict) -> None:
+        """全ワーカーの管理者ソケットへ送る（ブローカーに繋がらない間はこのワーカーの分だけ）。"""
+        msg = {"op": "admin", "e": event_id, "p": payload}
+        if not await self.bus.send(msg):
+            self._send_admin(event_id, payload)
+
+    async def publish_invalidation(self, kind: str, key: str | None = None) -> None:
+        if await self.bus.send({"op": "invalidate", "k": kind, "key": key, "w": self.worker_id}):
+            self.invalidations_sent += 1
+
+    def _on_bus_message(self, msg: dict[str, Any]) -> None:
+        """ブローカーから届いたメッセージをこのワーカーの接続へ送る。"""
+        op = msg["op"]
+        if op == "invalidate":
+            if msg.get("w") != self.worker_id:
+                self.invalidations_received += 1
+                self._invalidated(msg["k"], msg.get("key"))
+            return
+        event_id = msg["e"]
+        if op == "admin":
+            self._send_admin(event_id, msg["p"])
+        elif op == "publish":
+            text, frame = self._stream(event_id).publish(msg["p"], seq=msg["seq"])
+            if msg.get("q") is None:
+                self._send_encoded(event_id, text, frame)
+            else:
+                self._deliver_question(event_id, msg["q"], msg.get("rid"), text, frame)
+        elif op == "preload":
+            self._send_preload(event_id, self._stream(event_id).set_preload(msg["p"], seq=msg["seq"]))
+        elif op == "delivered":
+            if self._delivered_question.get(event_id) == msg["q"]:
+                self._delivered_at.setdefault(event_id, {}).update(msg["m"])
+
+    def _deliver_question(
+        self,
+        event_id: str,
+        question_id: str,
+        request_id: str | None,
+        text: str,
+        frame: bytes,
+    ) -> None:
+        delivered_map: dict[str, str] = {}
+        self._delivered_at[event_id] = delivered_map
+        self._delivered_question[event_id] = question_id
+
+        def _mark(sid: str) -> None:
+            delivered_map[sid] = _now_iso()
+
+        fanouts = self._send_encoded(event_id, text, frame, on_delivered=_mark)
+        task = asyncio.create_task(
+            self._report_delivered(event_id, question_id, request_id, fanouts, delivered_map)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _report_delivered(
+        self,
+        event_id: str,
+        question_id: str,
+        request_id: str | None,
+        fanouts: list,
+        delivered_map: dict[str, str],
+    ) -> None:
+        """送信完了を待ち、記録した delivered_at をブローカーへ送る。"""
+        for fanout in fanouts:
+            await fanout.wait(self.fanout.send_timeout_sec)
+        if delivered_map:
+            await self.bus.send({"op": "delivered", "e": event_id, "q": question_id, "m": dict(delivered_map)})
+        waiter = self._waiters.get(request_id) if request_id else None
+        if waiter is not None and not waiter.done():
+            waiter.set_result(dict(delivered_map))
+
+    # ── delivered_at 管理 ──────────────────────────────
+
+    async def get_delivered_at(
+        self,
+        event_id: str,
+        session_id: str,
+        question_id: str | None = None,
+    ) -> str | None:
+        """このワーカーに届いていればそれを、なければブローカーに問い合わせて返す。"""
+        if question_id is None or self._delivered_question.get(event_id) == question_id:
+            value = self._delivered_at.get(event_id, {}).get(session_id)
+            if value is not None:
+                return value
+        return await self.bus.lookup(event_id, session_id, question_id)
+
+    def clear_delivered_at(self, event_id: str) -> None:
+        super().clear_delivered_at(event_id)
+        self._delivered_question.pop(event_id, None)
+
+    # ── 計測 ───────────────────────────────────────────
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            **super().stats(),
+            "local_only": self.local_only,
+            "invalidations_sent": self.invalidations_sent,
+            "invalidations_received": self.invalidations_received,
+            "ipc": self.bus.stats(),
+        }
@@ -2,25 +2,78 @@
 
 Phase 1 と同等のインメモリ管理。Phase 3 で Redis Pub/Sub 版に差し替え。
 delivered_at_map もインメモリで保持する（問題ごとにリセット）。
+送信は FanoutEngine に任せ、ペイロードのエンコードはプロトコルごとに1回だけ行う。
+プロトコル v2（?protocol=v2）の詳細は app/ws/protocol.py を参照。
+再接続時は ?resume_from=<seq> で v1 / v2 とも履歴から続きを再送する（DB は読まない）。
+uvicorn --workers N で動かす場合は WS_IPC_SOCKET を設定する（app/ws/ipc_manager.py）。
+プロセス内キャッシュの無効化通知（publish_invalidation / on_invalidate）も同じバスで他ワーカーへ届く。
+管理者セッションで接続したソケット（管理画面・プロジェクター）には admin=True が付き、
+broadcast_admin の配信（出題中の回答集計など）はそれらにだけ届く。
 """
 
 from __future__ import annotations
 
+from collections.abc import Callable
 from datetime import datetime, timezone
+from typing import Any
 
 from fastapi import WebSocket
 
+from app.config import WS_IPC_SOCKET, WS_SEND_QUEUE_SIZE, WS_SEND_TIMEOUT_SEC
+from app.ws.fanout import FanoutEngine, SocketOutbox, encode_message
+from app.ws.protocol import PROTOCOL_V1, PROTOCOL_V2, EventStream, pack, to_v2_data
+
 
 def _now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
 class ConnectionManager:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        *,
+        send_timeout_sec: float = WS_SEND_TIMEOUT_SEC,
+        queue_size: int = WS_SEND_QUEUE_SIZE,
+    ) -> None:
         # event_id -> {session_id: WebSocket}
         self._connections: dict[str, dict[str, WebSocket]] = {}
         # event_id -> {session_id: iso_timestamp}
         self._delivered_at: dict[str, dict[str, str]] = {}
+        # プロトコル v2 で接続中のソケットと、イベントごとの seq・履歴
+        self._v2: set[WebSocket] = set()
+        self._streams: dict[str, EventStream] = {}
+        # event_id -> {session_id: WebSocket}（管理者セッションで接続したソケットのみ）
+        self._admins: dict[str, dict[str, WebSocket]] = {}
+        # 無効化通知の種類 -> 受け取る処理（キャッシュから key を消す）
+        self._invalidation_handlers: dict[str, list[Callable[[str | None], None]]] = {}
+        self.resumed = 0
+        self.fanout = FanoutEngine(
+            queue_size=queue_size,
+            send_timeout_sec=send_timeout_sec,
+            on_evict=self._on_evict,
+        )
+
+    def _stream(self, event_id: str) -> EventStream:
+        stream = self._streams.get(event_id)
+        if stream is None:
+            stream = self._streams[event_id] = EventStream()
+        return stream
+
+    def _split(self, conns: dict[str, WebSocket]) -> tuple[dict[str, WebSocket], dict[str, WebSocket]]:
+        """接続を (v1, v2) に分ける。"""
+        if not self._v2:
+            return conns, {}
+        v1: dict[str, WebSocket] = {}
+        v2: dict[str, WebSocket] = {}
+        for sid, ws in conns.items():
+            (v2 if ws in self._v2 else v1)[sid] = ws
+        return v1, v2
+
+    async def start(self) -> None:
+        """起動時に呼ぶ（インメモリ版は何もしない。IPC 版はブローカーへ接続する）。"""
+
+    async def stop(self) -> None:
+        """終了時に呼ぶ。"""
 
     # ── 接続管理 ───────────────────────────────────────
 
@@ -29,25 +82,117 @@ class ConnectionManager:
         event_id: str,
         session_id: str,
         websocket: WebSocket,
+        *,
+        protocol: str | None = None,
+        resume_from: int | None = None,
+        admin: bool = False,
     ) -> None:
         await websocket.accept()
-        self._connections.setdefault(event_id, {})[session_id] = websocket
+        conns = self._connections.setdefault(event_id, {})
+        old = conns.get(session_id)
+        if old is not None and old is not websocket:
+            self.fanout.detach(old)
+            self._v2.discard(old)
+        conns[session_id] = websocket
+        self._set_admin(event_id, session_id, websocket, admin)
+        self.fanout.attach(event_id, session_id, websocket)
+        # 以降のブロードキャストより先に送信キューへ積む（間に await を挟まない）
+        target = {session_id: websocket}
+        if protocol == PROTOCOL_V2:
+            self._v2.add(websocket)
+            for frame in self._initial_frames(event_id, resume_from):
+                self.fanout.send(event_id, target, frame)
+        elif resume_from is not None:
+            stream = self._stream(event_id)
+            replay = stream.replay_from(resume_from, PROTOCOL_V1)
+            for text in replay if replay is not None else [stream.resync_text()]:
+                self.fanout.send(event_id, target, text)
+            self.resumed += 1
+
+    def _initial_frames(self, event_id: str, resume_from: int | None) -> list[bytes]:
+        stream = self._stream(event_id)
+        frames = [stream.hello()]
+        if resume_from is not None:
+            self.resumed += 1
+            replay = stream.replay_from(resume_from)
+            if replay is not None:
+                return frames + replay
+            frames.append(stream.resync())
+        if stream.preload is not None:
+            frames.append(stream.preload)
+        return frames
 
-    def disconnect(self, event_id: str, session_id: str) -> None:
+    def disconnect(
+        self,
+        event_id: str,
+        session_id: str,
+        websocket: WebSocket | None = None,
+    ) -> None:
+        """接続を外す。websocket 指定時は同一ソケットの場合のみ（再接続後の誤削除防止）。"""
         conns = self._connections.get(event_id)
-        if conns and session_id in conns:
-            del conns[session_id]
+        if not conns or session_id not in conns:
+            return
+        current = conns[session_id]
+        if websocket is not None and current is not websocket:
+            return
+        del conns[session_id]
+        self._v2.discard(current)
+        self._drop_admin(event_id, session_id, current)
+        self.fanout.detach(current)
+
+    def _on_evict(self, outbox: SocketOutbox) -> None:
+        self._v2.discard(outbox.websocket)
+        self._drop_admin(outbox.event_id, outbox.session_id, outbox.websocket)
+        conns = self._connections.get(outbox.event_id)
+        if conns and conns.get(outbox.session_id) is outbox.websocket:
+            del conns[outbox.session_id]
+
+    def _set_admin(self, event_id: str, session_id: str, websocket: WebSocket, admin: bool) -> None:
+        """接続時に管理者ソケットかどうかを記録する（同じ session_id の前のソケットの分は上書き）。"""
+        if admin:
+            self._admins.setdefault(event_id, {})[session_id] = websocket
+        else:
+            self._admins.get(event_id, {}).pop(session_id, None)
+
+    def _drop_admin(self, event_id: str, session_id: str, websocket: WebSocket) -> None:
+        admins = self._admins.get(event_id)
+        if admins and admins.get(session_id) is websocket:
+            del admins[session_id]
 
     # ── ブロードキャスト ───────────────────────────────
 
-    async def broadcast(self, event_id: str, payload: dict) -> None:
-        """イベント内の全クライアントにメッセージ送信。"""
+    def _send_all(self, event_id: str, payload: dict, on_delivered=None) -> list:
+        """v1 / v2 それぞれ1回だけエンコードして送信キューに積む。"""
+        text, frame = self._stream(event_id).publish(payload)
+        return self._send_encoded(event_id, text, frame, on_delivered)
+
+    def _send_encoded(self, event_id: str, text: str, frame: bytes, on_delivered=None) -> list:
         conns = self._connections.get(event_id, {})
-        for ws in list(conns.values()):
-            try:
-                await ws.send_json(payload)
-            except Exception:
-                pass
+        v1, v2 = self._split(conns)
+        fanouts = []
+        if v1:
+            fanouts.append(self.fanout.send(event_id, v1, text, on_delivered=on_delivered))
+        if v2:
+            fanouts.append(self.fanout.send(event_id, v2, frame, on_delivered=on_delivered))
+        return fanouts
+
+    async def broadcast(self, event_id: str, payload: dict) -> None:
+        """イベント内の全クライアントにメッセージ送信（キューに積んで即座に戻る）。"""
+        self._send_all(event_id, payload)
+
+    async def broadcast_admin(self, event_id: str, payload: dict) -> None:
+        """管理者ソケットにだけ送る（seq は付けず、再送履歴にも残さない）。"""
+        self._send_admin(event_id, payload)
+
+    def _send_admin(self, event_id: str, payload: dict) -> None:
+        admins = self._admins.get(event_id)
+        if not admins:
+            return
+        v1, v2 = self._split(admins)
+        if v1:
+            self.fanout.send(event_id, v1, encode_message(payload))
+        if v2:
+            self.fanout.send(event_id, v2, pack(0, *to_v2_data(payload)))
 
     async def broadcast_question(
         self,
@@ -56,27 +201,78 @@ class ConnectionManager:
     ) -> dict[str, str]:
         """問題配信用ブロードキャスト。
 
-        送信成功した各セッションの delivered_at を記録して返す。
+        各セッションの delivered_at は実際に送信が完了した時刻で記録する。
+        全ソケットの送信完了（最大で送信タイムアウトまで）を待って記録済みの分を返す。
         """
         delivered_map: dict[str, str] = {}
-        conns = self._connections.get(event_id, {})
-        for sid, ws in list(conns.items()):
-            try:
-                await ws.send_json(payload)
-                delivered_map[sid] = _now_iso()
-            except Exception:
-                pass
         self._delivered_at[event_id] = delivered_map
-        return delivered_map
+
+        def _mark(sid: str) -> None:
+            delivered_map[sid] = _now_iso()
+
+        for fanout in self._send_all(event_id, payload, on_delivered=_mark):
+            await fanout.wait(self.fanout.send_timeout_sec)
+        return dict(delivered_map)
+
+    async def preload_questions(self, event_id: str, questions: list[dict[str, Any]]) -> None:
+        """v2 クライアントへ全問題を先送りする（後から接続した v2 クライアントにも送る）。"""
+        self._send_preload(event_id, self._stream(event_id).set_preload(questions))
+
+    def _send_preload(self, event_id: str, frame: bytes) -> None:
+        _, v2 = self._split(self._connections.get(event_id, {}))
+        if v2:
+            self.fanout.send(event_id, v2, frame)
 
     # ── delivered_at 管理 ──────────────────────────────
 
-    def get_delivered_at(self, event_id: str, session_id: str) -> str | None:
+    def get_delivered_at(
+        self,
+        event_id: str,
+        session_id: str,
+        question_id: str | None = None,
+    ) -> str | None:
+        # インメモリ版は出題中の問題の分だけ保持する（question_id は Valkey 版との互換用）
         return self._delivered_at.get(event_id, {}).get(session_id)
 
     def clear_delivered_at(self, event_id: str) -> None:
         self._delivered_at.pop(event_id, None)
 
+    # ── キャッシュの無効化通知（複数ワーカー） ─────────────
+
+    def on_invalidate(self, kind: str, handler: Callable[[str | None], None]) -> None:
+        """他ワーカーからの無効化通知（kind, key）を受け取る処理を登録する（起動時）。"""
+        self._invalidation_handlers.setdefault(kind, []).append(handler)
+
+    async def publish_invalidation(self, kind: str, key: str | None = None) -> None:
+        """他ワーカーのキャッシュから key（None なら全て）を消させる。
+
+        呼び出し側は自分のキャッシュを更新済みであること。単一ワーカー版は何もしない。
+        """
+
+    def _invalidated(self, kind: str, key: str | None) -> None:
+        for handler in self._invalidation_handlers.get(kind, ()):
+            handler(key)
+
+    # ── 計測 ───────────────────────────────────────────
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "connections": sum(len(c) for c in self._connections.values()),
+            "v2_connections": len(self._v2),
+            "admin_connections": sum(len(a) for a in self._admins.values()),
+            "resumed": self.resumed,
+            **self.fanout.stats(),
+        }
+
+
+def _create_ws_manager() -> ConnectionManager:
+    """WS_IPC_SOCKET があれば同一ホストの複数ワーカーで配信を共有する IPC 版を使う。"""
+    if WS_IPC_SOCKET:
+        from app.ws.ipc_manager import IPCConnectionManager
+
+        return IPCConnectionManager(WS_IPC_SOCKET)
+    return ConnectionManager()
+
 
-# グローバルシングルトン
-ws_manager = ConnectionManager()
+# グローバルシングルトン（main.py の lifespan で start / stop）
+ws_manager = _create_ws_manager()
@@ -0,0 +1,110 @@
+"""WebSocket プロトコル v2（バイナリ・シーケンス番号付き）。
+
+/api/ws?protocol=v2 で接続したクライアントだけが対象。既定の v1（JSON テキスト）は変更しない。
+
+フレームは msgpack のバイナリメッセージ:
+  {"v": 2, "seq": <イベント内で単調増加>, "t": <type>, "d": <data>}
+
+- seq はイベントごとに全メッセージで採番する。直近のフレームは履歴に残し、
+  再接続時に ?resume_from=<最後に受け取った seq> を付けると続きから再送する。
+  履歴に残っていなければ "resync" を送る（クライアントは me/state を取得し直す）。
+- event.start 時に全問題（正解なし）を "questions.preload" で送っておき、
+  question.shown は問題ID・開始時刻・締切のみの差分にする。
+- 圧縮は WebSocket の permessage-deflate に任せる（uvicorn の既定で交渉される）。
+
+v1 のブロードキャストにも同じ seq を "seq" キーで付け、同じ履歴から
+?resume_from=<seq> で再送する。履歴にない場合は {"type": "resync"} を送る。
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from typing import Any
+
+import msgpack
+
+from app.config import WS_V2_HISTORY_SIZE
+from app.ws.fanout import encode_message
+
+PROTOCOL_V1 = "v1"
+PROTOCOL_V2 = "v2"
+SUPPORTED_PROTOCOLS = (PROTOCOL_V1, PROTOCOL_V2)
+
+
+def pack(seq: int, msg_type: str, data: Any) -> bytes:
+    return msgpack.packb({"v": 2, "seq": seq, "t": msg_type, "d": data}, use_bin_type=True)
+
+
+def unpack(frame: bytes) -> dict[str, Any]:
+    return msgpack.unpackb(frame, raw=False)
+
+
+def to_v2_data(payload: dict[str, Any]) -> tuple[str, Any]:
+    """v1 ペイロードを v2 の (type, data) に変換する。"""
+    msg_type = payload.get("type", "")
+    data = payload.get("data")
+    if msg_type == "question.shown" and isinstance(data, dict):
+        # 問題本文は preload 済みなので送らない
+        data = {
+            "question_id": data.get("question_id"),
+            "started_at": data.get("started_at"),
+            "deadline_at": data.get("deadline_at"),
+        }
+    return msg_type, data
+
+
+class EventStream:
+    """1イベント分の seq 採番と再送用の履歴（上限付きのリングバッファ）。"""
+
+    def __init__(self, history_size: int = WS_V2_HISTORY_SIZE) -> None:
+        self.seq = 0
+        # (seq, v2 フレーム, v1 テキスト)。v2 専用のフレーム（preload）は v1 テキストなし
+        self._history: deque[tuple[int, bytes, str | None]] = deque(maxlen=history_size)
+        self.preload: bytes | None = None
+
+    def _next(self, seq: int | None) -> int:
+        """次の seq（複数ワーカー構成ではブローカーが採番した seq をそのまま使う）。"""
+        self.seq = self.seq + 1 if seq is None else seq
+        return self.seq
+
+    def append(self, msg_type: str, data: Any, *, seq: int | None = None) -> bytes:
+        """v2 専用のフレームを採番して履歴に積む。"""
+        self._next(seq)
+        frame = pack(self.seq, msg_type, data)
+        self._history.append((self.seq, frame, None))
+        return frame
+
+    def publish(self, payload: dict[str, Any], *, seq: int | None = None) -> tuple[str, bytes]:
+        """ブロードキャストを採番し、(v1 テキスト, v2 フレーム) を1回ずつエンコードして履歴に積む。"""
+        self._next(seq)
+        text = encode_message({"seq": self.seq, **payload})
+        frame = pack(self.seq, *to_v2_data(payload))
+        self._history.append((self.seq, frame, text))
+        return text, frame
+
+    def set_preload(self, questions: list[dict[str, Any]], *, seq: int | None = None) -> bytes:
+        frame = self.append("questions.preload", {"questions": questions}, seq=seq)
+        self.preload = frame
+        return frame
+
+    def replay_from(self, last_seq: int, protocol: str = PROTOCOL_V2) -> list[Any] | None:
+        """last_seq より後のメッセージを返す。履歴が欠けていれば None。
+
+        v2 はフレーム（bytes）、v1 はテキスト（v2 専用のフレームは除く）を返す。
+        """
+        if last_seq >= self.seq:
+            return []
+        if not self._history or self._history[0][0] > last_seq + 1:
+            return None
+        if protocol == PROTOCOL_V2:
+            return [frame for seq, frame, _ in self._history if seq > last_seq]
+        return [text for seq, _, text in self._history if seq > last_seq and text is not None]
+
+    def hello(self) -> bytes:
+        return pack(self.seq, "hello", {"protocol": PROTOCOL_V2})
+
+    def resync(self) -> bytes:
+        return pack(self.seq, "resync", None)
+
+    def resync_text(self) -> str:
+        return encode_message({"seq": self.seq, "type": "resync", "data": None})
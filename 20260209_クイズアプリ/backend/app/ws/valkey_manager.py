@@ -1,56 +1,186 @@
 """Phase 3: Valkey Pub/Sub を使った WebSocket マネージャー。
 
 複数 ECS タスク間でイベントをブロードキャストするために、
-Valkey (Redis) の Pub/Sub 機能を使用します。
+Valkey (Redis) の Pub/Sub 機能を使用します。接続は app/valkey.py の共有プールから借りる。
+
+delivered_at はイベント×問題ごとに1つのハッシュに保存する:
+  delivered:{event_id}:{question_id}  field=session_id value=ISO時刻
+各タスクは自分のローカル接続への送信完了後、HSET + EXPIRE を1回の
+パイプラインで書き込む。AnswerService からの参照は同時刻の要求を
+まとめて HMGET 1回で引く。
+
+ブロードキャストは event_log:{event_id}（Valkey stream、直近 WS_V2_HISTORY_SIZE 件）にも
+残し、エントリIDから作った seq をメッセージに付けて配信する。再接続時に
+?resume_from=<seq> が付いていれば stream から続きを再送する（DB は読まない）。
+管理者ソケット向けの配信（broadcast_admin）は "A\n{json}" として同じチャネルに流し、
+event_log には残さない。
 """
 
 from __future__ import annotations
 
 import asyncio
-import json
+import logging
 from datetime import datetime, timezone
 from typing import Any
 
 import redis.asyncio as aioredis
 from fastapi import WebSocket
 
+from app.config import WS_V2_HISTORY_SIZE
+from app.valkey import ValkeyPool, valkey_pool
+from app.ws.fanout import FanoutEngine, SocketOutbox, encode_message
+from app.ws.protocol import PROTOCOL_V1
+
+logger = logging.getLogger(__name__)
+
+_DELIVERED_TTL_SEC = 3600  # 1時間で自動削除
+_EVENT_LOG_TTL_SEC = 3600  # 最後のブロードキャストから1時間で自動削除
+# stream のエントリID "<ms>-<n>" を seq = ms * 1000 + n に変換する。
+# JavaScript の Number で正確に扱える範囲に収めるため、同一ミリ秒内は 1000 件まで。
+_SEQ_PER_MS = 1000
+# 問題配信メッセージのヘッダ（JSON 本体は必ず "{" で始まるので衝突しない）
+_QUESTION_PREFIX = "Q"
+# 管理者ソケット向けメッセージのヘッダ
+_ADMIN_PREFIX = "A\n"
+
 
 def _now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
+def delivered_key(event_id: str, question_id: str) -> str:
+    return f"delivered:{event_id}:{question_id}"
+
+
+def event_log_key(event_id: str) -> str:
+    return f"event_log:{event_id}"
+
+
+def stream_id_to_seq(entry_id: str) -> int:
+    ms, _, n = entry_id.partition("-")
+    return int(ms) * _SEQ_PER_MS + int(n or 0)
+
+
+def seq_to_stream_id(seq: int) -> str:
+    return f"{seq // _SEQ_PER_MS}-{seq % _SEQ_PER_MS}"
+
+
+def _with_seq(text: str, seq: int) -> str:
+    """エンコード済みの JSON オブジェクトの先頭に "seq" を差し込む（再エンコードしない）。"""
+    rest = text[1:].lstrip()
+    if rest.startswith("}"):
+        # 空のオブジェクト: 区切りのカンマを付けない
+        return f'{{"seq":{seq}}}'
+    return f'{{"seq":{seq},{rest}'
+
+
+class _HashFieldBatcher:
+    """同じイベントループ周回で届いた HGET 要求を、キーごとの HMGET にまとめる。"""
+
+    def __init__(self, get_redis) -> None:
+        self._get_redis = get_redis
+        # key -> field -> 待機中の Future
+        self._pending: dict[str, dict[str, list[asyncio.Future]]] = {}
+        self._scheduled = False
+        self.round_trips = 0
+
+    async def get(self, key: str, field: str) -> str | None:
+        fut = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(key, {}).setdefault(field, []).append(fut)
+        if not self._scheduled:
+            self._scheduled = True
+            asyncio.get_running_loop().call_soon(
+                lambda: asyncio.ensure_future(self._flush()),
+            )
+        return await fut
+
+    async def _flush(self) -> None:
+        pending, self._pending = self._pending, {}
+        self._scheduled = False
+        try:
+            redis = await self._get_redis()
+            pipe = redis.pipeline(transaction=False)
+            requests = [(key, list(fields.items())) for key, fields in pending.items()]
+            for key, fields in requests:
+                pipe.hmget(key, [f for f, _ in fields])
+            results = await pipe.execute()
+            self.round_trips += 1
+        except Exception as e:
+            for fields in pending.values():
+                for futs in fields.values():
+                    for fut in futs:
+                        if not fut.done():
+                            fut.set_exception(e)
+            return
+
+        for (_, fields), values in zip(requests, results):
+            for (_, futs), value in zip(fields, values):
+                for fut in futs:
+                    if not fut.done():
+                        fut.set_result(value)
+
+
 class ValkeyConnectionManager:
     """Valkey Pub/Sub ベースの WebSocket 接続マネージャー。"""
 
-    def __init__(self, redis_url: str) -> None:
+    def __init__(
+        self,
+        redis_url: str,
+        *,
+        redis: aioredis.Redis | None = None,
+        pool: ValkeyPool | None = None,
+        delivered_ttl_sec: int = _DELIVERED_TTL_SEC,
+        history_size: int = WS_V2_HISTORY_SIZE,
+        log_ttl_sec: int = _EVENT_LOG_TTL_SEC,
+    ) -> None:
         self.redis_url = redis_url
-        self._redis: aioredis.Redis | None = None
+        self.delivered_ttl_sec = delivered_ttl_sec
+        self.history_size = history_size
+        self.log_ttl_sec = log_ttl_sec
+        self._redis: aioredis.Redis | None = redis
+        # 接続はプロセス共有のプールから借りる（REDIS_URL と異なる URL なら専用のプール）
+        if pool is None:
+            pool = valkey_pool if redis_url == valkey_pool.redis_url else ValkeyPool(redis_url)
+        self._pool = pool
         self._pubsub: aioredis.client.PubSub | None = None
         # ローカルのWebSocket接続: event_id -> {session_id: WebSocket}
         self._connections: dict[str, dict[str, WebSocket]] = {}
-        # delivered_at はValkey に保存: delivered:{event_id}:{session_id}
+        # event_id -> {session_id: WebSocket}（管理者セッションで接続したローカル接続のみ）
+        self._admins: dict[str, dict[str, WebSocket]] = {}
+        # event_id -> 出題中の question_id（delivered_at のハッシュ特定用）
+        self._current_question: dict[str, str] = {}
         self._subscriber_task: asyncio.Task | None = None
+        # 購読中の event_id（ローカル接続が1つ以上あるイベント）
+        self._subscribed: set[str] = set()
+        self._subscription_lock = asyncio.Lock()
+        self._has_subscriptions = asyncio.Event()
+        self._record_tasks: set[asyncio.Task] = set()
+        self.forwarded = 0
+        self.dropped_no_local = 0
+        self.resumed = 0
+        self.resynced = 0
+        self.fanout = FanoutEngine(on_evict=self._on_evict)
+        self._lookups = _HashFieldBatcher(self._get_redis)
 
     async def _get_redis(self) -> aioredis.Redis:
-        """Redis接続を取得（遅延初期化）。"""
+        """共有プールのクライアントを取得（遅延初期化）。"""
         if self._redis is None:
-            self._redis = await aioredis.from_url(
-                self.redis_url,
-                encoding="utf-8",
-                decode_responses=True,
-            )
+            self._redis = self._pool.client()
         return self._redis
 
     async def start_subscriber(self) -> None:
         """Pub/Sub購読タスクを開始。
 
         アプリケーション起動時に1回だけ呼び出す。
+        購読するのはローカル接続のあるイベントのチャンネルのみ。
         """
         if self._subscriber_task is not None:
             return  # すでに起動済み
 
         redis = await self._get_redis()
-        self._pubsub = redis.pubsub()
+        self._pubsub = redis.pubsub(ignore_subscribe_messages=True)
+        for event_id in list(self._connections):
+            await self._sync_subscription(event_id)
         self._subscriber_task = asyncio.create_task(self._subscribe_loop())
 
     async def stop_subscriber(self) -> None:
@@ -66,56 +196,128 @@ class ValkeyConnectionManager:
                 pass
             self._subscriber_task = None
 
+        if self._record_tasks:
+            await asyncio.gather(*self._record_tasks, return_exceptions=True)
+
         if self._pubsub is not None:
-            await self._pubsub.close()
+            await self._pubsub.aclose()
             self._pubsub = None
+        self._subscribed.clear()
+        self._has_subscriptions.clear()
+
+        # 共有プールは閉じない（valkey_pool は lifespan 終了時に閉じる）
+        if self._pool is not valkey_pool:
+            await self._pool.close()
+        self._redis = None
 
-        if self._redis is not None:
-            await self._redis.close()
-            self._redis = None
+    # ── チャンネル購読（イベント単位・参照カウント） ──
+
+    async def _sync_subscription(self, event_id: str) -> None:
+        """ローカル接続数に合わせて event:{id} を SUBSCRIBE / UNSUBSCRIBE する。"""
+        if self._pubsub is None:
+            return
+        async with self._subscription_lock:
+            wanted = bool(self._connections.get(event_id))
+            channel = f"event:{event_id}"
+            try:
+                if wanted and event_id not in self._subscribed:
+                    await self._pubsub.subscribe(channel)
+                    self._subscribed.add(event_id)
+                elif not wanted and event_id in self._subscribed:
+                    await self._pubsub.unsubscribe(channel)
+                    self._subscribed.discard(event_id)
+                    self._connections.pop(event_id, None)
+            except Exception as e:
+                logger.warning("[ValkeyManager] (un)subscribe %s failed: %s", channel, e)
+            if self._subscribed:
+                self._has_subscriptions.set()
+            else:
+                self._has_subscriptions.clear()
+
+    def _schedule_sync(self, event_id: str) -> None:
+        if self._pubsub is None:
+            return
+        task = asyncio.create_task(self._sync_subscription(event_id))
+        self._record_tasks.add(task)
+        task.add_done_callback(self._record_tasks.discard)
 
     async def _subscribe_loop(self) -> None:
         """Pub/Subメッセージを受信してローカルのWebSocketに送信。"""
         if self._pubsub is None:
             return
 
-        # 全イベントチャンネルを購読（パターンマッチ）
-        await self._pubsub.psubscribe("event:*")
+        while True:
+            if not self._subscribed:
+                await self._has_subscriptions.wait()
+            try:
+                message = await self._pubsub.get_message(
+                    ignore_subscribe_messages=True,
+                    timeout=1.0,
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("[ValkeyManager] Subscribe loop error: %s", e)
+                await asyncio.sleep(1.0)
+                continue
+            if message is None or message["type"] != "message":
+                continue
+
+            channel = message["channel"]  # e.g., "event:evt_123"
+            if not channel.startswith("event:"):
+                continue
+            event_id = channel[6:]  # "event:"を除去
+
+            self._dispatch(event_id, message["data"])
+
+    def _dispatch(self, event_id: str, data: str) -> None:
+        """受信した文字列をデコードせずにローカル接続へ転送する。
+
+        問題配信は "Q{question_id}\n{json}" 形式で届く（delivered_at 記録のため）。
+        """
+        conns = self._connections.get(event_id)
+        if not conns:
+            # UNSUBSCRIBE 前に届いた分など
+            self.dropped_no_local += 1
+            return
+        self.forwarded += 1
 
+        if data.startswith(_ADMIN_PREFIX):
+            admins = self._admins.get(event_id)
+            if admins:
+                self.fanout.send(event_id, admins, data[len(_ADMIN_PREFIX):])
+            return
+        if not data.startswith(_QUESTION_PREFIX):
+            self.fanout.send(event_id, conns, data)
+            return
+
+        header, _, text = data.partition("\n")
+        question_id = header[len(_QUESTION_PREFIX):]
+        self._current_question[event_id] = question_id
+        delivered: dict[str, str] = {}
+
+        def _mark(sid: str) -> None:
+            delivered[sid] = _now_iso()
+
+        fanout = self.fanout.send(event_id, conns, text, on_delivered=_mark)
+        task = asyncio.create_task(
+            self._record_after(fanout, event_id, question_id, delivered),
+        )
+        self._record_tasks.add(task)
+        task.add_done_callback(self._record_tasks.discard)
+
+    async def _record_after(
+        self,
+        fanout,
+        event_id: str,
+        question_id: str,
+        delivered: dict[str, str],
+    ) -> None:
+        await fanout.wait(self.fanout.send_timeout_sec)
         try:
-            async for message in self._pubsub.listen():
-                if message["type"] != "pmessage":
-                    continue
-
-                channel = message["channel"]  # e.g., "event:evt_123"
-                data_str = message["data"]
-
-                # チャンネル名からevent_idを抽出
-                if not channel.startswith("event:"):
-                    continue
-                event_id = channel[6:]  # "event:"を除去
-
-                # メッセージをデシリアライズ
-                try:
-                    payload = json.loads(data_str)
-                except json.JSONDecodeError:
-                    continue
-
-                # ローカル接続にブロードキャスト
-                await self._local_broadcast(event_id, payload)
-        except asyncio.CancelledError:
-            raise
+            await self.record_delivered(event_id, question_id, delivered)
         except Exception as e:
-            print(f"[ValkeyManager] Subscribe loop error: {e}")
-
-    async def _local_broadcast(self, event_id: str, payload: dict) -> None:
-        """ローカルのWebSocket接続に送信。"""
-        conns = self._connections.get(event_id, {})
-        for ws in list(conns.values()):
-            try:
-                await ws.send_json(payload)
-            except Exception:
-                pass
+            logger.warning("[ValkeyManager] failed to record delivered_at: %s", e)
 
     # ── 接続管理 ───────────────────────────────────────
 
@@ -124,16 +326,100 @@ class ValkeyConnectionManager:
         event_id: str,
         session_id: str,
         websocket: WebSocket,
+        *,
+        protocol: str | None = None,
+        resume_from: int | None = None,
+        admin: bool = False,
     ) -> None:
-        """WebSocket接続を受け入れてローカルに保存。"""
-        await websocket.accept()
-        self._connections.setdefault(event_id, {})[session_id] = websocket
+        """WebSocket接続を受け入れてローカルに保存。
 
-    def disconnect(self, event_id: str, session_id: str) -> None:
+        プロトコル v2 は未対応のため v1 で扱い、要求したクライアントにはその旨を通知する。
+        resume_from があれば event_log から続きを再送する。再送は接続登録の後に行うので
+        取りこぼしはないが、その間に届いたライブ配信と前後・重複しうる（seq で判別できる）。
+        """
+        await websocket.accept()
+        if protocol not in (None, PROTOCOL_V1):
+            await websocket.send_text(
+                encode_message({"type": "hello", "data": {"protocol": PROTOCOL_V1}}),
+            )
+        conns = self._connections.setdefault(event_id, {})
+        old = conns.get(session_id)
+        if old is not None and old is not websocket:
+            self.fanout.detach(old)
+        conns[session_id] = websocket
+        if admin:
+            self._admins.setdefault(event_id, {})[session_id] = websocket
+        else:
+            self._admins.get(event_id, {}).pop(session_id, None)
+        self.fanout.attach(event_id, session_id, websocket)
+        if event_id not in self._subscribed:
+            await self._sync_subscription(event_id)
+        if resume_from is not None:
+            await self._resume(event_id, session_id, websocket, resume_from)
+
+    async def _resume(
+        self,
+        event_id: str,
+        session_id: str,
+        websocket: WebSocket,
+        last_seq: int,
+    ) -> None:
+        try:
+            texts = await self.replay_from(event_id, last_seq)
+        except Exception as e:
+            logger.warning("[ValkeyManager] replay failed: %s", e)
+            texts = None
+        if texts is None:
+            self.resynced += 1
+            texts = [encode_message({"type": "resync", "data": None})]
+        else:
+            self.resumed += 1
+        if self._connections.get(event_id, {}).get(session_id) is not websocket:
+            return  # 再送の取得中に切断された
+        target = {session_id: websocket}
+        for text in texts:
+            self.fanout.send(event_id, target, text)
+
+    async def replay_from(self, event_id: str, last_seq: int) -> list[str] | None:
+        """last_seq より後のメッセージを返す。取りこぼしがありうる場合は None。"""
+        redis = await self._get_redis()
+        key = event_log_key(event_id)
+        pipe = redis.pipeline(transaction=False)
+        pipe.xlen(key)
+        pipe.xrange(key, "-", "+", count=1)
+        pipe.xrange(key, f"({seq_to_stream_id(last_seq)}", "+")
+        length, first, entries = await pipe.execute()
+        # 上限まで溜まっている = 古い分が切り詰められている。先頭が last_seq より新しければ欠けている
+        if first and length >= self.history_size and stream_id_to_seq(first[0][0]) > last_seq:
+            return None
+        return [_with_seq(fields["m"], stream_id_to_seq(entry_id)) for entry_id, fields in entries]
+
+    def disconnect(
+        self,
+        event_id: str,
+        session_id: str,
+        websocket: WebSocket | None = None,
+    ) -> None:
         """WebSocket接続を切断。"""
         conns = self._connections.get(event_id)
-        if conns and session_id in conns:
-            del conns[session_id]
+        if not conns or session_id not in conns:
+            return
+        current = conns[session_id]
+        if websocket is not None and current is not websocket:
+            return
+        del conns[session_id]
+        self._drop_admin(event_id, session_id, current)
+        self.fanout.detach(current)
+        if not conns:
+            self._schedule_sync(event_id)
+
+    def _on_evict(self, outbox: SocketOutbox) -> None:
+        self._drop_admin(outbox.event_id, outbox.session_id, outbox.websocket)
+        conns = self._connections.get(outbox.event_id)
+        if conns and conns.get(outbox.session_id) is outbox.websocket:
+            del conns[outbox.session_id]
+            if not conns:
+                self._schedule_sync(outbox.event_id)
 
     # ── ブロードキャスト ───────────────────────────────
 
@@ -142,10 +428,32 @@ class ValkeyConnectionManager:
 
         Valkey Pub/Subを使って全タスクに配信。
         """
+        async with self._pool.timed():
+            text = await self._append_log(event_id, payload)
+            redis = await self._get_redis()
+            await redis.publish(f"event:{event_id}", text)
+
+    async def broadcast_admin(self, event_id: str, payload: dict) -> None:
+        """全タスクの管理者ソケットへ送る（seq は付けず、event_log にも残さない）。"""
+        async with self._pool.timed():
+            redis = await self._get_redis()
+            await redis.publish(f"event:{event_id}", _ADMIN_PREFIX + encode_message(payload))
+
+    def _drop_admin(self, event_id: str, session_id: str, websocket: WebSocket) -> None:
+        admins = self._admins.get(event_id)
+        if admins and admins.get(session_id) is websocket:
+            del admins[session_id]
+
+    async def _append_log(self, event_id: str, payload: dict) -> str:
+        """event_log に追記し、seq を付けた配信用の文字列を返す（XADD + EXPIRE を1往復）。"""
+        text = encode_message(payload)
         redis = await self._get_redis()
-        channel = f"event:{event_id}"
-        message = json.dumps(payload)
-        await redis.publish(channel, message)
+        key = event_log_key(event_id)
+        pipe = redis.pipeline(transaction=False)
+        pipe.xadd(key, {"m": text}, maxlen=self.history_size, approximate=False)
+        pipe.expire(key, self.log_ttl_sec)
+        entry_id, _ = await pipe.execute()
+        return _with_seq(text, stream_id_to_seq(entry_id))
 
     async def broadcast_question(
         self,
@@ -154,41 +462,80 @@ class ValkeyConnectionManager:
     ) -> dict[str, str]:
         """問題配信用ブロードキャスト。
 
-        Pub/Subで配信し、ローカル接続のdelivered_atを記録してValkeyに保存。
+        Pub/Subで配信する。delivered_at は各タスクの購読側が
+        ローカル接続への送信完了後に記録するため、ここでは空の dict を返す。
         """
-        redis = await self._get_redis()
-        channel = f"event:{event_id}"
-        message = json.dumps(payload)
-        await redis.publish(channel, message)
-
-        # ローカル接続のdelivered_atを記録
-        delivered_map: dict[str, str] = {}
-        conns = self._connections.get(event_id, {})
-        now = _now_iso()
-        for sid in conns.keys():
-            delivered_map[sid] = now
-            # Valkeyに保存: delivered:{event_id}:{session_id}
-            key = f"delivered:{event_id}:{sid}"
-            await redis.set(key, now, ex=3600)  # 1時間で自動削除
-
-        return delivered_map
+        question_id = (payload.get("data") or {}).get("question_id")
+        if not question_id:
+            await self.broadcast(event_id, payload)
+            return {}
+        self._current_question[event_id] = question_id
+        async with self._pool.timed():
+            text = await self._append_log(event_id, payload)
+            redis = await self._get_redis()
+            await redis.publish(f"event:{event_id}", f"{_QUESTION_PREFIX}{question_id}\n{text}")
+        return {}
 
     # ── delivered_at 管理 ──────────────────────────────
 
-    async def get_delivered_at(self, event_id: str, session_id: str) -> str | None:
-        """Valkeyからdelivered_atを取得。"""
+    async def record_delivered(
+        self,
+        event_id: str,
+        question_id: str,
+        delivered: dict[str, str],
+    ) -> None:
+        """delivered_at をまとめて書き込む（HSET + EXPIRE を1往復）。"""
+        if not delivered:
+            return
+        redis = await self._get_redis()
+        key = delivered_key(event_id, question_id)
+        pipe = redis.pipeline(transaction=False)
+        pipe.hset(key, mapping=delivered)
+        pipe.expire(key, self.delivered_ttl_sec)
+        await pipe.execute()
+
+    async def get_delivered_at(
+        self,
+        event_id: str,
+        session_id: str,
+        question_id: str | None = None,
+    ) -> str | None:
+        """Valkeyからdelivered_atを取得（同時の問い合わせは HMGET 1回にまとめる）。"""
+        question_id = question_id or self._current_question.get(event_id)
+        if not question_id:
+            return None
+        return await self._lookups.get(delivered_key(event_id, question_id), session_id)
+
+    async def get_delivered_at_many(
+        self,
+        event_id: str,
+        question_id: str,
+        session_ids: list[str],
+    ) -> dict[str, str | None]:
         redis = await self._get_redis()
-        key = f"delivered:{event_id}:{session_id}"
-        value = await redis.get(key)
-        return value
+        values = await redis.hmget(delivered_key(event_id, question_id), session_ids)
+        return dict(zip(session_ids, values))
 
     async def clear_delivered_at(self, event_id: str) -> None:
-        """イベントのdelivered_atを全削除。"""
+        """イベントのdelivered_atを全削除（問題ごとのハッシュを1コマンドで削除）。"""
         redis = await self._get_redis()
-        # パターンマッチで削除
-        pattern = f"delivered:{event_id}:*"
-        async for key in redis.scan_iter(match=pattern):
-            await redis.delete(key)
+        keys = [k async for k in redis.scan_iter(match=f"delivered:{event_id}:*", count=1000)]
+        if keys:
+            await redis.unlink(*keys)
+        self._current_question.pop(event_id, None)
+
+    # ── 計測 ───────────────────────────────────────────
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "connections": sum(len(c) for c in self._connections.values()),
+            "subscribed_events": len(self._subscribed),
+            "forwarded": self.forwarded,
+            "dropped_no_local": self.dropped_no_local,
+            "resumed": self.resumed,
+            "resynced": self.resynced,
+            **self.fanout.stats(),
+        }
 
 
 # グローバルインスタンス（main.pyで初期化）
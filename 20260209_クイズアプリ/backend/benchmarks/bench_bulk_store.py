@@ -0,0 +1,114 @@
+"""問題バンクの並び替え・出題リスト登録のベンチマーク（in-memory SQLite）。
+
+旧: reorder は session.get + 属性更新を1問ずつ（N SELECT + N UPDATE）、
+    set_event_questions は EventQuestion を1件ずつ session.add
+新: UPDATE / INSERT を1文の executemany で発行（SQLiteQuestionStore / SQLiteEventStore）
+
+実行: cd backend && python -m benchmarks.bench_bulk_store --sizes 10,100,1000,10000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import delete, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+import app.models  # noqa: F401 — メタデータに全モデル登録
+from app.database import Base
+from app.models.event import Event, EventQuestion
+from app.models.question import Question
+from app.store.sqlite_store import SQLiteEventStore, SQLiteQuestionStore
+
+
+async def _legacy_reorder(session: AsyncSession, ordered_ids: list[str]) -> None:
+    for i, qid in enumerate(ordered_ids):
+        question = await session.get(Question, qid)
+        if question:
+            question.sort_order = i
+    await session.flush()
+
+
+async def _legacy_set_event_questions(
+    session: AsyncSession,
+    event_id: str,
+    question_ids: list[str],
+) -> None:
+    await session.execute(delete(EventQuestion).where(EventQuestion.event_id == event_id))
+    for i, qid in enumerate(question_ids):
+        session.add(EventQuestion(event_id=event_id, question_id=qid, sort_order=i))
+    await session.flush()
+
+
+async def _setup(size: int):
+    engine = create_async_engine("sqlite+aiosqlite://", echo=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    now = datetime.now(timezone.utc).isoformat()
+    ids = [f"q{i:05d}" for i in range(size)]
+    async with factory() as session:
+        session.add(Event(id="bench", title="bench", join_code="000000", created_at=now))
+        session.add_all(
+            Question(
+                id=qid, question_text=qid, question_image_path=None,
+                correct_choice_index=0, sort_order=i, created_at=now, updated_at=now,
+            )
+            for i, qid in enumerate(ids)
+        )
+        await session.commit()
+    return engine, factory, ids
+
+
+def _count_statements(engine) -> list[int]:
+    counter = [0]
+
+    def _on_execute(*_args):
+        counter[0] += 1
+
+    event.listen(engine.sync_engine, "before_cursor_execute", _on_execute)
+    return counter
+
+
+async def bench(size: int) -> list[tuple[str, str, float, int]]:
+    rows: list[tuple[str, str, float, int]] = []
+    engine, factory, ids = await _setup(size)
+    counter = _count_statements(engine)
+    shuffled = ids[:]
+    random.Random(size).shuffle(shuffled)
+
+    cases = [
+        ("reorder", "old", lambda s: _legacy_reorder(s, shuffled)),
+        ("reorder", "new", lambda s: SQLiteQuestionStore(s).reorder(shuffled)),
+        ("set_event_questions", "old", lambda s: _legacy_set_event_questions(s, "bench", shuffled)),
+        ("set_event_questions", "new", lambda s: SQLiteEventStore(s).set_event_questions("bench", shuffled)),
+    ]
+    for op, impl, fn in cases:
+        # 各回とも新しいセッション（identity map が空の状態）で測る
+        async with factory() as session:
+            counter[0] = 0
+            t = time.perf_counter()
+            await fn(session)
+            await session.commit()
+            rows.append((op, impl, time.perf_counter() - t, counter[0]))
+    await engine.dispose()
+    return rows
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10,100,1000,10000")
+    args = parser.parse_args()
+
+    print(f"{'size':>6}  {'operation':<20}{'impl':<5}{'ms':>10}{'statements':>12}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        for op, impl, elapsed, stmts in await bench(size):
+            print(f"{size:>6}  {op:<20}{impl:<5}{elapsed * 1000:>10.1f}{stmts:>12}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,94 @@
+"""delivered_at の保存レイアウト比較ベンチマーク（fakeredis 使用）。
+
+旧: delivered:{event_id}:{session_id} を1キーずつ SET / GET / SCAN+DELETE
+新: delivered:{event_id}:{question_id} のハッシュに HSET 1回、HMGET 1回、UNLINK 1回
+
+fakeredis はネットワーク往復がないため、実測時間に加えて往復回数と
+--rtt-ms を掛けた推定時間も表示する。
+
+実行: cd backend && python -m benchmarks.bench_delivered_at --sessions 1000 --rtt-ms 0.5
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from datetime import datetime, timezone
+
+import fakeredis
+
+from app.ws.valkey_manager import ValkeyConnectionManager, delivered_key
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+async def bench_old(redis, sids: list[str]) -> dict[str, tuple[float, int]]:
+    out: dict[str, tuple[float, int]] = {}
+
+    t = time.perf_counter()
+    now = _now_iso()
+    for sid in sids:
+        await redis.set(f"delivered:e1:{sid}", now, ex=3600)
+    out["write"] = (time.perf_counter() - t, len(sids))
+
+    t = time.perf_counter()
+    for sid in sids:
+        await redis.get(f"delivered:e1:{sid}")
+    out["lookup"] = (time.perf_counter() - t, len(sids))
+
+    t = time.perf_counter()
+    trips = 0
+    async for key in redis.scan_iter(match="delivered:e1:*"):
+        await redis.delete(key)
+        trips += 1
+    # SCAN 自体の往復（既定 COUNT=10）
+    trips += max(1, len(sids) // 10)
+    out["clear"] = (time.perf_counter() - t, trips)
+    return out
+
+
+async def bench_new(redis, sids: list[str]) -> dict[str, tuple[float, int]]:
+    mgr = ValkeyConnectionManager("redis://fake", redis=redis)
+    out: dict[str, tuple[float, int]] = {}
+
+    t = time.perf_counter()
+    now = _now_iso()
+    await mgr.record_delivered("e1", "q1", {sid: now for sid in sids})
+    out["write"] = (time.perf_counter() - t, 1)
+
+    t = time.perf_counter()
+    before = mgr._lookups.round_trips
+    await asyncio.gather(*[mgr.get_delivered_at("e1", sid, "q1") for sid in sids])
+    out["lookup"] = (time.perf_counter() - t, mgr._lookups.round_trips - before)
+
+    t = time.perf_counter()
+    await mgr.clear_delivered_at("e1")
+    out["clear"] = (time.perf_counter() - t, 2)
+    assert not await redis.exists(delivered_key("e1", "q1"))
+    return out
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--rtt-ms", type=float, default=0.5, help="想定する Valkey 往復時間")
+    args = parser.parse_args()
+
+    sids = [f"sess{i:05d}" for i in range(args.sessions)]
+    old = await bench_old(fakeredis.FakeAsyncRedis(decode_responses=True), sids)
+    new = await bench_new(fakeredis.FakeAsyncRedis(decode_responses=True), sids)
+
+    print(f"sessions={args.sessions} rtt={args.rtt_ms}ms")
+    print(f"{'phase':<8}{'layout':<6}{'measured_ms':>13}{'round_trips':>13}{'est_ms':>10}")
+    for phase in ("write", "lookup", "clear"):
+        for name, res in (("old", old), ("new", new)):
+            sec, trips = res[phase]
+            est = sec * 1000 + trips * args.rtt_ms
+            print(f"{phase:<8}{name:<6}{sec * 1000:>13.2f}{trips:>13}{est:>10.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
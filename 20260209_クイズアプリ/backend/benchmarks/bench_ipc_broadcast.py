@@ -0,0 +1,136 @@
+"""複数ワーカー（IPC バス）でのブロードキャスト遅延ベンチマーク。
+
+--sockets 本の接続を N 個のワーカープロセスに均等に分け、親プロセス（ブローカー）から
+ブロードキャストして「最後の接続への送信が終わるまで」の時間を測る。
+N = 1, 2, 4, 8 で比較する。
+
+1ソケットあたりの送信コスト（WebSocket のフレーミング・システムコール相当）は
+--send-cost-us の CPU 時間で模擬する。ワーカーを増やすとこの部分が並列になり、
+代わりにバスの中継（ブローカー → 各ワーカー）が1段増える。
+時刻は全プロセス共通の time.monotonic() で比較する。
+
+実行: cd backend && python -m benchmarks.bench_ipc_broadcast --sockets 2000 --rounds 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import multiprocessing as mp
+import os
+import statistics
+import tempfile
+import time
+
+from app.ws.ipc_manager import IPCConnectionManager
+
+
+class _BenchSocket:
+    """送信ごとに CPU を消費し、メッセージごとの最後の送信時刻を記録する。"""
+
+    def __init__(self, cost_sec: float, on_sent) -> None:
+        self.cost_sec = cost_sec
+        self.on_sent = on_sent
+
+    async def accept(self) -> None:
+        pass
+
+    async def send_text(self, text: str) -> None:
+        end = time.perf_counter() + self.cost_sec
+        while time.perf_counter() < end:
+            pass
+        self.on_sent(text)
+
+    async def send_bytes(self, data: bytes) -> None:
+        await self.send_text(data)  # type: ignore[arg-type]
+
+    async def close(self, code: int = 1000) -> None:
+        pass
+
+
+def _worker(path: str, n_sockets: int, cost_sec: float, ready, results) -> None:
+    asyncio.run(_worker_main(path, n_sockets, cost_sec, ready, results))
+
+
+async def _worker_main(path: str, n_sockets: int, cost_sec: float, ready, results) -> None:
+    mgr = IPCConnectionManager(path, queue_size=1024)
+    await mgr.start()
+    remaining: dict[str, int] = {}
+    done = asyncio.Event()
+
+    def on_sent(text: str) -> None:
+        if '"bench.stop"' in text:
+            done.set()
+            return
+        left = remaining.get(text, n_sockets) - 1
+        if left == 0:
+            remaining.pop(text, None)
+            results.put(time.monotonic())
+        else:
+            remaining[text] = left
+
+    for i in range(n_sockets):
+        await mgr.connect("bench", f"{os.getpid()}-{i}", _BenchSocket(cost_sec, on_sent))
+    ready.put(os.getpid())
+    await done.wait()
+    await mgr.stop()
+
+
+async def run(n_workers: int, n_sockets: int, rounds: int, cost_us: float) -> dict[str, float]:
+    ctx = mp.get_context("spawn")
+    ready, results = ctx.Queue(), ctx.Queue()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "ws.sock")
+        publisher = IPCConnectionManager(path)
+        await publisher.start()  # 先に起動してブローカーになる
+        per_worker = n_sockets // n_workers
+        procs = [
+            ctx.Process(target=_worker, args=(path, per_worker, cost_us / 1e6, ready, results))
+            for _ in range(n_workers)
+        ]
+        for p in procs:
+            p.start()
+        loop = asyncio.get_running_loop()
+        for _ in procs:
+            await loop.run_in_executor(None, ready.get)
+
+        latencies = []
+        for i in range(rounds):
+            start = time.monotonic()
+            await publisher.broadcast("bench", {"type": "bench", "data": {"i": i}})
+            finished = [await loop.run_in_executor(None, results.get) for _ in procs]
+            latencies.append(max(finished) - start)
+            await asyncio.sleep(0.01)
+
+        await publisher.broadcast("bench", {"type": "bench.stop"})
+        for p in procs:
+            await loop.run_in_executor(None, p.join)
+        await publisher.stop()
+
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        "max_ms": latencies[-1] * 1000,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sockets", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--send-cost-us", type=float, default=20.0)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    print(f"sockets={args.sockets} rounds={args.rounds} send_cost={args.send_cost_us}us cpus={os.cpu_count()}")
+    if (os.cpu_count() or 1) < max(args.workers):
+        print("warning: fewer CPUs than workers; the send cost cannot run in parallel")
+    print(f"{'workers':>8} {'p50 ms':>10} {'p99 ms':>10} {'max ms':>10}")
+    for n in args.workers:
+        r = await run(n, args.sockets, args.rounds, args.send_cost_us)
+        print(f"{n:>8} {r['p50_ms']:>10.2f} {r['p99_ms']:>10.2f} {r['max_ms']:>10.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,158 @@
+"""SQLite 実行時プロファイル（WAL + 単一 writer）の有無による回答スループット比較。
+
+一時ファイルの SQLite に demo イベントを用意し、N 人の参加者が同時に
+AnswerService.submit を呼ぶ（1回答 = 1セッション = 1 COMMIT、本番の1リクエストと同じ）。
+同時に参加者の状態取得に相当する読み取りも流す。
+
+  baseline: rollback journal・busy_timeout なし（pysqlite 既定の 5 秒待ち）・接続プールのみ
+  tuned:    WAL / synchronous=NORMAL / busy_timeout / mmap / cache + 単一 writer 接続
+
+実行: cd backend && python -m benchmarks.bench_sqlite_profile --participants 500 --concurrency 100
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+from fastapi import HTTPException
+
+import app.models  # noqa: F401 — メタデータに全モデル登録
+from app.database import Base, create_engines, create_session_factory
+from app.metrics import percentiles
+from app.models.user import EventSession, EventUser
+from app.seed import seed_all
+from app.services.answer_service import AnswerService
+from app.services.event_service import EventService
+from app.services.event_state import event_state_cache
+from app.store import stores_for
+from app.ws.manager import ConnectionManager
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+async def _prepare(factory, participants: int) -> tuple[str, list[str]]:
+    ws = ConnectionManager()
+    async with factory() as session:
+        await seed_all(session)
+        await session.commit()
+    async with factory() as session:
+        stores = stores_for(session)
+        svc = EventService(
+            stores.event(session), stores.question(session), stores.user(session),
+            stores.answer(session), ws,
+        )
+        await svc.start("demo")
+        qid = (await svc.next_question("demo")).question_id
+        # 締切で弾かれないよう十分先に延ばす
+        await stores.event(session).update("demo", current_deadline_at="2999-01-01T00:00:00+00:00")
+        sids = []
+        for i in range(participants):
+            sid, uid = uuid.uuid4().hex, uuid.uuid4().hex
+            session.add(EventSession(id=sid, event_id="demo", user_id=uid, created_at=_now_iso()))
+            session.add(EventUser(
+                id=uid, event_id="demo", session_id=sid, display_name=f"p{i}",
+                display_suffix=f"{i:05d}", joined_at=_now_iso(),
+            ))
+            sids.append(sid)
+        await session.commit()
+    await event_state_cache.invalidate("demo")
+    return qid, sids
+
+
+async def run(tuned: bool, participants: int, concurrency: int, readers: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite+aiosqlite:///{Path(tmp) / 'quiz.db'}"
+        reader, writer = create_engines(url, sqlite_tuning=tuned)
+        async with (writer or reader).begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = create_session_factory(reader, writer)
+        qid, sids = await _prepare(factory, participants)
+
+        ws = ConnectionManager()
+        sem = asyncio.Semaphore(concurrency)
+        latencies: list[float] = []
+        errors: dict[str, int] = {}
+        done = asyncio.Event()
+
+        async def _answer(sid: str) -> None:
+            async with sem:
+                t = time.perf_counter()
+                try:
+                    async with factory() as session:
+                        stores = stores_for(session)
+                        svc = AnswerService(
+                            stores.answer(session), stores.event(session),
+                            stores.question(session), stores.user(session), ws,
+                        )
+                        await svc.submit("demo", qid, sid, random.randrange(4))
+                        await session.commit()
+                except HTTPException as e:
+                    errors[f"http_{e.status_code}"] = errors.get(f"http_{e.status_code}", 0) + 1
+                    return
+                except Exception as e:
+                    key = "locked" if "locked" in str(e) else type(e).__name__
+                    errors[key] = errors.get(key, 0) + 1
+                    return
+                latencies.append(time.perf_counter() - t)
+
+        reads = 0
+
+        async def _reader() -> None:
+            # 参加者の状態取得（セッション参照）に相当する読み取り
+            nonlocal reads
+            while not done.is_set():
+                async with factory() as session:
+                    await stores_for(session).user(session).get_session(random.choice(sids))
+                reads += 1
+                await asyncio.sleep(0)
+
+        reader_tasks = [asyncio.create_task(_reader()) for _ in range(readers)]
+        t = time.perf_counter()
+        await asyncio.gather(*[_answer(sid) for sid in sids])
+        elapsed = time.perf_counter() - t
+        done.set()
+        await asyncio.gather(*reader_tasks)
+
+        await reader.dispose()
+        if writer is not None:
+            await writer.dispose()
+        event_state_cache.clear()
+        return {
+            "ok": len(latencies),
+            "elapsed": elapsed,
+            "throughput": len(latencies) / elapsed,
+            "reads": reads,
+            "errors": errors,
+            **percentiles(latencies),
+        }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--participants", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--readers", type=int, default=4, help="並行して読み取りを流すタスク数")
+    args = parser.parse_args()
+
+    print(f"participants={args.participants} concurrency={args.concurrency} readers={args.readers}")
+    print(f"{'profile':<10}{'ok':>6}{'ans/s':>9}{'p50_ms':>9}{'p95_ms':>9}{'p99_ms':>9}{'reads':>8}  errors")
+    for name, tuned in (("baseline", False), ("tuned", True)):
+        r = await run(tuned, args.participants, args.concurrency, args.readers)
+        print(
+            f"{name:<10}{r['ok']:>6}{r['throughput']:>9.1f}"
+            f"{r.get('p50_ms', 0):>9.1f}{r.get('p95_ms', 0):>9.1f}{r.get('p99_ms', 0):>9.1f}"
+            f"{r['reads']:>8}  {r['errors'] or '-'}",
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
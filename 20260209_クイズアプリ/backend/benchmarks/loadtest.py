@@ -0,0 +1,296 @@
+"""ライブクイズ1回分を再現する負荷試験ハーネス。
+
+N 人の参加者が join → register → WebSocket 接続を行い、question.shown を受けたら
+締切内にランダムな時刻で回答する。管理者は start / next / close / reveal / finish を進める。
+本番と同じルーター（events / admin / ws）を HTTP・WebSocket 越しに叩く。
+
+計測項目:
+  - answer:    回答 POST のレイテンシ
+  - broadcast: question.shown の started_at から受信までの時間（同一ホスト前提）
+  - results:   ランキング取得のレイテンシ
+  - db:        サーバ側の書き込み文・COMMIT 所要時間（/api/health の db 欄）
+
+実行例:
+  cd backend
+  # 一時 SQLite でサーバを起動して計測
+  python -m benchmarks.loadtest --participants 200
+  # 任意の DB で起動
+  python -m benchmarks.loadtest --participants 500 --database-url postgresql+asyncpg://...
+  # 起動済みのサーバに対して計測
+  python -m benchmarks.loadtest --url http://localhost:8000 --participants 100
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+import websockets
+
+from app.metrics import percentiles
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+@dataclass
+class Report:
+    answer: list[float] = field(default_factory=list)
+    broadcast: list[float] = field(default_factory=list)
+    results: list[float] = field(default_factory=list)
+    join: list[float] = field(default_factory=list)
+    status: dict[str, int] = field(default_factory=dict)
+    server: dict = field(default_factory=dict)  # 終了時の /api/health
+
+    def count(self, key: str) -> None:
+        self.status[key] = self.status.get(key, 0) + 1
+
+
+# ── サーバ起動 ───────────────────────────────────────
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@asynccontextmanager
+async def spawn_server(database_url: str | None, admin_password: str, workers: int):
+    """uvicorn をサブプロセスで起動し、ベース URL を返す。"""
+    port = _free_port()
+    tmpdir = None
+    if database_url is None:
+        tmpdir = tempfile.TemporaryDirectory(prefix="quiz-loadtest-")
+        database_url = f"sqlite+aiosqlite:///{tmpdir.name}/quiz.db"
+    env = {
+        **os.environ,
+        "DATABASE_URL": database_url,
+        "ADMIN_PASSWORD": admin_password,
+    }
+    proc = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(workers), "--log-level", "warning",
+        ],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        async with httpx.AsyncClient() as client:
+            for _ in range(100):
+                try:
+                    if (await client.get(f"{base_url}/api/health")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError("server did not start")
+        yield base_url
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+        if tmpdir is not None:
+            tmpdir.cleanup()
+
+
+# ── 参加者 ───────────────────────────────────────────
+
+
+class Participant:
+    def __init__(self, base_url: str, event_id: str, report: Report, answer_window: float) -> None:
+        self.base_url = base_url
+        self.event_id = event_id
+        self.report = report
+        self.answer_window = answer_window
+        self.http = httpx.AsyncClient(base_url=base_url, timeout=30)
+        self.ws = None
+        self.answered: set[str] = set()
+        self._tasks: set[asyncio.Task] = set()
+
+    async def join(self, join_code: str, name: str) -> None:
+        t = time.perf_counter()
+        r = await self.http.post(f"/api/events/{self.event_id}/join", json={"join_code": join_code})
+        r.raise_for_status()
+        r = await self.http.post(
+            f"/api/events/{self.event_id}/users/register",
+            json={"display_name_base": name},
+        )
+        r.raise_for_status()
+        ws_url = self.base_url.replace("http", "ws", 1) + f"/api/ws?event_id={self.event_id}"
+        sid = self.http.cookies.get("session_id")
+        self.ws = await websockets.connect(
+            ws_url,
+            additional_headers={"Cookie": f"session_id={sid}"},
+            max_queue=None,
+        )
+        self.report.join.append(time.perf_counter() - t)
+
+    async def listen(self) -> None:
+        try:
+            async for raw in self.ws:
+                received = datetime.now(timezone.utc)
+                try:
+                    msg = json.loads(raw)
+                except (TypeError, ValueError):
+                    continue
+                if msg.get("type") != "question.shown":
+                    continue
+                data = msg["data"]
+                started = datetime.fromisoformat(data["started_at"])
+                self.report.broadcast.append((received - started).total_seconds())
+                deadline = datetime.fromisoformat(data["deadline_at"])
+                window = (deadline - received).total_seconds() * self.answer_window
+                task = asyncio.create_task(self._answer(data["question_id"], max(0.0, window)))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        except websockets.ConnectionClosed:
+            self.report.count("ws_closed")
+
+    async def _answer(self, question_id: str, window: float) -> None:
+        await asyncio.sleep(random.uniform(0, window))
+        t = time.perf_counter()
+        try:
+            r = await self.http.post(
+                f"/api/events/{self.event_id}/questions/{question_id}/answers",
+                json={"choice_index": random.randrange(4)},
+            )
+        except httpx.HTTPError as e:
+            self.report.count(f"answer_error:{type(e).__name__}")
+            return
+        self.report.answer.append(time.perf_counter() - t)
+        self.report.count(f"answer_{r.status_code}")
+        self.answered.add(question_id)
+
+    async def fetch_results(self) -> None:
+        t = time.perf_counter()
+        r = await self.http.get(f"/api/events/{self.event_id}/results", params={"limit": 10})
+        self.report.results.append(time.perf_counter() - t)
+        self.report.count(f"results_{r.status_code}")
+
+    async def close(self) -> None:
+        if self.ws is not None:
+            await self.ws.close()
+        await self.http.aclose()
+
+
+# ── シナリオ ─────────────────────────────────────────
+
+
+async def run(args: argparse.Namespace, base_url: str) -> Report:
+    report = Report()
+    event_id = args.event
+    admin = httpx.AsyncClient(base_url=base_url, timeout=60)
+    r = await admin.post("/api/admin/login", json={"password": args.admin_password})
+    r.raise_for_status()
+    await admin.post(f"/api/admin/events/{event_id}/reset")
+
+    participants = [
+        Participant(base_url, event_id, report, args.answer_window)
+        for _ in range(args.participants)
+    ]
+    sem = asyncio.Semaphore(args.ramp_concurrency)
+
+    async def _join(i: int, p: Participant) -> None:
+        async with sem:
+            await p.join(args.join_code, f"load{i}")
+
+    t = time.perf_counter()
+    await asyncio.gather(*[_join(i, p) for i, p in enumerate(participants)])
+    print(f"joined {len(participants)} participants in {time.perf_counter() - t:.1f}s")
+    listeners = [asyncio.create_task(p.listen()) for p in participants]
+
+    (await admin.post(f"/api/admin/events/{event_id}/start")).raise_for_status()
+    for n in range(args.questions):
+        r = await admin.post(f"/api/admin/events/{event_id}/questions/next")
+        r.raise_for_status()
+        body = r.json()
+        qid = body.get("question_id")
+        if not qid:
+            break  # 全問終了
+        deadline = datetime.fromisoformat(body["deadline_at"])
+        # 全員回答するか締切まで待つ
+        while datetime.now(timezone.utc) < deadline:
+            if all(qid in p.answered for p in participants):
+                break
+            await asyncio.sleep(0.05)
+        await admin.post(f"/api/admin/events/{event_id}/questions/{qid}/close")
+        await admin.post(f"/api/admin/events/{event_id}/questions/{qid}/reveal")
+        print(f"question {n + 1} ({qid}): {sum(qid in p.answered for p in participants)} answers")
+    await admin.post(f"/api/admin/events/{event_id}/finish")
+
+    await asyncio.gather(*[p.fetch_results() for p in participants])
+
+    report.server = (await admin.get("/api/health")).json()
+
+    for p in participants:
+        await p.close()
+    for task in listeners:
+        task.cancel()
+    await admin.aclose()
+    return report
+
+
+def print_report(report: Report) -> None:
+    print()
+    print(f"{'metric':<12}{'n':>7}{'p50_ms':>10}{'p95_ms':>10}{'p99_ms':>10}{'max_ms':>10}")
+    for name in ("join", "answer", "broadcast", "results"):
+        samples = getattr(report, name)
+        p = percentiles(samples)
+        print(
+            f"{name:<12}{len(samples):>7}"
+            + "".join(f"{p.get(k, 0):>10.1f}" for k in ("p50_ms", "p95_ms", "p99_ms", "max_ms")),
+        )
+    server = report.server
+    db = server.get("db", {})
+    for name in ("write_latency", "commit_latency"):
+        p = db.get(name, {})
+        print(
+            f"db.{name.split('_')[0]:<9}{p.get('count', 0):>7}"
+            + "".join(f"{p.get(k, 0):>10.1f}" for k in ("p50_ms", "p95_ms", "p99_ms", "max_ms")),
+        )
+    print()
+    print("status:", dict(sorted(report.status.items())))
+    print("db locked errors:", db.get("locked_errors"))
+    print("ws evicted:", server.get("ws", {}).get("evicted"))
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--participants", type=int, default=100)
+    parser.add_argument("--questions", type=int, default=3)
+    parser.add_argument("--url", help="起動済みサーバのベース URL（省略時はサブプロセスで起動）")
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--event", default="demo")
+    parser.add_argument("--join-code", default="123456")
+    parser.add_argument("--admin-password", default=os.getenv("ADMIN_PASSWORD", "secret"))
+    parser.add_argument("--answer-window", type=float, default=0.5, help="締切までの何割の時間内に回答するか")
+    parser.add_argument("--ramp-concurrency", type=int, default=50, help="同時に参加処理を行う人数")
+    args = parser.parse_args()
+
+    if args.url:
+        report = await run(args, args.url)
+    else:
+        async with spawn_server(args.database_url, args.admin_password, args.workers) as url:
+            report = await run(args, url)
+    print_report(report)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+"""管理者セッションの検証キャッシュ・失効通知と共有 Valkey プールのテスト。"""
+
+from __future__ import annotations
+
+import asyncio
+
+import fakeredis
+import pytest
+from httpx import AsyncClient
+
+from app.services.admin_sessions import AdminSessionStore
+from app.valkey import ValkeyPool
+from tests.conftest import admin_login
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+async def _wait_for(cond, timeout: float = 2.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not cond():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("timeout")
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_verification_is_cached_locally():
+    redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    pool = ValkeyPool("redis://fake", redis=redis)
+    clock = _Clock()
+    store = AdminSessionStore(pool, cache_ttl_sec=5, clock=clock)
+
+    await redis.set("admin_session:t1", "2026-01-01T00:00:00+00:00")
+    for _ in range(10):
+        assert await store.get("t1") == "2026-01-01T00:00:00+00:00"
+    assert (store.misses, store.hits) == (1, 9)
+    assert pool.latency.count == 1
+
+    # Valkey 側で消えてもキャッシュ期限までは有効、期限後は読み直す
+    await redis.delete("admin_session:t1")
+    assert await store.get("t1") is not None
+    clock.now = 5.1
+    assert await store.get("t1") is None
+    assert await store.get("unknown") is None
+    assert store.stats()["cached"] == 0
+
+
+@pytest.mark.asyncio
+async def test_logout_invalidates_other_tasks_immediately():
+    redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    a = AdminSessionStore(ValkeyPool("redis://fake", redis=redis), cache_ttl_sec=60)
+    b = AdminSessionStore(ValkeyPool("redis://fake", redis=redis), cache_ttl_sec=60)
+    await b.start()
+    try:
+        await a.create("t1", "ts")
+        assert await b.get("t1") == "ts"
+        assert await b.get("t1") == "ts"  # キャッシュから
+        assert b.hits == 1
+
+        await a.delete("t1")
+        await _wait_for(lambda: b.revoked == 1)
+        assert await b.get("t1") is None
+        assert await redis.exists("admin_session:t1") == 0
+    finally:
+        await b.stop()
+
+
+@pytest.mark.asyncio
+async def test_in_memory_fallback_without_valkey():
+    store = AdminSessionStore(ValkeyPool(None))
+    await store.create("t1", "ts")
+    assert await store.get("t1") == "ts"
+    await store.delete("t1")
+    assert await store.get("t1") is None
+    await store.start()  # REDIS_URL がなければ購読しない
+    assert store._listener is None
+
+
+@pytest.mark.asyncio
+async def test_admin_logout_endpoint(client: AsyncClient):
+    await admin_login(client)
+    assert (await client.get("/api/admin/verify")).status_code == 200
+    r = await client.post("/api/admin/logout")
+    assert r.status_code == 200
+    assert (await client.get("/api/admin/verify")).status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_health_reports_valkey_and_admin_sessions(client: AsyncClient):
+    r = await client.get("/api/health")
+    data = r.json()
+    assert data["valkey"] == {"configured": False}
+    assert set(data["admin_sessions"]) == {"cached", "hits", "misses", "revoked"}
+
+
+@pytest.mark.asyncio
+async def test_pool_health_ping():
+    pool = ValkeyPool("redis://fake", redis=fakeredis.FakeAsyncRedis(decode_responses=True))
+    health = await pool.health()
+    assert health["configured"] is True and health["ok"] is True
+    assert health["latency"]["count"] == 1
@@ -0,0 +1,127 @@
+"""分析用アーカイブ（終了時の Parquet 書き出しとイベント横断の集計 API）のテスト。"""
+
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+import pytest
+from httpx import AsyncClient
+
+import app.services.analytics as analytics
+from app.services.analytics import ArchivedEvent, analytics_archive
+from tests.conftest import admin_login, join_and_register
+
+pytest.importorskip("duckdb")
+
+
+async def _join(client: AsyncClient, names: list[str]) -> list[str]:
+    """参加者を登録して session_id を返す（Cookie は1人分ずつ入れ替える）。"""
+    sessions = []
+    for name in names:
+        client.cookies.delete("session_id")
+        await join_and_register(client, display_name=name)
+        sessions.append(client.cookies["session_id"])
+    return sessions
+
+
+async def _answer(client: AsyncClient, session_id: str, question_id: str, choice: int) -> None:
+    client.cookies.set("session_id", session_id)
+    r = await client.post(
+        f"/api/events/demo/questions/{question_id}/answers", json={"choice_index": choice},
+    )
+    assert r.status_code == 200
+
+
+async def _play(client: AsyncClient, rounds: list[dict[int, int]]) -> None:
+    """rounds[i] = {参加者の番号: choice_index}。i 問目まで出題して終了する。"""
+    sessions = await _join(client, [f"u{i}" for i in range(3)])
+    await admin_login(client)
+    assert (await client.post("/api/admin/events/demo/start")).status_code == 200
+    for picks in rounds:
+        qid = (await client.post("/api/admin/events/demo/questions/next")).json()["question_id"]
+        for user, choice in picks.items():
+            await _answer(client, sessions[user], qid, choice)
+    assert (await client.post("/api/admin/events/demo/finish")).status_code == 200
+    await analytics_archive.wait_idle()
+
+
+@pytest.mark.asyncio
+async def test_finish_archives_results_and_survives_reset(client: AsyncClient):
+    # q1 の正解は 2。2 問目は1人だけ回答（他は離脱）
+    await _play(client, [{0: 2, 1: 0, 2: 2}, {0: 1}])
+    assert len(list((analytics_archive.root / "answers").glob("*.parquet"))) == 1
+    assert len(list((analytics_archive.root / "participants").glob("*.parquet"))) == 1
+
+    # 2 回目の finish では書き足さない
+    assert (await client.post("/api/admin/events/demo/finish")).status_code == 200
+    await analytics_archive.wait_idle()
+    assert analytics_archive.stats()["archived_runs"] == 1
+
+    retention = (await client.get("/api/admin/analytics/retention")).json()
+    assert [(p["position"], p["participants"], p["answered"]) for p in retention] == [
+        (1, 3, 3), (2, 3, 1), (3, 3, 0), (4, 3, 0), (5, 3, 0),
+    ]
+
+    # リセットで回答を消しても履歴は残り、次の回と合算される
+    assert (await client.post("/api/admin/events/demo/reset")).status_code == 200
+    await _play(client, [{0: 2}])
+    difficulty = (await client.get("/api/admin/analytics/questions/difficulty")).json()
+    q1 = next(row for row in difficulty if row["question_id"] == "q1")
+    assert (q1["events"], q1["answers"], q1["correct"], q1["correct_rate"]) == (2, 4, 3, 0.75)
+    assert [row["correct_rate"] for row in difficulty] == sorted(row["correct_rate"] for row in difficulty)
+
+    r = await client.get("/api/admin/analytics/questions/difficulty", params={"min_answers": 2})
+    assert [row["question_id"] for row in r.json()] == ["q1"]
+
+
+@pytest.mark.asyncio
+async def test_response_time_percentiles(client: AsyncClient):
+    await _play(client, [{0: 2, 1: 0, 2: 1}])
+    r = await client.get("/api/admin/analytics/questions/response-times", params={"event_id": "demo"})
+    assert r.status_code == 200
+    [row] = r.json()
+    assert row["question_id"] == "q1" and row["answers"] == 3
+    assert 0 <= row["p50_sec"] <= row["p90_sec"] <= row["p99_sec"]
+
+    r = await client.get("/api/admin/analytics/questions/response-times", params={"event_id": "other"})
+    assert r.json() == []
+
+
+@pytest.mark.asyncio
+async def test_analytics_requires_admin_and_handles_empty_archive(client: AsyncClient):
+    assert (await client.get("/api/admin/analytics/retention")).status_code == 401
+    await admin_login(client)
+    for path in ("questions/difficulty", "questions/response-times", "retention"):
+        r = await client.get(f"/api/admin/analytics/{path}")
+        assert r.status_code == 200 and r.json() == []
+
+
+@pytest.mark.asyncio
+async def test_without_duckdb_finish_still_works(client: AsyncClient, monkeypatch):
+    monkeypatch.setattr(analytics, "_duckdb", lambda: None)
+    await _play(client, [{0: 2}])
+    assert not analytics_archive.root.exists()
+    assert (await client.get("/api/admin/analytics/retention")).status_code == 503
+
+
+def test_build_dedupes_pending_and_stored_answers():
+    event = SimpleNamespace(id="e1", title="Quiz")
+    questions = [
+        SimpleNamespace(id="q1", question_text="first", correct_choice_index=0),
+        SimpleNamespace(id="q2", question_text="second", correct_choice_index=1),
+    ]
+    users = [SimpleNamespace(id="u1", joined_at="t0")]
+
+    def answer(qid: str, choice: int) -> SimpleNamespace:
+        return SimpleNamespace(
+            question_id=qid, user_id="u1", choice_index=choice, accepted=True,
+            is_correct=choice == 0, response_time_sec_1dp=1.5, submitted_at="t1",
+        )
+
+    archived = ArchivedEvent.build(
+        event, "2026-01-01T00:00:00+00:00", questions, users,
+        [answer("q2", 1), answer("q2", 1), answer("gone", 0), answer("q1", 0)],
+    )
+    assert [(a["question_id"], a["position"]) for a in archived.answers] == [("q2", 2), ("q1", 1)]
+    assert archived.participants[0]["num_questions"] == 2
+    assert archived.file_stem.startswith("20260101000000")
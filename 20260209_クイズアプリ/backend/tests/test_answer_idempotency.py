@@ -0,0 +1,147 @@
+"""回答提出の Idempotency-Key（再送の重複排除）のテスト。"""
+
+from __future__ import annotations
+
+import asyncio
+
+import fakeredis
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import event, text
+
+from app.schemas.answer import AnswerInfo, AnswerResponse
+from app.services.answer_idempotency import AnswerIdempotencyStore, answer_idempotency_store
+from app.valkey import ValkeyPool
+from tests.conftest import admin_login, join_and_register
+
+ANSWER_URL = "/api/events/demo/questions/q1/answers"
+
+
+async def _start_q1(client: AsyncClient) -> None:
+    await join_and_register(client)
+    await admin_login(client)
+    await client.post("/api/admin/events/demo/start")
+    r = await client.post("/api/admin/events/demo/questions/next")
+    assert r.json()["question_id"] == "q1"
+
+
+def _post(client: AsyncClient, choice: int, key: str | None):
+    headers = {"Idempotency-Key": key} if key else {}
+    return client.post(ANSWER_URL, json={"choice_index": choice}, headers=headers)
+
+
+def _response(choice: int) -> AnswerResponse:
+    return AnswerResponse(result="accepted", answer=AnswerInfo(
+        choice_index=choice, delivered_at="t0", submitted_at="t1", accepted=True,
+    ))
+
+
+@pytest.mark.asyncio
+async def test_retry_with_same_key_replays_without_db(client: AsyncClient, test_engine):
+    await _start_q1(client)
+    first = await _post(client, 2, "k1")
+    assert first.status_code == 200
+
+    statements: list[str] = []
+    event.listen(
+        test_engine.sync_engine, "before_cursor_execute",
+        lambda conn, cursor, statement, *a: statements.append(statement),
+    )
+    retry = await _post(client, 2, "k1")
+    assert retry.status_code == 200
+    assert retry.json() == first.json()
+    assert statements == []
+    assert answer_idempotency_store.stats()["replays"] == 1
+
+    # 別のキー・キーなしの再提出は従来どおり二重提出
+    assert (await _post(client, 1, "k2")).status_code == 409
+    assert (await _post(client, 1, None)).status_code == 409
+
+
+@pytest.mark.asyncio
+async def test_concurrent_retries_share_one_submission(client: AsyncClient):
+    await _start_q1(client)
+    responses = await asyncio.gather(*(_post(client, 2, "same") for _ in range(3)))
+    assert [r.status_code for r in responses] == [200, 200, 200]
+    assert len({r.text for r in responses}) == 1
+    assert answer_idempotency_store.stats()["stored"] == 1
+
+
+@pytest.mark.asyncio
+async def test_errors_are_not_stored_and_keys_are_per_session(client: AsyncClient):
+    await join_and_register(client)
+    # 出題前の提出（400）は保存しない → 同じキーの再送は改めて判定される
+    assert (await _post(client, 2, "k")).status_code == 400
+    await admin_login(client)
+    await client.post("/api/admin/events/demo/start")
+    await client.post("/api/admin/events/demo/questions/next")
+    mine = await _post(client, 2, "k")
+    assert mine.status_code == 200
+
+    # 他の参加者が同じキーを送っても自分の回答として判定される
+    client.cookies.delete("session_id")
+    await join_and_register(client, display_name="other")
+    other = await _post(client, 0, "k")
+    assert other.status_code == 200
+    assert other.json()["answer"]["choice_index"] == 0
+
+    assert (await _post(client, 0, "x" * 129)).status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_store_ttl_and_valkey_backend():
+    now = [0.0]
+    local = AnswerIdempotencyStore(ValkeyPool(None), ttl_sec=10, clock=lambda: now[0])
+    await local.put("s", _response(1))
+    assert (await local.get("s")).answer.choice_index == 1
+    now[0] = 11.0
+    assert await local.get("s") is None
+
+    redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    shared = AnswerIdempotencyStore(ValkeyPool(None, redis=redis), ttl_sec=30)
+    calls = []
+
+    async def submit() -> AnswerResponse:
+        calls.append(1)
+        return _response(3)
+
+    assert (await shared.run("s", submit)).answer.choice_index == 3
+    # 別タスク（別インスタンス）からの再送も Valkey の保存値を返す
+    other = AnswerIdempotencyStore(ValkeyPool(None, redis=redis), ttl_sec=30)
+    assert await other.run("s", submit) == _response(3)
+    assert len(calls) == 1
+    assert 0 < await redis.ttl("answer_idem:s") <= 30
+
+
+@pytest.mark.asyncio
+async def test_response_stored_only_after_commit(session_factory):
+    store = AnswerIdempotencyStore(ValkeyPool(None), ttl_sec=30)
+    calls = []
+
+    async def submit() -> AnswerResponse:
+        calls.append(1)
+        return _response(len(calls))
+
+    # ロールバックされた提出は保存せず、待っていた再送が判定し直す
+    async with session_factory() as session:
+        await session.execute(text("SELECT 1"))
+        assert (await store.run("s", submit, session=session)).answer.choice_index == 1
+        retry = asyncio.create_task(store.run("s", submit))
+        await asyncio.sleep(0.01)
+        assert not retry.done()
+        await session.rollback()
+    assert (await retry).answer.choice_index == 2
+
+    # コミットされるまでは保存しない（再送はコミットを待って同じ結果を受け取る）
+    async with session_factory() as session:
+        await session.execute(text("SELECT 1"))
+        assert (await store.run("t", submit, session=session)).answer.choice_index == 3
+        assert await store.get("t") is None
+        retry = asyncio.create_task(store.run("t", submit))
+        await asyncio.sleep(0.01)
+        assert not retry.done()
+        await session.commit()
+    assert (await retry).answer.choice_index == 3
+    assert (await store.get("t")).answer.choice_index == 3
+    assert len(calls) == 3
+    assert store.stats()["inflight"] == 0
@@ -0,0 +1,284 @@
+"""回答のライトビハインド取り込みのテスト。"""
+
+from __future__ import annotations
+
+import asyncio
+from functools import partial
+
+import fakeredis
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy import func, select
+
+from app.models.answer import Answer
+from app.services.answer_ingest import AnswerIngestor, answer_ingestor
+from app.services.answer_service import record_stored_answers
+from app.services.question_stats import question_stats_registry
+from app.store import store_classes, stores_for
+from app.valkey import ValkeyPool
+from app.ws.manager import ws_manager
+from tests.conftest import admin_login, join_and_register
+
+
+@pytest_asyncio.fixture
+async def ingestor(session_factory, test_engine):
+    # 自動フラッシュを待たずにテストから flush() を呼べるよう間隔を長めにする
+    answer_ingestor.flush_interval_sec = 60
+    await answer_ingestor.start(
+        session_factory, store_classes(test_engine.dialect.name).answer,
+        on_written=partial(record_stored_answers, ws_manager=ws_manager),
+    )
+    yield answer_ingestor
+    await answer_ingestor.stop()
+    answer_ingestor.flush_interval_sec = 0.005
+
+
+async def _count_answers(session_factory) -> int:
+    async with session_factory() as session:
+        return await session.scalar(select(func.count()).select_from(Answer))
+
+
+async def _start_and_next(client: AsyncClient) -> str:
+    await admin_login(client)
+    await client.post("/api/admin/events/demo/start")
+    r = await client.post("/api/admin/events/demo/questions/next")
+    return r.json()["question_id"]
+
+
+@pytest.mark.asyncio
+async def test_write_behind_accepts_then_flushes(client, session_factory, ingestor):
+    await join_and_register(client)
+    qid = await _start_and_next(client)
+
+    r = await client.post(
+        f"/api/events/demo/questions/{qid}/answers",
+        json={"choice_index": 2},
+    )
+    assert r.status_code == 200
+    assert r.json()["answer"]["is_correct"] is True
+    assert await _count_answers(session_factory) == 0
+
+    assert await ingestor.flush() == 1
+    assert await _count_answers(session_factory) == 1
+
+
+@pytest.mark.asyncio
+async def test_write_behind_duplicate_rejected(client, ingestor):
+    await join_and_register(client)
+    qid = await _start_and_next(client)
+
+    r1 = await client.post(
+        f"/api/events/demo/questions/{qid}/answers",
+        json={"choice_index": 1},
+    )
+    assert r1.status_code == 200
+    r2 = await client.post(
+        f"/api/events/demo/questions/{qid}/answers",
+        json={"choice_index": 2},
+    )
+    assert r2.status_code == 409
+
+    # 書き込み後に再起動相当（スナップショット破棄）でも DB から回答済みを復元する
+    await ingestor.flush()
+    ingestor.invalidate("demo")
+    r3 = await client.post(
+        f"/api/events/demo/questions/{qid}/answers",
+        json={"choice_index": 2},
+    )
+    assert r3.status_code == 409
+
+
+@pytest.mark.asyncio
+async def test_write_behind_read_your_writes(client, ingestor):
+    await join_and_register(client)
+    qid = await _start_and_next(client)
+    await client.post(
+        f"/api/events/demo/questions/{qid}/answers",
+        json={"choice_index": 2},
+    )
+
+    # 書き込み前でも自分の回答は読める
+    me = (await client.get("/api/events/demo/me/state")).json()
+    assert me["my_answer"]["choice_index"] == 2
+
+    # ランキングは書き込めてから反映する
+    results = (await client.get("/api/events/demo/results")).json()
+    assert results["leaderboard"][0]["correct_count"] == 0
+    await ingestor.flush()
+    results = (await client.get("/api/events/demo/results")).json()
+    assert results["leaderboard"][0]["correct_count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_write_behind_stop_flushes_pending(client, session_factory, ingestor):
+    await join_and_register(client)
+    qid = await _start_and_next(client)
+    await client.post(
+        f"/api/events/demo/questions/{qid}/answers",
+        json={"choice_index": 0},
+    )
+
+    await ingestor.stop()
+    assert not ingestor.running
+    assert await _count_answers(session_factory) == 1
+
+
+@pytest.mark.asyncio
+async def test_write_behind_closed_question_rejected(client, ingestor):
+    await join_and_register(client)
+    qid = await _start_and_next(client)
+    await client.post(f"/api/admin/events/demo/questions/{qid}/close")
+
+    # close 時刻 + 猶予2秒以内なので受理される
+    r = await client.post(
+        f"/api/events/demo/questions/{qid}/answers",
+        json={"choice_index": 2},
+    )
+    assert r.json()["result"] == "accepted"
+
+    r2 = await client.post(
+        "/api/events/demo/questions/q2/answers",
+        json={"choice_index": 0},
+    )
+    assert r2.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_skips_conflicts(client, session_factory, ingestor):
+    await join_and_register(client)
+    qid = await _start_and_next(client)
+    await client.post(
+        f"/api/events/demo/questions/{qid}/answers",
+        json={"choice_index": 2},
+    )
+    pending = list(ingestor.pending_for_event("demo"))
+    await ingestor.flush()
+
+    # 同じ (event, question, user) を別タスクが書いた場合を模擬
+    async with session_factory() as session:
+        dup = Answer(**{
+            c.name: getattr(pending[0], c.name) for c in Answer.__table__.columns
+        })
+        dup.id = "dup"
+        inserted = await stores_for(session).answer(session).bulk_create([dup])
+        await session.commit()
+    assert inserted == 0
+    assert await _count_answers(session_factory) == 1
+
+
+@pytest.mark.asyncio
+async def test_reset_discards_pending(client, session_factory, ingestor):
+    await join_and_register(client)
+    qid = await _start_and_next(client)
+    await client.post(
+        f"/api/events/demo/questions/{qid}/answers",
+        json={"choice_index": 2},
+    )
+    r = await client.post("/api/admin/events/demo/reset")
+    assert r.status_code == 200
+    assert ingestor.pending_for_event("demo") == []
+    await ingestor.flush()
+    assert await _count_answers(session_factory) == 0
+
+
+@pytest.mark.asyncio
+async def test_conflicting_answer_is_counted(client, session_factory, ingestor):
+    await join_and_register(client)
+    qid = await _start_and_next(client)
+    await client.post(
+        f"/api/events/demo/questions/{qid}/answers",
+        json={"choice_index": 2},
+    )
+    pending = ingestor.pending_for_event("demo")[0]
+
+    # 別タスクが同じユーザーの回答を先に書いた場合を模擬
+    async with session_factory() as session:
+        other = Answer(**{
+            c.name: getattr(pending, c.name) for c in Answer.__table__.columns
+        })
+        other.id = "other"
+        other.choice_index = 0
+        await stores_for(session).answer(session).bulk_create([other])
+        await session.commit()
+
+    await ingestor.flush()
+    assert ingestor.stats()["conflict_rows"] == 1
+    assert ingestor.stats()["flushed_rows"] == 0
+    assert ingestor.pending_for_event("demo") == []
+    # 書き込めなかった回答は回答分布に数えない
+    assert question_stats_registry.get("demo", qid).answered_count == 0
+
+
+@pytest.mark.asyncio
+async def test_failing_batch_is_split_after_retries(client, session_factory, ingestor, monkeypatch):
+    await join_and_register(client, display_name="alice")
+    qid = await _start_and_next(client)
+    await client.post(
+        f"/api/events/demo/questions/{qid}/answers",
+        json={"choice_index": 2},
+    )
+    client.cookies.clear()
+    await join_and_register(client, display_name="bob")
+    await client.post(
+        f"/api/events/demo/questions/{qid}/answers",
+        json={"choice_index": 1},
+    )
+    bad = ingestor.pending_for_event("demo")[0]
+    # 書き込むまでは回答分布に反映しない
+    assert question_stats_registry.get("demo", qid).answered_count == 0
+
+    store_cls = ingestor._store_factory
+
+    class BrokenStore(store_cls):
+        async def bulk_create(self, answers):
+            if any(a.id == bad.id for a in answers):
+                raise RuntimeError("broken row")
+            return await super().bulk_create(answers)
+
+    monkeypatch.setattr(ingestor, "_store_factory", BrokenStore)
+    ingestor.max_retries = 2
+    try:
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await ingestor.flush()
+        # 上限を超えたら1件ずつ書き、書けない行だけを捨てる
+        assert await ingestor.flush() == 2
+    finally:
+        ingestor.max_retries = 3
+    assert ingestor.pending_for_event("demo") == []
+    assert ingestor.stats()["dropped_rows"] == 1
+    assert await _count_answers(session_factory) == 1
+    assert question_stats_registry.get("demo", qid).answered_count == 1
+
+
+@pytest.mark.asyncio
+async def test_answered_set_is_pruned_on_next_question(client, ingestor):
+    await join_and_register(client)
+    q1 = await _start_and_next(client)
+    await client.post(
+        f"/api/events/demo/questions/{q1}/answers",
+        json={"choice_index": 2},
+    )
+    await client.post(f"/api/admin/events/demo/questions/{q1}/close")
+    r = await client.post("/api/admin/events/demo/questions/next")
+    q2 = r.json()["question_id"]
+    assert set(ingestor._answered) == {("demo", q2)}
+
+
+@pytest.mark.asyncio
+async def test_claim_is_shared_between_workers():
+    """2つのワーカー（ingestor）に同じユーザの回答が同時に届いても1回だけ受理する。"""
+    redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    pool = ValkeyPool(None, redis=redis)
+    workers = [AnswerIngestor(pool=pool), AnswerIngestor(pool=pool)]
+
+    results = await asyncio.gather(*[w.claim("demo", "q1", "u1") for w in workers])
+    assert sorted(results) == [False, True]
+    assert [await w.claim("demo", "q1", "u1") for w in workers] == [False, False]
+    assert await workers[0].claim("demo", "q1", "u2")
+
+    # リセットで共有の回答枠も消える
+    await workers[0].discard_event("demo")
+    assert await redis.exists("answer_claim:demo:q1:u1") == 0
+    assert await workers[0].claim("demo", "q1", "u1")
@@ -0,0 +1,130 @@
+"""監査ログの非同期書き込み・インデックス・カーソルページングのテスト。"""
+
+from __future__ import annotations
+
+import uuid
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func, inspect, select, text
+
+from app.database import _create_missing_indexes
+from app.models.admin import AdminAuditLog
+from app.services.audit_log import AuditLogWriter, audit_log_writer
+from app.store.sqlite_store import SQLiteAdminStore
+from tests.conftest import admin_login
+
+
+def _log(action: str, created_at: str, event_id: str | None = "demo") -> AdminAuditLog:
+    return AdminAuditLog(
+        id=uuid.uuid4().hex, action=action, event_id=event_id,
+        payload='{"n": 1}', created_at=created_at,
+    )
+
+
+async def _count(session_factory) -> int:
+    async with session_factory() as s:
+        return await s.scalar(select(func.count()).select_from(AdminAuditLog))
+
+
+@pytest.mark.asyncio
+async def test_writer_batches_in_background(session_factory):
+    writer = AuditLogWriter(flush_interval_sec=60, max_batch=4)
+    assert writer.enqueue(_log("start", "t0")) is False  # 未開始ならリクエスト内で書く
+
+    await writer.start(session_factory, SQLiteAdminStore)
+    try:
+        for i in range(10):
+            assert writer.enqueue(_log("next", f"t{i:02d}"))
+        assert await _count(session_factory) == 0  # まだ書いていない
+        assert await writer.flush() == 10
+        assert await _count(session_factory) == 10
+    finally:
+        await writer.stop()
+    assert writer.stats()["flushed_rows"] == 10
+
+
+@pytest.mark.asyncio
+async def test_writer_flushes_on_stop_and_bounds_queue(session_factory):
+    writer = AuditLogWriter(flush_interval_sec=60, max_queue=3)
+    await writer.start(session_factory, SQLiteAdminStore)
+    assert [writer.enqueue(_log("next", f"t{i}")) for i in range(4)] == [True, True, True, False]
+    assert writer.overflows == 1
+    await writer.stop()
+    assert await _count(session_factory) == 3
+
+
+@pytest.mark.asyncio
+async def test_admin_actions_do_not_write_in_request(client: AsyncClient, session_factory):
+    interval = audit_log_writer.flush_interval_sec
+    await audit_log_writer.start(session_factory, SQLiteAdminStore)
+    audit_log_writer.flush_interval_sec = 60  # 自動では書き出さない
+    try:
+        await admin_login(client)
+        assert (await client.post("/api/admin/events/demo/start")).status_code == 200
+        assert audit_log_writer.stats()["queued"] == 1
+        assert await _count(session_factory) == 0
+
+        # 閲覧時は書き出してから返す
+        logs = (await client.get("/api/admin/logs")).json()
+        assert [log["action"] for log in logs] == ["start"]
+        assert await _count(session_factory) == 1
+    finally:
+        await audit_log_writer.stop()
+        audit_log_writer.flush_interval_sec = interval
+
+
+@pytest.mark.asyncio
+async def test_logs_cursor_pagination_by_event(client: AsyncClient, session_factory):
+    async with session_factory() as s:
+        store = SQLiteAdminStore(s)
+        # 同じ時刻のログもカーソルで取りこぼさない
+        logs = [_log(f"a{i}", f"2026-01-01T00:00:{i // 2:02d}") for i in range(7)]
+        logs.append(_log("other", "2026-01-01T00:00:09", event_id="e2"))
+        await store.bulk_create_audit_logs(logs)
+        await s.commit()
+    await admin_login(client)
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 3, "event_id": "demo", **({"cursor": cursor} if cursor else {})}
+        r = await client.get("/api/admin/logs", params=params)
+        assert r.status_code == 200
+        seen += [log["action"] for log in r.json()]
+        cursor = r.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+    expected = sorted(logs[:7], key=lambda log: (log.created_at, log.id), reverse=True)
+    assert seen == [log.action for log in expected]
+
+    first = (await client.get("/api/admin/logs", params={"limit": 1})).json()
+    assert first == [{"ts": "2026-01-01T00:00:09", "action": "other", "event_id": "e2", "payload": {"n": 1}}]
+    assert (await client.get("/api/admin/logs", params={"cursor": "!!"})).status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_logs_with_empty_or_broken_payload(client: AsyncClient, session_factory):
+    async with session_factory() as s:
+        logs = [_log(f"a{i}", f"2026-01-01T00:00:0{i}") for i in range(4)]
+        for log, payload in zip(logs, [None, "", "not json", "[1, 2]"]):
+            log.payload = payload
+        await SQLiteAdminStore(s).bulk_create_audit_logs(logs)
+        await s.commit()
+    await admin_login(client)
+
+    r = await client.get("/api/admin/logs", params={"event_id": "demo"})
+    assert r.status_code == 200
+    assert [log["payload"] for log in r.json()] == [
+        {"raw": "[1, 2]"}, {"raw": "not json"}, None, None,
+    ]
+
+
+@pytest.mark.asyncio
+async def test_indexes_added_to_existing_table(test_engine):
+    async with test_engine.begin() as conn:
+        await conn.execute(text("DROP INDEX ix_admin_audit_logs_created_at"))
+        await conn.execute(text("DROP INDEX ix_admin_audit_logs_event_id_created_at"))
+        await conn.run_sync(_create_missing_indexes)
+        indexes = await conn.run_sync(lambda c: inspect(c).get_indexes("admin_audit_logs"))
+    names = {index["name"] for index in indexes}
+    assert {"ix_admin_audit_logs_created_at", "ix_admin_audit_logs_event_id_created_at"} <= names
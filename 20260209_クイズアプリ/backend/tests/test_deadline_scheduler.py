@@ -0,0 +1,174 @@
+"""締切の自動クローズと単調時計での締切判定のテスト。"""
+
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import fakeredis
+import pytest
+from httpx import AsyncClient
+
+from app.services.deadline_scheduler import DeadlineScheduler, deadline_scheduler
+from app.services.event_service import EventService
+from app.store import stores_for
+from app.ws.manager import ws_manager
+from app.valkey import ValkeyPool
+from tests.conftest import admin_login, join_and_register
+
+
+def _in(sec: float) -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=sec)).isoformat()
+
+
+class _RecordingCloser:
+    def __init__(self) -> None:
+        self.calls: list[tuple[str, str]] = []
+
+    async def __call__(self, event_id: str, question_id: str) -> None:
+        self.calls.append((event_id, question_id))
+
+
+@pytest.mark.asyncio
+async def test_fires_at_deadline():
+    scheduler = DeadlineScheduler(grace_sec=2)
+    closer = _RecordingCloser()
+    scheduler.configure(closer)
+
+    scheduler.schedule("e1", "q1", _in(0.05))
+    await asyncio.sleep(0.02)
+    assert closer.calls == []
+    await asyncio.sleep(0.08)
+    await scheduler.wait_idle()
+    assert closer.calls == [("e1", "q1")]
+
+
+@pytest.mark.asyncio
+async def test_is_past_uses_grace_and_parses_once():
+    scheduler = DeadlineScheduler(grace_sec=2, auto_close=False)
+    deadline = _in(-1)
+    assert scheduler.is_past("e1", "q1", deadline) is False  # 猶予内
+    entry = scheduler._deadlines["e1"]
+    assert scheduler.is_past("e1", "q1", deadline) is False
+    assert scheduler._deadlines["e1"] is entry  # 同じ締切は再パースしない
+
+    assert scheduler.is_past("e1", "q1", _in(-3)) is True
+    assert scheduler.is_past("e1", "q1", None) is False
+
+
+@pytest.mark.asyncio
+async def test_manual_close_cancels_timer():
+    scheduler = DeadlineScheduler()
+    closer = _RecordingCloser()
+    scheduler.configure(closer)
+    scheduler.schedule("e1", "q1", _in(0.05))
+    scheduler.mark_closed("e1", "q1", datetime.now(timezone.utc))
+    # 閉じた後の回答でタイマーが仕掛け直されない
+    scheduler.is_past("e1", "q1", datetime.now(timezone.utc))
+    await asyncio.sleep(0.1)
+    assert closer.calls == []
+
+
+@pytest.mark.asyncio
+async def test_only_one_task_closes_with_valkey():
+    closer = _RecordingCloser()
+    pool = ValkeyPool(None, redis=fakeredis.FakeAsyncRedis(decode_responses=True))
+    tasks = [DeadlineScheduler(pool=pool) for _ in range(3)]
+    deadline = _in(0.05)
+    for s in tasks:
+        s.configure(closer)
+        s.schedule("e1", "q1", deadline)
+    await asyncio.sleep(0.1)
+    for s in tasks:
+        await s.wait_idle()
+    assert closer.calls == [("e1", "q1")]
+    assert sum(s.fired for s in tasks) == 3
+
+
+@pytest.mark.asyncio
+async def test_question_auto_closes_end_to_end(client: AsyncClient, session_factory):
+    async def _closer(event_id: str, question_id: str) -> None:
+        async with session_factory() as session:
+            stores = stores_for(session)
+            svc = EventService(
+                stores.event(session), stores.question(session), stores.user(session),
+                stores.answer(session), ws_manager,
+            )
+            await svc.close_expired(event_id, question_id)
+            await session.commit()
+
+    deadline_scheduler.configure(_closer)
+    async with session_factory() as session:
+        await stores_for(session).event(session).update("demo", time_limit_sec=0)
+        await session.commit()
+
+    await join_and_register(client)
+    await admin_login(client)
+    await client.post("/api/admin/events/demo/start")
+    r = await client.post("/api/admin/events/demo/questions/next")
+    assert r.status_code == 200
+    await asyncio.sleep(0.05)
+    await deadline_scheduler.wait_idle()
+    assert deadline_scheduler.closed == 1
+
+    async with session_factory() as session:
+        event = await stores_for(session).event(session).get("demo")
+    assert event.closed is True
+
+    # 手動クローズは従来どおり可能（二重に閉じても壊れない）、自動クローズは再発火しない
+    r = await client.post("/api/admin/events/demo/questions/q1/close")
+    assert r.status_code == 200
+    await asyncio.sleep(0.05)
+    assert deadline_scheduler.closed == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_auto_close_closes_once(tmp_path):
+    """別ワーカーのタイマーが同時に発火しても、閉じて question.closed を送るのは1回だけ。"""
+    from app.database import Base, create_engines, create_session_factory
+    from app.seed import seed_all
+    from app.ws.manager import ConnectionManager
+
+    reader, writer = create_engines(f"sqlite+aiosqlite:///{tmp_path / 'quiz.db'}", sqlite_tuning=True)
+    async with writer.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = create_session_factory(reader, writer)
+    async with factory() as session:
+        await seed_all(session)
+
+    closed: list[str] = []
+
+    class _Manager(ConnectionManager):
+        async def broadcast(self, event_id, payload):
+            if payload["type"] == "question.closed":
+                closed.append(payload["data"]["question_id"])
+
+    def _service(session) -> EventService:
+        stores = stores_for(session)
+        return EventService(
+            stores.event(session), stores.question(session), stores.user(session),
+            stores.answer(session), _Manager(),
+        )
+
+    async with factory() as session:
+        await _service(session).start("demo")
+        await _service(session).next_question("demo")
+        await session.commit()
+
+    async def _close() -> bool:
+        async with factory() as session:
+            service = _service(session)
+            # 両方のワーカーが「まだ開いている」状態を読んだ後に閉じに行く
+            assert (await service.event_store.get("demo")).closed is False
+            await asyncio.sleep(0.01)
+            result = await service.close_expired("demo", "q1")
+            await session.commit()
+            return result is not None
+
+    try:
+        results = await asyncio.gather(_close(), _close())
+    finally:
+        await reader.dispose()
+        await writer.dispose()
+    assert sorted(results) == [False, True]
+    assert closed == ["q1"]
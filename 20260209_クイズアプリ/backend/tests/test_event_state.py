@@ -0,0 +1,208 @@
+"""出題中のイベント状態キャッシュのテスト。"""
+
+from __future__ import annotations
+
+import asyncio
+
+import fakeredis
+import pytest
+from httpx import AsyncClient
+
+from app.schemas.question import ChoiceResponse, QuestionPublic
+from app.services.event_state import (
+    EventState,
+    InMemoryEventStateCache,
+    ValkeyEventStateCache,
+    event_state_cache,
+)
+from app.valkey import ValkeyPool
+from app.services.event_service import EventService
+from app.store import stores_for
+from app.ws.manager import ws_manager
+from tests.conftest import admin_login, join_and_register
+
+
+def _state(event_id: str = "demo", qid: str | None = "q1") -> EventState:
+    return EventState(
+        event_id=event_id,
+        state="running",
+        current_question_id=qid,
+        current_index=0,
+        current_shown_at=None,
+        current_deadline_at=None,
+        revealed=False,
+        closed=False,
+        question=QuestionPublic(
+            question_id="q1",
+            question_text="?",
+            choices=[ChoiceResponse(choice_index=0, text="a")],
+        ) if qid else None,
+        correct_choice_index=0 if qid else None,
+    )
+
+
+def test_event_state_json_roundtrip():
+    s = _state()
+    restored = EventState.from_json(s.to_json())
+    assert restored == s
+    assert restored.public_question(include_answer=False).correct_choice_index is None
+    assert restored.public_question(include_answer=True).correct_choice_index == 0
+
+
+@pytest.mark.asyncio
+async def test_put_increments_version_and_fill_keeps_newer():
+    cache = InMemoryEventStateCache()
+    v1 = await cache.put(_state())
+    v2 = await cache.put(_state())
+    assert (v1.version, v2.version) == (1, 2)
+
+    # 古い DB 読み込みで上書きしない
+    filled = await cache.fill(_state(qid=None))
+    assert filled.version == 2
+    assert filled.current_question_id == "q1"
+
+    # invalidate 後も version は巻き戻らない
+    await cache.invalidate("demo")
+    assert await cache.get("demo") is None
+    assert (await cache.put(_state())).version == 3
+
+
+@pytest.mark.asyncio
+async def test_valkey_cache_uses_shared_pool():
+    """Valkey 版は共有プールのクライアントを使い、コマンドの所要時間を記録する。"""
+    redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    pool = ValkeyPool(None, redis=redis)
+    cache = ValkeyEventStateCache(pool)
+    await redis.set("event_state_ver:demo", 4)
+
+    filled = await cache.fill(_state())
+    assert filled.version == 4
+    assert await cache.get("demo") == filled
+    await cache.invalidate("demo")
+    assert await cache.get("demo") is None
+    assert pool.latency.count == 4
+
+
+@pytest.mark.asyncio
+async def test_invalidate_question():
+    cache = InMemoryEventStateCache()
+    await cache.put(_state("e1", "q1"))
+    await cache.put(_state("e2", None))
+    await cache.invalidate_question("q1")
+    assert await cache.get("e1") is None
+    assert await cache.get("e2") is not None
+
+
+@pytest.mark.asyncio
+async def test_read_path_served_from_cache(client: AsyncClient):
+    await join_and_register(client)
+    await admin_login(client)
+    await client.post("/api/admin/events/demo/start")
+    await client.post("/api/admin/events/demo/questions/next")
+
+    misses = event_state_cache.misses
+    for _ in range(5):
+        r = await client.get("/api/events/demo/questions/current")
+        assert r.json()["question"]["question_id"] == "q1"
+        r = await client.get("/api/events/demo/me/state")
+        assert r.json()["current_question"]["question_id"] == "q1"
+    assert event_state_cache.misses == misses
+
+
+@pytest.mark.asyncio
+async def test_admin_actions_bump_version(client: AsyncClient):
+    await join_and_register(client)
+    await admin_login(client)
+    await client.post("/api/admin/events/demo/start")
+    v_start = (await client.get("/api/events/demo/questions/current")).json()["state_version"]
+
+    await client.post("/api/admin/events/demo/questions/next")
+    cur = (await client.get("/api/events/demo/questions/current")).json()
+    assert cur["state_version"] > v_start
+    assert cur["question"]["correct_choice_index"] is None
+
+    await client.post("/api/admin/events/demo/questions/q1/reveal")
+    cur2 = (await client.get("/api/events/demo/questions/current")).json()
+    assert cur2["state_version"] > cur["state_version"]
+    assert cur2["question"]["correct_choice_index"] == 2
+
+    await client.post("/api/admin/events/demo/reset")
+    me = (await client.get("/api/events/demo/questions/current")).json()
+    assert me["event_state"] == "waiting"
+    assert me["question"] is None
+
+
+@pytest.mark.asyncio
+async def test_question_edit_invalidates_cached_state(client: AsyncClient):
+    await join_and_register(client)
+    await admin_login(client)
+    await client.post("/api/admin/events/demo/start")
+    await client.post("/api/admin/events/demo/questions/next")
+    await client.get("/api/events/demo/questions/current")
+
+    r = await client.put("/api/admin/questions/q1", json={"question_text": "edited"})
+    assert r.status_code == 200
+    cur = (await client.get("/api/events/demo/questions/current")).json()
+    assert cur["question"]["question_text"] == "edited"
+
+
+@pytest.mark.asyncio
+async def test_forget_drops_local_entries():
+    cache = InMemoryEventStateCache()
+    await cache.put(_state("e1", "q1"))
+    await cache.put(_state("e2", None))
+    cache.forget("e1")
+    assert await cache.get("e1") is None
+    assert await cache.get("e2") is not None
+    cache.forget(None)
+    assert await cache.get("e2") is None
+
+
+@pytest.mark.asyncio
+async def test_other_workers_invalidated_after_commit(client: AsyncClient, session_factory, monkeypatch):
+    seen: list[tuple[str, str | None, str | None]] = []
+
+    async def publish(kind, key=None):
+        # 他ワーカーが読み直したときにコミット済みの状態が見えること
+        async with session_factory() as session:
+            event = await stores_for(session).event(session).get("demo")
+        seen.append((kind, key, event.current_question_id))
+
+    monkeypatch.setattr(ws_manager, "publish_invalidation", publish)
+    await admin_login(client)
+    await client.post("/api/admin/events/demo/start")
+    await client.post("/api/admin/events/demo/questions/next")
+    await client.put("/api/admin/questions/q1", json={"question_text": "edited"})
+    for _ in range(20):
+        if len(seen) >= 3:
+            break
+        await asyncio.sleep(0.01)
+    assert seen == [
+        ("event_state", "demo", None),
+        ("event_state", "demo", "q1"),
+        ("event_state", None, "q1"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_state_cached_only_after_commit(client: AsyncClient, session_factory):
+    """管理操作の状態はコミット後にキャッシュへ入り、ロールバックされたら入らない。"""
+    def _service(session) -> EventService:
+        stores = stores_for(session)
+        return EventService(
+            stores.event(session), stores.question(session), stores.user(session),
+            stores.answer(session), ws_manager,
+        )
+
+    async with session_factory() as session:
+        await _service(session).start("demo")
+        assert await event_state_cache.get("demo") is None
+        await session.rollback()
+    await asyncio.sleep(0.01)
+    assert await event_state_cache.get("demo") is None
+
+    async with session_factory() as session:
+        await _service(session).start("demo")
+        await session.commit()
+    await asyncio.sleep(0.01)
+    assert (await event_state_cache.get("demo")).state == "running"
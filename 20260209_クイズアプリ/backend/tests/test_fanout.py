@@ -0,0 +1,109 @@
+"""WebSocket ファンアウト送信のテスト。"""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from app.metrics import percentiles
+from app.ws.manager import ConnectionManager
+
+
+class FakeWebSocket:
+    """send_text の所要時間を指定できるテスト用ソケット。"""
+
+    def __init__(self, delay: float = 0.0) -> None:
+        self.delay = delay
+        self.sent: list[str | bytes] = []
+        self.closed_code: int | None = None
+
+    async def accept(self) -> None:
+        pass
+
+    async def send_text(self, text: str) -> None:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.sent.append(text)
+
+    async def send_bytes(self, data: bytes) -> None:
+        await self.send_text(data)  # type: ignore[arg-type]
+
+    async def close(self, code: int = 1000) -> None:
+        self.closed_code = code
+
+
+@pytest.mark.asyncio
+async def test_broadcast_encodes_once_and_shares_text():
+    mgr = ConnectionManager()
+    sockets = [FakeWebSocket() for _ in range(5)]
+    for i, ws in enumerate(sockets):
+        await mgr.connect("e1", f"s{i}", ws)
+
+    await mgr.broadcast_question("e1", {"type": "question.shown", "data": {"q": "問題"}})
+
+    texts = [ws.sent[0] for ws in sockets]
+    assert all(t is texts[0] for t in texts)
+    assert texts[0] == '{"seq":1,"type":"question.shown","data":{"q":"問題"}}'
+
+
+@pytest.mark.asyncio
+async def test_slow_socket_does_not_block_and_is_evicted():
+    mgr = ConnectionManager(send_timeout_sec=0.1)
+    fast = FakeWebSocket()
+    slow = FakeWebSocket(delay=10)
+    await mgr.connect("e1", "fast", fast)
+    await mgr.connect("e1", "slow", slow)
+
+    delivered = await mgr.broadcast_question("e1", {"type": "x"})
+
+    assert set(delivered) == {"fast"}
+    assert mgr.get_delivered_at("e1", "slow") is None
+    await asyncio.sleep(0.01)
+    assert "slow" not in mgr._connections["e1"]
+    assert slow.closed_code == 1013
+    assert mgr.stats()["evicted"] == 1
+
+
+@pytest.mark.asyncio
+async def test_delivered_at_recorded_at_send_completion():
+    mgr = ConnectionManager()
+    early = FakeWebSocket()
+    late = FakeWebSocket(delay=0.05)
+    # 接続順とは逆に、先に送信が完了したソケットの方が早い時刻になる
+    await mgr.connect("e1", "late", late)
+    await mgr.connect("e1", "early", early)
+
+    delivered = await mgr.broadcast_question("e1", {"type": "x"})
+    assert delivered["early"] < delivered["late"]
+
+
+@pytest.mark.asyncio
+async def test_queue_overflow_evicts():
+    mgr = ConnectionManager(queue_size=2, send_timeout_sec=5)
+    ws = FakeWebSocket(delay=1)
+    await mgr.connect("e1", "s", ws)
+    for _ in range(4):
+        await mgr.broadcast("e1", {"type": "x"})
+    await asyncio.sleep(0)
+    assert "s" not in mgr._connections["e1"]
+
+
+@pytest.mark.asyncio
+async def test_reconnect_is_not_removed_by_stale_disconnect():
+    mgr = ConnectionManager()
+    old, new = FakeWebSocket(), FakeWebSocket()
+    await mgr.connect("e1", "s", old)
+    await mgr.connect("e1", "s", new)
+    mgr.disconnect("e1", "s", old)
+    assert mgr._connections["e1"]["s"] is new
+
+
+def test_percentiles():
+    samples = [i / 1000 for i in range(1, 101)]  # 1..100ms
+    p = percentiles(samples)
+    assert p["p50_ms"] == 50
+    assert p["p95_ms"] == 95
+    assert p["p99_ms"] == 99
+    assert p["max_ms"] == 100
+    assert percentiles([]) == {}
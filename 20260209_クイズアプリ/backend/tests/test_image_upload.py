@@ -0,0 +1,123 @@
+"""画像アップロードがイベントループを止めないことのテスト。"""
+
+from __future__ import annotations
+
+import asyncio
+import io
+import time
+
+import pytest
+from httpx import AsyncClient
+
+from app.config import UPLOADS_DIR
+from app.services import image_service
+from app.ws.manager import ConnectionManager
+from tests.conftest import admin_login
+from tests.test_fanout import FakeWebSocket
+
+_20MB = 20 * 1024 * 1024
+
+
+class _SlowS3:
+    """upload_fileobj を 1MB ごとに待たせる（ネットワーク送信の代わり）。"""
+
+    def __init__(self, delay_per_mb: float) -> None:
+        self.delay_per_mb = delay_per_mb
+        self.uploads: list[tuple[str, str, int, dict]] = []
+
+    def upload_fileobj(self, fileobj, bucket, key, ExtraArgs=None):
+        size = 0
+        while chunk := fileobj.read(1024 * 1024):
+            size += len(chunk)
+            time.sleep(self.delay_per_mb)
+        self.uploads.append((bucket, key, size, ExtraArgs or {}))
+
+    def get_object(self, Bucket, Key):
+        raise FileNotFoundError(Key)  # マニフェストは未保存
+
+
+async def _broadcast_latencies(mgr: ConnectionManager, until: asyncio.Task) -> list[float]:
+    """until が終わるまで 10ms ごとに配信し、送信完了までの時間を集める。"""
+    latencies: list[float] = []
+    while not until.done():
+        start = time.perf_counter()
+        await mgr.broadcast_question("e1", {"type": "question.shown", "data": {"question_id": "q1"}})
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01)
+    return latencies
+
+
+async def _upload_while_broadcasting(client: AsyncClient, data: bytes) -> tuple[dict, list[float]]:
+    mgr = ConnectionManager()
+    for i in range(50):
+        await mgr.connect("e1", f"s{i}", FakeWebSocket())
+
+    files = {"file": ("big.png", io.BytesIO(data), "image/png")}
+    upload = asyncio.create_task(client.post("/api/admin/assets/images", files=files))
+    latencies = await _broadcast_latencies(mgr, upload)
+    r = await upload
+    assert r.status_code == 200
+    return r.json(), latencies
+
+
+@pytest.mark.asyncio
+async def test_broadcast_latency_flat_during_20mb_upload(client: AsyncClient, monkeypatch):
+    """20MB の S3 アップロード（送信に約1秒）中も配信が待たされない。"""
+    s3 = _SlowS3(delay_per_mb=0.05)
+    monkeypatch.setattr(image_service, "S3_BUCKET_NAME", "quiz-assets")
+    monkeypatch.setattr(image_service, "CLOUDFRONT_DOMAIN", "cdn.example.com")
+    monkeypatch.setattr(image_service, "_s3_client", lambda: s3)
+    await admin_login(client)
+
+    data, latencies = await _upload_while_broadcasting(client, b"\0" * _20MB)
+
+    assert data["url"] == f"https://cdn.example.com/images/{data['filename']}"
+    # 原寸と（画像として読めないので縮小版なしの）マニフェスト
+    [(bucket, key, size, extra), (_, manifest_key, _, _)] = s3.uploads
+    assert (bucket, key, size) == ("quiz-assets", f"images/{data['filename']}", _20MB)
+    assert extra["ContentType"] == "image/png"
+    assert extra["CacheControl"].endswith("immutable")
+    assert manifest_key == f"images/{data['filename'].split('.')[0]}.json"
+    # 送信中も配信が続いており、どの配信も S3 送信に引きずられていない
+    assert len(latencies) >= 20
+    assert max(latencies) < 0.2
+
+
+@pytest.mark.asyncio
+async def test_local_upload_streams_to_disk(client: AsyncClient):
+    await admin_login(client)
+    data, latencies = await _upload_while_broadcasting(client, b"\1" * _20MB)
+
+    path = UPLOADS_DIR / data["filename"]
+    try:
+        assert data["url"] == f"/uploads/{data['filename']}"
+        assert path.stat().st_size == _20MB
+        assert not list(UPLOADS_DIR.glob(".*.part"))
+        assert max(latencies) < 0.2
+    finally:
+        path.unlink(missing_ok=True)
+        path.with_suffix(".json").unlink(missing_ok=True)
+
+
+@pytest.mark.asyncio
+async def test_upload_over_limit_returns_413(client: AsyncClient, monkeypatch):
+    monkeypatch.setattr(image_service, "MAX_UPLOAD_BYTES", 1024)
+    await admin_login(client)
+    before = set(UPLOADS_DIR.iterdir())
+    files = {"file": ("big.png", io.BytesIO(b"\0" * 2048), "image/png")}
+    r = await client.post("/api/admin/assets/images", files=files)
+    assert r.status_code == 413
+    assert set(UPLOADS_DIR.iterdir()) == before
+
+
+def test_s3_client_is_cached(monkeypatch):
+    import boto3
+
+    created: list[str] = []
+    monkeypatch.setattr(boto3, "client", lambda name: created.append(name) or object())
+    image_service._s3_client.cache_clear()
+    try:
+        assert image_service._s3_client() is image_service._s3_client()
+        assert created == ["s3"]
+    finally:
+        image_service._s3_client.cache_clear()
@@ -0,0 +1,130 @@
+"""画像の縮小版（AVIF / WebP）・内容ハッシュでの重複排除・事前読み込みのテスト。"""
+
+from __future__ import annotations
+
+import asyncio
+import io
+import json
+
+import pytest
+from httpx import AsyncClient
+from PIL import Image
+
+from app.services import image_service
+from app.services.image_service import image_variant_index
+from app.ws.manager import ws_manager
+from tests.conftest import admin_login
+from tests.test_fanout import FakeWebSocket
+
+
+def _png(width: int = 800, height: int = 600, color=(200, 30, 30)) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+async def _upload(client: AsyncClient, data: bytes) -> dict:
+    files = {"file": ("photo.png", io.BytesIO(data), "image/png")}
+    r = await client.post("/api/admin/assets/images", files=files)
+    assert r.status_code == 200
+    return r.json()
+
+
+@pytest.fixture
+def uploads(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_service, "UPLOADS_DIR", tmp_path)
+    return tmp_path
+
+
+@pytest.mark.asyncio
+async def test_upload_writes_variants_and_manifest(client: AsyncClient, uploads):
+    await admin_login(client)
+    data = await _upload(client, _png())
+
+    name = data["filename"].split(".")[0]
+    assert data["filename"] == f"{name}.png" and len(name) == 32
+    # 原寸（800px）より大きい 1080 は原寸に揃える
+    for width in (320, 640, 800):
+        for fmt in ("avif", "webp"):
+            with Image.open(uploads / f"{name}_{width}w.{fmt}") as img:
+                assert img.width == width
+                assert img.format == fmt.upper()
+    manifest = json.loads((uploads / f"{name}.json").read_text())
+    assert (manifest["width"], manifest["height"]) == (800, 600)
+    assert len(manifest["variants"]) == 6
+
+    avif, webp = image_variant_index.sources(data["url"])
+    assert (avif.type, webp.type) == ("image/avif", "image/webp")
+    assert webp.srcset == (
+        f"/uploads/{name}_320w.webp 320w, "
+        f"/uploads/{name}_640w.webp 640w, "
+        f"/uploads/{name}_800w.webp 800w"
+    )
+
+
+@pytest.mark.asyncio
+async def test_same_content_is_stored_once(client: AsyncClient, uploads):
+    await admin_login(client)
+    first = await _upload(client, _png())
+    files = sorted(p.name for p in uploads.iterdir())
+    mtimes = [p.stat().st_mtime_ns for p in sorted(uploads.iterdir())]
+
+    second = await _upload(client, _png())
+    assert second == first
+    assert sorted(p.name for p in uploads.iterdir()) == files
+    assert [p.stat().st_mtime_ns for p in sorted(uploads.iterdir())] == mtimes
+
+    other = await _upload(client, _png(color=(0, 0, 255)))
+    assert other["filename"] != first["filename"]
+
+
+@pytest.mark.asyncio
+async def test_undecodable_image_is_kept_without_variants(client: AsyncClient, uploads):
+    await admin_login(client)
+    data = await _upload(client, b"not really a png")
+    assert (uploads / data["filename"]).read_bytes() == b"not really a png"
+    assert image_variant_index.sources(data["url"]) == []
+
+
+@pytest.mark.asyncio
+async def test_index_loads_manifest_from_storage(client: AsyncClient, uploads):
+    await admin_login(client)
+    data = await _upload(client, _png())
+    image_variant_index.clear()
+    assert image_variant_index.sources(data["url"]) == []
+
+    await image_variant_index.load([data["url"], "/uploads/legacy.png", None])
+    assert [s.type for s in image_variant_index.sources(data["url"])] == ["image/avif", "image/webp"]
+    assert image_variant_index.sources("/uploads/legacy.png") == []
+
+
+@pytest.mark.asyncio
+async def test_start_prefetches_and_question_carries_sources(client: AsyncClient, uploads):
+    await admin_login(client)
+    image = await _upload(client, _png())
+    questions = (await client.get("/api/admin/questions")).json()
+    for q in questions:
+        r = await client.put(f"/api/admin/questions/{q['question_id']}", json={"question_image": image["url"]})
+        assert r.status_code == 200
+    image_variant_index.clear()  # 開始時にストレージから読み直す
+
+    ws = FakeWebSocket()
+    await ws_manager.connect("demo", "s1", ws)
+    try:
+        assert (await client.post("/api/admin/events/demo/start")).status_code == 200
+        assert (await client.post("/api/admin/events/demo/questions/next")).status_code == 200
+        await asyncio.sleep(0.05)
+    finally:
+        ws_manager.disconnect("demo", "s1", ws)
+
+    messages = {m["type"]: m for m in map(json.loads, ws.sent)}
+    # 同じ画像は1回だけ先読みさせる
+    [prefetch] = messages["event.state_changed"]["data"]["prefetch"]
+    assert prefetch["src"] == image["url"]
+    assert prefetch["srcset"].endswith("_800w.webp 800w")
+
+    shown = messages["question.shown"]["data"]["question"]
+    assert [s["type"] for s in shown["question_image_sources"]] == ["image/avif", "image/webp"]
+    # 途中参加・再読み込み用の現在の問題にも付く
+    current = (await client.get("/api/events/demo/questions/current")).json()
+    assert current["question"]["question_image_sources"] == shown["question_image_sources"]
@@ -0,0 +1,247 @@
+"""インクリメンタル・リーダーボードのテスト。"""
+
+from __future__ import annotations
+
+import bisect
+import random
+
+import pytest
+from httpx import AsyncClient
+
+from app.services.leaderboard import EventLeaderboard, LeaderboardRegistry, RankIndex
+from tests.conftest import admin_login, join_and_register
+
+
+# ── RankIndex ─────────────────────────────────────────
+
+
+def test_rank_index_matches_sorted_list():
+    """ランダムな insert/remove 後も count_less と走査順が sorted list と一致する。"""
+    rng = random.Random(42)
+    index = RankIndex(seed=1)
+    expected: list[tuple[int, int, int]] = []
+
+    for step in range(3000):
+        if expected and rng.random() < 0.4:
+            key = expected.pop(rng.randrange(len(expected)))
+            index.remove(key)
+        else:
+            key = (-rng.randint(0, 10), rng.randint(0, 500), step)
+            bisect.insort(expected, key)
+            index.insert(key)
+
+        probe = (-rng.randint(0, 10), rng.randint(0, 500), -1)
+        assert index.count_less(probe) == bisect.bisect_left(expected, probe)
+
+    assert list(index) == expected
+    assert len(index) == len(expected)
+
+
+def test_rank_index_remove_missing():
+    index = RankIndex()
+    index.insert((0, 0, 0))
+    with pytest.raises(KeyError):
+        index.remove((0, 0, 1))
+
+
+# ── EventLeaderboard ──────────────────────────────────
+
+
+def _legacy_ranking(qids, users, answers):
+    """従来の RankingService.calculate と同じ全件再計算。"""
+    answer_map = {(a["question_id"], a["user_id"]): a for a in answers}
+    entries = []
+    for uid in users:
+        correct = unanswered = 0
+        time_sum = 0.0
+        for qid in qids:
+            ans = answer_map.get((qid, uid))
+            if ans is None:
+                unanswered += 1
+            elif ans["is_correct"] and ans["accepted"]:
+                correct += 1
+                if ans["rt"] is not None:
+                    time_sum += ans["rt"]
+        entries.append({
+            "user_id": uid,
+            "correct_count": correct,
+            "unanswered_count": unanswered,
+            "correct_time_sum_sec_1dp": round(time_sum, 1),
+        })
+    entries.sort(key=lambda e: (-e["correct_count"], e["correct_time_sum_sec_1dp"]))
+    for i, e in enumerate(entries):
+        prev = entries[i - 1] if i else None
+        if prev and (
+            e["correct_count"] == prev["correct_count"]
+            and e["correct_time_sum_sec_1dp"] == prev["correct_time_sum_sec_1dp"]
+        ):
+            e["rank"] = prev["rank"]
+        else:
+            e["rank"] = i + 1
+    return entries
+
+
+def test_board_matches_legacy_ranking():
+    """差分更新の結果が全件再計算と順位・同着・並び順まで一致する。"""
+    rng = random.Random(7)
+    qids = [f"q{i}" for i in range(6)]
+    users = [f"u{i}" for i in range(200)]
+    answers = []
+    for uid in users:
+        for qid in qids:
+            if rng.random() < 0.8:
+                answers.append({
+                    "question_id": qid,
+                    "user_id": uid,
+                    "accepted": rng.random() < 0.9,
+                    "is_correct": rng.random() < 0.6,
+                    "rt": rng.choice([0.5, 1.0, 1.5, 2.0]),
+                })
+    rng.shuffle(answers)
+
+    board = EventLeaderboard(qids)
+    for uid in users:
+        board.add_user(uid, uid)
+    for a in answers:
+        board.record_answer(
+            a["user_id"],
+            a["question_id"],
+            accepted=a["accepted"],
+            is_correct=a["is_correct"],
+            response_time_sec_1dp=a["rt"],
+        )
+
+    legacy = _legacy_ranking(qids, users, answers)
+    got = board.top()
+    assert [
+        (e.user_id, e.rank, e.correct_count, e.unanswered_count, e.correct_time_sum_sec_1dp)
+        for e in got
+    ] == [
+        (e["user_id"], e["rank"], e["correct_count"], e["unanswered_count"],
+         e["correct_time_sum_sec_1dp"])
+        for e in legacy
+    ]
+
+    # 個別の順位参照も一致する
+    for e in legacy:
+        assert board.entry_for(e["user_id"]).rank == e["rank"]
+
+    # top-k は全件の先頭と一致する
+    assert board.top(10) == got[:10]
+
+
+def test_board_ignores_duplicate_and_foreign_answers():
+    board = EventLeaderboard(["q1"])
+    board.add_user("u1", "alice")
+    kwargs = {"accepted": True, "is_correct": True, "response_time_sec_1dp": 1.2}
+    assert board.record_answer("u1", "q1", **kwargs)
+    assert board.record_answer("u1", "q1", **kwargs)  # 二重は無視
+    assert board.record_answer("u1", "other", **kwargs)  # イベント外の問題は無視
+    assert not board.record_answer("ghost", "q1", **kwargs)
+
+    entry = board.entry_for("u1")
+    assert entry.correct_count == 1
+    assert entry.correct_time_sum_sec_1dp == 1.2
+    assert entry.unanswered_count == 0
+
+
+# ── LeaderboardRegistry ───────────────────────────────
+
+
+def test_registry_unknown_user_invalidates():
+    registry = LeaderboardRegistry()
+    registry.begin_build("e1")
+    registry.finish_build("e1", EventLeaderboard(["q1"]))
+    registry.record_answer(
+        "e1", "ghost", "q1",
+        accepted=True, is_correct=True, response_time_sec_1dp=1.0,
+    )
+    assert registry.get("e1") is None
+
+
+def test_registry_replays_updates_during_build():
+    """構築中に届いた登録・回答は完成したボードに再適用される。"""
+    registry = LeaderboardRegistry()
+    registry.begin_build("e1")
+    board = EventLeaderboard(["q1"])  # DB 読み込み時点ではユーザ不在
+    registry.add_user("e1", "u1", "alice")
+    registry.record_answer(
+        "e1", "u1", "q1",
+        accepted=True, is_correct=True, response_time_sec_1dp=2.0,
+    )
+    registry.finish_build("e1", board)
+    assert registry.get("e1").entry_for("u1").correct_count == 1
+
+
+def test_registry_invalidated_during_build_is_dropped():
+    registry = LeaderboardRegistry()
+    registry.begin_build("e1")
+    registry.invalidate("e1")
+    registry.finish_build("e1", EventLeaderboard([]))
+    assert registry.get("e1") is None
+
+
+def test_registry_max_age():
+    registry = LeaderboardRegistry(max_age_sec=0)
+    registry.begin_build("e1")
+    registry.finish_build("e1", EventLeaderboard([]))
+    assert registry.get("e1") is None
+
+
+# ── API ───────────────────────────────────────────────
+
+
+@pytest.mark.asyncio
+async def test_results_limit_and_me(client: AsyncClient):
+    """limit で上位のみ返り、Cookie の参加者の順位が me に入る。"""
+    await join_and_register(client, display_name="me")
+    await admin_login(client)
+    await client.post("/api/admin/events/demo/start")
+    r = await client.post("/api/admin/events/demo/questions/next")
+    qid = r.json()["question_id"]
+    await client.post(
+        f"/api/events/demo/questions/{qid}/answers",
+        json={"choice_index": 2},
+    )
+
+    r = await client.get("/api/events/demo/results?limit=1")
+    assert r.status_code == 200
+    data = r.json()
+    assert len(data["leaderboard"]) == 1
+    assert data["me"]["rank"] == 1
+    assert data["me"]["correct_count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_results_updated_incrementally(client: AsyncClient):
+    """ボード構築後の回答もランキングに反映される。"""
+    await join_and_register(client)
+    await admin_login(client)
+    await client.post("/api/admin/events/demo/start")
+    r = await client.post("/api/admin/events/demo/questions/next")
+    qid = r.json()["question_id"]
+
+    r = await client.get("/api/events/demo/results")
+    assert r.json()["leaderboard"][0]["correct_count"] == 0
+
+    await client.post(
+        f"/api/events/demo/questions/{qid}/answers",
+        json={"choice_index": 2},
+    )
+    r = await client.get("/api/events/demo/results")
+    entry = r.json()["leaderboard"][0]
+    assert entry["correct_count"] == 1
+    assert entry["unanswered_count"] == 4
+
+
+@pytest.mark.asyncio
+async def test_results_after_reset(client: AsyncClient):
+    """reset でボードが破棄され、参加者が消える。"""
+    await join_and_register(client)
+    r = await client.get("/api/events/demo/results")
+    assert len(r.json()["leaderboard"]) == 1
+
+    await admin_login(client)
+    await client.post("/api/admin/events/demo/reset")
+    r = await client.get("/api/events/demo/results")
+    assert r.json()["leaderboard"] == []
@@ -0,0 +1,45 @@
+"""レイテンシ計測と /api/health の計測値のテスト。"""
+
+from __future__ import annotations
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import text
+
+from app.database import DBMetrics
+from app.metrics import LatencyRecorder
+
+
+def test_latency_recorder_keeps_recent_samples():
+    rec = LatencyRecorder(sample_size=3)
+    for s in (1.0, 0.001, 0.002, 0.003):
+        rec.record(s)
+    summary = rec.summary()
+    assert summary["count"] == 4
+    assert summary["max_ms"] == 3.0  # 1.0 は押し出されている
+    rec.clear()
+    assert rec.summary() == {"count": 0}
+
+
+@pytest.mark.asyncio
+async def test_db_metrics_counts_only_writes(test_engine):
+    metrics = DBMetrics()
+    metrics.install(test_engine.sync_engine)
+    async with test_engine.begin() as conn:
+        await conn.execute(text("CREATE TABLE t (x INTEGER)"))
+        await conn.execute(text("INSERT INTO t VALUES (1)"))
+        await conn.execute(text("UPDATE t SET x = 2"))
+        await conn.execute(text("SELECT * FROM t"))
+    stats = metrics.stats()
+    assert stats["write_latency"]["count"] == 2
+    assert stats["locked_errors"] == 0
+
+
+@pytest.mark.asyncio
+async def test_health_exposes_metrics(client: AsyncClient):
+    r = await client.get("/api/health")
+    assert r.status_code == 200
+    data = r.json()
+    assert data["status"] == "ok"
+    assert "send_latency" in data["ws"]
+    assert {"write_latency", "commit_latency", "locked_errors"} <= data["db"].keys()
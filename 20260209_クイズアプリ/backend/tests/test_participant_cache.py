@@ -0,0 +1,147 @@
+"""参加者解決キャッシュ（session_id → セッション + ユーザ）のテスト。"""
+
+from __future__ import annotations
+
+import asyncio
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import event
+
+from app.models.user import EventSession, EventUser
+from app.services.participant_cache import ParticipantCache, participant_cache
+from app.store import stores_for
+from app.ws.manager import ws_manager
+from tests.conftest import admin_login, join_and_register
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+async def _add_participants(session_factory, n: int) -> list[str]:
+    sids = []
+    async with session_factory() as session:
+        for i in range(n):
+            sid, uid = uuid.uuid4().hex, uuid.uuid4().hex
+            session.add(EventSession(id=sid, event_id="demo", user_id=uid, created_at=_now_iso()))
+            session.add(EventUser(
+                id=uid, event_id="demo", session_id=sid, display_name=f"p{i}",
+                display_suffix=f"{i:05d}", joined_at=_now_iso(),
+            ))
+            sids.append(sid)
+        await session.commit()
+    return sids
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_are_batched(client: AsyncClient, session_factory, test_engine):
+    """同時に起きたキャッシュミスは IN 句の1クエリにまとめられる。"""
+    sids = await _add_participants(session_factory, 50)
+    selects: list[str] = []
+    event.listen(
+        test_engine.sync_engine, "before_cursor_execute",
+        lambda *a: selects.append(a[2]) if "event_sessions" in a[2] else None,
+    )
+    cache = ParticipantCache(batch_window_sec=0.01)
+
+    async def _resolve(sid: str):
+        async with session_factory() as session:
+            return await cache.resolve(sid, stores_for(session).user(session))
+
+    results = await asyncio.gather(*[_resolve(sid) for sid in sids])
+    assert [p.session_id for p in results] == sids
+    assert all(p.registered for p in results)
+    assert len(selects) == 1
+    assert cache.stats()["batches"] == 1
+
+    # 2回目はキャッシュから
+    await asyncio.gather(*[_resolve(sid) for sid in sids])
+    assert len(selects) == 1
+    assert cache.hits == 50
+
+
+@pytest.mark.asyncio
+async def test_unknown_and_unregistered_not_cached(client: AsyncClient, session_factory):
+    cache = ParticipantCache(batch_window_sec=0)
+    async with session_factory() as session:
+        session.add(EventSession(id="s-unreg", event_id="demo", created_at=_now_iso()))
+        await session.commit()
+
+    async with session_factory() as session:
+        store = stores_for(session).user(session)
+        assert await cache.resolve("missing", store) is None
+        p = await cache.resolve("s-unreg", store)
+    assert p is not None and not p.registered and p.user_info() is None
+    assert cache.stats()["entries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_ttl_expiry(client: AsyncClient, session_factory):
+    sid = (await _add_participants(session_factory, 1))[0]
+    cache = ParticipantCache(ttl_sec=0, batch_window_sec=0)
+    async with session_factory() as session:
+        store = stores_for(session).user(session)
+        await cache.resolve(sid, store)
+        await asyncio.sleep(0.001)
+        await cache.resolve(sid, store)
+    assert cache.hits == 0
+    assert cache.batches == 2
+
+
+@pytest.mark.asyncio
+async def test_register_then_state_sees_user(client: AsyncClient):
+    """未登録で状態取得 → 登録後は me が返る（未登録状態をキャッシュしない）。"""
+    r = await client.post("/api/events/demo/join", json={"join_code": "123456"})
+    assert r.status_code == 200
+    r = await client.get("/api/events/demo/me/state")
+    assert r.json()["me"] is None
+
+    r = await client.post("/api/events/demo/users/register", json={"display_name_base": "a"})
+    assert r.status_code == 200
+    user_id = r.json()["user"]["user_id"]
+    r = await client.get("/api/events/demo/me/state")
+    assert r.json()["me"]["user_id"] == user_id
+    assert r.json()["me"]["display_name"].startswith("a-")
+    assert participant_cache.stats()["entries"] == 1
+
+
+@pytest.mark.asyncio
+async def test_reset_and_logout_invalidate(client: AsyncClient):
+    await join_and_register(client)
+    assert (await client.get("/api/events/demo/me/state")).status_code == 200
+    assert participant_cache.stats()["entries"] == 1
+
+    await admin_login(client)
+    r = await client.post("/api/admin/events/demo/reset")
+    assert r.status_code == 200
+    assert participant_cache.stats()["entries"] == 0
+    # リセットでセッションも消えているため、キャッシュから古い値を返さない
+    assert (await client.get("/api/events/demo/me/state")).status_code == 401
+
+    await join_and_register(client)
+    assert (await client.get("/api/events/demo/me/state")).status_code == 200
+    assert participant_cache.stats()["entries"] == 1
+    assert (await client.post("/api/events/demo/logout")).status_code == 200
+    assert participant_cache.stats()["entries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_other_workers_invalidated(client: AsyncClient, monkeypatch):
+    published: list[tuple[str, str | None]] = []
+
+    async def publish(kind, key=None):
+        published.append((kind, key))
+
+    monkeypatch.setattr(ws_manager, "publish_invalidation", publish)
+    await join_and_register(client)
+    sid = client.cookies["session_id"]
+    await client.post("/api/events/demo/logout")
+    await admin_login(client)
+    await client.post("/api/admin/events/demo/reset")
+    await asyncio.sleep(0.01)
+
+    assert published.count(("participant", sid)) == 2  # 登録・ログアウト
+    assert ("participant_event", "demo") in published
@@ -0,0 +1,187 @@
+"""問題ごとの回答分布と question.stats 配信のテスト。"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import uuid
+
+import pytest
+from httpx import AsyncClient
+
+from app.models.answer import Answer
+from app.services.answer_service import AnswerService
+from app.services.question_stats import QuestionStats, QuestionStatsRegistry, question_stats_registry
+from app.store import stores_for
+from app.ws.manager import ws_manager
+from tests.test_fanout import FakeWebSocket
+from tests.conftest import admin_login, join_and_register
+
+
+def _answer(
+    user_id: str,
+    choice: int,
+    *,
+    question_id: str = "q1",
+    accepted: bool = True,
+    rt: float | None = 1.0,
+) -> Answer:
+    return Answer(
+        id=uuid.uuid4().hex, event_id="demo", question_id=question_id, user_id=user_id,
+        choice_index=choice, delivered_at="", submitted_at="", accepted=accepted,
+        is_correct=(choice == 2) if accepted else None, response_time_sec_1dp=rt,
+    )
+
+
+class _RecordingManager:
+    def __init__(self) -> None:
+        self.messages: list[dict] = []
+
+    async def broadcast_admin(self, event_id: str, payload: dict) -> None:
+        self.messages.append(payload)
+
+
+def test_stats_histogram_and_quantiles():
+    stats = QuestionStats("q1", num_choices=4)
+    for i, (choice, rt) in enumerate([(2, 1.0), (2, 2.0), (0, 3.0), (1, 4.0)]):
+        stats.record(_answer(f"u{i}", choice, rt=rt))
+    assert not stats.record(_answer("u0", 3))  # 同一ユーザの2件目は数えない
+    stats.record(_answer("late", 1, accepted=False))
+
+    r = stats.to_response()
+    assert r.choice_counts == [1, 1, 2, 0]
+    assert (r.answered_count, r.rejected_count, r.correct_count) == (4, 1, 2)
+    assert r.response_time_avg_sec == 2.5
+    assert r.response_time_p50_sec == 2.0
+    assert r.response_time_p90_sec == 4.0
+    assert stats.to_response(include_correct=False).correct_count is None
+
+
+@pytest.mark.asyncio
+async def test_pushes_are_throttled():
+    """短時間に大量の回答が来ても配信は上限回数まで、最後の配信に全件が入る。"""
+    registry = QuestionStatsRegistry(push_hz=4)
+    registry.start_question("demo", "q1", 4)
+    ws = _RecordingManager()
+
+    for i in range(200):
+        registry.record(_answer(f"u{i}", i % 4), ws)
+        await asyncio.sleep(0.003)  # 約 0.6 秒に分散
+    await registry.wait_pushes()
+
+    assert 2 <= len(ws.messages) <= 5
+    last = ws.messages[-1]
+    assert last["type"] == "question.stats"
+    assert last["data"]["answered_count"] == 200
+    assert last["data"]["choice_counts"] == [50, 50, 50, 50]
+    assert last["data"]["correct_count"] is None
+
+
+async def _open_q1(client: AsyncClient) -> None:
+    await admin_login(client)
+    await client.post("/api/admin/events/demo/start")
+    r = await client.post("/api/admin/events/demo/questions/next")
+    assert r.json()["question_id"] == "q1"
+
+
+@pytest.mark.asyncio
+async def test_admin_stats_endpoint(client: AsyncClient):
+    await _open_q1(client)
+    for i, choice in enumerate([2, 2, 0]):
+        await join_and_register(client, display_name=f"p{i}")
+        r = await client.post("/api/events/demo/questions/q1/answers", json={"choice_index": choice})
+        assert r.status_code == 200
+    await question_stats_registry.wait_pushes()
+
+    r = await client.get("/api/admin/events/demo/questions/q1/stats")
+    assert r.status_code == 200
+    data = r.json()
+    assert data["answered_count"] == 3
+    assert data["correct_count"] == 2
+    assert data["choice_counts"][0] == 1 and data["choice_counts"][2] == 2
+    assert len(data["choice_counts"]) == 4
+
+    # プロセス再起動相当（インメモリ集計なし）でも DB から同じ値を作り直す
+    question_stats_registry.clear()
+    r = await client.get("/api/admin/events/demo/questions/q1/stats")
+    assert r.json() == data
+
+
+@pytest.mark.asyncio
+async def test_admin_stats_requires_admin_and_known_question(client: AsyncClient):
+    r = await client.get("/api/admin/events/demo/questions/q1/stats")
+    assert r.status_code == 401
+    await admin_login(client)
+    r = await client.get("/api/admin/events/demo/questions/nope/stats")
+    assert r.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_only_admin_sockets_get_live_stats(client: AsyncClient):
+    """出題中の回答分布は管理者ソケットにだけ間引いて届き、参加者のソケットには届かない。"""
+    await _open_q1(client)
+    admin_socket, participant_socket = FakeWebSocket(), FakeWebSocket()
+    await ws_manager.connect("demo", "admin:projector", admin_socket, admin=True)
+    await ws_manager.connect("demo", "participant", participant_socket)
+    try:
+        for i, choice in enumerate([2, 0, 1]):
+            await join_and_register(client, display_name=f"p{i}")
+            r = await client.post("/api/events/demo/questions/q1/answers", json={"choice_index": choice})
+            assert r.status_code == 200
+        await question_stats_registry.wait_pushes()
+        await asyncio.sleep(0.05)
+
+        def _stats(socket: FakeWebSocket) -> list[dict]:
+            messages = [json.loads(text) for text in socket.sent]
+            return [m["data"] for m in messages if m["type"] == "question.stats"]
+
+        pushed = _stats(admin_socket)
+        assert 1 <= len(pushed) <= 3  # 回答3件を QUESTION_STATS_PUSH_HZ で間引く
+        assert pushed[-1]["answered_count"] == 3
+        assert pushed[-1]["correct_count"] is None
+        assert _stats(participant_socket) == []
+        # seq を消費しない（再送履歴に残らない）
+        assert all("seq" not in json.loads(text) for text in admin_socket.sent
+                   if json.loads(text)["type"] == "question.stats")
+    finally:
+        ws_manager.disconnect("demo", "admin:projector", admin_socket)
+        ws_manager.disconnect("demo", "participant", participant_socket)
+
+
+@pytest.mark.asyncio
+async def test_answers_counted_only_after_commit(client: AsyncClient, session_factory):
+    """同期パスの回答はコミットされてから回答分布・リーダーボードに反映する。"""
+    await _open_q1(client)
+    await join_and_register(client, display_name="alice")
+    session_id = client.cookies.get("session_id")
+
+    async def _submit(session) -> None:
+        stores = stores_for(session)
+        service = AnswerService(
+            answer_store=stores.answer(session),
+            event_store=stores.event(session),
+            question_store=stores.question(session),
+            user_store=stores.user(session),
+            ws_manager=ws_manager,
+        )
+        await service.submit("demo", "q1", session_id, 2)
+
+    async def _correct_count() -> int:
+        results = (await client.get("/api/events/demo/results")).json()
+        return results["leaderboard"][0]["correct_count"]
+
+    assert await _correct_count() == 0  # リーダーボードを構築しておく
+    async with session_factory() as session:
+        await _submit(session)
+        await session.rollback()
+    await asyncio.sleep(0.01)
+    assert question_stats_registry.get("demo", "q1").answered_count == 0
+    assert await _correct_count() == 0
+
+    async with session_factory() as session:
+        await _submit(session)
+        assert question_stats_registry.get("demo", "q1").answered_count == 0
+        await session.commit()
+    await asyncio.sleep(0.01)
+    assert question_stats_registry.get("demo", "q1").answered_count == 1
+    assert await _correct_count() == 1
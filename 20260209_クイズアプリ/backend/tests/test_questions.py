@@ -5,6 +5,7 @@ from __future__ import annotations
 import pytest
 from httpx import AsyncClient
 
+from app.store import stores_for
 from tests.conftest import admin_login
 
 _SAMPLE_CHOICES = [
@@ -133,3 +134,114 @@ async def test_reorder_questions(client: AsyncClient):
     r = await client.get("/api/admin/questions")
     new_ids = [q["question_id"] for q in r.json()]
     assert new_ids == reversed_ids
+
+
+@pytest.mark.asyncio
+async def test_store_reorder_and_event_questions_bulk(client: AsyncClient, session_factory):
+    """一括 UPDATE 後も読み込み済みオブジェクトと DB の sort_order が一致すること。"""
+    async with session_factory() as session:
+        stores = stores_for(session)
+        store = stores.question(session)
+        loaded = await store.list()
+        ids = [q.id for q in loaded]
+        new_order = ids[1:] + ids[:1]
+
+        await store.reorder([*new_order, "missing"])
+        assert {q.id: q.sort_order for q in loaded} == {qid: i for i, qid in enumerate(new_order)}
+
+        event_store = stores.event(session)
+        await event_store.set_event_questions("demo", list(reversed(new_order)))
+        await session.commit()
+
+    async with session_factory() as session:
+        stores = stores_for(session)
+        assert [q.id for q in await stores.question(session).list()] == new_order
+        assert await stores.event(session).get_question_ids("demo") == list(reversed(new_order))
+
+
+# ── 検索・絞り込み・キーセットページング ────────────────────
+
+
+async def _list(client: AsyncClient, **params) -> list[str]:
+    r = await client.get("/api/admin/questions", params=params)
+    assert r.status_code == 200
+    return [q["question_id"] for q in r.json()]
+
+
+@pytest.mark.asyncio
+async def test_search_questions_by_text_tag_and_enabled(client: AsyncClient):
+    await admin_login(client)
+    assert await _list(client, q="首都はどこ") == ["q1"]  # trigram（3 文字以上）
+    assert await _list(client, q="東京") == ["q1"]  # 選択肢・2 文字（LIKE）
+    assert await _list(client, q="h2o") == ["q2"]  # 大文字小文字を区別しない
+    assert await _list(client, q="100%") == []
+    assert await _list(client, tag="歴史") == ["q3", "q5"]
+    assert await _list(client, tag=["歴史", "文学"]) == ["q5"]
+
+    await client.put("/api/admin/questions/q3/enabled", json={"enabled": False})
+    assert await _list(client, tag="歴史", enabled="true") == ["q5"]
+    assert await _list(client, enabled="false") == ["q3"]
+
+
+@pytest.mark.asyncio
+async def test_search_index_follows_edits(client: AsyncClient, session_factory):
+    await admin_login(client)
+    r = await client.post("/api/admin/questions", json={
+        "question_text": "富士山の標高は？",
+        "choices": _SAMPLE_CHOICES,
+        "correct_choice_index": 0,
+        "tags": [" 地理 ", "地理", ""],
+    })
+    qid = r.json()["question_id"]
+    assert r.json()["tags"] == ["地理"]
+    assert await _list(client, q="富士山") == [qid]
+
+    r = await client.put(f"/api/admin/questions/{qid}", json={
+        "question_text": "エベレストの標高は？", "tags": ["山"],
+    })
+    assert r.json()["tags"] == ["山"]
+    assert await _list(client, q="富士山") == []
+    assert await _list(client, q="エベレスト", tag="山") == [qid]
+    assert await _list(client, tag="地理") == ["q1"]
+
+    async with session_factory() as session:
+        assert await stores_for(session).question(session).delete(qid)
+        await session.commit()
+    assert await _list(client, q="エベレスト") == []
+
+
+@pytest.mark.asyncio
+async def test_list_questions_keyset_pagination(client: AsyncClient):
+    await admin_login(client)
+    # 同じ sort_order の問題も id 順で取りこぼさない
+    for i in range(3):
+        await client.post("/api/admin/questions", json={
+            "question_text": f"追加 {i}", "choices": _SAMPLE_CHOICES, "correct_choice_index": 0,
+        })
+    everything = await _list(client)
+    assert len(everything) == 8
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        r = await client.get("/api/admin/questions", params=params)
+        seen += [q["question_id"] for q in r.json()]
+        cursor = r.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+    assert seen == everything
+    assert (await client.get("/api/admin/questions", params={"cursor": "!!"})).status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_index_missing_backfills_existing_questions(client: AsyncClient, session_factory):
+    from sqlalchemy import delete
+
+    from app.models.question import QuestionSearch
+
+    async with session_factory() as session:
+        await session.execute(delete(QuestionSearch))
+        store = stores_for(session).question(session)
+        assert await store.index_missing() == 5
+        assert await store.index_missing() == 0
+        assert [q.id for q in await store.search(query="紫式部")] == ["q5"]
@@ -2,9 +2,18 @@
 
 from __future__ import annotations
 
+import csv
+import io
+import random
+import uuid
+
 import pytest
 from httpx import AsyncClient
 
+from app.models.answer import Answer
+from app.models.user import EventUser
+from app.services.ranking_service import RankingService
+from app.store import stores_for
 from tests.conftest import admin_login, join_and_register
 
 
@@ -65,3 +74,86 @@ async def test_ranking_order(client: AsyncClient):
     lb = r.json()["leaderboard"]
     assert len(lb) == 1
     assert lb[0]["correct_count"] == 1
+
+
+# ── CSV エクスポート（ストリーミング） ─────────────────
+
+
+async def _seed_answers(session_factory, n_users: int, seed: int = 7) -> None:
+    """demo イベントに参加者と回答（同着を含む）を直接書き込む。"""
+    rng = random.Random(seed)
+    async with session_factory() as session:
+        qids = await stores_for(session).event(session).get_question_ids("demo")
+        for i in range(n_users):
+            uid = f"u{i:04d}"
+            session.add(EventUser(
+                id=uid, event_id="demo", display_name=f"user{i}",
+                display_suffix=f"{i:04d}", joined_at=f"2026-01-01T00:00:{i % 60:02d}+00:00",
+            ))
+            for qid in qids:
+                if rng.random() < 0.2:
+                    continue  # 未回答
+                correct = rng.random() < 0.5
+                session.add(Answer(
+                    id=str(uuid.uuid4()), event_id="demo", question_id=qid, user_id=uid,
+                    choice_index=rng.randrange(4),
+                    delivered_at="2026-01-01T00:00:00+00:00",
+                    submitted_at="2026-01-01T00:00:01+00:00",
+                    accepted=rng.random() < 0.9,
+                    is_correct=correct,
+                    response_time_sec_1dp=rng.choice([0.5, 1.0, 1.5]),
+                ))
+        await session.commit()
+
+
+def _csv_rows(text: str) -> list[list[str]]:
+    return list(csv.reader(io.StringIO(text)))
+
+
+@pytest.mark.asyncio
+async def test_csv_stream_matches_leaderboard(client: AsyncClient, session_factory):
+    """小さな batch_size で分割して読んでも、順位・集計値がリーダーボードと一致する。"""
+    await _seed_answers(session_factory, 60)
+
+    async with session_factory() as session:
+        stores = stores_for(session)
+        service = RankingService(
+            stores.event(session), stores.user(session), stores.answer(session),
+        )
+        chunks = [c async for c in await service.export_csv("demo", batch_size=7)]
+        expected = (await service.calculate("demo")).leaderboard
+
+    assert len(chunks) == 9  # 60 行 / 7 行ずつ（先頭チャンクにヘッダ）
+    rows = _csv_rows("".join(chunks))[1:]
+    assert len(rows) == len(expected)
+    ranks = [(e.rank, e.correct_count, e.unanswered_count, e.correct_time_sum_sec_1dp) for e in expected]
+    got = [(int(r[0]), int(r[2]), int(r[3]), float(r[5])) for r in rows]
+    assert got == ranks
+    assert len({r[0] for r in rows}) < len(rows)  # 同着が含まれている
+
+
+@pytest.mark.asyncio
+async def test_csv_wide_format(client: AsyncClient):
+    await admin_login(client)
+    await join_and_register(client, display_name="wide")
+    await client.post("/api/admin/events/demo/start")
+    r = await client.post("/api/admin/events/demo/questions/next")
+    qid = r.json()["question_id"]
+    await client.post(f"/api/events/demo/questions/{qid}/answers", json={"choice_index": 2})
+
+    r = await client.get("/api/events/demo/results/csv", params={"format": "wide"})
+    assert r.status_code == 200
+    header, row = _csv_rows(r.content.decode("utf-8-sig"))
+    assert header[6:9] == ["Q1 選択肢", "Q1 正誤", "Q1 回答時間(秒)"]
+    assert len(header) == 6 + 3 * 5
+    assert row[6:8] == ["2", "○"]
+    assert row[9:] == [""] * 12  # Q2 以降は未回答
+
+    r = await client.get("/api/events/demo/results/csv", params={"format": "xml"})
+    assert r.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_csv_not_found(client: AsyncClient):
+    r = await client.get("/api/events/nonexistent/results/csv")
+    assert r.status_code == 404
@@ -15,14 +15,10 @@ from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from app.seed import seed_all
 from app.services.answer_service import AnswerService
 from app.services.event_service import EventService
+from app.services.event_state import event_state_cache
 from app.services.question_service import QuestionService
 from app.services.ranking_service import RankingService
-from app.store.sqlite_store import (
-    SQLiteAnswerStore,
-    SQLiteEventStore,
-    SQLiteQuestionStore,
-    SQLiteUserStore,
-)
+from app.store import stores_for
 from app.ws.manager import ConnectionManager
 from app.models.user import EventSession, EventUser
 
@@ -57,37 +53,40 @@ def ws_manager():
 
 @pytest_asyncio.fixture
 async def event_svc(session, ws_manager):
+    stores = stores_for(session)
     return EventService(
-        event_store=SQLiteEventStore(session),
-        question_store=SQLiteQuestionStore(session),
-        user_store=SQLiteUserStore(session),
-        answer_store=SQLiteAnswerStore(session),
+        event_store=stores.event(session),
+        question_store=stores.question(session),
+        user_store=stores.user(session),
+        answer_store=stores.answer(session),
         ws_manager=ws_manager,
     )
 
 
 @pytest_asyncio.fixture
 async def answer_svc(session, ws_manager):
+    stores = stores_for(session)
     return AnswerService(
-        answer_store=SQLiteAnswerStore(session),
-        event_store=SQLiteEventStore(session),
-        question_store=SQLiteQuestionStore(session),
-        user_store=SQLiteUserStore(session),
+        answer_store=stores.answer(session),
+        event_store=stores.event(session),
+        question_store=stores.question(session),
+        user_store=stores.user(session),
         ws_manager=ws_manager,
     )
 
 
 @pytest_asyncio.fixture
 async def question_svc(session):
-    return QuestionService(SQLiteQuestionStore(session))
+    return QuestionService(stores_for(session).question(session))
 
 
 @pytest_asyncio.fixture
 async def ranking_svc(session):
+    stores = stores_for(session)
     return RankingService(
-        event_store=SQLiteEventStore(session),
-        user_store=SQLiteUserStore(session),
-        answer_store=SQLiteAnswerStore(session),
+        event_store=stores.event(session),
+        user_store=stores.user(session),
+        answer_store=stores.answer(session),
     )
 
 
@@ -421,10 +420,12 @@ async def test_answer_submit_deadline_passed(answer_svc, event_svc, session):
     await event_svc.next_question("demo")
 
     # 期限を過去に設定
-    store = SQLiteEventStore(session)
+    store = stores_for(session).event(session)
     past = datetime.now(timezone.utc) - timedelta(seconds=30)
     await store.update("demo", current_deadline_at=past.isoformat())
     await session.flush()
+    # サービスを経由しない更新なので出題状態キャッシュを破棄する
+    await event_state_cache.invalidate("demo")
 
     sid, _ = await _create_user_session(session)
     res = await answer_svc.submit("demo", "q1", sid, 0)
@@ -690,10 +691,10 @@ async def test_ranking_calculate_tie(ranking_svc, event_svc, answer_svc, session
 
 @pytest.mark.asyncio
 async def test_ranking_export_csv(ranking_svc, event_svc):
-    """CSV エクスポートはヘッダを含む文字列を返す。"""
+    """CSV エクスポートはヘッダを含むチャンク列を返す。"""
     await event_svc.start("demo")
     await event_svc.finish("demo")
-    csv_text = await ranking_svc.export_csv("demo")
+    csv_text = "".join([c async for c in await ranking_svc.export_csv("demo")])
     assert "順位" in csv_text
     assert "表示名" in csv_text
 
@@ -709,7 +710,7 @@ async def test_ranking_export_csv_with_data(
     await answer_svc.submit("demo", nxt.question_id, sid, 0)
     await event_svc.finish("demo")
 
-    csv_text = await ranking_svc.export_csv("demo")
+    csv_text = "".join([c async for c in await ranking_svc.export_csv("demo")])
     lines = [l for l in csv_text.splitlines() if l]
     assert len(lines) >= 2  # ヘッダ + 1ユーザ
 
@@ -0,0 +1,118 @@
+"""SQLite 実行時プロファイル（PRAGMA・writer への書き込み集約）のテスト。"""
+
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event, select, text
+
+import app.models  # noqa: F401 — メタデータに全モデル登録
+from app.database import Base, create_engines, create_session_factory, is_sqlite_file
+from app.models.event import Event
+
+
+def test_is_sqlite_file():
+    assert is_sqlite_file("sqlite+aiosqlite:////tmp/quiz.db")
+    assert not is_sqlite_file("sqlite+aiosqlite://")
+    assert not is_sqlite_file("sqlite+aiosqlite:///:memory:")
+    assert not is_sqlite_file("postgresql+asyncpg://u:p@db/quiz")
+
+
+@pytest_asyncio.fixture
+async def engines(tmp_path):
+    reader, writer = create_engines(f"sqlite+aiosqlite:///{tmp_path / 'quiz.db'}", sqlite_tuning=True)
+    async with writer.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield reader, writer
+    await reader.dispose()
+    await writer.dispose()
+
+
+@pytest.mark.asyncio
+async def test_pragmas_applied_on_connect(engines):
+    reader, _ = engines
+    async with reader.connect() as conn:
+        assert (await conn.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+        assert (await conn.execute(text("PRAGMA synchronous"))).scalar() == 1  # NORMAL
+        assert (await conn.execute(text("PRAGMA busy_timeout"))).scalar() > 0
+
+
+@pytest.mark.asyncio
+async def test_writes_routed_to_single_writer(engines):
+    reader, writer = engines
+    seen: dict[str, list[str]] = {"reader": [], "writer": []}
+    for name, e in (("reader", reader), ("writer", writer)):
+        event.listen(
+            e.sync_engine, "before_cursor_execute",
+            lambda *a, _n=name: seen[_n].append(a[2].split()[0].upper()),
+        )
+    factory = create_session_factory(reader, writer)
+    now = datetime.now(timezone.utc).isoformat()
+
+    async with factory() as session:
+        await session.execute(select(Event))
+        session.add(Event(id="e1", title="t", join_code="1", created_at=now))
+        await session.flush()
+        # 書き込み後の読み取りは自分の未コミットの行が見える writer で行う
+        assert (await session.execute(select(Event.id))).scalar_one() == "e1"
+        await session.commit()
+
+    assert seen["reader"] == ["SELECT"]
+    assert seen["writer"] == ["INSERT", "SELECT"]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_writers_do_not_lock(engines):
+    """書き込みトランザクションは writer 接続を順番に使い、locked エラーにならない。"""
+    factory = create_session_factory(*engines)
+    now = datetime.now(timezone.utc).isoformat()
+
+    async def _write(i: int) -> None:
+        async with factory() as session:
+            await session.execute(select(Event))  # 読み取りから始まるトランザクション
+            session.add(Event(id=f"e{i}", title="t", join_code="1", created_at=now))
+            await session.commit()
+
+    await asyncio.gather(*[_write(i) for i in range(50)])
+    async with factory() as session:
+        assert len((await session.execute(select(Event.id))).all()) == 50
+
+
+@pytest.mark.asyncio
+async def test_next_question_releases_writer_before_fanout(engines):
+    """出題の配信を待つ間、writer 接続を他のリクエストに譲る。"""
+    from app.seed import seed_all
+    from app.services.event_service import EventService
+    from app.store import stores_for
+    from app.ws.manager import ConnectionManager
+
+    _, writer = engines
+    factory = create_session_factory(*engines)
+    async with factory() as session:
+        await seed_all(session)
+
+    checked_out: list[int] = []
+
+    class _Manager(ConnectionManager):
+        async def broadcast_question(self, event_id, payload):
+            checked_out.append(writer.sync_engine.pool.checkedout())
+            return await super().broadcast_question(event_id, payload)
+
+    async with factory() as session:
+        stores = stores_for(session)
+        service = EventService(
+            event_store=stores.event(session),
+            question_store=stores.question(session),
+            user_store=stores.user(session),
+            answer_store=stores.answer(session),
+            ws_manager=_Manager(),
+        )
+        await service.start("demo")
+        await session.commit()
+        await service.next_question("demo")
+        await session.commit()
+
+    assert checked_out == [0]
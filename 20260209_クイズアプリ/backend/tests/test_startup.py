@@ -0,0 +1,124 @@
+"""起動処理（テーブル作成の省略・シード投入のロック・問題バンク・起動時間の計測）のテスト。"""
+
+from __future__ import annotations
+
+import asyncio
+
+import fakeredis
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import event, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from starlette.testclient import TestClient
+
+import app.database as database
+import app.seed as seed
+from app.database import Base, init_db
+from app.main import app
+from app.models.admin import Admin
+from app.models.question import Question
+from app.seed import seed_all
+from app.services.question_bank import QuestionBank, question_bank
+from app.store.sqlite_store import SQLiteQuestionStore
+from app.valkey import ValkeyPool
+from tests.conftest import admin_login
+
+
+@pytest.mark.asyncio
+async def test_init_db_skips_create_all_when_alembic_head_applied(test_engine, monkeypatch):
+    # マイグレーション未作成なら従来どおり create_all
+    monkeypatch.setattr(database, "_alembic_heads", lambda: set())
+    assert await init_db(mode="auto", bind=test_engine) == "create_all"
+
+    monkeypatch.setattr(database, "_alembic_heads", lambda: {"abc123"})
+    assert await init_db(mode="auto", bind=test_engine) == "create_all"  # 未適用
+
+    async with test_engine.begin() as conn:
+        await conn.execute(text("CREATE TABLE alembic_version (version_num VARCHAR(32) PRIMARY KEY)"))
+        await conn.execute(text("INSERT INTO alembic_version VALUES ('abc123')"))
+    assert await init_db(mode="auto", bind=test_engine) == "skipped"
+    assert await init_db(mode="create_all", bind=test_engine) == "create_all"
+    assert await init_db(mode="skip", bind=test_engine) == "skipped"
+
+
+@pytest.mark.asyncio
+async def test_seed_is_a_single_query_once_seeded(test_engine, session_factory, monkeypatch):
+    async with session_factory() as s:
+        assert await seed_all(s) is True
+
+    statements: list[str] = []
+    event.listen(
+        test_engine.sync_engine, "before_cursor_execute",
+        lambda conn, cursor, statement, *a: statements.append(statement),
+    )
+    # 投入済みならサンプル JSON も読まない
+    monkeypatch.setattr(seed, "QUESTIONS_SAMPLE_PATH", None)
+    async with session_factory() as s:
+        assert await seed_all(s) is False
+    assert len(statements) == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_seeding_inserts_once(tmp_path, monkeypatch):
+    """同時に起動した2タスクのうち1つだけが投入する（Valkey のロック）。"""
+    monkeypatch.setattr(seed, "valkey_pool", ValkeyPool(None, redis=fakeredis.FakeAsyncRedis(decode_responses=True)))
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'quiz.db'}")
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+        async def boot() -> bool:
+            async with factory() as s:
+                return await seed_all(s)
+
+        assert sorted(await asyncio.gather(boot(), boot())) == [False, True]
+        async with factory() as s:
+            assert await s.scalar(select(func.count()).select_from(Question)) == 5
+            assert await s.scalar(select(func.count()).select_from(Admin)) == 1
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_question_bank_warm_and_ttl(client: AsyncClient, session_factory):
+    now = [0.0]
+    bank = QuestionBank(ttl_sec=5, clock=lambda: now[0])
+    assert await bank.warm(session_factory, SQLiteQuestionStore) == 5
+
+    q1 = bank.get("q1")
+    assert q1 is not None and len(q1.choices) == 4
+    with pytest.raises(AttributeError):
+        q1.question_text = "changed"  # 読み取り専用
+
+    now[0] = 6.0
+    assert bank.get("q1") is None
+    async with session_factory() as s:
+        assert (await bank.get_or_load("q1", SQLiteQuestionStore(s))).id == "q1"
+        assert await bank.get_or_load("missing", SQLiteQuestionStore(s)) is None
+    assert bank.stats()["misses"] == 2
+
+
+@pytest.mark.asyncio
+async def test_event_flow_reads_questions_from_bank(client: AsyncClient, session_factory):
+    await question_bank.warm(session_factory, SQLiteQuestionStore)
+    await admin_login(client)
+    assert (await client.post("/api/admin/events/demo/start")).status_code == 200
+    assert (await client.post("/api/admin/events/demo/questions/next")).status_code == 200
+    assert question_bank.stats()["misses"] == 0
+    assert question_bank.stats()["hits"] > 0
+
+    # 管理画面での編集は次の読み込みに反映される
+    r = await client.put("/api/admin/questions/q1", json={"question_text": "edited"})
+    assert r.status_code == 200
+    assert question_bank.get("q1") is None
+    current = (await client.get("/api/events/demo/questions/current")).json()
+    assert current["question"]["question_text"] == "edited"
+
+
+def test_health_reports_startup_phases():
+    with TestClient(app) as client:
+        startup = client.get("/api/health").json()["startup"]
+    assert {"init_db", "seed", "services", "total"} <= set(startup["phases_ms"])
+    assert startup["init_db"] in ("create_all", "skipped")
+    assert startup["seeded"] in (True, False)
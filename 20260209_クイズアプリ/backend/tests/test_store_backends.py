@@ -0,0 +1,67 @@
+"""ストア実装の選択と方言依存部分のテスト。
+
+PostgreSQL 上での実行は TEST_DATABASE_URL を指定して全テストを流す（conftest 参照）。
+ここでは接続なしで確認できる部分と、実行中のバックエンドでの一意制約の扱いを見る。
+"""
+
+from __future__ import annotations
+
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.dialects import postgresql
+
+from app.database import engine_options
+from app.models.answer import Answer
+from app.store import store_classes, stores_for
+from app.store.postgres_store import PostgresAnswerStore
+from app.store.sqlite_store import SQLiteAnswerStore
+from tests.conftest import join_and_register
+
+
+def test_store_classes_by_dialect():
+    assert store_classes("postgresql").answer is PostgresAnswerStore
+    assert store_classes("sqlite").answer is SQLiteAnswerStore
+
+
+def test_engine_options_pool_only_for_postgres():
+    opts = engine_options("postgresql+asyncpg://u:p@db/quiz")
+    assert opts["pool_pre_ping"] is True
+    assert "prepared_statement_cache_size" in opts["connect_args"]
+    assert engine_options("sqlite+aiosqlite://") == {}
+
+
+def test_postgres_insert_uses_on_conflict():
+    stmt = (
+        PostgresAnswerStore(None)._insert()
+        .values(id="a", event_id="e", question_id="q", user_id="u")
+        .on_conflict_do_nothing(index_elements=["event_id", "question_id", "user_id"])
+    )
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT (event_id, question_id, user_id) DO NOTHING" in sql
+
+
+@pytest.mark.asyncio
+async def test_create_if_absent_rejects_duplicate(client: AsyncClient, session_factory):
+    """同じユーザ・問題の2件目は挿入されず False が返ること。"""
+    user = await join_and_register(client)
+    now = datetime.now(timezone.utc).isoformat()
+
+    def _answer(choice: int) -> Answer:
+        return Answer(
+            id=str(uuid.uuid4()), event_id="demo", question_id="q1",
+            user_id=user["user"]["user_id"], choice_index=choice,
+            delivered_at=now, submitted_at=now, accepted=True,
+        )
+
+    async with session_factory() as session:
+        store = stores_for(session).answer(session)
+        assert await store.create_if_absent(_answer(0)) is True
+        assert await store.create_if_absent(_answer(1)) is False
+        await session.commit()
+
+    async with session_factory() as session:
+        stored = await stores_for(session).answer(session).get("demo", "q1", user["user"]["user_id"])
+        assert stored.choice_index == 0
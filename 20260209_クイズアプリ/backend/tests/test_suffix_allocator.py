@@ -0,0 +1,253 @@
+"""表示名サフィックス払い出しのテスト。"""
+
+from __future__ import annotations
+
+import asyncio
+import uuid
+from datetime import datetime, timezone
+
+import fakeredis
+import pytest
+import pytest_asyncio
+from fastapi import HTTPException
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import func, select
+
+import app.models  # noqa: F401 — メタデータに全モデル登録
+from app.database import Base, create_engines, create_session_factory, get_session
+from app.main import app
+from app.models.user import EventSession, EventUser
+from app.seed import seed_all
+from app.services.suffix_allocator import (
+    SUFFIX_SPACE,
+    InMemorySuffixAllocator,
+    ValkeySuffixAllocator,
+    suffix_allocator,
+)
+from app.store import stores_for
+from app.valkey import ValkeyPool
+from tests.conftest import admin_login, join_and_register
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class _CountingUserStore:
+    """list_suffixes の呼び出し回数を数える（払い出しで使うのはこれだけ）。"""
+
+    def __init__(self, used: set[str] | None = None) -> None:
+        self.used = used or set()
+        self.calls = 0
+
+    async def list_suffixes(self, event_id: str) -> set[str]:
+        self.calls += 1
+        await asyncio.sleep(0)
+        return set(self.used)
+
+
+@pytest.mark.asyncio
+async def test_in_memory_concurrent_allocations_are_unique():
+    allocator = InMemorySuffixAllocator()
+    store = _CountingUserStore(used={"0000", "0042"})
+    suffixes = await asyncio.gather(*[allocator.allocate("e1", store) for _ in range(9000)])
+    assert len(set(suffixes)) == 9000
+    assert not {"0000", "0042"} & set(suffixes)
+    assert store.calls == 1
+    assert allocator.remaining("e1") == SUFFIX_SPACE - 2 - 9000
+
+
+@pytest.mark.asyncio
+async def test_exhausted_pool_returns_409():
+    allocator = InMemorySuffixAllocator()
+    store = _CountingUserStore(used={f"{i:04d}" for i in range(SUFFIX_SPACE - 1)})
+    assert await allocator.allocate("e1", store) == f"{SUFFIX_SPACE - 1:04d}"
+    with pytest.raises(HTTPException) as exc:
+        await allocator.allocate("e1", store)
+    assert exc.value.status_code == 409
+
+
+@pytest.mark.asyncio
+async def test_valkey_allocators_share_one_pool():
+    """2タスク分のアロケータが同じ Valkey から払い出しても重複しない。"""
+    redis = fakeredis.FakeAsyncRedis(decode_responses=True, max_connections=2000)
+    pool = ValkeyPool(None, redis=redis)
+    a = ValkeySuffixAllocator(pool)
+    b = ValkeySuffixAllocator(pool)
+    store = _CountingUserStore(used={"1234"})
+    suffixes = await asyncio.gather(*[
+        (a if i % 2 else b).allocate("e1", store) for i in range(2000)
+    ])
+    assert len(set(suffixes)) == 2000
+    assert "1234" not in suffixes
+    assert await redis.scard("suffix_pool:e1") == SUFFIX_SPACE - 1 - 2000
+
+    await a.release_event("e1")
+    assert await redis.exists("suffix_pool:e1", "suffix_pool_init:e1") == 0
+
+
+@pytest.mark.asyncio
+async def test_9000_concurrent_users_satisfy_unique_constraint(client: AsyncClient, session_factory):
+    """9000 人分を同時に払い出し、そのまま INSERT しても (event_id, display_suffix) に当たらない。"""
+    allocator = InMemorySuffixAllocator()
+    sids = [uuid.uuid4().hex for _ in range(9000)]
+
+    async with session_factory() as session:
+        store = stores_for(session).user(session)
+        suffixes = await asyncio.gather(*[allocator.allocate("demo", store) for _ in sids])
+        for sid, suffix in zip(sids, suffixes):
+            uid = uuid.uuid4().hex
+            session.add(EventSession(id=sid, event_id="demo", user_id=uid, created_at=_now_iso()))
+            session.add(EventUser(
+                id=uid, event_id="demo", session_id=sid, display_name=f"p-{suffix}",
+                display_suffix=suffix, joined_at=_now_iso(),
+            ))
+        await session.commit()
+
+    async with session_factory() as session:
+        assert len(await stores_for(session).user(session).list_suffixes("demo")) == 9000
+
+
+@pytest_asyncio.fixture
+async def file_client(tmp_path):
+    """ファイル SQLite（本番と同じ WAL + 単一 writer 構成）を使うクライアント。
+
+    in-memory の共有接続では同時実行中のトランザクションが混ざるため、
+    多数の同時登録はこちらで確認する。
+    """
+    reader, writer = create_engines(f"sqlite+aiosqlite:///{tmp_path / 'quiz.db'}", sqlite_tuning=True)
+    async with writer.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = create_session_factory(reader, writer)
+    async with factory() as session:
+        await seed_all(session)
+
+    async def override_get_session():
+        async with factory() as session:
+            try:
+                yield session
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
+
+    app.dependency_overrides[get_session] = override_get_session
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        yield c, factory
+    app.dependency_overrides.clear()
+    await reader.dispose()
+    await writer.dispose()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_registrations_fill_db_without_conflict(file_client):
+    """同時登録でも一意制約に当たらない（HTTP 経由、ルータ・コミットまで通す）。"""
+    client, factory = file_client
+    sids = [uuid.uuid4().hex for _ in range(500)]
+    async with factory() as session:
+        session.add_all([
+            EventSession(id=sid, event_id="demo", created_at=_now_iso()) for sid in sids
+        ])
+        await session.commit()
+
+    async def _register(sid: str) -> int:
+        r = await client.post(
+            "/api/events/demo/users/register",
+            json={"display_name_base": "p"},
+            headers={"Cookie": f"session_id={sid}"},
+        )
+        return r.status_code
+
+    statuses = await asyncio.gather(*[_register(sid) for sid in sids])
+    assert set(statuses) == {200}
+
+    async with factory() as session:
+        count, distinct = (await session.execute(
+            select(func.count(), func.count(EventUser.display_suffix.distinct()))
+            .where(EventUser.event_id == "demo"),
+        )).one()
+    assert count == distinct == 500
+
+
+@pytest.mark.asyncio
+async def test_reset_rebuilds_pool(client: AsyncClient, session_factory):
+    await join_and_register(client)
+    await admin_login(client)
+    assert (await client.post("/api/admin/events/demo/reset")).status_code == 200
+
+    user = await join_and_register(client)
+    async with session_factory() as session:
+        users = await stores_for(session).user(session).list_event_users("demo")
+    assert [u.id for u in users] == [user["user"]["user_id"]]
+
+
+@pytest.mark.asyncio
+async def test_suffix_taken_by_other_worker_is_skipped(file_client):
+    """プールを共有しない別ワーカーが同じサフィックスを使っていれば、取り直して登録する。"""
+    client, factory = file_client
+    await join_and_register(client, display_name="a")
+    # 次に払い出されるサフィックスを、別ワーカーが先に使ったことにする
+    taken = suffix_allocator._pools["demo"][-1]
+    async with factory() as session:
+        sid, uid = uuid.uuid4().hex, uuid.uuid4().hex
+        session.add(EventSession(id=sid, event_id="demo", user_id=uid, created_at=_now_iso()))
+        session.add(EventUser(
+            id=uid, event_id="demo", session_id=sid, display_name=f"other-{taken}",
+            display_suffix=taken, joined_at=_now_iso(),
+        ))
+        await session.commit()
+
+    client.cookies.clear()
+    user = await join_and_register(client, display_name="b")
+    assert not user["user"]["display_name"].endswith(taken)
+    async with factory() as session:
+        assert len(await stores_for(session).user(session).list_suffixes("demo")) == 3
+
+
+@pytest.mark.asyncio
+async def test_release_returns_suffix_to_pool():
+    allocator = InMemorySuffixAllocator()
+    store = _CountingUserStore()
+    suffix = await allocator.allocate("e1", store)
+    await allocator.release("e1", suffix)
+    await allocator.release("e1", suffix)  # 二重に戻しても1件
+    assert allocator.remaining("e1") == SUFFIX_SPACE
+    await allocator.release("e2", "0001")  # プール未作成なら何もしない
+    assert allocator.remaining("e2") is None
+
+    redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    valkey = ValkeySuffixAllocator(ValkeyPool(None, redis=redis))
+    suffix = await valkey.allocate("e1", store)
+    await valkey.release("e1", suffix)
+    assert await redis.sismember("suffix_pool:e1", suffix)
+    assert await redis.scard("suffix_pool:e1") == SUFFIX_SPACE
+    await valkey.release_event("e1")
+    await valkey.release("e1", suffix)
+    assert await redis.exists("suffix_pool:e1") == 0
+
+
+@pytest.mark.asyncio
+async def test_suffix_released_when_registration_rolls_back(file_client, monkeypatch):
+    """払い出し後に登録がロールバックされたら、サフィックスはプールに戻る。"""
+    client, factory = file_client
+    await join_and_register(client, display_name="a")
+    remaining = suffix_allocator.remaining("demo")
+    next_suffix = suffix_allocator._pools["demo"][-1]
+
+    async with factory() as session:
+        store_cls = type(stores_for(session).user(session))
+
+    async def _broken_update_session(self, session_id, **kwargs):
+        raise RuntimeError("db down")
+
+    monkeypatch.setattr(store_cls, "update_session", _broken_update_session)
+    client.cookies.clear()
+    r = await client.post("/api/events/demo/join", json={"join_code": "123456"})
+    assert r.status_code == 200
+    with pytest.raises(RuntimeError):
+        await client.post("/api/events/demo/users/register", json={"display_name_base": "b"})
+    await asyncio.sleep(0.01)
+
+    assert suffix_allocator.remaining("demo") == remaining
+    assert suffix_allocator._pools["demo"][-1] == next_suffix
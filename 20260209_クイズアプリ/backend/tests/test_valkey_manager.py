@@ -0,0 +1,165 @@
+"""Valkey 版 WebSocket マネージャーの delivered_at 保存のテスト（fakeredis 使用）。"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+
+import fakeredis
+import pytest
+
+from app.ws.valkey_manager import ValkeyConnectionManager, _with_seq, delivered_key
+from tests.test_fanout import FakeWebSocket
+
+
+@pytest.fixture
+def redis():
+    return fakeredis.FakeAsyncRedis(decode_responses=True)
+
+
+@pytest.fixture
+def manager(redis):
+    return ValkeyConnectionManager("redis://fake", redis=redis)
+
+
+async def _deliver_question(manager, event_id: str, question_id: str) -> None:
+    manager._dispatch(event_id, f'Q{question_id}\n{{"type":"question.shown"}}')
+    await asyncio.gather(*manager._record_tasks)
+
+
+@pytest.mark.asyncio
+async def test_delivered_at_stored_in_one_hash(manager, redis):
+    for i in range(20):
+        await manager.connect("e1", f"s{i}", FakeWebSocket())
+    await _deliver_question(manager, "e1", "q1")
+
+    key = delivered_key("e1", "q1")
+    assert await redis.hlen(key) == 20
+    assert 0 < await redis.ttl(key) <= 3600
+    # 旧レイアウト（セッションごとのキー）は作られない
+    assert await redis.exists("delivered:e1:s0") == 0
+
+
+@pytest.mark.asyncio
+async def test_concurrent_lookups_are_batched(manager):
+    for i in range(10):
+        await manager.connect("e1", f"s{i}", FakeWebSocket())
+    await _deliver_question(manager, "e1", "q1")
+
+    before = manager._lookups.round_trips
+    values = await asyncio.gather(*[
+        manager.get_delivered_at("e1", f"s{i}", "q1") for i in range(10)
+    ], manager.get_delivered_at("e1", "unknown", "q1"))
+    assert all(values[:10])
+    assert values[10] is None
+    assert manager._lookups.round_trips - before == 1
+
+
+@pytest.mark.asyncio
+async def test_lookup_uses_current_question(manager):
+    await manager.connect("e1", "s", FakeWebSocket())
+    await _deliver_question(manager, "e1", "q1")
+    await _deliver_question(manager, "e1", "q2")
+    assert await manager.get_delivered_at("e1", "s") is not None
+    many = await manager.get_delivered_at_many("e1", "q2", ["s", "x"])
+    assert many["s"] is not None and many["x"] is None
+
+
+@pytest.mark.asyncio
+async def test_clear_delivered_at(manager, redis):
+    await manager.connect("e1", "s", FakeWebSocket())
+    await manager.connect("e2", "s", FakeWebSocket())
+    await _deliver_question(manager, "e1", "q1")
+    await _deliver_question(manager, "e1", "q2")
+    await _deliver_question(manager, "e2", "q1")
+
+    await manager.clear_delivered_at("e1")
+    assert await redis.exists(delivered_key("e1", "q1"), delivered_key("e1", "q2")) == 0
+    assert await redis.exists(delivered_key("e2", "q1")) == 1
+    assert await manager.get_delivered_at("e1", "s") is None
+
+
+# ── イベント単位の購読 ──────────────────────────────
+
+
+async def _wait_for(cond, timeout: float = 2.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not cond():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("timeout")
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_subscribes_only_events_with_local_sockets(manager, redis):
+    await manager.start_subscriber()
+    try:
+        ws = FakeWebSocket()
+        await manager.connect("e1", "s1", ws)
+        await manager.connect("e1", "s2", FakeWebSocket())
+        assert manager._subscribed == {"e1"}
+
+        # 他タスクからの publish（ローカル接続のない e2 は購読しない）
+        await manager.broadcast("e1", {"type": "event.state_changed", "data": {"state": "running"}})
+        await manager.broadcast("e2", {"type": "event.state_changed"})
+        await _wait_for(lambda: ws.sent)
+        assert len(ws.sent) == 1
+        msg = json.loads(ws.sent[0])
+        assert msg.pop("seq") > 0
+        assert msg == {"type": "event.state_changed", "data": {"state": "running"}}
+        assert manager.forwarded == 1
+
+        # 最後の1本が切れたら UNSUBSCRIBE
+        manager.disconnect("e1", "s1")
+        assert manager._subscribed == {"e1"}
+        manager.disconnect("e1", "s2")
+        await _wait_for(lambda: not manager._subscribed)
+    finally:
+        await manager.stop_subscriber()
+
+
+@pytest.mark.asyncio
+async def test_question_shown_forwarded_and_recorded(manager, redis):
+    await manager.start_subscriber()
+    try:
+        ws = FakeWebSocket()
+        await manager.connect("e1", "s1", ws)
+        await manager.broadcast_question(
+            "e1", {"type": "question.shown", "data": {"question_id": "q1"}},
+        )
+        await _wait_for(lambda: ws.sent)
+        assert json.loads(ws.sent[0])["type"] == "question.shown"
+        await _wait_for(lambda: not manager._record_tasks)
+        assert await redis.hget(delivered_key("e1", "q1"), "s1") is not None
+    finally:
+        await manager.stop_subscriber()
+
+
+def test_dropped_without_local_sockets(manager):
+    manager._dispatch("e9", '{"type":"x"}')
+    assert manager.dropped_no_local == 1
+    assert manager.stats()["dropped_no_local"] == 1
+
+
+def test_with_seq_keeps_json_valid():
+    assert json.loads(_with_seq('{"type":"x"}', 3)) == {"seq": 3, "type": "x"}
+    assert json.loads(_with_seq("{}", 1)) == {"seq": 1}
+    assert json.loads(_with_seq("{ }", 2)) == {"seq": 2}
+
+
+
+@pytest.mark.asyncio
+async def test_admin_messages_go_only_to_admin_sockets(manager, monkeypatch):
+    async def _no_subscription(event_id: str) -> None:
+        pass
+
+    monkeypatch.setattr(manager, "_sync_subscription", _no_subscription)
+    admin, participant = FakeWebSocket(), FakeWebSocket()
+    await manager.connect("e1", "admin:1", admin, admin=True)
+    await manager.connect("e1", "s1", participant)
+
+    manager._dispatch("e1", 'A\n{"type":"question.stats"}')
+    manager._dispatch("e1", '{"type":"x"}')
+    await _wait_for(lambda: len(admin.sent) == 2 and participant.sent)
+    assert admin.sent == ['{"type":"question.stats"}', '{"type":"x"}']
+    assert participant.sent == ['{"type":"x"}']
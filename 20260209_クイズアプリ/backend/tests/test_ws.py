@@ -23,3 +23,31 @@ def test_ws_no_event_id():
         with pytest.raises(Exception):
             with client.websocket_connect("/api/ws") as ws:
                 ws.receive_text()
+
+
+def test_ws_admin_session_marks_admin_socket():
+    """管理者セッションの接続だけが管理者ソケットとして登録される。"""
+    from app.ws.manager import ws_manager
+
+    def _admin_count() -> int:
+        return sum(len(a) for a in ws_manager._admins.values())
+
+    with TestClient(app) as client:
+        with client.websocket_connect("/api/ws?event_id=demo") as ws:
+            ws.send_text("ping")
+            ws.receive_text()
+            assert _admin_count() == 0
+
+        client.cookies.set("admin_session", "forged")
+        with client.websocket_connect("/api/ws?event_id=demo") as ws:
+            ws.send_text("ping")
+            ws.receive_text()
+            assert _admin_count() == 0
+
+        client.cookies.clear()
+        assert client.post("/api/admin/login", json={"password": "secret"}).status_code == 200
+        with client.websocket_connect("/api/ws?event_id=demo") as ws:
+            ws.send_text("ping")
+            ws.receive_text()
+            assert _admin_count() == 1
+        assert _admin_count() == 0
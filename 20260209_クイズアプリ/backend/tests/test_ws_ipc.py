@@ -0,0 +1,179 @@
+"""複数ワーカー（IPC バス）での配信・seq・delivered_at のテスト。
+
+1プロセス内に IPCConnectionManager を複数作り、同じ Unix ソケットでワーカーの代わりにする。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+
+import pytest
+
+from app.ws.ipc_manager import IPCConnectionManager
+from app.ws.protocol import PROTOCOL_V2, unpack
+from tests.test_fanout import FakeWebSocket
+
+
+async def _wait_for(cond, timeout: float = 2.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not cond():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("timeout")
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+async def workers(tmp_path):
+    path = str(tmp_path / "ws.sock")
+    managers = [IPCConnectionManager(path, timeout_sec=0.5) for _ in range(3)]
+    for m in managers:
+        await m.start()
+    yield managers
+    for m in managers:
+        await m.stop()
+
+
+def _texts(ws: FakeWebSocket) -> list[dict]:
+    return [json.loads(t) for t in ws.sent if isinstance(t, str)]
+
+
+@pytest.mark.asyncio
+async def test_single_broker_elected(workers):
+    assert [m.bus.broker is not None for m in workers] == [True, False, False]
+    await _wait_for(lambda: workers[0].bus.broker.workers == 3)
+
+
+@pytest.mark.asyncio
+async def test_broadcast_reaches_every_worker_with_same_seq(workers):
+    sockets = []
+    for i, m in enumerate(workers):
+        ws = FakeWebSocket()
+        await m.connect("e1", f"s{i}", ws)
+        sockets.append(ws)
+
+    # どのワーカーから送っても全ワーカーの接続へ、同じ順序・同じ seq で届く
+    await workers[1].broadcast("e1", {"type": "event.state_changed", "data": {"state": "running"}})
+    await workers[2].broadcast("e1", {"type": "question.closed", "data": {"question_id": "q1"}})
+    await _wait_for(lambda: all(len(ws.sent) == 2 for ws in sockets))
+
+    received = [[(m["seq"], m["type"]) for m in _texts(ws)] for ws in sockets]
+    assert received[0] == received[1] == received[2]
+    assert [seq for seq, _ in received[0]] == [1, 2]
+    assert {t for _, t in received[0]} == {"event.state_changed", "question.closed"}
+
+
+@pytest.mark.asyncio
+async def test_resume_on_another_worker(workers):
+    await workers[0].broadcast("e1", {"type": "event.state_changed", "data": {"state": "running"}})
+    await workers[0].broadcast("e1", {"type": "question.closed", "data": {"question_id": "q1"}})
+    await _wait_for(lambda: workers[2]._stream("e1").seq == 2)
+
+    # ワーカー0で seq=1 まで受け取ったクライアントがワーカー2に再接続
+    ws = FakeWebSocket()
+    await workers[2].connect("e1", "s1", ws, resume_from=1)
+    await _wait_for(lambda: len(ws.sent) == 1)
+    assert [(m["seq"], m["type"]) for m in _texts(ws)] == [(2, "question.closed")]
+
+
+@pytest.mark.asyncio
+async def test_delivered_at_is_visible_from_every_worker(workers):
+    ws_a, ws_b = FakeWebSocket(), FakeWebSocket()
+    await workers[1].connect("e1", "a", ws_a)
+    await workers[2].connect("e1", "b", ws_b, protocol=PROTOCOL_V2)
+
+    payload = {"type": "question.shown", "data": {"question_id": "q1", "question": {}}}
+    delivered = await workers[0].broadcast_question("e1", payload)
+    assert delivered == {}  # ワーカー0には接続がない
+
+    await _wait_for(lambda: "a" in workers[0]._delivered_at.get("e1", {}))
+    assert unpack(ws_b.sent[-1])["t"] == "question.shown"
+    # 回答を受けたワーカーに関係なく同じ時刻が引ける
+    for m in workers:
+        assert await m.get_delivered_at("e1", "a", "q1") == workers[1]._delivered_at["e1"]["a"]
+        assert await m.get_delivered_at("e1", "b", "q1") == workers[2]._delivered_at["e1"]["b"]
+        assert await m.get_delivered_at("e1", "b", "q0") is None
+    assert await workers[0].get_delivered_at("e1", "nobody", "q1") is None
+
+
+@pytest.mark.asyncio
+async def test_lookup_covers_not_yet_forwarded_entries(workers):
+    ws = FakeWebSocket()
+    await workers[1].connect("e1", "a", ws)
+    await workers[1].broadcast_question("e1", {"type": "question.shown", "data": {"question_id": "q1"}})
+    # 転送前に問い合わせが来てもブローカーが持っている
+    workers[2]._delivered_at.pop("e1", None)
+    await _wait_for(lambda: "a" in workers[0].bus.broker._delivered["e1"][1])
+    assert await workers[2].get_delivered_at("e1", "a", "q1") is not None
+
+
+@pytest.mark.asyncio
+async def test_broker_failover_keeps_seq(workers):
+    ws = FakeWebSocket()
+    await workers[2].connect("e1", "s1", ws)
+    await workers[1].broadcast("e1", {"type": "event.state_changed", "data": {"state": "running"}})
+    await _wait_for(lambda: len(ws.sent) == 1)
+
+    await workers[0].stop()  # ブローカーのワーカーが落ちる
+    await _wait_for(lambda: any(m.bus.broker is not None for m in workers[1:]))
+    await _wait_for(lambda: all(m.bus.stats()["connected"] for m in workers[1:]))
+
+    await workers[1].broadcast("e1", {"type": "question.closed", "data": {"question_id": "q1"}})
+    await _wait_for(lambda: len(ws.sent) == 2)
+    assert [m["seq"] for m in _texts(ws)] == [1, 2]
+    assert workers[1].local_only == 0
+    assert workers[1].bus.reconnects == 1
+
+
+@pytest.mark.asyncio
+async def test_preload_reaches_v2_clients_on_all_workers(workers):
+    sockets = []
+    for i, m in enumerate(workers):
+        ws = FakeWebSocket()
+        await m.connect("e1", f"s{i}", ws, protocol=PROTOCOL_V2)
+        sockets.append(ws)
+    await workers[0].preload_questions("e1", [{"question_id": "q1"}])
+    await _wait_for(lambda: all(len(ws.sent) == 2 for ws in sockets))
+    for ws in sockets:
+        frame = unpack(ws.sent[-1])
+        assert (frame["t"], frame["seq"]) == ("questions.preload", 1)
+
+
+@pytest.mark.asyncio
+async def test_local_delivery_without_broker(tmp_path):
+    """ブローカーに繋がらない間もそのワーカーの接続には送る。"""
+    m = IPCConnectionManager(str(tmp_path / "ws.sock"), timeout_sec=0.05)
+    ws = FakeWebSocket()
+    await m.connect("e1", "s1", ws)
+    delivered = await m.broadcast_question("e1", {"type": "question.shown", "data": {"question_id": "q1"}})
+    assert set(delivered) == {"s1"}
+    assert m.local_only == 1
+    assert _texts(ws)[0]["seq"] == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidation_reaches_other_workers(workers):
+    received: list[list[tuple[str, str | None]]] = [[] for _ in workers]
+    for i, m in enumerate(workers):
+        m.on_invalidate("participant", lambda key, i=i: received[i].append(("participant", key)))
+    await _wait_for(lambda: workers[0].bus.broker.workers == 3)
+
+    await workers[1].publish_invalidation("participant", "s1")
+    await workers[1].publish_invalidation("unknown", None)  # 受け取り手がいなければ何もしない
+    await _wait_for(lambda: all(workers[i].invalidations_received == 2 for i in (0, 2)))
+    assert received == [[("participant", "s1")], [], [("participant", "s1")]]
+    assert workers[1].stats()["invalidations_sent"] == 2
+
+
+@pytest.mark.asyncio
+async def test_admin_broadcast_reaches_only_admin_sockets(workers):
+    admin, participant = FakeWebSocket(), FakeWebSocket()
+    await workers[2].connect("e1", "admin:1", admin, admin=True)
+    await workers[2].connect("e1", "s1", participant)
+
+    await workers[0].broadcast_admin("e1", {"type": "question.stats", "data": {"answered_count": 1}})
+    await _wait_for(lambda: admin.sent)
+    await asyncio.sleep(0.05)
+    assert _texts(admin) == [{"type": "question.stats", "data": {"answered_count": 1}}]
+    assert participant.sent == []
+    assert workers[2]._stream("e1").seq == 0  # seq・再送履歴を消費しない
@@ -0,0 +1,118 @@
+"""WebSocket プロトコル v2（msgpack・seq・再送）のテスト。"""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from starlette.testclient import TestClient
+
+from app.main import app
+from app.ws.manager import ConnectionManager
+from app.ws.protocol import EventStream, unpack
+from tests.test_fanout import FakeWebSocket
+
+_SHOWN = {
+    "type": "question.shown",
+    "data": {
+        "question_id": "q1",
+        "question": {"question_id": "q1", "question_text": "長い問題文", "choices": []},
+        "started_at": "2026-01-01T00:00:00+00:00",
+        "deadline_at": "2026-01-01T00:00:10+00:00",
+    },
+}
+
+
+async def _drain() -> None:
+    await asyncio.sleep(0.01)
+
+
+def _frames(ws: FakeWebSocket) -> list[dict]:
+    return [unpack(f) for f in ws.sent if isinstance(f, bytes)]
+
+
+@pytest.mark.asyncio
+async def test_v1_and_v2_clients_get_their_own_encoding():
+    mgr = ConnectionManager()
+    v1, v2 = FakeWebSocket(), FakeWebSocket()
+    await mgr.connect("e1", "a", v1)
+    await mgr.connect("e1", "b", v2, protocol="v2")
+    await mgr.preload_questions("e1", [{"question_id": "q1", "question_text": "長い問題文"}])
+    delivered = await mgr.broadcast_question("e1", _SHOWN)
+    await mgr.broadcast("e1", {"type": "question.closed", "data": {"question_id": "q1"}})
+    await _drain()
+
+    assert set(delivered) == {"a", "b"}
+    assert all(isinstance(m, str) for m in v1.sent)
+    assert "長い問題文" in v1.sent[0]
+
+    frames = _frames(v2)
+    assert [f["t"] for f in frames] == ["hello", "questions.preload", "question.shown", "question.closed"]
+    shown = frames[2]
+    assert shown["d"] == {
+        "question_id": "q1",
+        "started_at": "2026-01-01T00:00:00+00:00",
+        "deadline_at": "2026-01-01T00:00:10+00:00",
+    }
+    seqs = [f["seq"] for f in frames[1:]]
+    assert seqs == sorted(seqs) and len(set(seqs)) == len(seqs)
+
+
+@pytest.mark.asyncio
+async def test_resume_replays_missed_frames():
+    mgr = ConnectionManager()
+    first = FakeWebSocket()
+    await mgr.connect("e1", "s", first, protocol="v2")
+    await mgr.broadcast("e1", {"type": "event.state_changed", "data": {"state": "running"}})
+    await _drain()
+    last_seq = _frames(first)[-1]["seq"]
+    mgr.disconnect("e1", "s", first)
+
+    # 切断中に2件
+    await mgr.broadcast_question("e1", _SHOWN)
+    await mgr.broadcast("e1", {"type": "question.closed", "data": {"question_id": "q1"}})
+
+    again = FakeWebSocket()
+    await mgr.connect("e1", "s", again, protocol="v2", resume_from=last_seq)
+    await _drain()
+    frames = _frames(again)
+    assert [f["t"] for f in frames] == ["hello", "question.shown", "question.closed"]
+    assert frames[1]["seq"] == last_seq + 1
+
+
+@pytest.mark.asyncio
+async def test_resume_outside_history_requests_resync():
+    mgr = ConnectionManager()
+    mgr._streams["e1"] = EventStream(history_size=2)
+    await mgr.preload_questions("e1", [])
+    for _ in range(5):
+        await mgr.broadcast("e1", {"type": "x", "data": None})
+
+    ws = FakeWebSocket()
+    await mgr.connect("e1", "s", ws, protocol="v2", resume_from=0)
+    await _drain()
+    assert [f["t"] for f in _frames(ws)] == ["hello", "resync", "questions.preload"]
+
+
+def test_event_stream_replay_bounds():
+    stream = EventStream(history_size=3)
+    for i in range(5):
+        stream.append("x", i)
+    assert stream.replay_from(5) == []
+    assert [unpack(f)["d"] for f in stream.replay_from(2)] == [2, 3, 4]
+    assert stream.replay_from(1) is None
+
+
+def test_ws_v2_handshake():
+    with TestClient(app) as client:
+        with client.websocket_connect("/api/ws?event_id=demo&protocol=v2") as ws:
+            hello = unpack(ws.receive_bytes())
+            assert hello["t"] == "hello"
+            assert hello["d"] == {"protocol": "v2"}
+
+
+def test_ws_unknown_protocol_rejected():
+    with TestClient(app) as client:
+        with pytest.raises(Exception):
+            with client.websocket_connect("/api/ws?event_id=demo&protocol=v9") as ws:
+                ws.receive_bytes()
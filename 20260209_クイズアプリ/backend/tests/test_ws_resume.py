@@ -0,0 +1,172 @@
+"""再接続時の再送（?resume_from）と接続受付レート制限のテスト。"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+
+import fakeredis
+import pytest
+from starlette.testclient import TestClient
+
+from app.main import app
+from app.ws.admission import AcceptLimiter
+from app.ws.manager import ConnectionManager
+from app.ws.protocol import EventStream
+from app.ws.valkey_manager import ValkeyConnectionManager, event_log_key
+from tests.test_fanout import FakeWebSocket
+
+
+async def _drain() -> None:
+    await asyncio.sleep(0.01)
+
+
+def _messages(ws: FakeWebSocket) -> list[dict]:
+    return [json.loads(t) for t in ws.sent if isinstance(t, str)]
+
+
+# ── インメモリ（v1） ────────────────────────────────
+
+
+@pytest.mark.asyncio
+async def test_v1_clients_resume_from_ring_buffer():
+    """一斉に再接続した v1 クライアントが、切断中の配信を履歴から受け取る。"""
+    mgr = ConnectionManager()
+    first = [FakeWebSocket() for _ in range(200)]
+    for i, ws in enumerate(first):
+        await mgr.connect("e1", f"s{i}", ws)
+    await mgr.broadcast("e1", {"type": "event.state_changed", "data": {"state": "running"}})
+    await _drain()
+    last_seq = _messages(first[0])[-1]["seq"]
+    for i, ws in enumerate(first):
+        mgr.disconnect("e1", f"s{i}", ws)
+
+    await mgr.broadcast_question("e1", {"type": "question.shown", "data": {"question_id": "q1"}})
+    await mgr.broadcast("e1", {"type": "question.closed", "data": {"question_id": "q1"}})
+
+    again = [FakeWebSocket() for _ in range(200)]
+    for i, ws in enumerate(again):
+        await mgr.connect("e1", f"s{i}", ws, resume_from=last_seq)
+    await _drain()
+    for ws in again:
+        msgs = _messages(ws)
+        assert [m["type"] for m in msgs] == ["question.shown", "question.closed"]
+        assert [m["seq"] for m in msgs] == [last_seq + 1, last_seq + 2]
+    # 最新まで受け取っている場合は何も送らない
+    up_to_date = FakeWebSocket()
+    await mgr.connect("e1", "x", up_to_date, resume_from=last_seq + 2)
+    await _drain()
+    assert up_to_date.sent == []
+
+
+@pytest.mark.asyncio
+async def test_v1_resume_outside_history_requests_resync():
+    mgr = ConnectionManager()
+    mgr._streams["e1"] = EventStream(history_size=2)
+    for _ in range(5):
+        await mgr.broadcast("e1", {"type": "x", "data": None})
+    # preload は v2 専用なので v1 の再送には含まれない
+    await mgr.preload_questions("e1", [])
+
+    ws = FakeWebSocket()
+    await mgr.connect("e1", "s", ws, resume_from=0)
+    await _drain()
+    assert [m["type"] for m in _messages(ws)] == ["resync"]
+
+    ws = FakeWebSocket()
+    await mgr.connect("e1", "t", ws, resume_from=4)
+    await _drain()
+    assert [m["seq"] for m in _messages(ws)] == [5]
+
+
+# ── Valkey stream ──────────────────────────────────
+
+
+@pytest.mark.asyncio
+async def test_valkey_event_log_resume():
+    redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    publisher = ValkeyConnectionManager("redis://fake", redis=redis, history_size=3)
+    other_task = ValkeyConnectionManager("redis://fake", redis=redis, history_size=3)
+
+    await publisher.broadcast("e1", {"type": "event.state_changed", "data": {"state": "running"}})
+    first = await publisher.replay_from("e1", 0)
+    last_seq = json.loads(first[-1])["seq"]
+    await publisher.broadcast_question("e1", {"type": "question.shown", "data": {"question_id": "q1"}})
+    await publisher.broadcast("e1", {"type": "question.closed", "data": {"question_id": "q1"}})
+    assert 0 < await redis.ttl(event_log_key("e1")) <= 3600
+
+    ws = FakeWebSocket()
+    await other_task.connect("e1", "s", ws, resume_from=last_seq)
+    await _drain()
+    msgs = _messages(ws)
+    assert [m["type"] for m in msgs] == ["question.shown", "question.closed"]
+    assert msgs[0]["seq"] > last_seq and msgs[1]["seq"] > msgs[0]["seq"]
+    assert msgs[0]["data"] == {"question_id": "q1"}
+
+    # 上限を超えて切り詰められた範囲からの再開は resync
+    for _ in range(3):
+        await publisher.broadcast("e1", {"type": "x", "data": None})
+    ws = FakeWebSocket()
+    await other_task.connect("e1", "t", ws, resume_from=last_seq)
+    await _drain()
+    assert [m["type"] for m in _messages(ws)] == ["resync"]
+    assert other_task.stats()["resumed"] == 1 and other_task.stats()["resynced"] == 1
+
+
+# ── 接続受付のレート制限 ─────────────────────────────
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_accept_limiter_spreads_retries():
+    clock = _Clock()
+    limiter = AcceptLimiter(100, 10, max_retry_sec=5, jitter=0.5, clock=clock, rng=lambda: 1.0)
+    assert all(limiter.try_acquire() is None for _ in range(10))
+
+    waits = [limiter.try_acquire() for _ in range(50)]
+    assert all(w is not None for w in waits)
+    # 後から断られた接続ほど後ろの枠を案内される（ジッタ 50% 込み）
+    assert waits == sorted(waits)
+    assert waits[0] == pytest.approx(0.01 * 1.5)
+    assert waits[-1] == pytest.approx(0.5 * 1.5)
+
+    # 案内した枠の頃にはトークンが補充されて受け付ける
+    clock.now = 0.5
+    assert limiter.try_acquire() is None
+    assert limiter.stats()["rejected"] == 50
+
+    # 待ち時間は上限で頭打ち
+    for _ in range(2000):
+        wait = limiter.try_acquire()
+    assert wait == 5
+
+
+def test_accept_limiter_jitter_range():
+    limiter = AcceptLimiter(10, 1, jitter=0.5, clock=_Clock())
+    limiter.try_acquire()
+    limiter.reset()
+    limiter.try_acquire()
+    waits = {limiter.try_acquire() for _ in range(20)}
+    assert len(waits) > 1
+
+
+def test_ws_rejects_with_retry_hint(monkeypatch):
+    import app.routers.ws as ws_router
+
+    monkeypatch.setattr(ws_router, "accept_limiter", AcceptLimiter(0.001, 1))
+    with TestClient(app) as client:
+        with client.websocket_connect("/api/ws?event_id=demo"):
+            pass
+        with client.websocket_connect("/api/ws?event_id=demo") as ws:
+            msg = ws.receive_json()
+            assert msg["type"] == "retry"
+            assert msg["data"]["retry_after_ms"] > 0
+            close = ws.receive()
+            assert close["type"] == "websocket.close"
+            assert close["code"] == 1013
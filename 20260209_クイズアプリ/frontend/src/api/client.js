@@ -10,8 +10,8 @@ async function request(path, options = {}) {
 
   const res = await fetch(path, {
     credentials: 'include',
-    headers: { ...headers, ...(options.headers || {}) },
     ...options,
+    headers: { ...headers, ...(options.headers || {}) },
   })
   return res
 }
@@ -20,10 +20,11 @@ export function get(path) {
   return request(path, { method: 'GET' })
 }
 
-export function post(path, body) {
+export function post(path, body, headers) {
   return request(path, {
     method: 'POST',
     body: body !== undefined ? (body instanceof FormData ? body : JSON.stringify(body)) : undefined,
+    headers,
   })
 }
 
@@ -9,6 +9,7 @@ const DEFAULT_FORM = {
   choices: [EMPTY_CHOICE(0), EMPTY_CHOICE(1), EMPTY_CHOICE(2), EMPTY_CHOICE(3)],
   correct_choice_index: 0,
   is_enabled: true,
+  tags: '',
 }
 
 export default function QuestionForm({ initial, onSaved, onCancel }) {
@@ -22,6 +23,7 @@ export default function QuestionForm({ initial, onSaved, onCancel }) {
       choices: initial.choices.map(c => ({ ...c })),
       correct_choice_index: initial.correct_choice_index ?? 0,
       is_enabled: initial.is_enabled ?? true,
+      tags: (initial.tags || []).join(', '),
     }
   })
   const [error, setError] = useState('')
@@ -66,6 +68,7 @@ export default function QuestionForm({ initial, onSaved, onCancel }) {
         choices: form.choices.map((c, i) => ({ choice_index: i, text: c.text })),
         correct_choice_index: Number(form.correct_choice_index),
         is_enabled: form.is_enabled,
+        tags: form.tags.split(',').map(t => t.trim()).filter(Boolean),
       }
       const res = isEdit
         ? await put(`/api/admin/questions/${initial.question_id}`, body)
@@ -126,6 +129,17 @@ export default function QuestionForm({ initial, onSaved, onCancel }) {
         ))}
       </div>
 
+      <div style={{ marginBottom: 8 }}>
+        <label>タグ（カンマ区切り）</label><br />
+        <input
+          type="text"
+          placeholder="例: 地理, 歴史"
+          style={{ width: '100%', marginTop: 4 }}
+          value={form.tags}
+          onChange={e => setForm(f => ({ ...f, tags: e.target.value }))}
+        />
+      </div>
+
       <div style={{ marginBottom: 8 }}>
         <label>
           <input
@@ -14,9 +14,10 @@ import {
 } from '@dnd-kit/sortable'
 import { CSS } from '@dnd-kit/utilities'
 
-function SortableRow({ question, onEdit, onToggleEnabled }) {
+function SortableRow({ question, sortable, onEdit, onToggleEnabled }) {
   const { attributes, listeners, setNodeRef, transform, transition } = useSortable({
     id: question.question_id,
+    disabled: !sortable,
   })
 
   const style = {
@@ -32,11 +33,17 @@ function SortableRow({ question, onEdit, onToggleEnabled }) {
 
   return (
     <div ref={setNodeRef} style={style}>
-      {/* ドラッグハンドル */}
+      {/* ドラッグハンドル（絞り込み中・一部だけ読み込んだ状態では並び替えない） */}
       <span
         {...attributes}
         {...listeners}
-        style={{ cursor: 'grab', color: '#999', userSelect: 'none', paddingTop: 2 }}
+        style={{
+          cursor: sortable ? 'grab' : 'default',
+          color: '#999',
+          userSelect: 'none',
+          paddingTop: 2,
+          visibility: sortable ? 'visible' : 'hidden',
+        }}
         title="ドラッグして並び替え"
       >
         ⠿
@@ -58,6 +65,13 @@ function SortableRow({ question, onEdit, onToggleEnabled }) {
             </span>
           ))}
         </div>
+        {question.tags?.length > 0 && (
+          <div style={{ fontSize: '0.8em', color: '#0366d6', marginTop: 2 }}>
+            {question.tags.map(t => (
+              <span key={t} style={{ marginRight: 6 }}>#{t}</span>
+            ))}
+          </div>
+        )}
       </div>
 
       <div style={{ display: 'flex', gap: 6, alignItems: 'center' }}>
@@ -77,7 +91,7 @@ function SortableRow({ question, onEdit, onToggleEnabled }) {
   )
 }
 
-export default function QuestionList({ questions, onQuestionsChange, onEdit }) {
+export default function QuestionList({ questions, onQuestionsChange, onEdit, sortable = true }) {
   const sensors = useSensors(useSensor(PointerSensor))
 
   async function handleDragEnd(event) {
@@ -123,6 +137,7 @@ export default function QuestionList({ questions, onQuestionsChange, onEdit }) {
           <SortableRow
             key={q.question_id}
             question={q}
+            sortable={sortable}
             onEdit={onEdit}
             onToggleEnabled={handleToggleEnabled}
           />
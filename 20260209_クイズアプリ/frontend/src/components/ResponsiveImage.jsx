@@ -0,0 +1,29 @@
+// 画像の縮小版（AVIF / WebP）があれば <picture> で端末に合った幅・形式を選ばせる
+const IMAGE_SIZES = '(max-width: 600px) 100vw, 600px'
+
+export default function ResponsiveImage({ src, sources = [], alt, style }) {
+  return (
+    <picture>
+      {sources.map(s => (
+        <source key={s.type} type={s.type} srcSet={s.srcset} sizes={IMAGE_SIZES} />
+      ))}
+      <img src={src} alt={alt} style={style} decoding="async" />
+    </picture>
+  )
+}
+
+// 開始時に受け取った画像を <link rel="preload"> で先読みする（同じ画像は1回だけ）
+export function preloadImages(entries = []) {
+  for (const { src, srcset } of entries) {
+    if (document.head.querySelector(`link[rel="preload"][href="${CSS.escape(src)}"]`)) continue
+    const link = document.createElement('link')
+    link.rel = 'preload'
+    link.as = 'image'
+    link.href = src
+    if (srcset) {
+      link.setAttribute('imagesrcset', srcset)
+      link.setAttribute('imagesizes', IMAGE_SIZES)
+    }
+    document.head.appendChild(link)
+  }
+}
@@ -24,7 +24,9 @@ export function AuthProvider({ children }) {
     setIsAdmin(true)
   }, [])
 
-  const logout = useCallback(() => {
+  const logout = useCallback(async () => {
+    // サーバ側のセッションも破棄する（失敗しても画面上はログアウト扱い）
+    await post('/api/admin/logout').catch(() => {})
     setIsAdmin(false)
   }, [])
 
@@ -1,11 +1,19 @@
 import { useEffect, useRef } from 'react'
 
 const RECONNECT_DELAY = 1500
+const MAX_RECONNECT_DELAY = 15000
+
+/** 待ち時間に 0〜50% のランダムな上乗せをする（再接続が同時に揃わないように） */
+function withJitter(ms) {
+  return ms * (1 + Math.random() * 0.5)
+}
 
 /**
  * WebSocket 接続フック。
  * url が変わると再接続。アンマウント時はクリーンアップ。
- * 1.5 秒後に自動再接続。
+ * 切断時は 1.5 秒（失敗が続くと最大 15 秒）＋ジッタ後に自動再接続。
+ * 最後に受け取った seq を ?resume_from に付けて再接続し、切断中の配信を受け取る。
+ * サーバから retry（接続の混雑）が来たら retry_after_ms に従って待つ。
  */
 export function useWebSocket(url, { onMessage, onOpen, onClose } = {}) {
   const wsRef = useRef(null)
@@ -21,10 +29,14 @@ export function useWebSocket(url, { onMessage, onOpen, onClose } = {}) {
 
   useEffect(() => {
     if (!url) return
+    let lastSeq = null
+    let retryAfter = null
+    let failures = 0
 
     function connect() {
       if (wsRef.current) return
-      const ws = new WebSocket(url)
+      const sep = url.includes('?') ? '&' : '?'
+      const ws = new WebSocket(lastSeq == null ? url : `${url}${sep}resume_from=${lastSeq}`)
       wsRef.current = ws
 
       ws.onopen = () => {
@@ -41,6 +53,14 @@ export function useWebSocket(url, { onMessage, onOpen, onClose } = {}) {
           return
         }
         console.log('[WS] msg', parsed)
+        if (parsed.type === 'retry') {
+          retryAfter = parsed.data?.retry_after_ms ?? null
+          return
+        }
+        failures = 0
+        if (typeof parsed.seq === 'number' && (lastSeq == null || parsed.seq > lastSeq)) {
+          lastSeq = parsed.seq
+        }
         onMessageRef.current?.(parsed)
       }
 
@@ -48,7 +68,11 @@ export function useWebSocket(url, { onMessage, onOpen, onClose } = {}) {
         console.log('[WS] close')
         wsRef.current = null
         onCloseRef.current?.()
-        timerRef.current = setTimeout(connect, RECONNECT_DELAY)
+        const backoff = Math.min(RECONNECT_DELAY * 2 ** failures, MAX_RECONNECT_DELAY)
+        const delay = retryAfter ?? withJitter(backoff)
+        retryAfter = null
+        failures += 1
+        timerRef.current = setTimeout(connect, delay)
       }
 
       ws.onerror = (e) => { console.error('[WS] error', e) }
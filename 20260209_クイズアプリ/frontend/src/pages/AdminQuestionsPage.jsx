@@ -12,17 +12,31 @@ export default function AdminQuestionsPage() {
   return <QuestionsContent />
 }
 
+const PAGE_SIZE = 100
+const EMPTY_FILTERS = { q: '', tag: '', enabled: '' }
+
 function QuestionsContent() {
   const [questions, setQuestions] = useState([])
+  const [nextCursor, setNextCursor] = useState(null)
+  const [filters, setFilters] = useState(EMPTY_FILTERS)
+  const [applied, setApplied] = useState(EMPTY_FILTERS)
   const [editTarget, setEditTarget] = useState(null) // null = 新規, question obj = 編集
   const [showForm, setShowForm] = useState(false)
   const [error, setError] = useState('')
 
-  async function loadQuestions() {
+  // cursor なしなら先頭から読み直し、ありなら続きを末尾に追加する
+  async function loadQuestions(cursor = null, f = applied) {
     try {
-      const res = await get('/api/admin/questions')
+      const params = new URLSearchParams({ limit: PAGE_SIZE })
+      if (f.q.trim()) params.set('q', f.q.trim())
+      f.tag.split(',').map(t => t.trim()).filter(Boolean).forEach(t => params.append('tag', t))
+      if (f.enabled) params.set('enabled', f.enabled)
+      if (cursor) params.set('cursor', cursor)
+      const res = await get(`/api/admin/questions?${params}`)
       if (!res.ok) throw new Error('fetch failed')
-      setQuestions(await res.json())
+      const page = await res.json()
+      setQuestions(prev => (cursor ? [...prev, ...page] : page))
+      setNextCursor(res.headers.get('X-Next-Cursor'))
     } catch (e) {
       setError('問題一覧取得失敗: ' + e.message)
     }
@@ -32,6 +46,22 @@ function QuestionsContent() {
     loadQuestions()
   }, [])
 
+  function handleSearch(e) {
+    e.preventDefault()
+    setApplied(filters)
+    loadQuestions(null, filters)
+  }
+
+  function handleClearFilters() {
+    setFilters(EMPTY_FILTERS)
+    setApplied(EMPTY_FILTERS)
+    loadQuestions(null, EMPTY_FILTERS)
+  }
+
+  const filtered = applied.q.trim() || applied.tag.trim() || applied.enabled
+  // 並び替えは全件を読み込んでいて絞り込みがないときだけ
+  const sortable = !filtered && !nextCursor
+
   function handleEdit(question) {
     setEditTarget(question)
     setShowForm(true)
@@ -77,17 +107,52 @@ function QuestionsContent() {
         </button>
       )}
 
+      <form onSubmit={handleSearch} style={{ display: 'flex', gap: 6, flexWrap: 'wrap', marginBottom: 12 }}>
+        <input
+          type="search"
+          placeholder="問題文・選択肢で検索"
+          value={filters.q}
+          onChange={e => setFilters(f => ({ ...f, q: e.target.value }))}
+        />
+        <input
+          type="text"
+          placeholder="タグ（カンマ区切り）"
+          value={filters.tag}
+          onChange={e => setFilters(f => ({ ...f, tag: e.target.value }))}
+        />
+        <select
+          value={filters.enabled}
+          onChange={e => setFilters(f => ({ ...f, enabled: e.target.value }))}
+        >
+          <option value="">すべて</option>
+          <option value="true">有効のみ</option>
+          <option value="false">無効のみ</option>
+        </select>
+        <button type="submit">検索</button>
+        {filtered && <button type="button" onClick={handleClearFilters}>クリア</button>}
+      </form>
+
       <div>
         <p style={{ color: '#555', fontSize: '0.9em', margin: '0 0 8px' }}>
-          ドラッグ&ドロップで並び替え可能です
+          {sortable
+            ? 'ドラッグ&ドロップで並び替え可能です'
+            : '並び替えは絞り込みを解除し、全件を読み込むと使えます'}
         </p>
         <QuestionList
           questions={questions}
           onQuestionsChange={setQuestions}
           onEdit={handleEdit}
+          sortable={sortable}
         />
+        {nextCursor && (
+          <button onClick={() => loadQuestions(nextCursor)} style={{ marginTop: 8 }}>
+            さらに読み込む
+          </button>
+        )}
         {questions.length === 0 && !error && (
-          <p style={{ color: '#888' }}>問題がありません。新規作成してください。</p>
+          <p style={{ color: '#888' }}>
+            {filtered ? '条件に合う問題がありません。' : '問題がありません。新規作成してください。'}
+          </p>
         )}
       </div>
     </div>
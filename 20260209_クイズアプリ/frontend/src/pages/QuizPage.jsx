@@ -1,4 +1,4 @@
-import { useEffect, useCallback, useState } from 'react'
+import { useEffect, useCallback, useRef, useState } from 'react'
 import { useParams, useNavigate } from 'react-router-dom'
 import { post } from '../api/client'
 
@@ -7,26 +7,42 @@ import { useWebSocket } from '../hooks/useWebSocket'
 import { useEvent, EventProvider } from '../contexts/EventContext'
 import ChoiceButton from '../components/ChoiceButton'
 import Timer from '../components/Timer'
+import ResponsiveImage, { preloadImages } from '../components/ResponsiveImage'
 
 const POLL_INTERVAL_MS = 3000  // WS切断時のポーリング間隔
+// 回答送信の再試行（通信エラー・5xx のみ。同じ Idempotency-Key で再送する）
+const SUBMIT_RETRY_DELAYS_MS = [300, 1000, 2000]
+
+function newIdempotencyKey() {
+  if (window.crypto?.randomUUID) return window.crypto.randomUUID()
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`
+}
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms))
 
 function QuizContent() {
   const { eventId } = useParams()
   const navigate = useNavigate()
   const { eventState, currentQuestion, myAnswer, me, fetchState } = useEvent()
   const [wsConnected, setWsConnected] = useState(false)
+  // question_id -> 送信中の Idempotency-Key（再送・連打でも同じキーを使う）
+  const submitKeys = useRef({})
 
   // WS URL（プロキシ経由）
   const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:'
   const wsUrl = `${protocol}//${window.location.host}/api/ws?event_id=${eventId}`
 
   const handleMessage = useCallback((msg) => {
+    if (msg.type === 'event.state_changed' && msg.data?.prefetch) {
+      preloadImages(msg.data.prefetch)
+    }
     if (
       msg.type === 'question.shown' ||
       msg.type === 'question.revealed' ||
       msg.type === 'event.state_changed' ||
       msg.type === 'question.closed' ||
-      msg.type === 'event.finished'
+      msg.type === 'event.finished' ||
+      msg.type === 'resync'
     ) {
       fetchState(eventId)
     }
@@ -65,16 +81,20 @@ function QuizContent() {
   }
 
   async function submitAnswer(choice_index) {
-    try {
-      const res = await post(
-        `/api/events/${eventId}/questions/${encodeURIComponent(currentQuestion.question_id)}/answers`,
-        { choice_index }
-      )
-      if (res.status === 409) return
-      await fetchState(eventId)
-    } catch (e) {
-      console.error('submitAnswer', e)
+    const questionId = currentQuestion.question_id
+    const key = submitKeys.current[questionId] ||= newIdempotencyKey()
+    const url = `/api/events/${eventId}/questions/${encodeURIComponent(questionId)}/answers`
+    for (let attempt = 0; ; attempt++) {
+      try {
+        const res = await post(url, { choice_index }, { 'Idempotency-Key': key })
+        if (res.status < 500) break  // 受理・409・400 は再送しない
+      } catch (e) {
+        console.error('submitAnswer', e)
+      }
+      if (attempt >= SUBMIT_RETRY_DELAYS_MS.length) break
+      await sleep(SUBMIT_RETRY_DELAYS_MS[attempt])
     }
+    await fetchState(eventId)
   }
 
   // T-082: abort 状態
@@ -145,8 +165,9 @@ function QuizContent() {
       {currentQuestion ? (
         <div>
           {currentQuestion.question_image && (
-            <img
+            <ResponsiveImage
               src={currentQuestion.question_image}
+              sources={currentQuestion.question_image_sources}
               alt="問題画像"
               style={{ maxHeight: 200, marginBottom: 8 }}
             />